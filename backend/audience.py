@@ -0,0 +1,255 @@
+"""
+AUDIENCE - Résolution des destinataires des campagnes (email / WhatsApp)
+Streame les contacts depuis les curseurs MongoDB par lots avec une projection
+minimale, et dédoublonne users + chat_participants par email ou téléphone normalisé.
+
+Utilisé par server.launch_campaign (Motor, async), scheduler_engine et scheduler.py (pymongo).
+Aucune liste de documents n'est matérialisée: seules les clés de dédoublonnage sont gardées.
+Les issues par contact (CampaignResultWriter / SyncCampaignResultWriter) sont écrites par lots
+dans campaign_results: seuls des compteurs et un aperçu borné restent en mémoire.
+"""
+
+import re
+import logging
+from typing import Dict, Any, Iterator, AsyncIterator, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Champs nécessaires à l'envoi - le reste du document ne quitte pas MongoDB
+AUDIENCE_PROJECTION = {"_id": 0, "id": 1, "name": 1, "email": 1, "whatsapp": 1}
+
+# Ordre de priorité: un contact présent dans users l'emporte sur son doublon CRM
+AUDIENCE_COLLECTIONS = ("users", "chat_participants")
+
+# Taille des lots rapatriés par le curseur
+DEFAULT_BATCH_SIZE = 500
+
+# Découpage des listes selectedContacts pour garder des requêtes $in bornées
+SELECTED_IDS_CHUNK = 1000
+
+# Issues par contact: collection, taille des lots écrits, aperçu gardé sur le document campagne
+CAMPAIGN_RESULTS = "campaign_results"
+RESULT_BATCH_SIZE = 500
+RESULTS_PREVIEW = 200
+
+_PHONE_STRIP = re.compile(r'[^\d+]')
+
+
+def normalize_email(email: str) -> str:
+    """Email normalisé pour la comparaison (minuscules, sans espaces)."""
+    return (email or "").strip().lower()
+
+
+def normalize_phone(phone: str) -> str:
+    """
+    Téléphone normalisé au format international.
+    Même convention que l'envoi Twilio: un numéro local (0...) est suisse (+41).
+    """
+    digits = _PHONE_STRIP.sub('', phone or '')
+    if not digits or digits == '+':
+        return ""
+    if digits.startswith("00"):
+        return "+" + digits[2:]
+    if digits.startswith("0"):
+        return "+41" + digits[1:]
+    if not digits.startswith("+"):
+        return "+" + digits
+    return digits
+
+
+def audience_queries(campaign: Dict[str, Any]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Requêtes (collection, filtre) à exécuter pour une campagne.
+    - targetType "all": tous les users puis tous les chat_participants
+    - targetType "segment": les membres matérialisés du segment (un seul curseur indexé)
+    - sinon: les selectedContacts (ids users OU participants CRM), par paquets
+    """
+    if campaign.get("targetType", "all") == "all":
+        for collection in AUDIENCE_COLLECTIONS:
+            yield collection, {}
+        return
+
+    if campaign.get("targetType") == "segment":
+        if campaign.get("targetSegmentId"):
+            yield "segment_members", {"segment_id": campaign["targetSegmentId"]}
+        return
+
+    selected_ids = [cid for cid in (campaign.get("selectedContacts") or []) if cid]
+    for start in range(0, len(selected_ids), SELECTED_IDS_CHUNK):
+        chunk = selected_ids[start:start + SELECTED_IDS_CHUNK]
+        for collection in AUDIENCE_COLLECTIONS:
+            yield collection, {"id": {"$in": chunk}}
+
+
+class AudienceDeduplicator:
+    """Filtre les contacts déjà vus (même email OU même téléphone normalisé)."""
+
+    def __init__(self):
+        self._seen = set()
+        self.duplicates = 0
+
+    def admit(self, contact: Dict[str, Any]) -> bool:
+        keys = []
+        email = normalize_email(contact.get("email"))
+        phone = normalize_phone(contact.get("whatsapp"))
+        if email:
+            keys.append("e:" + email)
+        if phone:
+            keys.append("p:" + phone)
+        if not keys and contact.get("id"):
+            keys.append("i:" + contact["id"])
+        if not keys:
+            return False
+
+        known = any(key in self._seen for key in keys)
+        # Un doublon qui apporte un nouvel identifiant (ex: téléphone) le rattache à la même personne
+        self._seen.update(keys)
+        if known:
+            self.duplicates += 1
+            return False
+        return True
+
+
+def iter_audience(db, campaign: Dict[str, Any], batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[Dict[str, Any]]:
+    """Version synchrone (pymongo) - scheduler_engine / scheduler.py."""
+    dedup = AudienceDeduplicator()
+    for collection, query in audience_queries(campaign):
+        cursor = db[collection].find(query, AUDIENCE_PROJECTION).batch_size(batch_size)
+        try:
+            for contact in cursor:
+                if dedup.admit(contact):
+                    yield contact
+        finally:
+            cursor.close()
+    if dedup.duplicates:
+        logger.info(f"[AUDIENCE] {dedup.duplicates} doublon(s) ignoré(s) pour '{campaign.get('name', campaign.get('id'))}'")
+
+
+async def aiter_audience(db, campaign: Dict[str, Any], batch_size: int = DEFAULT_BATCH_SIZE) -> AsyncIterator[Dict[str, Any]]:
+    """Version asynchrone (Motor) - launch_campaign. Chaque lot rend la main à la boucle d'événements."""
+    dedup = AudienceDeduplicator()
+    for collection, query in audience_queries(campaign):
+        cursor = db[collection].find(query, AUDIENCE_PROJECTION).batch_size(batch_size)
+        try:
+            async for contact in cursor:
+                if dedup.admit(contact):
+                    yield contact
+        finally:
+            await cursor.close()
+    if dedup.duplicates:
+        logger.info(f"[AUDIENCE] {dedup.duplicates} doublon(s) ignoré(s) pour '{campaign.get('name', campaign.get('id'))}'")
+
+
+class CampaignResultWriter:
+    """
+    Issues d'un lancement de campagne: insert_many par lots dans campaign_results.
+    Mémoire constante quelle que soit l'audience (compteurs par statut + aperçu des premières issues).
+    """
+
+    def __init__(self, db, campaign_id: str, batch_size: int = RESULT_BATCH_SIZE, preview: int = RESULTS_PREVIEW):
+        self._db = db
+        self._campaign_id = campaign_id
+        self._batch_size = batch_size
+        self._preview_size = preview
+        self._buffer = []
+        self.preview = []
+        self.counts: Dict[str, int] = {}
+
+    def _resume(self, campaign: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Reprend les issues déjà enregistrées (scheduler: une campagne récurrente cumule ses dates).
+        Retourne les issues de l'ancien format (liste complète sur le document) à recopier.
+        """
+        if campaign.get("resultsSummary") is not None:
+            self.counts = {k: v for k, v in campaign["resultsSummary"].items() if k != "total"}
+            self.preview = list(campaign.get("results") or [])[:self._preview_size]
+            return []
+        return list(campaign.get("results") or [])
+
+    def _record(self, result: Dict[str, Any]) -> bool:
+        """Compte l'issue et la met en tampon; True quand le lot est plein."""
+        status = result.get("status", "pending")
+        self.counts[status] = self.counts.get(status, 0) + 1
+        if len(self.preview) < self._preview_size:
+            self.preview.append(result)
+        self._buffer.append({**result, "campaign_id": self._campaign_id})
+        return len(self._buffer) >= self._batch_size
+
+    def _sent_query(self, contact_id: str, channel: str) -> Dict[str, Any]:
+        return {"campaign_id": self._campaign_id, "contactId": contact_id, "channel": channel, "status": "sent"}
+
+    def _buffered_sent(self, contact_id: str, channel: str) -> bool:
+        return any(r.get("contactId") == contact_id and r.get("channel") == channel and r.get("status") == "sent"
+                   for r in self._buffer)
+
+    async def reset(self):
+        """Relance: les issues du lancement précédent sont remplacées."""
+        await self._db[CAMPAIGN_RESULTS].delete_many({"campaign_id": self._campaign_id})
+
+    async def resume(self, campaign: Dict[str, Any]):
+        legacy = self._resume(campaign)
+        if legacy:
+            for result in legacy:
+                await self.add(result)
+            await self.flush()
+            # Document converti tout de suite: une reprise interrompue ne recopie pas deux fois
+            await self._db.campaigns.update_one({"id": self._campaign_id}, {"$set": self._document_fields()})
+
+    async def add(self, result: Dict[str, Any]):
+        if self._record(result):
+            await self.flush()
+
+    async def flush(self):
+        if self._buffer:
+            batch, self._buffer = self._buffer, []
+            await self._db[CAMPAIGN_RESULTS].insert_many(batch, ordered=False)
+
+    async def already_sent(self, contact_id: str, channel: str) -> bool:
+        """Tampon du lot en cours (borné), puis lookup indexé (campaign_id, contactId, channel)."""
+        if self._buffered_sent(contact_id, channel):
+            return True
+        return await self._db[CAMPAIGN_RESULTS].find_one(self._sent_query(contact_id, channel), {"_id": 1}) is not None
+
+    @property
+    def summary(self) -> Dict[str, int]:
+        return {"total": sum(self.counts.values()), **self.counts}
+
+    def _document_fields(self) -> Dict[str, Any]:
+        return {"results": self.preview, "resultsSummary": self.summary}
+
+
+class SyncCampaignResultWriter(CampaignResultWriter):
+    """Même écriture par lots en pymongo (scheduler_engine, scheduler.py)."""
+
+    def reset(self):
+        self._db[CAMPAIGN_RESULTS].delete_many({"campaign_id": self._campaign_id})
+
+    def resume(self, campaign: Dict[str, Any]):
+        legacy = self._resume(campaign)
+        if legacy:
+            for result in legacy:
+                self.add(result)
+            self.flush()
+            self._db.campaigns.update_one({"id": self._campaign_id}, {"$set": self._document_fields()})
+
+    def add(self, result: Dict[str, Any]):
+        if self._record(result):
+            self.flush()
+
+    def flush(self):
+        if self._buffer:
+            batch, self._buffer = self._buffer, []
+            self._db[CAMPAIGN_RESULTS].insert_many(batch, ordered=False)
+
+    def already_sent(self, contact_id: str, channel: str) -> bool:
+        if self._buffered_sent(contact_id, channel):
+            return True
+        return self._db[CAMPAIGN_RESULTS].find_one(self._sent_query(contact_id, channel), {"_id": 1}) is not None
+
+
+def ensure_campaign_result_indexes_sync(db):
+    db[CAMPAIGN_RESULTS].create_index([("campaign_id", 1), ("contactId", 1), ("channel", 1)])
+
+
+async def ensure_campaign_result_indexes(db):
+    await db[CAMPAIGN_RESULTS].create_index([("campaign_id", 1), ("contactId", 1), ("channel", 1)])
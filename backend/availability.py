@@ -0,0 +1,237 @@
+"""
+AVAILABILITY - Places par séance de cours (course, date)
+Les cours n'ont qu'une règle weekday/time et les réservations une liste selectedDates:
+savoir si une séance est complète demandait de parcourir les réservations.
+
+- course_occurrences: _id = "<course_id>:<YYYY-MM-DD>", booked = réservations sur la séance
+- reserve_seats(): $inc conditionnel (booked <= capacity - seats), deux réservations simultanées
+  ne dépassent jamais la capacité; les dates déjà prises sont rendues si une date est complète
+- release_seats(): suppression d'une réservation (jamais en dessous de 0)
+- compteurs amorcés à l'écriture ($setOnInsert après comptage exact): à la réservation, à
+  l'écriture d'un cours avec capacité (seed_course_occurrences) et par un rattrapage au
+  démarrage (backfill_occurrences) pour les séances à venir
+- course_availability(): lecture seule, route publique. Séances calculées depuis weekday
+  (0 = dimanche, convention du frontend), une lecture des compteurs pour toute la fenêtre et,
+  pour les séances sans compteur, une seule lecture des réservations (aucune écriture)
+"""
+
+import logging
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Any, List, Optional, Tuple
+
+import pytz
+from fastapi import HTTPException
+from pymongo.errors import DuplicateKeyError
+
+from bson_dates import as_datetime
+
+logger = logging.getLogger(__name__)
+
+OCCURRENCES = "course_occurrences"
+COURSE_TZ = pytz.timezone('Europe/Paris')
+DEFAULT_WINDOW_DAYS = 28
+MAX_WINDOW_DAYS = 92
+
+
+# ==================== DATES ====================
+
+def occurrence_date(value) -> Optional[str]:
+    """Date sélectionnée (ISO UTC envoyé par le frontend ou 'YYYY-MM-DD') -> jour local de la séance."""
+    if isinstance(value, str) and len(value.strip()) == 10:
+        try:
+            return date.fromisoformat(value.strip()).isoformat()
+        except ValueError:
+            return None
+    moment = as_datetime(value)
+    return moment.astimezone(COURSE_TZ).date().isoformat() if moment else None
+
+
+def booked_dates(reservation: Dict[str, Any]) -> List[str]:
+    """Séances occupées par une réservation de cours (aucune pour un produit)."""
+    course_id = reservation.get("courseId")
+    if reservation.get("isProduct") or not course_id or course_id == "N/A":
+        return []
+    days = {occurrence_date(value) for value in reservation.get("selectedDates") or []}
+    return sorted(day for day in days if day)
+
+
+def occurrences(weekday: int, start: date, end: date) -> List[date]:
+    """Séances du cours entre start et end inclus (weekday: 0 = dimanche ... 6 = samedi)."""
+    python_weekday = (weekday - 1) % 7
+    current = start + timedelta(days=(python_weekday - start.weekday()) % 7)
+    days = []
+    while current <= end:
+        days.append(current)
+        current += timedelta(days=7)
+    return days
+
+
+def parse_window(start: Optional[str], end: Optional[str]) -> Tuple[date, date]:
+    """?from&to (YYYY-MM-DD), par défaut les 4 prochaines semaines; 400 si invalide."""
+    try:
+        first = date.fromisoformat(start) if start else datetime.now(COURSE_TZ).date()
+        last = date.fromisoformat(end) if end else first + timedelta(days=DEFAULT_WINDOW_DAYS - 1)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates invalides (format YYYY-MM-DD)")
+    if last < first or (last - first).days >= MAX_WINDOW_DAYS:
+        raise HTTPException(status_code=400, detail=f"Fenêtre invalide (max {MAX_WINDOW_DAYS} jours)")
+    return first, last
+
+
+def _local_start(day: date, course_time: str = "00:00") -> datetime:
+    try:
+        hours, minutes = (int(part) for part in course_time.split(":")[:2])
+    except (ValueError, AttributeError):
+        hours, minutes = 0, 0
+    return COURSE_TZ.localize(datetime.combine(day, time(hours, minutes)))
+
+
+def _day_bounds(day: str) -> Tuple[str, str]:
+    """Jour local -> bornes UTC en chaînes ISO (selectedDates est stocké tel qu'envoyé)."""
+    start = date.fromisoformat(day)
+    fmt = "%Y-%m-%dT%H:%M:%S"
+    return (_local_start(start).astimezone(pytz.UTC).strftime(fmt),
+            _local_start(start + timedelta(days=1)).astimezone(pytz.UTC).strftime(fmt))
+
+
+# ==================== COMPTEURS ====================
+
+def occurrence_key(course_id: str, day: str) -> str:
+    return f"{course_id}:{day}"
+
+
+def course_capacity(course: Optional[Dict[str, Any]]) -> Optional[int]:
+    """None = places illimitées."""
+    capacity = (course or {}).get("capacity")
+    return capacity if isinstance(capacity, int) and capacity >= 0 else None
+
+
+async def _computed_counts(db, course_id: str, days: List[str]) -> Dict[str, int]:
+    """Réservations par séance, comptées depuis reservations en une seule lecture (aucune écriture)."""
+    counts = dict.fromkeys(days, 0)
+    if not days:
+        return counts
+    low, high = _day_bounds(min(days))[0], _day_bounds(max(days))[1]
+    cursor = db.reservations.find(
+        {"courseId": course_id, "selectedDates": {"$elemMatch": {"$gte": low, "$lt": high}}},
+        {"_id": 0, "courseId": 1, "isProduct": 1, "selectedDates": 1}
+    )
+    async for reservation in cursor:
+        for day in booked_dates(reservation):
+            if day in counts:
+                counts[day] += 1
+    return counts
+
+
+async def _seed(db, course_id: str, days: List[str]) -> Dict[str, int]:
+    counts = await _computed_counts(db, course_id, days)
+    for day, booked in counts.items():
+        try:
+            await db[OCCURRENCES].update_one(
+                {"_id": occurrence_key(course_id, day)},
+                {"$setOnInsert": {"course_id": course_id, "date": day, "booked": booked}}, upsert=True
+            )
+        except DuplicateKeyError:
+            pass  # amorcé en parallèle par une autre requête
+    return counts
+
+
+async def _take(db, course_id: str, day: str, capacity: Optional[int], seats: int) -> bool:
+    guard = {"_id": occurrence_key(course_id, day)}
+    if capacity is not None:
+        guard["booked"] = {"$lte": capacity - seats}
+    result = await db[OCCURRENCES].update_one(guard, {"$inc": {"booked": seats}})
+    return result.matched_count > 0
+
+
+async def reserve_seats(db, course_id: str, days: List[str], capacity: Optional[int], seats: int = 1):
+    """Prend une place sur chaque séance; 409 (et rien de pris) si l'une d'elles est complète."""
+    taken = []
+    for day in days:
+        ok = await _take(db, course_id, day, capacity, seats)
+        if not ok and not await db[OCCURRENCES].find_one({"_id": occurrence_key(course_id, day)}, {"_id": 1}):
+            await _seed(db, course_id, [day])
+            ok = await _take(db, course_id, day, capacity, seats)
+        if not ok:
+            for done in taken:
+                await db[OCCURRENCES].update_one({"_id": occurrence_key(course_id, done)}, {"$inc": {"booked": -seats}})
+            raise HTTPException(status_code=409, detail=f"Séance complète le {day}")
+        taken.append(day)
+
+
+async def release_seats(db, course_id: str, days: List[str], seats: int = 1):
+    # Pas d'upsert: un compteur absent est amorcé par un comptage exact au prochain accès
+    for day in days:
+        await db[OCCURRENCES].update_one({"_id": occurrence_key(course_id, day), "booked": {"$gte": seats}},
+                                         {"$inc": {"booked": -seats}})
+
+
+async def on_reservation_released(db, reservation: Dict[str, Any]):
+    days = booked_dates(reservation)
+    if days:
+        await release_seats(db, reservation["courseId"], days)
+
+
+async def drop_course_occurrences(db, course_ids: Optional[List[str]] = None):
+    """Cours supprimés (ou import en masse si None): compteurs recalculés au prochain accès."""
+    await db[OCCURRENCES].delete_many({"course_id": {"$in": course_ids}} if course_ids is not None else {})
+
+
+async def _counters(db, course_id: str, days: List[str]) -> Dict[str, int]:
+    return {
+        counter["date"]: counter.get("booked", 0)
+        async for counter in db[OCCURRENCES].find({"course_id": course_id, "date": {"$in": days}}, {"date": 1, "booked": 1})
+    }
+
+
+def _window_days(course: Dict[str, Any], start: Optional[date], end: Optional[date]) -> List[str]:
+    start = start or datetime.now(COURSE_TZ).date()
+    end = end or start + timedelta(days=DEFAULT_WINDOW_DAYS - 1)
+    return [day.isoformat() for day in occurrences(course.get("weekday", 0), start, end)]
+
+
+async def seed_course_occurrences(db, course: Dict[str, Any], start: Optional[date] = None,
+                                  end: Optional[date] = None) -> int:
+    """Amorce les compteurs manquants des séances (4 prochaines semaines par défaut); retourne leur nombre."""
+    if course_capacity(course) is None:
+        return 0
+    days = _window_days(course, start, end)
+    missing = [day for day in days if day not in await _counters(db, course["id"], days)]
+    if missing:
+        await _seed(db, course["id"], missing)
+    return len(missing)
+
+
+async def backfill_occurrences(db) -> int:
+    """Rattrapage au démarrage: séances à venir de tous les cours actifs avec capacité."""
+    seeded = 0
+    async for course in db.courses.find({"archived": {"$ne": True}}, {"_id": 0, "id": 1, "weekday": 1, "capacity": 1}):
+        seeded += await seed_course_occurrences(db, course)
+    return seeded
+
+
+async def course_availability(db, course: Dict[str, Any], start: date, end: date) -> Dict[str, Any]:
+    """Places par séance - lecture seule: une séance sans compteur est comptée sans être amorcée."""
+    course_id = course["id"]
+    capacity = course_capacity(course)
+    days = _window_days(course, start, end)
+    counters = await _counters(db, course_id, days)
+    missing = [day for day in days if day not in counters]
+    if missing:
+        counters.update(await _computed_counts(db, course_id, missing))
+    rows = []
+    for day in days:
+        booked = counters[day]
+        rows.append({
+            "date": day,
+            "startsAt": _local_start(date.fromisoformat(day), course.get("time", "00:00")).isoformat(),
+            "booked": booked,
+            "remaining": max(capacity - booked, 0) if capacity is not None else None,
+            "full": capacity is not None and booked >= capacity
+        })
+    return {"courseId": course_id, "capacity": capacity, "occurrences": rows}
+
+
+async def ensure_availability_indexes(db):
+    await db[OCCURRENCES].create_index([("course_id", 1), ("date", 1)])
+    await db.reservations.create_index([("courseId", 1)])
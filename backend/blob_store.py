@@ -0,0 +1,233 @@
+"""
+BLOB STORE - Stockage des uploads adressé par contenu (SHA-256)
+Chaque image est rangée sous uploads/blobs/<2 premiers hex>/<sha256>_<taille>.<ext>:
+un même fichier renvoyé (avatar re-uploadé) est dédoublonné sans réécriture ni
+retraitement. La collection `blobs` tient un compteur de références depuis
+users / chat_participants / coaches; le ramasse-miettes recalcule ces compteurs
+(phase de marquage) puis supprime les blobs non référencés depuis plus que le délai de
+grâce, compté depuis la dernière référence (last_ref_at) et non depuis la création.
+
+Usage (ramasse-miettes):
+    python3 blob_store.py --dry-run          # rapport sans suppression
+    python3 blob_store.py --grace-hours 24   # supprime les blobs orphelins depuis > 24h
+    python3 blob_store.py --legacy           # + anciens fichiers uploads/profiles non référencés
+"""
+
+import os
+import re
+import time
+import hashlib
+import logging
+from collections import Counter
+from datetime import datetime, timezone, timedelta
+from typing import Dict, Any, Iterable, Optional, Sequence
+
+from image_variants import process_image, variant_urls, AVATAR_SIZES
+
+logger = logging.getLogger(__name__)
+
+BLOBS_DIR = os.environ.get('BLOBS_DIR', '/app/backend/uploads/blobs')
+BLOB_URL_PREFIX = "/api/uploads/blobs"
+LEGACY_PROFILES_DIR = "/app/backend/uploads/profiles"
+LEGACY_PROFILES_URL_PREFIX = "/api/uploads/profiles/"
+
+# Champs qui référencent un upload, par collection
+BLOB_REFERENCES = {
+    "users": ("photo_url", "photoUrl"),
+    "chat_participants": ("photo_url", "photoUrl"),
+    "coaches": ("photo_url", "logo_url"),
+}
+
+# Délai avant suppression d'un blob sans référence depuis sa dernière référence (upload en cours d'enregistrement)
+DEFAULT_GRACE_SECONDS = 3600
+
+_BLOB_URL = re.compile(r'^/api/uploads/blobs/[0-9a-f]{2}/([0-9a-f]{64})_')
+_BLOB_FILE = re.compile(r'^([0-9a-f]{64})_')
+
+
+def sha256_hex(contents: bytes) -> str:
+    return hashlib.sha256(contents).hexdigest()
+
+
+def blob_dir(sha: str, root: str = BLOBS_DIR) -> str:
+    return os.path.join(root, sha[:2])
+
+
+def sha_from_url(url: Optional[str]) -> Optional[str]:
+    """Hash du blob désigné par une URL publique (None si ce n'est pas un blob)."""
+    match = _BLOB_URL.match(url or "")
+    return match.group(1) if match else None
+
+
+async def store_image(db, source, sizes: Sequence[int] = AVATAR_SIZES, sha: Optional[str] = None,
+                      root: str = BLOBS_DIR) -> Dict[str, Any]:
+    """
+    Enregistre une image (bytes ou chemin) et ses variantes; retourne le document blob.
+    Contenu déjà connu: aucun décodage, aucune écriture ("deduplicated": True).
+    """
+    if sha is None:
+        sha = sha256_hex(source)
+    existing = await db.blobs.find_one({"sha256": sha}, {"_id": 0})
+    if existing and all(os.path.exists(os.path.join(blob_dir(sha, root), name)) for name in existing.get("files", [])):
+        # Re-référencé par l'upload en cours: le délai de grâce du GC repart de maintenant
+        await db.blobs.update_one({"sha256": sha}, {"$set": {"last_ref_at": datetime.now(timezone.utc).isoformat()}})
+        existing["deduplicated"] = True
+        return existing
+
+    result = await process_image(source, blob_dir(sha, root), sha, sizes)
+    files = [name for variant in result["variants"].values() for name in (variant["jpeg"], variant["webp"])]
+    now = datetime.now(timezone.utc).isoformat()
+    blob = {
+        "sha256": sha,
+        "kind": "image",
+        "width": result["width"],
+        "height": result["height"],
+        "variants": variant_urls(result, f"{BLOB_URL_PREFIX}/{sha[:2]}"),
+        "files": files,
+        "bytes": sum(os.path.getsize(os.path.join(blob_dir(sha, root), name)) for name in files),
+        "created_at": now,
+        "last_ref_at": now,
+    }
+    # Deux uploads simultanés du même contenu: un seul document
+    await db.blobs.update_one(
+        {"sha256": sha},
+        {"$set": {k: v for k, v in blob.items() if k != "created_at"}, "$setOnInsert": {"created_at": now, "ref_count": 0}},
+        upsert=True
+    )
+    blob["deduplicated"] = False
+    return blob
+
+
+async def adjust_refs(db, added: Iterable[Optional[str]] = (), removed: Iterable[Optional[str]] = ()):
+    """Met à jour les compteurs de références à partir d'URLs ajoutées / retirées."""
+    delta = Counter()
+    for url in added:
+        sha = sha_from_url(url)
+        if sha:
+            delta[sha] += 1
+    for url in removed:
+        sha = sha_from_url(url)
+        if sha:
+            delta[sha] -= 1
+    now = datetime.now(timezone.utc).isoformat()
+    for sha, change in delta.items():
+        if change:
+            await db.blobs.update_one({"sha256": sha}, {"$inc": {"ref_count": change}, "$set": {"last_ref_at": now}})
+
+
+async def count_references(db) -> Dict[str, Counter]:
+    """Phase de marquage: références réelles aux blobs et aux anciens fichiers de profil."""
+    blob_refs, legacy_refs = Counter(), Counter()
+    for collection, fields in BLOB_REFERENCES.items():
+        query = {"$or": [{field: {"$regex": "^/api/uploads/"}} for field in fields]}
+        projection = {"_id": 0, **{field: 1 for field in fields}}
+        async for doc in db[collection].find(query, projection).batch_size(1000):
+            # photo_url et photoUrl portent la même valeur: une référence par document
+            for url in set(doc.get(field) for field in fields if doc.get(field)):
+                sha = sha_from_url(url)
+                if sha:
+                    blob_refs[sha] += 1
+                elif url.startswith(LEGACY_PROFILES_URL_PREFIX):
+                    legacy_refs[url[len(LEGACY_PROFILES_URL_PREFIX):]] += 1
+    return {"blobs": blob_refs, "legacy": legacy_refs}
+
+
+async def collect_garbage(db, root: str = BLOBS_DIR, grace_seconds: int = DEFAULT_GRACE_SECONDS,
+                          dry_run: bool = False, legacy_dir: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Recalcule les compteurs puis supprime les blobs sans référence plus vieux que grace_seconds,
+    ainsi que les fichiers orphelins (sans document blob). legacy_dir: balaie aussi les anciens
+    fichiers {participant_id}_{uuid}.jpg non référencés.
+    """
+    refs = await count_references(db)
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=grace_seconds)
+    report = {"recounted": 0, "deleted_blobs": 0, "deleted_files": 0, "freed_bytes": 0, "dry_run": dry_run}
+
+    known = set()
+    cutoff_iso = cutoff.isoformat()
+    projection = {"_id": 0, "sha256": 1, "ref_count": 1, "files": 1, "created_at": 1, "last_ref_at": 1}
+    async for blob in db.blobs.find({}, projection):
+        sha = blob["sha256"]
+        known.add(sha)
+        actual = refs["blobs"].get(sha, 0)
+        if blob.get("ref_count") != actual:
+            report["recounted"] += 1
+            if not dry_run:
+                await db.blobs.update_one({"sha256": sha}, {"$set": {"ref_count": actual}})
+        if actual or max(blob.get("created_at") or "", blob.get("last_ref_at") or "") > cutoff_iso:
+            continue
+        if not dry_run:
+            # Conditionnel: une référence ajoutée entre-temps (adjust_refs, upload dédoublonné) protège le blob
+            deleted = await db.blobs.delete_one({"sha256": sha, "ref_count": 0, "$or": [
+                {"last_ref_at": {"$exists": False}}, {"last_ref_at": {"$lte": cutoff_iso}}
+            ]})
+            if not deleted.deleted_count:
+                continue
+        for name in blob.get("files", []):
+            report["freed_bytes"] += _remove(os.path.join(blob_dir(sha, root), name), dry_run)
+            report["deleted_files"] += 1
+        report["deleted_blobs"] += 1
+
+    # Fichiers écrits sans document (upload interrompu)
+    cutoff_ts = time.time() - grace_seconds
+    for path in _iter_files(root):
+        match = _BLOB_FILE.match(os.path.basename(path))
+        if (not match or match.group(1) not in known) and os.path.getmtime(path) < cutoff_ts:
+            report["freed_bytes"] += _remove(path, dry_run)
+            report["deleted_files"] += 1
+
+    if legacy_dir:
+        report["deleted_legacy"] = 0
+        for path in _iter_files(legacy_dir):
+            if os.path.basename(path) not in refs["legacy"] and os.path.getmtime(path) < cutoff_ts:
+                report["freed_bytes"] += _remove(path, dry_run)
+                report["deleted_legacy"] += 1
+
+    logger.info(f"[BLOBS] GC{' (dry-run)' if dry_run else ''}: {report}")
+    return report
+
+
+def _iter_files(root: str):
+    if not os.path.isdir(root):
+        return
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            yield os.path.join(dirpath, name)
+
+
+def _remove(path: str, dry_run: bool) -> int:
+    try:
+        size = os.path.getsize(path)
+        if not dry_run:
+            os.unlink(path)
+        return size
+    except FileNotFoundError:
+        return 0
+
+
+def main():
+    import argparse
+    import asyncio
+    import json
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from dotenv import load_dotenv
+
+    load_dotenv(os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env'))
+    parser = argparse.ArgumentParser(description="Ramasse-miettes du blob store Afroboost")
+    parser.add_argument("--dry-run", action="store_true", help="Rapport sans suppression")
+    parser.add_argument("--grace-hours", type=float, default=DEFAULT_GRACE_SECONDS / 3600)
+    parser.add_argument("--legacy", action="store_true", help="Balaie aussi uploads/profiles")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ.get('DB_NAME', 'afroboost_db')]
+    report = asyncio.run(collect_garbage(
+        db, grace_seconds=int(args.grace_hours * 3600), dry_run=args.dry_run,
+        legacy_dir=LEGACY_PROFILES_DIR if args.legacy else None
+    ))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
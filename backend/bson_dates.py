@@ -0,0 +1,142 @@
+"""
+BSON DATES - Horodatages stockés en dates BSON natives
+Les dates de chat_messages, chat_sessions, reservations, campaigns et ai_logs étaient des
+chaînes ISO, tantôt 'Z' tantôt '+00:00': les fenêtres de temps comparaient des chaînes,
+sync_messages normalisait `since` et get_reservations reparsait chaque ligne.
+
+- with_dates(): convertit les champs date d'un document avant écriture (DATE_FIELDS)
+- as_datetime() / iso(): lecture tolérante des deux formats pendant la migration,
+  sortie ISO '+00:00' pour les charges utiles Socket.IO / JSON manuelles
+- time_after() / time_before(): filtre de fenêtre qui couvre dates BSON et anciennes chaînes
+- migrate_dates(): migration en ligne par lots (_id croissant), reprise au dernier _id
+  enregistré dans date_migrations après un redémarrage
+"""
+
+import os
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Any, Optional, Sequence
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+DATE_FIELDS: Dict[str, Sequence[str]] = {
+    "chat_messages": ("created_at",),
+    "chat_sessions": ("created_at", "updated_at", "last_message_at"),
+    "reservations": ("createdAt", "validatedAt"),
+    "campaigns": ("createdAt", "updatedAt"),
+    "ai_logs": ("timestamp",),
+}
+MIGRATIONS = "date_migrations"
+DATE_MIGRATION_BATCH = int(os.environ.get('DATE_MIGRATION_BATCH', '500'))
+# Pause entre deux lots: la migration tourne pendant que l'API sert le trafic
+DATE_MIGRATION_PAUSE = float(os.environ.get('DATE_MIGRATION_PAUSE', '0.05'))
+
+
+def utc_now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def as_datetime(value) -> Optional[datetime]:
+    """Date BSON, chaîne ISO ('Z', '+00:00' ou sans fuseau = UTC) -> datetime UTC; None sinon."""
+    if isinstance(value, datetime):
+        return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+    if not isinstance(value, str) or not value.strip():
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.strip().replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    return parsed.astimezone(timezone.utc) if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def iso(value):
+    """Sortie JSON: datetime -> ISO '+00:00', chaînes et None inchangés."""
+    if isinstance(value, datetime):
+        return as_datetime(value).isoformat()
+    return value
+
+
+def with_dates(doc: Dict[str, Any], collection: str) -> Dict[str, Any]:
+    """Convertit en place les champs date de `collection` (chaînes illisibles laissées telles quelles)."""
+    for field in DATE_FIELDS.get(collection, ()):
+        value = doc.get(field)
+        if isinstance(value, str):
+            parsed = as_datetime(value)
+            if parsed is not None:
+                doc[field] = parsed
+    return doc
+
+
+def _window(field: str, value, op: str) -> Optional[Dict[str, Any]]:
+    moment = as_datetime(value)
+    if moment is None:
+        return None
+    # Comparaisons BSON par type: la branche date ne voit que les dates, la branche chaîne que les chaînes
+    return {"$or": [{field: {op: moment}}, {field: {op: moment.isoformat()}}]}
+
+
+def time_after(field: str, value) -> Optional[Dict[str, Any]]:
+    """Filtre field > value (None si value illisible)."""
+    return _window(field, value, "$gt")
+
+
+def time_before(field: str, value) -> Optional[Dict[str, Any]]:
+    """Filtre field < value (None si value illisible)."""
+    return _window(field, value, "$lt")
+
+
+# ==================== MIGRATION EN LIGNE ====================
+
+async def migrate_collection(db, name: str, fields: Sequence[str], batch_size: int = DATE_MIGRATION_BATCH,
+                             pause: float = DATE_MIGRATION_PAUSE, max_batches: Optional[int] = None) -> int:
+    """Convertit les chaînes restantes de `fields`; reprend au dernier _id traité. Retourne le nombre converti."""
+    state = await db[MIGRATIONS].find_one({"_id": name}) or {}
+    if state.get("done"):
+        return 0
+    last_id = state.get("last_id")
+    projection = {field: 1 for field in fields}
+    converted = batches = 0
+    while max_batches is None or batches < max_batches:
+        query = {"_id": {"$gt": last_id}} if last_id is not None else {}
+        docs = await db[name].find(query, projection).sort("_id", 1).limit(batch_size).to_list(batch_size)
+        if not docs:
+            await db[MIGRATIONS].update_one({"_id": name}, {"$set": {"done": True, "finished_at": utc_now()}},
+                                            upsert=True)
+            break
+        ops = []
+        for doc in docs:
+            updates = {f: as_datetime(doc[f]) for f in fields if isinstance(doc.get(f), str) and as_datetime(doc[f])}
+            if updates:
+                # Garde sur l'ancienne valeur: une écriture concurrente n'est jamais écrasée
+                guard = {"_id": doc["_id"]}
+                guard.update({f: doc[f] for f in updates})
+                ops.append(UpdateOne(guard, {"$set": updates}))
+        if ops:
+            await db[name].bulk_write(ops, ordered=False)
+        last_id = docs[-1]["_id"]
+        converted += len(ops)
+        batches += 1
+        await db[MIGRATIONS].update_one({"_id": name}, {"$set": {"last_id": last_id, "updated_at": utc_now()},
+                                                        "$inc": {"converted": len(ops)}}, upsert=True)
+        if pause:
+            await asyncio.sleep(pause)
+    return converted
+
+
+async def migrate_dates(db, **kwargs) -> Dict[str, int]:
+    """Toutes les collections de DATE_FIELDS, l'une après l'autre."""
+    results = {}
+    for name, fields in DATE_FIELDS.items():
+        results[name] = await migrate_collection(db, name, fields, **kwargs)
+        if results[name]:
+            logger.info(f"[DATES] {name}: {results[name]} document(s) convertis en dates BSON")
+    return results
+
+
+async def date_migration_status(db) -> Dict[str, Any]:
+    states = {s["_id"]: s async for s in db[MIGRATIONS].find({}, {"last_id": 0})}
+    return {name: {"done": states.get(name, {}).get("done", False),
+                   "converted": states.get(name, {}).get("converted", 0)} for name in DATE_FIELDS}
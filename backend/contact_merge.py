@@ -0,0 +1,276 @@
+"""
+CONTACT MERGE - Fusion en tâche de fond des doublons CRM (chat_participants)
+La reconnaissance des contacts a longtemps été approximative: une même personne a pu être
+créée plusieurs fois, avec ses propres sessions, et recevoir deux fois chaque campagne.
+
+- duplicate_clusters(): une seule agrégation (allowDiskUse) groupe les contacts d'un même coach par
+  email_lc et par phone_e164; seuls les groupes de plus d'un contact remontent, les groupes qui
+  partagent un contact sont réunis (union-find) -> aucune liste des 100k contacts en mémoire
+- merge_duplicates(): contact conservé = le plus ancien; champs vides complétés par les doublons,
+  références réécrites par bulk_write (sessions, messages, messages privés, abonnements push,
+  cibles des campagnes),
+  doublons supprimés, une entrée d'audit par groupe dans contact_merges (documents fusionnés inclus)
+- réservations (liées par l'email saisi): seules celles du coach du groupe dont l'email normalisé
+  est celui du contact conservé sont réécrites; un email différent, relié par le téléphone
+  seulement, n'est jamais réécrit et figure dans le rapport (distinct_emails)
+- segments: les lignes segment_members des doublons sont supprimées (member_count décrémenté),
+  puis les segments concernés sont reconstruits une fois en fin de passe pour le contact conservé
+- un seul passage à la fois sur tous les workers: bail MongoDB (job_leases), renouvelé à chaque lot
+- dry_run=True: rapport des groupes, aucune écriture (clés d'identité rattrapées au démarrage
+  ou par le passage réel: un contact ancien sans clés n'apparaît qu'ensuite)
+"""
+
+import uuid
+import logging
+from datetime import datetime, timezone, timedelta
+from typing import Dict, Any, List, Optional, Set, Tuple
+
+from pymongo import UpdateOne, UpdateMany, DeleteMany, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from audience import normalize_email
+from bson_dates import utc_now, as_datetime
+from identity import identity_update, backfill_identity_keys
+from segments import rebuild_segment
+
+logger = logging.getLogger(__name__)
+
+MERGES = "contact_merges"
+LEASES = "job_leases"
+MERGE_LEASE = "contact_merge"
+MERGE_LEASE_SECONDS = 900
+CLUSTER_BATCH = 200
+REPORT_LIMIT = 500
+
+# Champs complétés sur le contact conservé quand il ne les a pas
+FILL_FIELDS = ("name", "email", "whatsapp", "photo_url", "link_token", "last_seen_at")
+
+# collection -> champs contenant un id de participant (valeur simple)
+REFERENCES = {
+    "chat_sessions": ("participant_id",),
+    "chat_messages": ("sender_id",),
+    "private_messages": ("sender_id", "recipient_id"),
+    "private_conversations": ("participant_1_id", "participant_2_id"),
+    "push_subscriptions": ("participant_id",),
+}
+
+# collection -> listes d'ids de participants (ajout du conservé, puis retrait des doublons)
+ARRAY_REFERENCES = {
+    "chat_sessions": ("participant_ids",),
+    "campaigns": ("targetIds", "selectedContacts"),
+}
+
+DUPLICATE_PIPELINE = [
+    {"$match": {"$or": [{"email_lc": {"$gt": ""}}, {"phone_e164": {"$gt": ""}}]}},
+    # Un email contient '@', un numéro E.164 jamais: les deux clés partagent le même espace
+    {"$project": {"_id": 0, "id": 1, "coach_id": 1, "keys": ["$email_lc", "$phone_e164"]}},
+    {"$unwind": "$keys"},
+    {"$match": {"keys": {"$gt": ""}}},
+    {"$group": {"_id": {"coach_id": "$coach_id", "key": "$keys"}, "ids": {"$push": "$id"}, "count": {"$sum": 1}}},
+    {"$match": {"count": {"$gt": 1}}},
+]
+
+
+# ==================== GROUPES ====================
+
+def _find(parents: Dict[str, str], item: str) -> str:
+    root = item
+    while parents[root] != root:
+        root = parents[root]
+    while parents[item] != root:
+        parents[item], item = root, parents[item]
+    return root
+
+
+async def duplicate_clusters(db) -> List[Dict[str, Any]]:
+    """[{coach_id, ids, keys}] - contacts reliés par un email ou un téléphone commun, par coach."""
+    parents: Dict[str, str] = {}
+    keys: Dict[str, set] = {}
+    coaches: Dict[str, Any] = {}
+    async for group in db.chat_participants.aggregate(DUPLICATE_PIPELINE, allowDiskUse=True):
+        ids = [i for i in group["ids"] if i]
+        for contact_id in ids:
+            parents.setdefault(contact_id, contact_id)
+            coaches[contact_id] = group["_id"].get("coach_id")
+        root = _find(parents, ids[0])
+        for contact_id in ids[1:]:
+            other = _find(parents, contact_id)
+            if other != root:
+                parents[other] = root
+                keys.setdefault(root, set()).update(keys.pop(other, set()))
+        keys.setdefault(root, set()).add(group["_id"]["key"])
+    clusters: Dict[str, List[str]] = {}
+    for contact_id in parents:
+        clusters.setdefault(_find(parents, contact_id), []).append(contact_id)
+    return [{"coach_id": coaches[root], "ids": sorted(ids), "keys": sorted(keys.get(root, ()))}
+            for root, ids in clusters.items() if len(ids) > 1]
+
+
+def _age(contact: Dict[str, Any]) -> Tuple[datetime, str]:
+    created = as_datetime(contact.get("created_at")) or datetime.max.replace(tzinfo=timezone.utc)
+    return created, contact.get("id", "")
+
+
+def plan_merge(contacts: List[Dict[str, Any]]) -> Tuple[Dict[str, Any], List[Dict[str, Any]], Dict[str, Any]]:
+    """(conservé, doublons, champs à compléter) - le plus ancien contact est conservé."""
+    ordered = sorted(contacts, key=_age)
+    survivor, duplicates = ordered[0], ordered[1:]
+    fill = {}
+    for field in FILL_FIELDS:
+        if not survivor.get(field):
+            value = next((d[field] for d in duplicates if d.get(field)), None)
+            if value:
+                fill[field] = value
+    if not survivor.get("isSubscriber") and any(d.get("isSubscriber") for d in duplicates):
+        fill["isSubscriber"] = True
+    return survivor, duplicates, fill
+
+
+# ==================== FUSION ====================
+
+def _reference_ops(survivor_id: str, duplicate_ids: List[str]) -> Dict[str, list]:
+    ops = {collection: [UpdateMany({field: {"$in": duplicate_ids}}, {"$set": {field: survivor_id}}) for field in fields]
+           for collection, fields in REFERENCES.items()}
+    # Listes: ajout du conservé avant le retrait des doublons (ordre garanti par ordered=True)
+    for collection, fields in ARRAY_REFERENCES.items():
+        for field in fields:
+            ops.setdefault(collection, []).extend([
+                UpdateMany({field: {"$in": duplicate_ids}}, {"$addToSet": {field: survivor_id}}),
+                UpdateMany({field: {"$in": duplicate_ids}}, {"$pull": {field: {"$in": duplicate_ids}}}),
+            ])
+    return ops
+
+
+def _reservation_emails(survivor: Dict[str, Any], duplicates: List[Dict[str, Any]],
+                        fill: Dict[str, Any]) -> Tuple[Optional[str], List[str], List[str]]:
+    """(email conservé, variantes à réécrire, emails distincts jamais réécrits)."""
+    email = survivor.get("email") or fill.get("email")
+    key = normalize_email(email)
+    rewrite, distinct = set(), set()
+    for duplicate in duplicates:
+        other = duplicate.get("email")
+        if not other or other == email:
+            continue
+        # Même personne seulement si l'email normalisé est le même (pas un simple téléphone commun)
+        (rewrite if key and normalize_email(other) == key else distinct).add(other)
+    return email, sorted(rewrite), sorted(distinct)
+
+
+async def _drop_segment_members(db, duplicate_ids: List[str]) -> Set[str]:
+    """Supprime les lignes segment_members des doublons; retourne les segments concernés."""
+    segment_ids = set(await db.segment_members.distinct("segment_id", {"id": {"$in": duplicate_ids}}))
+    for segment_id in segment_ids:
+        result = await db.segment_members.delete_many({"segment_id": segment_id, "id": {"$in": duplicate_ids}})
+        if result.deleted_count:
+            await db.segments.update_one({"id": segment_id}, {"$inc": {"member_count": -result.deleted_count}})
+    return segment_ids
+
+
+async def _merge_batch(db, clusters: List[Dict[str, Any]], run_id: str, dry_run: bool,
+                       segments: Optional[Set[str]] = None) -> List[Dict[str, Any]]:
+    ids = [contact_id for cluster in clusters for contact_id in cluster["ids"]]
+    contacts = {c["id"]: c async for c in db.chat_participants.find({"id": {"$in": ids}}, {"_id": 0})}
+    ops: Dict[str, list] = {"chat_participants": [], "reservations": []}
+    audits, report, merged_ids = [], [], []
+    for cluster in clusters:
+        members = [contacts[i] for i in cluster["ids"] if i in contacts]
+        if len(members) < 2:
+            continue  # contact supprimé entre l'agrégation et la fusion
+        survivor, duplicates, fill = plan_merge(members)
+        duplicate_ids = [d["id"] for d in duplicates]
+        email, rewrite, distinct = _reservation_emails(survivor, duplicates, fill)
+        report.append({"coach_id": cluster["coach_id"], "keys": cluster["keys"], "survivor_id": survivor["id"],
+                       "survivor_name": survivor.get("name"), "duplicate_ids": duplicate_ids, "fill": fill,
+                       "distinct_emails": distinct})
+        if dry_run:
+            continue
+        if fill:
+            ops["chat_participants"].append(UpdateOne({"id": survivor["id"]}, {"$set": identity_update(fill)}))
+        ops["chat_participants"].append(DeleteMany({"id": {"$in": duplicate_ids}}))
+        for collection, collection_ops in _reference_ops(survivor["id"], duplicate_ids).items():
+            ops.setdefault(collection, []).extend(collection_ops)
+        # Réservations: liées au contact par l'email saisi, dans le périmètre du coach du groupe
+        if rewrite:
+            ops["reservations"].append(UpdateMany({"userEmail": {"$in": rewrite}, "coach_id": cluster["coach_id"]},
+                                                  {"$set": {"userEmail": email}}))
+        merged_ids.extend(duplicate_ids)
+        audits.append({"id": str(uuid.uuid4()), "run_id": run_id, "coach_id": cluster["coach_id"], "keys": cluster["keys"],
+                       "survivor_id": survivor["id"], "merged_ids": duplicate_ids, "filled": fill,
+                       "distinct_emails": distinct, "merged_contacts": duplicates, "merged_at": utc_now()})
+    # Audit, puis références, puis suppression des doublons: une fusion interrompue est refaite au passage suivant
+    if audits:
+        await db[MERGES].insert_many(audits)
+    participant_ops = ops.pop("chat_participants")
+    for collection, collection_ops in list(ops.items()) + [("chat_participants", participant_ops)]:
+        if collection_ops:
+            await db[collection].bulk_write(collection_ops, ordered=True)
+    if merged_ids:
+        touched = await _drop_segment_members(db, merged_ids)
+        if segments is not None:
+            segments.update(touched)
+    return report
+
+
+# ==================== BAIL (un passage à la fois) ====================
+
+async def acquire_merge_lease(db, owner: str, seconds: int = MERGE_LEASE_SECONDS) -> bool:
+    """Prend (ou prolonge, pour le même owner) le bail de fusion; False s'il est tenu ailleurs."""
+    now = utc_now()
+    try:
+        lease = await db[LEASES].find_one_and_update(
+            {"_id": MERGE_LEASE, "$or": [{"expires_at": {"$lt": now}}, {"owner": owner}]},
+            {"$set": {"owner": owner, "expires_at": now + timedelta(seconds=seconds), "renewed_at": now}},
+            upsert=True, return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        return False  # bail valide tenu par un autre worker
+    return lease is not None
+
+
+async def release_merge_lease(db, owner: str):
+    await db[LEASES].delete_one({"_id": MERGE_LEASE, "owner": owner})
+
+
+async def merge_lease_held(db) -> bool:
+    return await db[LEASES].find_one({"_id": MERGE_LEASE, "expires_at": {"$gte": utc_now()}}, {"_id": 1}) is not None
+
+
+async def merge_duplicates(db, dry_run: bool = True, batch_size: int = CLUSTER_BATCH,
+                           report_limit: int = REPORT_LIMIT, lease_owner: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Détecte (et sauf dry_run fusionne) les doublons. Retourne le résumé et les premiers groupes.
+    lease_owner: bail pris par l'appelant, prolongé à chaque lot.
+    """
+    run_id = lease_owner or str(uuid.uuid4())
+    if not dry_run:
+        await backfill_identity_keys(db)
+    clusters = await duplicate_clusters(db)
+    report: List[Dict[str, Any]] = []
+    segments: Set[str] = set()
+    merged = 0
+    for start in range(0, len(clusters), batch_size):
+        if lease_owner and not await acquire_merge_lease(db, lease_owner):
+            raise RuntimeError("Bail de fusion perdu")
+        batch_report = await _merge_batch(db, clusters[start:start + batch_size], run_id, dry_run, segments)
+        merged += sum(len(entry["duplicate_ids"]) for entry in batch_report)
+        report.extend(batch_report[:max(report_limit - len(report), 0)])
+    # Le contact conservé reprend les appartenances des doublons (règles réévaluées)
+    async for segment in db.segments.find({"id": {"$in": sorted(segments)}}, {"_id": 0}):
+        await rebuild_segment(db, segment)
+    if not dry_run:
+        logger.info(f"[MERGE] {len(clusters)} groupe(s), {merged} doublon(s) fusionnés (run {run_id})")
+    return {"run_id": run_id, "dry_run": dry_run, "clusters": len(clusters),
+            "duplicates": merged, "report": report}
+
+
+async def ensure_merge_indexes(db):
+    """Champs de référence indexés: chaque UpdateMany de la fusion est une recherche d'index."""
+    await db.chat_participants.create_index("id")
+    await db.reservations.create_index("userEmail")
+    for collection, fields in list(REFERENCES.items()) + list(ARRAY_REFERENCES.items()):
+        for field in fields:
+            await db[collection].create_index(field)
+    await db[MERGES].create_index("survivor_id")
+    await db[MERGES].create_index("merged_ids")
+    await db[MERGES].create_index([("merged_at", -1)])
+    await db.segment_members.create_index("id")
@@ -0,0 +1,216 @@
+"""
+EMOJI STORE - Emojis personnalisés stockés en fichiers + manifeste en cache
+Les emojis (POST /chat/emojis) étaient gardés en base64 dans `custom_emojis`:
+GET /chat/emojis renvoyait les octets de chaque emoji à chaque ouverture du chat.
+Ils sont maintenant décodés UNE fois dans uploads/emojis/custom/<sha256>.<ext>
+(+ miniature 64 px WebP avec transparence) et servis par /api/emojis (cache immutable).
+Les stickers animés (GIF / WebP multi-images) gardent l'original comme miniature: une
+miniature statique figerait l'animation. Une miniature impossible à produire se rabat sur
+l'original (erreur journalisée), un emoji ne disparaît jamais du manifeste.
+
+Le manifeste compact (id, name, category, url, thumb_url, hash) est gardé en mémoire
+et invalidé à l'upload / la suppression; son ETag permet des 304 côté client.
+
+Migration des anciens documents base64 (idempotente, reprise possible):
+    python3 emoji_store.py --migrate
+Elle est aussi exécutée au démarrage du serveur.
+"""
+
+import os
+import re
+import time
+import base64
+import hashlib
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional, Tuple
+
+from PIL import Image
+
+from image_variants import process_image
+from media_files import precompress
+
+logger = logging.getLogger(__name__)
+
+EMOJI_URL_PREFIX = "/api/emojis/custom"
+EMOJI_THUMB_SIZE = 64
+MAX_EMOJI_BYTES = 1024 * 1024
+
+EMOJI_TYPES = {
+    "image/png": "png", "image/jpeg": "jpg", "image/jpg": "jpg",
+    "image/gif": "gif", "image/webp": "webp", "image/svg+xml": "svg",
+}
+
+# Champs du manifeste (jamais image_data en base64)
+MANIFEST_PROJECTION = {"_id": 0, "id": 1, "name": 1, "category": 1, "url": 1, "thumb_url": 1, "hash": 1, "created_at": 1}
+
+# Filet de sécurité si plusieurs workers: un manifeste périmé ne vit pas plus longtemps
+MANIFEST_TTL_SECONDS = 300
+
+# Formats pouvant contenir plusieurs images
+ANIMATED_EXTENSIONS = ("gif", "webp")
+
+_DATA_URL = re.compile(r'^data:(image/[a-z0-9.+-]+);base64,(.*)$', re.DOTALL | re.IGNORECASE)
+
+
+def decode_data_url(data_url: str) -> Tuple[bytes, str]:
+    """data:image/...;base64,... -> (octets, type MIME). ValueError si invalide."""
+    match = _DATA_URL.match((data_url or "").strip())
+    if not match:
+        raise ValueError("Format d'image invalide. Utilisez base64 (data:image/...)")
+    mime = match.group(1).lower()
+    if mime not in EMOJI_TYPES:
+        raise ValueError(f"Type d'image non supporté: {mime}")
+    try:
+        contents = base64.b64decode(match.group(2), validate=False)
+    except (ValueError, base64.binascii.Error):
+        raise ValueError("Base64 invalide")
+    if not contents:
+        raise ValueError("Image vide")
+    if len(contents) > MAX_EMOJI_BYTES:
+        raise ValueError(f"Emoji trop volumineux (max {MAX_EMOJI_BYTES // 1024} KB)")
+    return contents, mime
+
+
+def is_animated(path: str) -> bool:
+    try:
+        with Image.open(path) as image:
+            return bool(getattr(image, "is_animated", False))
+    except Exception:
+        return False
+
+
+async def save_emoji_file(contents: bytes, mime: str, directory: str) -> Dict[str, str]:
+    """Écrit l'emoji sous son hash (dédoublonné) et sa miniature; retourne hash et URLs."""
+    sha = hashlib.sha256(contents).hexdigest()
+    ext = EMOJI_TYPES[mime]
+    filename = f"{sha}.{ext}"
+    path = os.path.join(directory, filename)
+    os.makedirs(directory, exist_ok=True)
+    if not os.path.exists(path):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(contents)
+        os.replace(tmp_path, path)
+
+    url = f"{EMOJI_URL_PREFIX}/{filename}"
+    thumb_url = url
+    if ext == "svg":
+        precompress(path)
+    elif not (ext in ANIMATED_EXTENSIONS and is_animated(path)):
+        thumb_name = f"{sha}_{EMOJI_THUMB_SIZE}.webp"
+        try:
+            if not os.path.exists(os.path.join(directory, thumb_name)):
+                result = await process_image(path, directory, sha, (EMOJI_THUMB_SIZE,), formats=("webp",))
+                thumb_name = result["variants"][str(EMOJI_THUMB_SIZE)]["webp"]
+            thumb_url = f"{EMOJI_URL_PREFIX}/{thumb_name}"
+        except Exception as e:
+            logger.warning(f"[EMOJIS] Miniature impossible pour {filename}, original servi: {e}")
+    return {"hash": sha, "url": url, "thumb_url": thumb_url}
+
+
+def manifest_entry(doc: Dict[str, Any]) -> Dict[str, Any]:
+    entry = {key: doc.get(key) for key in ("id", "name", "category", "url", "thumb_url", "hash")}
+    # Compatibilité: le frontend utilise image_data comme src d'image, une URL y fonctionne
+    entry["image_data"] = doc.get("url")
+    return entry
+
+
+class EmojiManifest:
+    """Manifeste des emojis actifs, chargé une fois puis servi depuis la mémoire."""
+
+    def __init__(self, ttl_seconds: int = MANIFEST_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._entries: Optional[List[Dict[str, Any]]] = None
+        self._etag = ""
+        self._loaded_at = 0.0
+
+    def invalidate(self):
+        self._entries = None
+
+    async def get(self, db) -> Tuple[List[Dict[str, Any]], str]:
+        if self._entries is None or time.monotonic() - self._loaded_at > self.ttl_seconds:
+            docs = await db.custom_emojis.find(
+                {"active": True, "url": {"$exists": True}}, MANIFEST_PROJECTION
+            ).sort("created_at", -1).to_list(500)
+            self._entries = [manifest_entry(doc) for doc in docs]
+            digest = hashlib.sha1("|".join(f"{e['id']}:{e['hash']}:{e['name']}" for e in self._entries).encode()).hexdigest()
+            self._etag = f'"emojis-{digest[:16]}"'
+            self._loaded_at = time.monotonic()
+        return self._entries, self._etag
+
+
+class DirectoryListing:
+    """Liste des fichiers d'un dossier, recalculée seulement quand son mtime change."""
+
+    def __init__(self, directory: str, extensions: Tuple[str, ...]):
+        self.directory = directory
+        self.extensions = extensions
+        self._mtime_ns = None
+        self._files: List[str] = []
+
+    def invalidate(self):
+        self._mtime_ns = None
+
+    def files(self) -> List[str]:
+        mtime_ns = os.stat(self.directory).st_mtime_ns
+        if mtime_ns != self._mtime_ns:
+            self._files = sorted(
+                name for name in os.listdir(self.directory)
+                if os.path.splitext(name)[1].lower() in self.extensions and os.path.isfile(os.path.join(self.directory, name))
+            )
+            self._mtime_ns = mtime_ns
+        return self._files
+
+
+async def migrate_base64_emojis(db, directory: str) -> Dict[str, int]:
+    """Convertit les documents custom_emojis encore en base64 (sans hash) en fichiers."""
+    report = {"migrated": 0, "failed": 0}
+    query = {"hash": {"$exists": False}, "image_data": {"$regex": "^data:"}}
+    async for doc in db.custom_emojis.find(query, {"_id": 0, "id": 1, "image_data": 1}):
+        try:
+            contents, mime = decode_data_url(doc["image_data"])
+            stored = await save_emoji_file(contents, mime, directory)
+            await db.custom_emojis.update_one(
+                {"id": doc["id"]},
+                {"$set": {**stored, "mime": mime, "size": len(contents), "migrated_at": datetime.now(timezone.utc).isoformat()},
+                 "$unset": {"image_data": ""}}
+            )
+            report["migrated"] += 1
+        except Exception as e:
+            report["failed"] += 1
+            logger.warning(f"[EMOJIS] Migration impossible pour {doc.get('id')}, original base64 conservé: {e}")
+            # Reste dans le manifeste en pointant sur l'original; retenté au prochain démarrage
+            await db.custom_emojis.update_one(
+                {"id": doc["id"]},
+                {"$set": {"url": doc["image_data"], "thumb_url": doc["image_data"], "migration_error": str(e)}}
+            )
+    if report["migrated"] or report["failed"]:
+        logger.info(f"[EMOJIS] Migration base64 -> fichiers: {report}")
+    return report
+
+
+def main():
+    import argparse
+    import asyncio
+    from pathlib import Path
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from dotenv import load_dotenv
+
+    root_dir = Path(__file__).parent
+    load_dotenv(root_dir / '.env')
+    parser = argparse.ArgumentParser(description="Emojis personnalisés Afroboost")
+    parser.add_argument("--migrate", action="store_true", help="Convertit les emojis base64 en fichiers")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    if not args.migrate:
+        parser.print_help()
+        return
+
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ.get('DB_NAME', 'afroboost_db')]
+    print(asyncio.run(migrate_base64_emojis(db, str(root_dir / "uploads" / "emojis" / "custom"))))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+EXPORT STREAM - Exports CSV / NDJSON en flux
+get_reservations(all_data=True) chargeait jusqu'à 10 000 réservations complètes en mémoire
+(createdAt converti ligne par ligne) pour un seul corps JSON, /chat/participants jusqu'à 1000 contacts.
+
+- itération d'un curseur Motor par lots (EXPORT_BATCH_SIZE): mémoire constante quelle que soit la taille
+- projection limitée aux colonnes demandées (?columns=a,b,c, liste blanche par export)
+- colonnes calculées (date / heure locales de la séance, quantité par défaut 1, total avec
+  repli sur price) et en-têtes traduits par le dashboard (?label=...&label=..., un par colonne)
+- CSV (en-tête + lignes) ou NDJSON (un objet JSON par ligne), envoyés par blocs de EXPORT_CHUNK_ROWS
+  lignes: le premier octet part dès le premier lot lu
+"""
+
+import csv
+import io
+import json
+import os
+from datetime import datetime
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Sequence, Tuple
+
+import pytz
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+from bson_dates import as_datetime
+
+EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', '500'))
+EXPORT_CHUNK_ROWS = 200
+EXPORT_FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+# Colonnes exportables (ordre par défaut = ordre du tableau du dashboard)
+RESERVATION_COLUMNS = [
+    "reservationCode", "userName", "userEmail", "userWhatsapp", "courseName", "courseTime", "datetime",
+    "offerName", "quantity", "totalPrice", "selectedDatesText", "variantsText", "promoCode", "validated",
+    "validatedAt", "shippingStatus", "trackingNumber", "source", "type", "createdAt", "id"
+]
+# Date / heure des séances telles qu'affichées au client (fr-CH)
+EXPORT_TZ = pytz.timezone(os.environ.get('EXPORT_TZ', 'Europe/Zurich'))
+
+
+def local_datetime(value: Any, fmt: str) -> str:
+    moment = as_datetime(value)
+    return moment.astimezone(EXPORT_TZ).strftime(fmt) if moment else ""
+
+
+# Colonnes calculées: nom -> (champs lus, valeur de la cellule)
+Derived = Dict[str, Tuple[Sequence[str], Callable[[Dict[str, Any]], Any]]]
+RESERVATION_DERIVED: Derived = {
+    "date": (("datetime",), lambda doc: local_datetime(doc.get("datetime"), "%d.%m.%Y")),
+    "time": (("datetime",), lambda doc: local_datetime(doc.get("datetime"), "%H:%M")),
+    "qty": (("quantity",), lambda doc: doc.get("quantity") or 1),
+    "total": (("totalPrice", "price"), lambda doc: doc.get("totalPrice") or doc.get("price")),
+}
+CONTACT_COLUMNS = [
+    "name", "email", "whatsapp", "source", "isSubscriber", "link_token", "last_seen_at", "created_at",
+    "coach_id", "id"
+]
+
+
+def parse_columns(requested: Optional[str], allowed: Sequence[str], derived: Optional[Derived] = None) -> List[str]:
+    """'a,b,c' -> colonnes connues dans l'ordre demandé (toutes les colonnes stockées si vide); 400 si inconnue."""
+    if not requested or not requested.strip():
+        return list(allowed)
+    columns = [c.strip() for c in requested.split(",") if c.strip()]
+    unknown = [c for c in columns if c not in allowed and c not in (derived or {})]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Colonnes inconnues: {', '.join(unknown)}")
+    return list(dict.fromkeys(columns))
+
+
+def parse_labels(labels: Optional[List[str]], columns: Sequence[str]) -> List[str]:
+    """En-têtes CSV: un libellé par colonne (noms des colonnes si absents); 400 sinon."""
+    if not labels:
+        return list(columns)
+    if len(labels) != len(columns):
+        raise HTTPException(status_code=400, detail="Un libellé par colonne attendu")
+    return [label.strip() or column for label, column in zip(labels, columns)]
+
+
+def check_format(fmt: str) -> str:
+    fmt = (fmt or "csv").lower()
+    if fmt not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="Format d'export: csv ou ndjson")
+    return fmt
+
+
+def projection_for(columns: Sequence[str], derived: Optional[Derived] = None) -> Dict[str, int]:
+    projection = {"_id": 0}
+    for column in columns:
+        sources = derived[column][0] if derived and column in derived else (column,)
+        projection.update({field: 1 for field in sources})
+    return projection
+
+
+def csv_cell(value: Any) -> Any:
+    """Listes jointes par '|', dates ISO, None vide."""
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (list, tuple)):
+        return "|".join(str(v) for v in value)
+    if isinstance(value, dict):
+        return json.dumps(value, ensure_ascii=False, default=str)
+    return value
+
+
+def json_default(value: Any) -> str:
+    return value.isoformat() if isinstance(value, datetime) else str(value)
+
+
+async def stream_rows(cursor, columns: Sequence[str], fmt: str, chunk_rows: int = EXPORT_CHUNK_ROWS,
+                      derived: Optional[Derived] = None, labels: Optional[Sequence[str]] = None) -> AsyncIterator[str]:
+    """Lignes CSV / NDJSON du curseur, par blocs; seul le bloc courant est en mémoire."""
+    derived = derived or {}
+    getters = [derived[c][1] if c in derived else (lambda doc, _c=c: doc.get(_c)) for c in columns]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if fmt == "csv" else None
+    if writer:
+        writer.writerow(labels or columns)
+        yield buffer.getvalue()  # en-tête envoyé avant la première lecture
+        buffer.seek(0)
+        buffer.truncate()
+    pending = 0
+    try:
+        async for doc in cursor:
+            if writer:
+                writer.writerow([csv_cell(get(doc)) for get in getters])
+            else:
+                row = {c: get(doc) for c, get in zip(columns, getters)}
+                buffer.write(json.dumps(row, ensure_ascii=False, default=json_default))
+                buffer.write("\n")
+            pending += 1
+            if pending >= chunk_rows:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+                pending = 0
+    finally:
+        await cursor.close()
+    if buffer.getvalue():
+        yield buffer.getvalue()
+
+
+def export_response(collection, query: Dict[str, Any], columns: Sequence[str], fmt: str, filename: str,
+                    sort: Optional[List] = None, derived: Optional[Derived] = None,
+                    labels: Optional[Sequence[str]] = None) -> StreamingResponse:
+    """StreamingResponse sur find(query) trié, projeté sur `columns` (et les champs des colonnes calculées)."""
+    cursor = collection.find(query, projection_for(columns, derived)).batch_size(EXPORT_BATCH_SIZE)
+    if sort:
+        cursor = cursor.sort(sort)
+    rows = stream_rows(cursor, columns, fmt, derived=derived, labels=labels)
+    return StreamingResponse(rows, media_type=EXPORT_FORMATS[fmt], headers={
+        "Content-Disposition": f'attachment; filename="{filename}.{fmt}"',
+        "Cache-Control": "no-store"
+    })
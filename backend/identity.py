@@ -0,0 +1,105 @@
+"""
+IDENTITY - Clés d'identité normalisées et recherche indexée des contacts
+smart_chat_entry, l'auto-save CRM de chat_with_ai et check_reservation_eligibility cherchaient
+les contacts par regex insensibles à la casse (email, nom) ou non ancrées (whatsapp):
+aucun index utilisable, un parcours complet de chat_participants à chaque premier message.
+
+- email_lc / phone_e164 / name_key maintenus sur chat_participants et users:
+  with_identity() à l'insertion, identity_update() pour un $set partiel
+- find_contact(): point unique de résolution (email > téléphone > nom), requêtes d'égalité indexées;
+  un document pas encore rattrapé (clé absente) reste trouvé par l'ancienne comparaison
+- backfill_identity_keys(): rattrapage par lots (bulk_write) des documents sans clés, au démarrage
+"""
+
+import re
+import logging
+import unicodedata
+from typing import Dict, Any, Optional, Iterator, Tuple
+
+from pymongo import UpdateOne
+
+from audience import normalize_email, normalize_phone
+
+logger = logging.getLogger(__name__)
+
+IDENTITY_COLLECTIONS = ("chat_participants", "users")
+IDENTITY_SOURCES = {"email_lc": "email", "phone_e164": "whatsapp", "name_key": "name"}
+BACKFILL_BATCH_SIZE = 500
+
+
+def name_key(name: str) -> str:
+    """Nom normalisé (casse et espaces ignorés) - même égalité que l'ancienne regex ^nom$ insensible à la casse."""
+    return " ".join(unicodedata.normalize("NFKC", name or "").split()).casefold()
+
+
+_NORMALIZERS = {"email_lc": normalize_email, "phone_e164": normalize_phone, "name_key": name_key}
+
+
+def identity_keys(doc: Dict[str, Any]) -> Dict[str, str]:
+    return {key: _NORMALIZERS[key](doc.get(source)) for key, source in IDENTITY_SOURCES.items()}
+
+
+def with_identity(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Ajoute en place les trois clés à un document avant insertion."""
+    doc.update(identity_keys(doc))
+    return doc
+
+
+def identity_update(fields: Dict[str, Any]) -> Dict[str, Any]:
+    """$set partiel: clés recalculées pour les seuls champs d'identité modifiés."""
+    update = dict(fields)
+    for key, source in IDENTITY_SOURCES.items():
+        if source in fields:
+            update[key] = _NORMALIZERS[key](fields[source])
+    return update
+
+
+def _lookups(email: Optional[str], phone: Optional[str], name: Optional[str]) -> Iterator[Tuple[str, str, Dict[str, Any]]]:
+    """(clé, valeur normalisée, ancienne comparaison) par ordre de priorité."""
+    if normalize_email(email):
+        yield "email_lc", normalize_email(email), {"email": {"$regex": f"^{re.escape(email.strip())}$", "$options": "i"}}
+    if normalize_phone(phone):
+        digits = re.sub(r'[\s\-+]', '', phone)
+        yield "phone_e164", normalize_phone(phone), {"whatsapp": {"$regex": re.escape(digits)}}
+    if name_key(name):
+        yield "name_key", name_key(name), {"name": {"$regex": f"^{re.escape(name.strip())}$", "$options": "i"}}
+
+
+async def find_contact(db, email: Optional[str] = None, phone: Optional[str] = None, name: Optional[str] = None,
+                       collection: str = "chat_participants",
+                       projection: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    """Premier contact correspondant par email, sinon téléphone, sinon nom (None si aucun)."""
+    for key, value, legacy in _lookups(email, phone, name):
+        # Branche legacy bornée par l'index (clé absente): vide une fois le rattrapage terminé
+        query = {"$or": [{key: value}, {key: {"$exists": False}, **legacy}]}
+        found = await db[collection].find_one(query, projection or {"_id": 0})
+        if found:
+            return found
+    return None
+
+
+async def backfill_identity_keys(db, batch_size: int = BACKFILL_BATCH_SIZE) -> int:
+    """Calcule les clés des documents qui n'en ont pas encore. Retourne le nombre mis à jour."""
+    updated = 0
+    projection = {source: 1 for source in IDENTITY_SOURCES.values()}
+    missing = {"$or": [{key: {"$exists": False}} for key in IDENTITY_SOURCES]}
+    for collection in IDENTITY_COLLECTIONS:
+        ops = []
+        async for doc in db[collection].find(missing, projection).batch_size(batch_size):
+            ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": identity_keys(doc)}))
+            if len(ops) >= batch_size:
+                await db[collection].bulk_write(ops, ordered=False)
+                updated += len(ops)
+                ops = []
+        if ops:
+            await db[collection].bulk_write(ops, ordered=False)
+            updated += len(ops)
+    if updated:
+        logger.info(f"[IDENTITY] {updated} contact(s) rattrapés (email_lc, phone_e164, name_key)")
+    return updated
+
+
+async def ensure_identity_indexes(db):
+    for collection in IDENTITY_COLLECTIONS:
+        for key in IDENTITY_SOURCES:
+            await db[collection].create_index(key)
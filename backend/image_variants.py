@@ -0,0 +1,123 @@
+"""
+IMAGE VARIANTS - Traitement des images hors de la boucle d'événements
+Le décodage / redimensionnement PIL est CPU-bound: exécuté sur la boucle, un upload
+de 5 MB bloquait toutes les sockets chat du worker. Le travail part dans un pool de
+processus (concurrence bornée par un sémaphore) et produit, en UN seul décodage,
+les variantes responsives (64/200/800/1920 px) en JPEG et WebP.
+
+Utilisé par server.upload_user_photo et server.upload_coach_asset.
+"""
+
+import os
+import io
+import asyncio
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+# Tailles (côté le plus long, px) des variantes responsives
+VARIANT_SIZES = (64, 200, 800, 1920)
+AVATAR_SIZES = (64, 200)
+LOGO_SIZES = (64, 200, 400)
+
+JPEG_QUALITY = 85
+WEBP_QUALITY = 80
+
+# Nombre de processus de traitement (0 = exécuteur par défaut de la boucle, ex: tests)
+IMAGE_WORKERS = int(os.environ.get('IMAGE_WORKERS', '2'))
+# Jobs en vol au maximum: au-delà, les uploads attendent au lieu d'empiler les images en RAM
+IMAGE_MAX_INFLIGHT = int(os.environ.get('IMAGE_MAX_INFLIGHT', str(max(IMAGE_WORKERS, 1) * 2)))
+
+_pool: Optional[ProcessPoolExecutor] = None
+_semaphore: Optional[asyncio.Semaphore] = None
+
+
+def render_variants(source, dest_dir: str, basename: str, sizes: Sequence[int] = VARIANT_SIZES,
+                    formats: Sequence[str] = ("jpeg", "webp")) -> Dict[str, Any]:
+    """
+    Décode l'image UNE fois et écrit chaque variante en JPEG et WebP.
+    `source` est un chemin de fichier ou des bytes. Exécutée dans un processus du pool:
+    fonction de module, arguments et résultat sérialisables.
+    Sans "jpeg" dans formats, la transparence est conservée (emojis, stickers).
+
+    Les tailles supérieures à l'original ne sont pas agrandies: la plus grande
+    variante produite est alors l'original (réencodé).
+    Retourne {"width", "height", "variants": {"200": {"jpeg", "webp", "width", "height"}, ...}}
+    """
+    from PIL import Image, ImageOps
+
+    img = Image.open(io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else source)
+    largest = max(sizes)
+    # JPEG: décodage réduit directement à l'échelle utile (1/2, 1/4, 1/8)
+    img.draft('RGB', (largest, largest))
+    img = ImageOps.exif_transpose(img)
+    mode = 'RGB' if "jpeg" in formats else 'RGBA'
+    if img.mode != mode:
+        img = img.convert(mode)
+    width, height = img.size
+
+    # Tailles qui réduisent l'original, plus la première qui le contient tel quel
+    longest = max(width, height)
+    targets = [size for size in sizes if size < longest]
+    covering = [size for size in sizes if size >= longest]
+    if covering:
+        targets.append(min(covering))
+
+    os.makedirs(dest_dir, exist_ok=True)
+    variants = {}
+    # Du plus grand au plus petit: chaque réduction repart de la précédente
+    for size in sorted(set(targets), reverse=True):
+        img.thumbnail((size, size), Image.LANCZOS)
+        variant = {"width": img.width, "height": img.height}
+        if "jpeg" in formats:
+            variant["jpeg"] = f"{basename}_{size}.jpg"
+            img.save(os.path.join(dest_dir, variant["jpeg"]), "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+        if "webp" in formats:
+            variant["webp"] = f"{basename}_{size}.webp"
+            img.save(os.path.join(dest_dir, variant["webp"]), "WEBP", quality=WEBP_QUALITY, method=4)
+        variants[str(size)] = variant
+
+    return {"width": width, "height": height, "variants": variants}
+
+
+def _get_pool() -> Optional[ProcessPoolExecutor]:
+    global _pool
+    if IMAGE_WORKERS > 0 and _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=IMAGE_WORKERS)
+        logger.info(f"[IMAGES] Pool de traitement démarré ({IMAGE_WORKERS} processus)")
+    return _pool
+
+
+async def process_image(source, dest_dir: str, basename: str, sizes: Sequence[int] = VARIANT_SIZES,
+                        formats: Sequence[str] = ("jpeg", "webp")) -> Dict[str, Any]:
+    """Génère les variantes dans le pool sans bloquer la boucle d'événements."""
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(IMAGE_MAX_INFLIGHT)
+    async with _semaphore:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_get_pool(), render_variants, source, dest_dir, basename, tuple(sizes), tuple(formats))
+
+
+def variant_urls(result: Dict[str, Any], url_prefix: str) -> Dict[str, Dict[str, Any]]:
+    """Préfixe les noms de fichiers par l'URL publique du dossier."""
+    return {
+        label: {key: f"{url_prefix}/{value}" if key in ("jpeg", "webp") else value for key, value in variant.items()}
+        for label, variant in result["variants"].items()
+    }
+
+
+def primary_variant(result: Dict[str, Any], max_size: int) -> Dict[str, Any]:
+    """Plus grande variante n'excédant pas max_size (URL historique renvoyée dans 'url')."""
+    candidates = [label for label in result["variants"] if int(label) <= max_size] or list(result["variants"])
+    return result["variants"][max(candidates, key=int)]
+
+
+def shutdown_image_pool():
+    global _pool, _semaphore
+    _semaphore = None
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
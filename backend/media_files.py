@@ -0,0 +1,274 @@
+"""
+MEDIA FILES - Service des médias statiques (photos, assets coaches, emojis, blobs)
+Remplace les montages StaticFiles bruts, sans politique de cache:
+- ETag fort + 304 (If-None-Match / If-Modified-Since)
+- Cache-Control immutable pour les noms adressés par contenu (sha256 du blob store et des emojis,
+  fragment de 12 hex des assets coachs): un avatar n'est plus revalidé à chaque rendu du chat
+- Range (206) efficace pour les vidéos .mp4/.webm: seul l'intervalle demandé est lu
+- variantes précompressées .br / .gz servies selon Accept-Encoding (emojis SVG)
+- envoi zéro-copie (extensions ASGI pathsend / zerocopysend) quand le serveur les supporte,
+  sinon lecture par blocs dans le threadpool
+"""
+
+import os
+import re
+import gzip
+import stat
+import logging
+import mimetypes
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Optional, Tuple, List
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.staticfiles import StaticFiles
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Noms produits par blob_store / emoji_store (<sha256>[_<taille>].<ext>) et par l'upload des assets
+# coachs / video_pipeline (<type>_<sha256[:12]>[_<taille>].<ext>): le contenu ne change jamais pour
+# cette URL. Longueurs exactes et au moins une lettre hex: une date (_20250101) n'est pas un hash.
+_CONTENT_ADDRESSED = re.compile(r'(?:^|_)(?=[0-9]*[a-f])(?:[0-9a-f]{64}|[0-9a-f]{12})(?:_\d+)?\.[A-Za-z0-9]+$')
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+DEFAULT_MAX_AGE = 3600
+CHUNK_SIZE = 256 * 1024
+
+# Types servis précompressés (les images raster sont déjà compressées)
+PRECOMPRESS_EXTENSIONS = (".svg",)
+# Préférence d'encodage: (token Accept-Encoding, suffixe du fichier)
+_ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+_EXTRA_TYPES = {
+    ".webp": "image/webp", ".svg": "image/svg+xml", ".mp4": "video/mp4",
+    ".webm": "video/webm", ".mov": "video/quicktime", ".m3u8": "application/vnd.apple.mpegurl",
+    ".ts": "video/mp2t",
+}
+
+
+def is_content_addressed(filename: str) -> bool:
+    return bool(_CONTENT_ADDRESSED.search(filename))
+
+
+def guess_media_type(filename: str) -> str:
+    ext = os.path.splitext(filename)[1].lower()
+    return _EXTRA_TYPES.get(ext) or mimetypes.guess_type(filename)[0] or "application/octet-stream"
+
+
+def strong_etag(stat_result: os.stat_result, encoding: Optional[str] = None) -> str:
+    """ETag fort: taille + mtime en ns (+ encodage, chaque représentation a le sien)."""
+    tag = f"{stat_result.st_size:x}-{stat_result.st_mtime_ns:x}"
+    return f'"{tag}-{encoding}"' if encoding else f'"{tag}"'
+
+
+def accepted_encodings(accept_encoding: str) -> List[str]:
+    accepted = []
+    for token in accept_encoding.split(","):
+        name, _, params = token.strip().partition(";")
+        if params.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.append(name.strip().lower())
+    return accepted
+
+
+def parse_range(range_header: str, size: int):
+    """
+    Intervalle d'octets (début, fin inclus) d'un en-tête Range simple.
+    None: pas de Range exploitable (multi-intervalles inclus -> réponse complète),
+    "unsatisfiable": hors du fichier (416).
+    """
+    units, _, spec = range_header.partition("=")
+    if units.strip().lower() != "bytes" or "," in spec:
+        return None
+    start_text, _, end_text = spec.strip().partition("-")
+    try:
+        if not start_text:
+            suffix = int(end_text)
+            if suffix <= 0:
+                return "unsatisfiable"
+            return max(size - suffix, 0), size - 1
+        start = int(start_text)
+        end = int(end_text) if end_text else size - 1
+    except ValueError:
+        return None
+    if start >= size or start > end:
+        return "unsatisfiable"
+    return start, min(end, size - 1)
+
+
+def precompress(path: str) -> List[str]:
+    """Écrit les variantes .gz (et .br si brotli est installé) d'un fichier texte, si plus petites."""
+    with open(path, "rb") as f:
+        raw = f.read()
+    written = []
+    compressed = {".gz": gzip.compress(raw, compresslevel=9, mtime=0)}
+    if BROTLI_AVAILABLE:
+        compressed[".br"] = brotli.compress(raw, quality=11)
+    for suffix, data in compressed.items():
+        if len(data) < len(raw):
+            with open(path + suffix, "wb") as f:
+                f.write(data)
+            written.append(path + suffix)
+    return written
+
+
+def precompress_directory(directory: str) -> int:
+    """Précompresse les fichiers dont les variantes manquent ou sont périmées."""
+    count = 0
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if not name.lower().endswith(PRECOMPRESS_EXTENSIONS) or not os.path.isfile(path):
+            continue
+        mtime = os.path.getmtime(path)
+        suffixes = [".gz", ".br"] if BROTLI_AVAILABLE else [".gz"]
+        if all(os.path.exists(path + s) and os.path.getmtime(path + s) >= mtime for s in suffixes):
+            continue
+        if precompress(path):
+            count += 1
+    return count
+
+
+class MediaFileResponse:
+    """Réponse fichier: 200 complet, 206 partiel ou 416, avec envoi zéro-copie si possible."""
+
+    def __init__(self, path: str, size: int, headers: dict, status_code: int = 200, byte_range=None):
+        self.path = path
+        self.size = size
+        self.headers = headers
+        self.status_code = status_code
+        self.byte_range = byte_range
+
+    async def __call__(self, scope, receive, send):
+        headers = dict(self.headers)
+        status = self.status_code
+        start, end = 0, self.size - 1
+
+        if status == 304:
+            await send({"type": "http.response.start", "status": 304,
+                        "headers": [(k.encode("latin-1"), v.encode("latin-1")) for k, v in headers.items()]})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        if self.byte_range == "unsatisfiable":
+            await send({"type": "http.response.start", "status": 416, "headers": [
+                (b"content-range", f"bytes */{self.size}".encode()), (b"content-length", b"0")]})
+            await send({"type": "http.response.body", "body": b""})
+            return
+        if self.byte_range:
+            start, end = self.byte_range
+            status = 206
+            headers["content-range"] = f"bytes {start}-{end}/{self.size}"
+
+        length = max(end - start + 1, 0)
+        headers["content-length"] = str(length)
+        await send({"type": "http.response.start", "status": status,
+                    "headers": [(k.encode("latin-1"), v.encode("latin-1")) for k, v in headers.items()]})
+        if scope["method"] == "HEAD" or length == 0:
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        extensions = scope.get("extensions") or {}
+        if status == 200 and "http.response.pathsend" in extensions:
+            await send({"type": "http.response.pathsend", "path": self.path})
+            return
+        if "http.response.zerocopysend" in extensions:
+            with open(self.path, "rb") as f:
+                await send({"type": "http.response.zerocopysend", "file": f.fileno(),
+                            "offset": start, "count": length, "more_body": False})
+            return
+
+        remaining = length
+        async with await anyio.open_file(self.path, "rb") as f:
+            if start:
+                await f.seek(start)
+            while remaining > 0:
+                chunk = await f.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+        if remaining > 0:
+            # Fichier tronqué pendant l'envoi: clôturer proprement la réponse
+            await send({"type": "http.response.body", "body": b""})
+
+
+class MediaFiles(StaticFiles):
+    """
+    StaticFiles avec politique de cache et Range.
+    precompressed=True: sert <fichier>.br / .gz quand le client les accepte.
+    max_age: durée de cache des fichiers non adressés par contenu (revalidés via ETag ensuite).
+    """
+
+    def __init__(self, *args, precompressed: bool = False, max_age: int = DEFAULT_MAX_AGE, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.precompressed = precompressed
+        self.max_age = max_age
+
+    def _encoded_variant(self, full_path: str, stat_result, accept_encoding: str) -> Tuple[str, os.stat_result, Optional[str]]:
+        accepted = accepted_encodings(accept_encoding)
+        for encoding, suffix in _ENCODINGS:
+            if encoding not in accepted and "*" not in accepted:
+                continue
+            try:
+                variant_stat = os.stat(full_path + suffix)
+            except OSError:
+                continue
+            if stat.S_ISREG(variant_stat.st_mode) and variant_stat.st_mtime >= stat_result.st_mtime:
+                return full_path + suffix, variant_stat, encoding
+        return full_path, stat_result, None
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200):
+        request_headers = Headers(scope=scope)
+        full_path = str(full_path)
+        filename = os.path.basename(full_path)
+
+        path, served_stat, encoding = full_path, stat_result, None
+        if self.precompressed and filename.lower().endswith(PRECOMPRESS_EXTENSIONS):
+            path, served_stat, encoding = self._encoded_variant(full_path, stat_result, request_headers.get("accept-encoding", ""))
+
+        etag = strong_etag(served_stat, encoding)
+        last_modified = formatdate(served_stat.st_mtime, usegmt=True)
+        headers = {
+            "content-type": guess_media_type(filename),
+            "etag": etag,
+            "last-modified": last_modified,
+            "cache-control": IMMUTABLE_CACHE_CONTROL if is_content_addressed(filename) else f"public, max-age={self.max_age}",
+        }
+        if self.precompressed:
+            headers["vary"] = "Accept-Encoding"
+        if encoding:
+            headers["content-encoding"] = encoding
+        else:
+            headers["accept-ranges"] = "bytes"
+
+        if status_code == 200 and self._not_modified(request_headers, etag, served_stat.st_mtime):
+            return MediaFileResponse(path, 0, {k: v for k, v in headers.items() if k != "content-type"}, status_code=304)
+
+        byte_range = None
+        range_header = request_headers.get("range")
+        if range_header and not encoding and status_code == 200:
+            if_range = request_headers.get("if-range")
+            if not if_range or if_range in (etag, last_modified):
+                byte_range = parse_range(range_header, served_stat.st_size)
+        return MediaFileResponse(path, served_stat.st_size, headers, status_code, byte_range)
+
+    @staticmethod
+    def _not_modified(request_headers: Headers, etag: str, mtime: float) -> bool:
+        if_none_match = request_headers.get("if-none-match")
+        if if_none_match:
+            if if_none_match.strip() == "*":
+                return True
+            return etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        if_modified_since = request_headers.get("if-modified-since")
+        if if_modified_since:
+            try:
+                return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
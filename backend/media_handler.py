@@ -1,14 +1,35 @@
 """
 MEDIA HANDLER - Module pour la gestion des médias YouTube/Google Drive
 Détecte et transforme les liens médias pour l'affichage dans le chat.
+
+Classification mémoïsée: un LRU borné (MEDIA_CACHE_SIZE URLs) évite de rejouer les
+regex pour les mêmes URLs à chaque rendu / validation. `annotate_message` fixe
+media_type / thumbnail_url sur le message À L'ÉCRITURE; les anciens messages sont
+annotés une fois par backfill_media_fields (tâche de fond au démarrage, par lots) et
+les endpoints de sync et d'historique ne classifient en lot (annotate_messages) que
+ceux que le rattrapage n'a pas encore atteints.
 """
 
+import os
 import re
+import asyncio
 import logging
-from typing import Optional, Dict, Any
+from functools import lru_cache
+from typing import Optional, Dict, Any, List
+
+from pymongo import UpdateOne
 
 logger = logging.getLogger(__name__)
 
+MEDIA_CACHE_SIZE = int(os.environ.get('MEDIA_CACHE_SIZE', '4096'))
+
+# Rattrapage des anciens messages: taille des lots et pause entre deux lots
+MEDIA_BACKFILL_BATCH = int(os.environ.get('MEDIA_BACKFILL_BATCH', '500'))
+MEDIA_BACKFILL_PAUSE = float(os.environ.get('MEDIA_BACKFILL_PAUSE', '0.05'))
+
+# Types affichés comme média dans le chat
+MEDIA_TYPES = ("youtube", "drive", "image", "video")
+
 # === PATTERNS REGEX ===
 YOUTUBE_PATTERNS = [
     re.compile(r'(?:youtube\.com/watch\?v=|youtu\.be/)([a-zA-Z0-9_-]{11})(?:[?&]|$)'),
@@ -18,6 +39,13 @@ YOUTUBE_PATTERNS = [
 
 GOOGLE_DRIVE_FILE_PATTERN = re.compile(r'drive\.google\.com/file/d/([a-zA-Z0-9_-]+)')
 GOOGLE_DRIVE_OPEN_PATTERN = re.compile(r'drive\.google\.com/open\?id=([a-zA-Z0-9_-]+)')
+GOOGLE_DRIVE_PATTERNS = [GOOGLE_DRIVE_FILE_PATTERN, GOOGLE_DRIVE_OPEN_PATTERN]
+
+# Pattern URL générique (compilé une fois)
+URL_PATTERN = re.compile(r'https?://[^\s<>"{}|\\^`\[\]]+')
+
+IMAGE_EXTENSIONS = frozenset(['jpg', 'jpeg', 'png', 'gif', 'webp', 'svg'])
+VIDEO_EXTENSIONS = frozenset(['mp4', 'webm', 'ogg', 'mov'])
 
 
 def get_media_type(url: str) -> Dict[str, Any]:
@@ -29,9 +57,13 @@ def get_media_type(url: str) -> Dict[str, Any]:
     """
     if not url or not isinstance(url, str):
         return {"type": "unknown", "error": "URL invalide"}
-    
-    url = url.strip()
-    
+    # Copie: le résultat en cache n'est jamais modifié par l'appelant
+    return dict(_classify(url.strip()))
+
+
+@lru_cache(maxsize=MEDIA_CACHE_SIZE)
+def _classify(url: str) -> Dict[str, Any]:
+    """Classification d'une URL nettoyée (mémoïsée, ne pas modifier le résultat)."""
     # === YOUTUBE ===
     for pattern in YOUTUBE_PATTERNS:
         match = pattern.search(url)
@@ -47,7 +79,7 @@ def get_media_type(url: str) -> Dict[str, Any]:
             }
     
     # === GOOGLE DRIVE ===
-    for pattern in [GOOGLE_DRIVE_FILE_PATTERN, GOOGLE_DRIVE_OPEN_PATTERN]:
+    for pattern in GOOGLE_DRIVE_PATTERNS:
         match = pattern.search(url)
         if match:
             file_id = match.group(1)
@@ -65,9 +97,8 @@ def get_media_type(url: str) -> Dict[str, Any]:
         logger.warning(f"[MEDIA] Lien Drive non reconnu: {url[:100]}")
     
     # === IMAGE DIRECTE ===
-    image_extensions = ['jpg', 'jpeg', 'png', 'gif', 'webp', 'svg']
     ext = url.split('.')[-1].lower().split('?')[0] if '.' in url else ''
-    if ext in image_extensions:
+    if ext in IMAGE_EXTENSIONS:
         return {
             "type": "image",
             "platform": "direct",
@@ -76,8 +107,7 @@ def get_media_type(url: str) -> Dict[str, Any]:
         }
     
     # === VIDÉO DIRECTE ===
-    video_extensions = ['mp4', 'webm', 'ogg', 'mov']
-    if ext in video_extensions:
+    if ext in VIDEO_EXTENSIONS:
         return {
             "type": "video",
             "platform": "direct",
@@ -107,15 +137,10 @@ def detect_media_in_text(text: str) -> Optional[Dict[str, Any]]:
     if not text:
         return None
     
-    # Pattern URL générique
-    url_pattern = re.compile(r'https?://[^\s<>"{}|\\^`\[\]]+')
-    urls = url_pattern.findall(text)
-    
-    for url in urls:
-        media_info = get_media_type(url)
-        if media_info.get("type") in ["youtube", "drive", "image", "video"]:
-            media_info["original_url"] = url
-            return media_info
+    for url in URL_PATTERN.findall(text):
+        media_info = _classify(url)
+        if media_info.get("type") in MEDIA_TYPES:
+            return {**media_info, "original_url": url}
     
     return None
 
@@ -123,4 +148,84 @@ def detect_media_in_text(text: str) -> Optional[Dict[str, Any]]:
 def is_media_url(url: str) -> bool:
     """Vérifie si une URL est un média supporté."""
     result = get_media_type(url)
-    return result.get("type") in ["youtube", "drive", "image", "video"]
+    return result.get("type") in MEDIA_TYPES
+
+
+# === CLASSIFICATION EN LOT (messages) ===
+
+def classify_messages(messages: List[Dict[str, Any]], text_field: str = "content") -> List[Optional[Dict[str, Any]]]:
+    """
+    Média de chaque message (même ordre): media_url en priorité (quel que soit son type),
+    sinon premier lien média du texte. Une URL déjà vue dans le lot (ou avant) est servie
+    par le LRU; les résultats sont partagés et en lecture seule.
+    """
+    results = []
+    for message in messages:
+        media_url = message.get("media_url")
+        if media_url:
+            results.append(_classify(media_url.strip()) if isinstance(media_url, str) else None)
+            continue
+        text = message.get(text_field) or message.get("text")
+        if not text or not isinstance(text, str) or "http" not in text:
+            results.append(None)
+            continue
+        results.append(next((info for info in map(_classify, URL_PATTERN.findall(text))
+                             if info["type"] in MEDIA_TYPES), None))
+    return results
+
+
+def media_fields(media_info: Optional[Dict[str, Any]]) -> Dict[str, Optional[str]]:
+    """Champs persistés sur le message (media_type None = classifié, sans média)."""
+    if not media_info:
+        return {"media_type": None, "thumbnail_url": None}
+    return {"media_type": media_info.get("type"), "thumbnail_url": media_info.get("thumbnail_url")}
+
+
+def annotate_message(message: Dict[str, Any], text_field: str = "content") -> Dict[str, Any]:
+    """À l'écriture: fixe media_type / thumbnail_url sur le document (un media_type fourni est conservé)."""
+    if message.get("media_type"):
+        return message
+    message.update(media_fields(classify_messages([message], text_field)[0]))
+    return message
+
+
+def annotate_messages(messages: List[Dict[str, Any]], text_field: str = "content") -> List[Dict[str, Any]]:
+    """À la lecture: classe en lot uniquement les messages jamais annotés (anciens documents)."""
+    pending = [m for m in messages if "media_type" not in m]
+    if pending:
+        for message, info in zip(pending, classify_messages(pending, text_field)):
+            message.update(media_fields(info))
+    return messages
+
+
+async def backfill_media_fields(db, batch_size: int = MEDIA_BACKFILL_BATCH, pause: float = MEDIA_BACKFILL_PAUSE,
+                                max_batches: Optional[int] = None) -> int:
+    """
+    Persiste media_type / thumbnail_url sur les messages jamais annotés, par lots (_id croissant).
+    Reprise naturelle après un redémarrage: les messages annotés sortent du filtre.
+    Retourne le nombre de messages annotés.
+    """
+    pending = {"media_type": {"$exists": False}}
+    projection = {"_id": 1, "content": 1, "text": 1, "media_url": 1}
+    last_id = None
+    annotated = batches = 0
+    while max_batches is None or batches < max_batches:
+        query = {"$and": [pending, {"_id": {"$gt": last_id}}]} if last_id is not None else pending
+        docs = await db.chat_messages.find(query, projection).sort("_id", 1).limit(batch_size).to_list(batch_size)
+        if not docs:
+            break
+        # Garde $exists: une annotation écrite entre-temps n'est jamais écrasée
+        ops = [UpdateOne({"_id": doc["_id"], "media_type": {"$exists": False}}, {"$set": media_fields(info)})
+               for doc, info in zip(docs, classify_messages(docs))]
+        await db.chat_messages.bulk_write(ops, ordered=False)
+        last_id = docs[-1]["_id"]
+        annotated += len(ops)
+        batches += 1
+        if pause:
+            await asyncio.sleep(pause)
+    return annotated
+
+
+def media_cache_info():
+    """Statistiques du LRU (hits, misses, maxsize, currsize)."""
+    return _classify.cache_info()
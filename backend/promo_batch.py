@@ -0,0 +1,158 @@
+"""
+PROMO BATCH - Génération en série de codes promo
+Le dashboard créait les codes d'un événement un par un (un POST /discount-codes par code,
+numérotation PREFIX-01, PREFIX-02... qui entrait en collision d'un lot à l'autre).
+
+- codes aléatoires PREFIX-XXXXXXXX (alphabet sans caractères ambigus par défaut)
+- collisions vérifiées en une seule requête $in sur code_upper (index unique)
+- insert_many(ordered=False): seuls les codes rejetés par l'index (course avec une autre
+  création) sont régénérés, le reste du lot est déjà en base
+- lot incomplet (CodeSpaceExhausted): les codes déjà insérés sont retirés par batch_id
+- préfixe limité à [A-Z0-9_-] (repris dans le nom du fichier CSV téléchargé)
+- export CSV produit ligne à ligne pour le téléchargement
+"""
+
+import csv
+import io
+import re
+import uuid
+import random
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional, Iterable, Iterator, Set
+
+from pymongo.errors import BulkWriteError
+
+from promo_index import normalize_code
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ALPHABET = "ABCDEFGHJKLMNPQRSTUVWXYZ23456789"  # sans 0/O, 1/I
+DEFAULT_CODE_LENGTH = 8
+MAX_BATCH_SIZE = 10000
+MAX_ROUNDS = 5
+# Espace de codes au moins 100x plus grand que le lot: collisions rares, retries courts
+MIN_SPACE_RATIO = 100
+DUPLICATE_KEY = 11000
+PREFIX_PATTERN = re.compile(r"^[A-Z0-9_-]*$")
+CSV_COLUMNS = ["code", "type", "value", "maxUses", "expiresAt", "assignedEmail", "courses"]
+
+_random = random.SystemRandom()
+
+
+class CodeSpaceExhausted(Exception):
+    """Plus assez de combinaisons libres pour produire le lot demandé."""
+
+
+def normalize_alphabet(alphabet: Optional[str]) -> str:
+    """Majuscules, sans doublons ni séparateurs (ordre conservé)."""
+    chars = []
+    for char in normalize_code(alphabet or DEFAULT_ALPHABET):
+        if char.isalnum() and char not in chars:
+            chars.append(char)
+    return "".join(chars)
+
+
+def normalize_prefix(prefix: Optional[str]) -> str:
+    """Préfixe en majuscules; ValueError hors de [A-Z0-9_-]."""
+    prefix = normalize_code(prefix)
+    if not PREFIX_PATTERN.match(prefix):
+        raise ValueError("Préfixe invalide: lettres, chiffres, '_' et '-' uniquement")
+    return prefix
+
+
+def check_code_space(count: int, alphabet: str, length: int):
+    if len(alphabet) < 2 or length < 4:
+        raise ValueError("Alphabet (2 caractères min.) ou longueur (4 min.) insuffisants")
+    if len(alphabet) ** length < count * MIN_SPACE_RATIO:
+        raise ValueError("Alphabet ou longueur trop courts pour ce nombre de codes")
+
+
+def random_codes(count: int, prefix: str, alphabet: str, length: int, exclude: Set[str]) -> List[str]:
+    """`count` codes distincts entre eux et absents de `exclude`."""
+    head = f"{prefix}-" if prefix else ""
+    codes = set()
+    while len(codes) < count:
+        code = head + "".join(_random.choices(alphabet, k=length))
+        if code not in exclude:
+            codes.add(code)
+    return list(codes)
+
+
+async def generate_discount_codes(db, count: int, template: Dict[str, Any], prefix: str = "",
+                                  alphabet: Optional[str] = None, length: int = DEFAULT_CODE_LENGTH,
+                                  assigned_emails: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """
+    Insère `count` codes uniques construits sur `template` (type, value, maxUses, courses...).
+    Les bénéficiaires éventuels sont attribués de manière circulaire.
+    Tout ou rien: si le lot ne peut être complété, les codes déjà insérés sont supprimés.
+    """
+    prefix = normalize_prefix(prefix)
+    alphabet = normalize_alphabet(alphabet)
+    check_code_space(count, alphabet, length)
+    beneficiaries = assigned_emails or [None]
+    created_at = datetime.now(timezone.utc).isoformat()
+    batch_id = str(uuid.uuid4())
+    created: List[Dict[str, Any]] = []
+    rejected: Set[str] = set()
+
+    for _ in range(MAX_ROUNDS):
+        missing = count - len(created)
+        if missing <= 0:
+            break
+        candidates = random_codes(missing, prefix, alphabet, length, rejected)
+        # Une seule requête indexée pour tout le lot
+        taken = await db.discount_codes.distinct("code_upper", {"code_upper": {"$in": candidates}})
+        rejected.update(taken)
+        taken = set(taken)
+        docs = []
+        for code in candidates:
+            if code in taken:
+                continue
+            doc = dict(template)
+            doc.update({"id": str(uuid.uuid4()), "code": code, "code_upper": code, "used": 0, "active": True,
+                        "assignedEmail": beneficiaries[(len(created) + len(docs)) % len(beneficiaries)],
+                        "created_at": created_at, "source": "batch", "batch_id": batch_id})
+            docs.append(doc)
+        if not docs:
+            continue
+        collided: Set[int] = set()
+        try:
+            await db.discount_codes.insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            errors = e.details.get("writeErrors", [])
+            if any(err.get("code") != DUPLICATE_KEY for err in errors):
+                raise
+            collided = {err["index"] for err in errors}
+            rejected.update(docs[i]["code"] for i in collided)
+            logger.info(f"[PROMO] {len(collided)} collision(s) à l'insertion, régénération")
+        for i, doc in enumerate(docs):
+            if i not in collided:
+                doc.pop("_id", None)
+                created.append(doc)
+
+    if len(created) < count:
+        await db.discount_codes.delete_many({"batch_id": batch_id})
+        logger.warning(f"[PROMO] Lot {batch_id} incomplet ({len(created)}/{count}): codes retirés")
+        raise CodeSpaceExhausted(f"{len(created)}/{count} codes générés")
+    return created
+
+
+def codes_csv(codes: Iterable[Dict[str, Any]], chunk_size: int = 500) -> Iterator[str]:
+    """CSV (en-tête + une ligne par code), produit par blocs pour StreamingResponse."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS)
+    for i, code in enumerate(codes, 1):
+        writer.writerow([
+            code.get("code"), code.get("type"), code.get("value"),
+            code.get("maxUses") if code.get("maxUses") is not None else "",
+            code.get("expiresAt") or "", code.get("assignedEmail") or "",
+            "|".join(code.get("courses") or [])
+        ])
+        if i % chunk_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.getvalue():
+        yield buffer.getvalue()
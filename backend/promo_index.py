@@ -0,0 +1,167 @@
+"""
+PROMO INDEX - Codes promo actifs en mémoire + rédemption atomique
+validate_discount_code et create_reservation cherchaient le code par regex ^code$ insensible à la
+casse (aucun index, code non échappé), et la limite maxUses était vérifiée sans jamais être
+décomptée de façon atomique.
+
+- champ normalisé `code_upper` (index unique) renseigné à chaque écriture et rattrapé au démarrage
+- carte code_upper -> code actif en mémoire: validation O(1); rechargée quand la version
+  "discount-codes" du cache catalogue change (toutes les écritures promo la bumpent) ou après TTL
+- redeem(): un seul find_one_and_update gardé par `used < maxUses`: deux réservations simultanées
+  ne peuvent pas consommer la dernière utilisation
+"""
+
+import os
+import time
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Any, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import OperationFailure
+
+from response_cache import catalog_cache
+
+logger = logging.getLogger(__name__)
+
+PROMO_INDEX_TTL_SECONDS = int(os.environ.get('PROMO_INDEX_TTL_SECONDS', '300'))
+
+
+def normalize_code(code: Optional[str]) -> str:
+    """Normalize: trim + uppercase"""
+    return (code or "").strip().upper()
+
+
+def parse_expiry(value) -> Optional[datetime]:
+    """expiresAt: 'YYYY-MM-DD' (fin de journée UTC), ISO complet ou datetime."""
+    if isinstance(value, datetime):
+        return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+    if not isinstance(value, str) or not value.strip():
+        return None
+    value = value.strip().replace('Z', '+00:00')
+    if 'T' not in value:
+        value = value + "T23:59:59+00:00"
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        logger.debug(f"Date parsing: {value}")
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def is_exhausted(code: Dict[str, Any]) -> bool:
+    return bool(code.get("maxUses")) and (code.get("used") or 0) >= code["maxUses"]
+
+
+def code_error(code: Dict[str, Any], email: str = "", course_id: str = "") -> Optional[str]:
+    """Message de refus (mêmes messages que /discount-codes/validate), None si le code s'applique."""
+    expiry = parse_expiry(code.get("expiresAt"))
+    if expiry and expiry < datetime.now(timezone.utc):
+        return "Code promo expiré"
+    if is_exhausted(code):
+        return "Code promo épuisé (nombre max d'utilisations atteint)"
+    # IMPORTANT: empty list = all courses allowed; SKIP if no courseId provided (identification flow)
+    allowed_courses = code.get("courses") or []
+    if course_id and allowed_courses and course_id not in allowed_courses:
+        return "Code non applicable à ce cours"
+    assigned = code.get("assignedEmail") or ""
+    if isinstance(assigned, str) and assigned.strip() and email:
+        if assigned.strip().lower() != email.strip().lower():
+            return "Code réservé à un autre compte"
+    return None
+
+
+class PromoCodeIndex:
+    """Carte en mémoire code_upper -> code actif, versionnée par le cache catalogue."""
+
+    def __init__(self, ttl_seconds: int = PROMO_INDEX_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._codes: Dict[str, Dict[str, Any]] = {}
+        self._version = None
+        self._loaded_at = 0.0
+        self._loading: Optional[asyncio.Future] = None
+        self.loads = 0
+
+    def _current_version(self):
+        return catalog_cache.version("discount-codes")
+
+    def is_fresh(self) -> bool:
+        return self._version == self._current_version() and time.monotonic() - self._loaded_at <= self.ttl_seconds
+
+    async def _load(self, db):
+        version = self._current_version()
+        self.loads += 1
+        codes = {}
+        async for code in db.discount_codes.find({"active": True}, {"_id": 0}):
+            codes[code.get("code_upper") or normalize_code(code.get("code"))] = code
+        self._codes = codes
+        self._version = version
+        self._loaded_at = time.monotonic()
+
+    async def refresh(self, db):
+        """Recharge si périmé; les rechargements simultanés partagent une seule lecture."""
+        if self.is_fresh():
+            return
+        if self._loading is None:
+            self._loading = asyncio.ensure_future(self._load(db))
+            self._loading.add_done_callback(lambda _: setattr(self, "_loading", None))
+        await asyncio.shield(self._loading)
+
+    async def lookup(self, db, code: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Code actif (document partagé, lecture seule) ou None."""
+        key = normalize_code(code)
+        if not key:
+            return None
+        await self.refresh(db)
+        return self._codes.get(key)
+
+    async def redeem(self, db, code: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Consomme une utilisation: document mis à jour, ou None si le code est épuisé / désactivé entre-temps.
+        La garde porte sur la valeur stockée de `used`, jamais sur la copie en mémoire.
+        """
+        query = {"id": code["id"], "active": True}
+        if code.get("maxUses"):
+            query["used"] = {"$lt": code["maxUses"]}
+        updated = await db.discount_codes.find_one_and_update(
+            query, {"$inc": {"used": 1}}, projection={"_id": 0}, return_document=ReturnDocument.AFTER
+        )
+        if updated is None:
+            # Refus (rare): état stocké relu pour que /validate réponde "épuisé" et non "inconnu"
+            updated = await db.discount_codes.find_one({"id": code["id"], "active": True}, {"_id": 0})
+            redeemed = None
+        else:
+            redeemed = updated
+        was_fresh = self.is_fresh()
+        catalog_cache.bump("discount-codes")  # la liste du dashboard affiche `used`
+        key = code.get("code_upper") or normalize_code(code.get("code"))
+        if updated:
+            self._codes[key] = updated
+        else:
+            self._codes.pop(key, None)
+        if was_fresh:
+            self._version = self._current_version()  # carte déjà à jour: pas de rechargement complet
+        return redeemed
+
+
+# Instance partagée: promo_routes (validation) et reservation_routes (rédemption)
+promo_index = PromoCodeIndex()
+
+
+async def ensure_promo_indexes(db) -> int:
+    """Rattrape code_upper sur les anciens codes puis crée l'index unique (non unique si doublons)."""
+    backfilled = 0
+    async for code in db.discount_codes.find({"code_upper": {"$exists": False}}, {"_id": 0, "id": 1, "code": 1}):
+        await db.discount_codes.update_one({"id": code["id"]}, {"$set": {"code_upper": normalize_code(code.get("code"))}})
+        backfilled += 1
+    try:
+        await db.discount_codes.create_index("code_upper", unique=True)
+    except OperationFailure as e:
+        # Doublons historiques ("promo" / "PROMO"): index simple, à dédoublonner depuis le dashboard
+        logger.warning(f"[PROMO] code_upper non unique ({e}); index simple créé")
+        await db.discount_codes.create_index("code_upper")
+    await db.discount_codes.create_index("id")
+    if backfilled:
+        catalog_cache.bump("discount-codes")
+    return backfilled
@@ -0,0 +1,145 @@
+"""
+RESERVATION PAGES - Pagination par curseur et totaux maintenus pour le dashboard réservations
+get_reservations faisait skip((page-1)*limit) + count_documents à chaque page: les deux
+parcourent toutes les réservations précédentes du coach, de plus en plus lent avec l'historique.
+
+- keyset sur (createdAt, id) décroissants: curseur opaque (base64) after / before,
+  index (coach_id, createdAt, id): une page profonde coûte autant que la première
+- totaux dans reservation_counters (_id = coach_id, "*" = toutes): $inc à la création /
+  suppression; sans compteur (premier accès, après une suppression en masse) -> count_documents
+  exact puis amorçage par $setOnInsert (jamais d'écrasement d'un compteur déjà maintenu);
+  le lecteur qui crée le compteur recompte: un $inc tombé sur le compteur absent pendant le
+  premier comptage n'est pas perdu.
+  `estimated` indique un total lu dans le compteur
+"""
+
+import base64
+import json
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional, Tuple
+
+from fastapi import HTTPException
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+COUNTERS = "reservation_counters"
+ALL_RESERVATIONS = "*"
+RESERVATION_SORT = [("createdAt", -1), ("id", -1)]
+
+
+# ==================== CURSEUR ====================
+
+def encode_cursor(doc: Dict[str, Any]) -> str:
+    """(createdAt, id) -> jeton opaque; createdAt date BSON ou chaîne ISO (anciennes réservations)."""
+    created = doc.get("createdAt")
+    key = ["d", created.isoformat()] if isinstance(created, datetime) else ["s", created]
+    raw = json.dumps([key, doc.get("id")], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> Tuple[Any, str]:
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        (kind, created), reservation_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if kind == "d":
+            created = datetime.fromisoformat(created)
+        return created, reservation_id
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Curseur de pagination invalide")
+
+
+def keyset_filter(query: Dict[str, Any], token: str, newer: bool) -> Dict[str, Any]:
+    """Réservations strictement après (plus anciennes) ou avant (plus récentes) le curseur."""
+    created, reservation_id = decode_cursor(token)
+    op = "$gt" if newer else "$lt"
+    branches = [
+        {"createdAt": {op: created}},
+        {"createdAt": created, "id": {op: reservation_id}}
+    ]
+    # Migration bson_dates en cours: MongoDB trie les chaînes avant les dates BSON
+    if isinstance(created, datetime) and not newer:
+        branches.append({"createdAt": {"$gte": ""}})  # toutes les chaînes
+    elif isinstance(created, str) and newer:
+        branches.append({"createdAt": {"$gte": datetime.min.replace(tzinfo=timezone.utc)}})  # toutes les dates
+    return {"$and": [query, {"$or": branches}]}
+
+
+async def keyset_page(collection, query: Dict[str, Any], projection: Dict[str, Any], limit: int,
+                      after: Optional[str] = None, before: Optional[str] = None
+                      ) -> Tuple[List[Dict[str, Any]], Optional[str], Optional[str]]:
+    """(page, curseur suivant, curseur précédent); une ligne de plus lue pour savoir s'il reste une page."""
+    projection = dict(projection, createdAt=1, id=1)
+    if before:
+        ascending = [(field, -direction) for field, direction in RESERVATION_SORT]
+        cursor = collection.find(keyset_filter(query, before, newer=True), projection).sort(ascending)
+        docs = await cursor.limit(limit + 1).to_list(limit + 1)
+        has_more = len(docs) > limit
+        docs = list(reversed(docs[:limit]))
+        next_cursor = encode_cursor(docs[-1]) if docs else None
+        prev_cursor = encode_cursor(docs[0]) if docs and has_more else None
+        return docs, next_cursor, prev_cursor
+    effective = keyset_filter(query, after, newer=False) if after else query
+    docs = await collection.find(effective, projection).sort(RESERVATION_SORT).limit(limit + 1).to_list(limit + 1)
+    has_more = len(docs) > limit
+    docs = docs[:limit]
+    next_cursor = encode_cursor(docs[-1]) if docs and has_more else None
+    prev_cursor = encode_cursor(docs[0]) if docs and after else None
+    return docs, next_cursor, prev_cursor
+
+
+# ==================== TOTAUX ====================
+
+def counter_key(query: Dict[str, Any]) -> str:
+    return query.get("coach_id") or ALL_RESERVATIONS
+
+
+async def reservation_total(db, query: Dict[str, Any], exact: bool = False) -> Tuple[int, bool]:
+    """(total, estimated). exact=True recompte et corrige le compteur."""
+    key = counter_key(query)
+    if not exact:
+        counter = await db[COUNTERS].find_one({"_id": key})
+        if counter is not None:
+            return counter.get("count", 0), True
+    total = await db.reservations.count_documents(query)
+    if exact:
+        await db[COUNTERS].update_one({"_id": key}, {"$set": {"count": total}}, upsert=True)
+        return total, False
+    # Amorçage en un seul upsert: un compteur créé entre-temps par un autre lecteur
+    # (et déjà incrémenté par $inc) n'est jamais écrasé par ce comptage plus ancien
+    try:
+        seeded = await db[COUNTERS].update_one({"_id": key}, {"$setOnInsert": {"count": total}}, upsert=True)
+    except DuplicateKeyError:
+        return total, False  # upsert concurrent sur le même _id: le compteur existe déjà
+    if seeded.upserted_id is not None:
+        # Compteur créé ici: les créations faites pendant le comptage ont $inc un compteur absent (sans effet)
+        recount = await db.reservations.count_documents(query)
+        if recount != total:
+            await db[COUNTERS].update_one({"_id": key}, {"$set": {"count": recount}})
+        total = recount
+    return total, False
+
+
+async def _increment(db, reservation: Dict[str, Any], delta: int):
+    # Pas d'upsert: un compteur absent est amorcé par un comptage exact à la lecture
+    for key in {reservation.get("coach_id") or ALL_RESERVATIONS, ALL_RESERVATIONS}:
+        await db[COUNTERS].update_one({"_id": key}, {"$inc": {"count": delta}})
+
+
+async def on_reservation_counted(db, reservation: Dict[str, Any]):
+    await _increment(db, reservation, 1)
+
+
+async def on_reservation_uncounted(db, reservation: Dict[str, Any]):
+    await _increment(db, reservation, -1)
+
+
+async def reset_reservation_counters(db):
+    """Suppressions / migrations en masse: compteurs recalculés au prochain affichage."""
+    await db[COUNTERS].delete_many({})
+
+
+async def ensure_reservation_page_indexes(db):
+    await db.reservations.create_index([("coach_id", 1), ("createdAt", -1), ("id", -1)])
+    await db.reservations.create_index([("createdAt", -1), ("id", -1)])
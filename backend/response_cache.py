@@ -0,0 +1,185 @@
+"""
+RESPONSE CACHE - Cache versionné des réponses du catalogue public
+GET /courses, /offers, /categories, /concept, /config, /feature-flags, /payment-links et
+/manifest.json interrogeaient Mongo à chaque chargement de page pour des données modifiées
+quelques fois par semaine.
+
+- une entrée par (endpoint, tenant); le tenant suit le scoping X-User-Email du concept, les
+  emails inconnus (ni coach ni Super Admin) partageant un même tenant (TenantContext.catalog_email)
+- entrées et bundles bornés en LRU (RESPONSE_CACHE_SIZE); une lecture de version n'ajoute rien
+- un compteur de version par endpoint (et par tenant), incrémenté par les endpoints d'écriture
+- ETag fort (hash du corps): If-None-Match -> 304 SANS accès à la base
+- les constructions simultanées d'une même entrée manquante sont fusionnées (pas de ruée)
+- TTL de sécurité si plusieurs workers (une écriture n'invalide que son propre processus)
+- bundle(): un document unique assemblé depuis plusieurs entrées (GET /bootstrap), versionné
+  par les ETags de ses composants; les corps déjà encodés sont concaténés sans ré-encodage
+"""
+
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from fastapi.encoders import jsonable_encoder
+from starlette.responses import Response
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE_TTL_SECONDS = int(os.environ.get('RESPONSE_CACHE_TTL_SECONDS', '300'))
+RESPONSE_CACHE_SIZE = int(os.environ.get('RESPONSE_CACHE_SIZE', '2048'))
+# Le client revalide à chaque chargement (304 quasi gratuit), une écriture est donc vue aussitôt
+CATALOG_CACHE_CONTROL = "no-cache"
+
+ALL_TENANTS = "*"
+
+Builder = Callable[[], Awaitable[Any]]
+# Composant d'un bundle: (endpoint, tenant, builder)
+Part = Tuple[str, str, Builder]
+
+
+class CacheEntry:
+    __slots__ = ("version", "body", "etag", "data", "built_at")
+
+    def __init__(self, version: Tuple[int, int], body: bytes, etag: str, data: Any):
+        self.version = version
+        self.body = body
+        self.etag = etag
+        self.data = data
+        self.built_at = time.monotonic()
+
+
+def encode_body(data: Any) -> bytes:
+    """JSON compact: même contenu -> mêmes octets -> même ETag."""
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+
+
+class ResponseCache:
+    """Réponses JSON en mémoire, invalidées par version (bump) ou TTL."""
+
+    def __init__(self, ttl_seconds: int = RESPONSE_CACHE_TTL_SECONDS, max_entries: int = RESPONSE_CACHE_SIZE):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        # Versions créées par les écritures (bump) seulement: une lecture n'ajoute pas de clé
+        self._versions: Dict[Tuple[str, str], int] = {}
+        self._entries: "OrderedDict[Tuple[str, str], CacheEntry]" = OrderedDict()
+        self._inflight: Dict[Tuple[str, str, Tuple[int, int]], asyncio.Future] = {}
+        self._bundles: "OrderedDict[Tuple[str, str], Tuple[Tuple[str, ...], CacheEntry]]" = OrderedDict()
+        self.builds = 0
+
+    def version(self, endpoint: str, tenant: str = ALL_TENANTS) -> Tuple[int, int]:
+        """(version de l'endpoint, version du tenant)."""
+        tenant_version = self._versions.get((endpoint, tenant), 0) if tenant != ALL_TENANTS else 0
+        return self._versions.get((endpoint, ALL_TENANTS), 0), tenant_version
+
+    def bump(self, endpoint: str, tenant: Optional[str] = None):
+        """Écriture: invalide un tenant, ou tous les tenants de l'endpoint si tenant est None."""
+        key = (endpoint, tenant or ALL_TENANTS)
+        self._versions[key] = self._versions.get(key, 0) + 1
+
+    def _store(self, store: "OrderedDict", key: Tuple[str, str], value):
+        store[key] = value
+        store.move_to_end(key)
+        while len(store) > self.max_entries:
+            store.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+        self._bundles.clear()
+
+    def _fresh_entry(self, endpoint: str, tenant: str) -> Optional[CacheEntry]:
+        entry = self._entries.get((endpoint, tenant))
+        if entry is None or entry.version != self.version(endpoint, tenant):
+            return None
+        if time.monotonic() - entry.built_at > self.ttl_seconds:
+            return None
+        self._entries.move_to_end((endpoint, tenant))
+        return entry
+
+    async def get(self, endpoint: str, tenant: str, builder: Builder) -> CacheEntry:
+        """Entrée à jour; construite une seule fois même si plusieurs requêtes arrivent ensemble."""
+        entry = self._fresh_entry(endpoint, tenant)
+        if entry is not None:
+            return entry
+        version = self.version(endpoint, tenant)
+        key = (endpoint, tenant, version)
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._build(endpoint, tenant, version, builder))
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(future)
+
+    async def _build(self, endpoint: str, tenant: str, version: Tuple[int, int], builder: Builder) -> CacheEntry:
+        self.builds += 1
+        # Même encodage que FastAPI (datetime ISO, modèles pydantic...)
+        data = jsonable_encoder(await builder())
+        body = encode_body(data)
+        entry = CacheEntry(version, body, f'"{endpoint}-{hashlib.sha1(body).hexdigest()[:20]}"', data)
+        # Une écriture pendant la construction a changé la version: ne pas mémoriser un état périmé
+        if self.version(endpoint, tenant) == version:
+            self._store(self._entries, (endpoint, tenant), entry)
+        return entry
+
+    async def data(self, endpoint: str, tenant: str, builder: Builder) -> Any:
+        """Données décodées (partagées, lecture seule) pour les agrégations côté serveur."""
+        return (await self.get(endpoint, tenant, builder)).data
+
+    async def respond(self, request_headers, endpoint: str, builder: Builder, tenant: str = ALL_TENANTS,
+                      media_type: str = "application/json") -> Response:
+        """200 avec ETag, ou 304 si le client a déjà la version courante (sans appeler le builder)."""
+        entry = self._fresh_entry(endpoint, tenant)
+        if entry is None:
+            entry = await self.get(endpoint, tenant, builder)
+        return entry_response(request_headers, entry, entry.body, tenant != ALL_TENANTS, media_type)
+
+    async def bundle(self, name: str, tenant: str, parts: Dict[str, Part]) -> CacheEntry:
+        """Document {"version", <clé>: <données>...}: composants manquants construits en parallèle."""
+        entries = await asyncio.gather(*[self.get(*part) for part in parts.values()])
+        return self._assemble(name, tenant, dict(zip(parts, entries)))
+
+    async def bundle_version(self, name: str, tenant: str, parts: Dict[str, Part]) -> CacheEntry:
+        """Même ETag que bundle(); sans accès base tant que tous les composants sont à jour."""
+        entries = {key: self._fresh_entry(endpoint, part_tenant) for key, (endpoint, part_tenant, _) in parts.items()}
+        if any(entry is None for entry in entries.values()):
+            return await self.bundle(name, tenant, parts)
+        return self._assemble(name, tenant, entries)
+
+    def _assemble(self, name: str, tenant: str, entries: Dict[str, CacheEntry]) -> CacheEntry:
+        etags = tuple(entry.etag for entry in entries.values())
+        cached = self._bundles.get((name, tenant))
+        if cached is not None and cached[0] == etags:
+            self._bundles.move_to_end((name, tenant))
+            return cached[1]
+        version = hashlib.sha1("".join(etags).encode()).hexdigest()[:20]
+        body = b",".join([encode_body("version") + b":" + encode_body(version)] +
+                         [encode_body(key) + b":" + entry.body for key, entry in entries.items()])
+        data = {"version": version, **{key: entry.data for key, entry in entries.items()}}
+        bundle = CacheEntry((0, 0), b"{" + body + b"}", f'"{name}-{version}"', data)
+        self._store(self._bundles, (name, tenant), (etags, bundle))
+        return bundle
+
+
+def entry_response(request_headers, entry: CacheEntry, body: bytes, tenant_scoped: bool = False,
+                   media_type: str = "application/json") -> Response:
+    """Réponse 200 (body) avec l'ETag de l'entrée, ou 304 si If-None-Match correspond."""
+    headers = {"ETag": entry.etag, "Cache-Control": CATALOG_CACHE_CONTROL}
+    if tenant_scoped:
+        headers["Vary"] = "X-User-Email"
+    if etag_matches(request_headers.get("if-none-match"), entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type=media_type, headers=headers)
+
+# Instance partagée: endpoints du catalogue (server.py, promo_routes) et écritures hors serveur (video_pipeline)
+catalog_cache = ResponseCache()
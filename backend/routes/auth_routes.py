@@ -1,13 +1,18 @@
 # auth_routes.py - Routes d'authentification v9.1.9
 # Extrait de server.py pour modularisation
 
-from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from pydantic import BaseModel
 from typing import Optional
 from datetime import datetime, timezone, timedelta
 import uuid
 import logging
 
+from response_cache import catalog_cache
+from vitrine import rebuild_vitrines
+from tenant_context import coach_profiles, is_super_admin as tenant_is_super_admin
+from session_auth import session_cache, require_session, session_token_from, SESSION_COOKIE
+
 logger = logging.getLogger(__name__)
 
 # Router avec préfixe /auth
@@ -27,7 +32,7 @@ SUPER_ADMIN_EMAILS = [
 
 def is_super_admin_email(email: str) -> bool:
     """Vérifie si l'email est celui d'un Super Admin"""
-    return email and email.lower().strip() in [e.lower() for e in SUPER_ADMIN_EMAILS]
+    return tenant_is_super_admin(email)
 
 def init_auth_db(database):
     """Initialise la référence DB"""
@@ -129,6 +134,9 @@ async def process_google_session(request: Request, response: Response):
                     "last_login": datetime.now(timezone.utc).isoformat()
                 }
                 await _db.coaches.insert_one(new_coach)
+                coach_profiles.invalidate(email)
+                catalog_cache.bump("partners")
+                await rebuild_vitrines(_db, [email])
                 logger.info(f"[AUTH] Nouveau coach créé automatiquement: {email}")
             else:
                 # Mettre à jour last_login pour les coachs existants
@@ -140,19 +148,20 @@ async def process_google_session(request: Request, response: Response):
         # Créer la session
         expires_at = datetime.now(timezone.utc) + timedelta(days=7)
         await _db.coach_sessions.delete_many({"user_id": user_id})  # Supprimer les anciennes sessions
+        session_cache.invalidate_user(user_id)
         await _db.coach_sessions.insert_one({
             "session_id": str(uuid.uuid4()),
             "user_id": user_id,
             "email": email,
             "name": name,
             "session_token": session_token,
-            "expires_at": expires_at.isoformat(),
+            "expires_at": expires_at,  # date BSON: index TTL (session_auth.ensure_session_indexes)
             "created_at": datetime.now(timezone.utc).isoformat()
         })
         
         # Définir le cookie httpOnly
         response.set_cookie(
-            key="coach_session_token",
+            key=SESSION_COOKIE,
             value=session_token,
             httponly=True,
             secure=True,
@@ -180,58 +189,13 @@ async def process_google_session(request: Request, response: Response):
 
 
 @auth_router.get("/me")
-async def get_current_user(request: Request):
+async def get_current_user(user: dict = Depends(require_session)):
     """
     Vérifie la session actuelle et retourne les infos utilisateur.
     Utilisé pour vérifier si l'utilisateur est connecté.
+    Session résolue par session_auth (cache token -> utilisateur, sans accès base si déjà vue).
     """
-    # Récupérer le token depuis le cookie ou le header Authorization
-    session_token = request.cookies.get("coach_session_token")
-    
-    if not session_token:
-        auth_header = request.headers.get("Authorization", "")
-        if auth_header.startswith("Bearer "):
-            session_token = auth_header[7:]
-    
-    if not session_token:
-        raise HTTPException(status_code=401, detail="Non authentifié")
-    
-    # Vérifier la session
-    session = await _db.coach_sessions.find_one(
-        {"session_token": session_token},
-        {"_id": 0}
-    )
-    
-    if not session:
-        raise HTTPException(status_code=401, detail="Session invalide")
-    
-    # Vérifier l'expiration
-    expires_at = session.get("expires_at")
-    if isinstance(expires_at, str):
-        expires_at = datetime.fromisoformat(expires_at.replace('Z', '+00:00'))
-    if expires_at.tzinfo is None:
-        expires_at = expires_at.replace(tzinfo=timezone.utc)
-    
-    if expires_at < datetime.now(timezone.utc):
-        await _db.coach_sessions.delete_one({"session_token": session_token})
-        raise HTTPException(status_code=401, detail="Session expirée")
-    
-    # Récupérer l'utilisateur
-    user = await _db.google_users.find_one(
-        {"user_id": session.get("user_id")},
-        {"_id": 0}
-    )
-    
-    if not user:
-        raise HTTPException(status_code=401, detail="Utilisateur non trouvé")
-    
-    return {
-        "user_id": user.get("user_id"),
-        "email": user.get("email"),
-        "name": user.get("name"),
-        "picture": user.get("picture"),
-        "is_coach": user.get("is_coach", True)
-    }
+    return user
 
 
 @auth_router.post("/logout")
@@ -239,13 +203,14 @@ async def logout(request: Request, response: Response):
     """
     Déconnexion: supprime la session et le cookie.
     """
-    session_token = request.cookies.get("coach_session_token")
+    session_token = session_token_from(request)
     
     if session_token:
         await _db.coach_sessions.delete_many({"session_token": session_token})
+        session_cache.invalidate(session_token)
     
     response.delete_cookie(
-        key="coach_session_token",
+        key=SESSION_COOKIE,
         path="/",
         secure=True,
         samesite="none"
@@ -327,7 +292,7 @@ async def check_partner_status(request: Request):
         }
     
     # Vérifier le profil coach
-    coach = await _db.coaches.find_one({"email": email})
+    coach = await coach_profiles.get(_db, email)
     
     if not coach:
         return {
@@ -1,19 +1,20 @@
 # campaign_routes.py - Routes campagnes v9.1.2
-from fastapi import APIRouter, HTTPException, Request
+from fastapi import APIRouter, HTTPException, Request, Depends
 from pydantic import BaseModel, Field
 from typing import Optional, List
 from datetime import datetime, timezone
 import uuid
 import logging
 
+from bson_dates import utc_now, iso
+from routes.segment_routes import check_campaign_segment
+from tenant_context import TenantContext, get_tenant
+
 logger = logging.getLogger(__name__)
 
 # Constantes
 SUPER_ADMIN_EMAIL = "contact.artboost@gmail.com"
 
-def is_super_admin(email: str) -> bool:
-    return email and email.lower().strip() == SUPER_ADMIN_EMAIL.lower()
-
 # Router
 campaign_router = APIRouter(tags=["campaigns"])
 
@@ -32,6 +33,7 @@ class CampaignCreate(BaseModel):
     mediaFormat: Optional[str] = None
     targetType: str = "all"
     selectedContacts: Optional[List[str]] = []
+    targetSegmentId: Optional[str] = None
     channels: dict = {}
     targetGroupId: Optional[str] = None
     targetIds: Optional[List[str]] = []
@@ -44,14 +46,11 @@ class CampaignCreate(BaseModel):
 
 # === ENDPOINTS CAMPAGNES ===
 @campaign_router.get("/campaigns")
-async def get_campaigns(request: Request):
+async def get_campaigns(tenant: TenantContext = Depends(get_tenant)):
     """Récupère les campagnes - Filtré par coach_id"""
-    caller_email = request.headers.get("X-User-Email", "").lower().strip()
-    if is_super_admin(caller_email):
-        campaigns = await db.campaigns.find({}, {"_id": 0}).sort("createdAt", -1).to_list(100)
-    else:
-        campaigns = await db.campaigns.find({"coach_id": caller_email}, {"_id": 0}).sort("createdAt", -1).to_list(100) if caller_email else []
-    return campaigns
+    if not tenant.email:
+        return []
+    return await db.campaigns.find(tenant.coach_filter, {"_id": 0}).sort("createdAt", -1).to_list(100)
 
 @campaign_router.get("/campaigns/logs")
 async def get_campaigns_error_logs():
@@ -68,7 +67,7 @@ async def get_campaigns_error_logs():
                         "source": "campaign_result", "campaign_id": campaign_id, "campaign_name": campaign_name,
                         "contact_id": result.get("contactId", ""), "contact_name": result.get("contactName", ""),
                         "channel": result.get("channel", "unknown"), "error": result.get("error", "Erreur inconnue"),
-                        "sent_at": result.get("sentAt", campaign.get("updatedAt", "")), "status": "failed"
+                        "sent_at": iso(result.get("sentAt", campaign.get("updatedAt", ""))), "status": "failed"
                     })
         try:
             twilio_errors = await db.campaign_errors.find({}, {"_id": 0}).sort("created_at", -1).to_list(50)
@@ -95,10 +94,12 @@ async def get_campaign(campaign_id: str):
     return campaign
 
 @campaign_router.put("/campaigns/{campaign_id}")
-async def update_campaign(campaign_id: str, request: Request):
+async def update_campaign(campaign_id: str, request: Request, tenant: TenantContext = Depends(get_tenant)):
     """Met à jour une campagne"""
     data = await request.json()
-    data["updatedAt"] = datetime.now(timezone.utc).isoformat()
+    await check_campaign_segment(data.get("targetSegmentId"), tenant.email)
+    data["updatedAt"] = utc_now()
+    data.pop("createdAt", None)  # renvoyé tel quel par le frontend: la date BSON stockée est conservée
     await db.campaigns.update_one({"id": campaign_id}, {"$set": data})
     return await db.campaigns.find_one({"id": campaign_id}, {"_id": 0})
 
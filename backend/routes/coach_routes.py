@@ -1,5 +1,5 @@
 # coach_routes.py - Routes coach et admin v9.5.6
-from fastapi import APIRouter, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Request
 from pydantic import BaseModel
 from typing import Optional, List
 from datetime import datetime, timezone
@@ -8,6 +8,13 @@ import os
 import logging
 import stripe
 
+from blob_store import adjust_refs
+from response_cache import catalog_cache, entry_response, encode_body, ALL_TENANTS
+from session_auth import optional_session
+from tenant_context import TenantContext, get_tenant, coach_profiles, is_super_admin as tenant_is_super_admin
+from vitrine import find_vitrine, rebuild_vitrines, assign_username_slug
+from reservation_pages import reset_reservation_counters
+
 logger = logging.getLogger(__name__)
 
 # v9.5.6: Liste des Super Admins autorisés
@@ -23,7 +30,7 @@ ROLE_USER = "user"
 
 def is_super_admin(email: str) -> bool:
     """Vérifie si l'email est celui d'un Super Admin"""
-    return email and email.lower().strip() in [e.lower() for e in SUPER_ADMIN_EMAILS]
+    return tenant_is_super_admin(email)
 
 # Router
 coach_router = APIRouter(tags=["coach"])
@@ -144,6 +151,9 @@ async def toggle_coach_status(coach_id: str, request: Request):
         raise HTTPException(status_code=404, detail="Coach non trouvé")
     new_status = not coach.get("is_active", True)
     await db.coaches.update_one({"id": coach_id}, {"$set": {"is_active": new_status, "updated_at": datetime.now(timezone.utc).isoformat()}})
+    coach_profiles.invalidate(coach.get("email"))
+    catalog_cache.bump("partners")
+    await rebuild_vitrines(db, [coach.get("email")])
     return {"success": True, "is_active": new_status}
 
 @coach_router.delete("/admin/coaches/{coach_id}")
@@ -152,38 +162,35 @@ async def delete_coach(coach_id: str, request: Request):
     caller_email = request.headers.get("X-User-Email", "").lower().strip()
     if not is_super_admin(caller_email):
         raise HTTPException(status_code=403, detail="Super Admin requis")
+    coach = await db.coaches.find_one({"id": coach_id}, {"_id": 0, "email": 1})
     result = await db.coaches.delete_one({"id": coach_id})
+    coach_profiles.invalidate((coach or {}).get("email"))
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Coach non trouvé")
+    catalog_cache.bump("partners")
+    await rebuild_vitrines(db, [coach.get("email")])
     return {"success": True, "deleted_id": coach_id}
 
 # === COACH PROFILE ===
 @coach_router.get("/coach/profile")
-async def get_coach_profile(request: Request):
-    """Profil du coach connecté"""
-    caller_email = request.headers.get("X-User-Email", "").lower().strip()
+async def get_coach_profile(request: Request, session: Optional[dict] = Depends(optional_session)):
+    """Profil du coach connecté (X-User-Email, sinon email de la session Google)"""
+    caller_email = request.headers.get("X-User-Email", "").lower().strip() or ((session or {}).get("email") or "").lower()
     if not caller_email:
         raise HTTPException(status_code=401, detail="Email requis")
     if is_super_admin(caller_email):
         return {"id": "super_admin", "email": SUPER_ADMIN_EMAIL, "name": "Super Admin", "role": ROLE_SUPER_ADMIN, "credits": -1, "is_super_admin": True}
-    coach = await db.coaches.find_one({"email": caller_email.lower()}, {"_id": 0})
+    coach = await coach_profiles.get(db, caller_email)
     if not coach:
         raise HTTPException(status_code=404, detail="Coach non trouvé")
     return coach
 
 @coach_router.get("/coach/check-credits")
-async def api_check_credits(request: Request):
+async def api_check_credits(tenant: TenantContext = Depends(get_tenant)):
     """Vérifie le solde de crédits"""
-    coach_email = request.headers.get("X-User-Email", "").lower().strip()
-    if not coach_email:
+    if not tenant.email:
         raise HTTPException(status_code=401, detail="Email requis")
-    if is_super_admin(coach_email):
-        return {"has_credits": True, "credits": -1, "unlimited": True}
-    coach = await db.coaches.find_one({"email": coach_email.lower()})
-    if not coach:
-        return {"has_credits": False, "credits": 0, "error": "Coach non trouvé"}
-    credits = coach.get("credits", 0)
-    return {"has_credits": credits > 0, "credits": credits}
+    return tenant.credits_snapshot()
 
 @coach_router.post("/coach/register")
 async def register_coach(coach_data: CoachCreate):
@@ -199,7 +206,11 @@ async def register_coach(coach_data: CoachCreate):
         "updated_at": None, "last_login": None
     }
     await db.coaches.insert_one(coach)
+    coach_profiles.invalidate(coach["email"])  # "Coach non trouvé" mis en cache avant l'inscription
+    catalog_cache.bump("partners")
     coach.pop("_id", None)
+    await assign_username_slug(db, coach)
+    await rebuild_vitrines(db, [coach["email"]])
     logger.info(f"[COACH] Nouveau: {coach_data.email}")
     return coach
 
@@ -220,6 +231,11 @@ async def update_coach_profile(request: Request):
         if field in body:
             update_data[field] = body[field]
     await db.coaches.update_one({"email": caller_email}, {"$set": update_data})
+    coach_profiles.invalidate(caller_email)
+    catalog_cache.bump("partners")
+    await rebuild_vitrines(db, [caller_email])
+    if "logo_url" in update_data and update_data["logo_url"] != coach.get("logo_url"):
+        await adjust_refs(db, added=[update_data["logo_url"]], removed=[coach.get("logo_url")])
     logger.info(f"[COACH] Profil mis à jour: {caller_email} -> {list(update_data.keys())}")
     updated = await db.coaches.find_one({"email": caller_email}, {"_id": 0})
     return updated
@@ -241,6 +257,7 @@ async def deduct_coach_credit(request: Request):
         raise HTTPException(status_code=402, detail="Crédits insuffisants")
     new_credits = coach.get("credits", 0) - 1
     await db.coaches.update_one({"email": coach_email}, {"$set": {"credits": new_credits, "updated_at": datetime.now(timezone.utc).isoformat()}})
+    coach_profiles.invalidate(coach_email)
     logger.info(f"[COACH] Crédit déduit: {coach_email} action={action} reste={new_credits}")
     return {"success": True, "credits_remaining": new_credits, "action": action}
 
@@ -260,19 +277,20 @@ async def add_coach_credits(request: Request):
         raise HTTPException(status_code=404, detail="Coach non trouvé")
     new_credits = coach.get("credits", 0) + credits_to_add
     await db.coaches.update_one({"email": coach_email}, {"$set": {"credits": new_credits, "updated_at": datetime.now(timezone.utc).isoformat()}})
+    coach_profiles.invalidate(coach_email)
     return {"success": True, "credits_total": new_credits, "coach_email": coach_email}
 
 # === AUTH ROLE ===
 @coach_router.get("/auth/role")
-async def get_user_role_endpoint(request: Request):
+async def get_user_role_endpoint(tenant: TenantContext = Depends(get_tenant)):
     """Vérifie le rôle de l'utilisateur"""
-    caller_email = request.headers.get("X-User-Email", "").lower().strip()
+    caller_email = tenant.email
     if not caller_email:
         return {"role": ROLE_USER, "is_super_admin": False, "is_coach": False}
-    if is_super_admin(caller_email):
+    if tenant.is_super_admin:
         return {"role": ROLE_SUPER_ADMIN, "is_super_admin": True, "is_coach": True, "email": caller_email}
-    coach = await db.coaches.find_one({"email": caller_email, "is_active": True})
-    if coach:
+    coach = tenant.coach
+    if coach and coach.get("is_active"):
         return {"role": ROLE_COACH, "is_super_admin": False, "is_coach": True, "email": caller_email, "coach_id": coach.get("id"), "credits": coach.get("credits", 0)}
     return {"role": ROLE_USER, "is_super_admin": False, "is_coach": False, "email": caller_email}
 
@@ -287,74 +305,108 @@ async def search_coaches(q: str = ""):
     return coaches
 
 # === v9.4.7: PARTENAIRES ACTIFS AVEC VIDÉOS (CAROUSEL HOME) ===
+PARTNERS_PAGE_SIZE = 20
+PARTNERS_MAX_PAGE_SIZE = 100
+PARTNER_COACH_FIELDS = {"_id": 0, "id": 1, "name": 1, "email": 1, "photo_url": 1, "logo_url": 1, "bio": 1, "platform_name": 1}
+PARTNER_CONCEPT_FIELDS = {"_id": 0, "id": 1, "coach_id": 1, "heroImageUrl": 1, "heroVideoUrl": 1, "heroPosterUrl": 1, "heroHlsUrl": 1}
+
+
+def partner_concept_ids(coach_email: str) -> List[str]:
+    """IDs possibles du concept d'un coach: f"concept_{email}" (server.py) et l'ancienne forme assainie"""
+    return [f"concept_{coach_email}", f"concept_{coach_email.replace('@', '_').replace('.', '_')}"]
+
+
+def partner_media_fields(concept: dict) -> dict:
+    return {
+        "video_url": concept.get("heroVideoUrl") or concept.get("heroImageUrl"),
+        "heroImageUrl": concept.get("heroImageUrl"),
+        # Affiche affichée avant la première image (video_pipeline), HLS si produit
+        "poster_url": concept.get("heroPosterUrl") or None,
+        "hls_url": concept.get("heroHlsUrl") or None
+    }
+
+
+async def build_active_partners() -> List[dict]:
+    """
+    Liste complète du carousel: 2 requêtes quel que soit le nombre de coachs
+    (coachs actifs, puis tous leurs concepts en un seul $in).
+    """
+    coaches = await db.coaches.find({"is_active": True}, PARTNER_COACH_FIELDS).to_list(None)
+    
+    # v9.6.6: Déduplication des partenaires par email
+    unique_coaches = []
+    seen_emails = set()
+    for coach in coaches:
+        coach_email = (coach.get("email") or "").lower()
+        if coach_email in seen_emails:
+            continue
+        seen_emails.add(coach_email)
+        unique_coaches.append((coach_email, coach))
+    
+    # v9.4.7: Collection "concept" (singulier) - id "concept" pour le principal
+    concept_ids = ["concept"] + [cid for email, _ in unique_coaches for cid in partner_concept_ids(email)]
+    coach_emails = [email for email, _ in unique_coaches if email]
+    concepts = await db.concept.find(
+        {"$or": [{"id": {"$in": concept_ids}}, {"coach_id": {"$in": coach_emails}}]},
+        PARTNER_CONCEPT_FIELDS
+    ).to_list(None)
+    by_id = {c["id"]: c for c in concepts if c.get("id")}
+    by_coach = {}
+    for concept in concepts:
+        if concept.get("coach_id"):
+            by_coach.setdefault(concept["coach_id"].lower(), concept)
+    
+    partners = []
+    # Ajouter Bassi (Super Admin) en premier s'il a une vidéo configurée
+    bassi_concept = by_id.get("concept")
+    if bassi_concept and (bassi_concept.get("heroImageUrl") or bassi_concept.get("heroVideoUrl")):
+        partners.append({
+            "id": "bassi_main",  # v9.6.6: ID unique
+            "name": "Bassi - Afroboost",
+            "email": SUPER_ADMIN_EMAIL,
+            "platform_name": "Afroboost",
+            "photo_url": None,
+            "logo_url": None,
+            "bio": "Coach Afroboost - Fitness & Bien-être",
+            **partner_media_fields(bassi_concept)
+        })
+    
+    # La carte du Super Admin n'est remplacée que si l'entrée concept a été émise
+    bassi_listed = bool(partners)
+    for coach_email, coach in unique_coaches:
+        if bassi_listed and coach_email == SUPER_ADMIN_EMAIL.lower():
+            continue
+        partner_data = dict(coach)
+        partner_data["id"] = partner_data.get("id") or f"coach_{coach_email.replace('@', '_').replace('.', '_')}"  # v9.6.6: ID unique
+        concept = next((by_id[cid] for cid in partner_concept_ids(coach_email) if cid in by_id), None) or by_coach.get(coach_email)
+        if concept:
+            partner_data.update(partner_media_fields(concept))
+        # Inclure même sans vidéo (affichera placeholder)
+        partners.append(partner_data)
+    
+    logger.info(f"[PARTNERS-CAROUSEL] {len(partners)} partenaires uniques (reconstruit)")
+    return partners
+
+
 @coach_router.get("/partners/active")
-async def get_active_partners():
+async def get_active_partners(request: Request, offset: int = 0, limit: int = PARTNERS_PAGE_SIZE):
     """
     Récupère les partenaires actifs avec leurs vidéos pour le carousel de la home page.
     Inclut le concept (heroImageUrl/video_url) de chaque partenaire.
     v9.6.6: Déduplication des partenaires par email
+    Liste mise en cache (invalidée par les écritures coach / concept), paginée par offset/limit;
+    le total est renvoyé dans X-Total-Count.
     """
+    offset = max(offset, 0)
+    limit = min(max(limit, 1), PARTNERS_MAX_PAGE_SIZE)
     try:
-        # Récupérer tous les coaches actifs
-        coaches = await db.coaches.find(
-            {"is_active": True},
-            {"_id": 0, "id": 1, "name": 1, "email": 1, "photo_url": 1, "logo_url": 1, "bio": 1, "platform_name": 1}
-        ).to_list(20)
-        
-        partners_with_videos = []
-        seen_emails = set()  # v9.6.6: Track des emails pour éviter les doublons
-        
-        # Ajouter Bassi (Super Admin) en premier s'il a une vidéo configurée
-        # v9.4.7: Collection "concept" (singulier) - id "concept" pour le principal
-        bassi_concept = await db.concept.find_one({"id": "concept"}, {"_id": 0, "heroImageUrl": 1, "heroVideoUrl": 1})
-        if bassi_concept and (bassi_concept.get("heroImageUrl") or bassi_concept.get("heroVideoUrl")):
-            bassi_data = {
-                "id": "bassi_main",  # v9.6.6: ID unique
-                "name": "Bassi - Afroboost",
-                "email": SUPER_ADMIN_EMAIL,
-                "platform_name": "Afroboost",
-                "photo_url": None,
-                "logo_url": None,
-                "bio": "Coach Afroboost - Fitness & Bien-être",
-                "video_url": bassi_concept.get("heroVideoUrl") or bassi_concept.get("heroImageUrl"),
-                "heroImageUrl": bassi_concept.get("heroImageUrl")
-            }
-            partners_with_videos.append(bassi_data)
-            seen_emails.add(SUPER_ADMIN_EMAIL.lower())  # v9.6.6: Marquer comme vu
-        
-        # Pour chaque coach, récupérer son concept (vidéo) - v9.6.6: Skip si déjà vu
-        for coach in coaches:
-            coach_email = coach.get("email", "").lower()
-            
-            # v9.6.6: Skip si email déjà dans la liste (évite les doublons)
-            if coach_email in seen_emails:
-                continue
-            seen_emails.add(coach_email)
-            
-            partner_data = dict(coach)
-            partner_data["id"] = partner_data.get("id") or f"coach_{coach_email.replace('@', '_').replace('.', '_')}"  # v9.6.6: ID unique
-            
-            # Chercher le concept du coach pour avoir la vidéo
-            # v9.4.7: Collection "concept" (singulier) pas "concepts"
-            concept_id = f"concept_{coach_email.replace('@', '_').replace('.', '_')}"
-            concept = await db.concept.find_one(
-                {"$or": [{"id": concept_id}, {"coach_id": coach_email}]},
-                {"_id": 0, "heroImageUrl": 1, "heroVideoUrl": 1}
-            )
-            
-            if concept:
-                partner_data["video_url"] = concept.get("heroVideoUrl") or concept.get("heroImageUrl")
-                partner_data["heroImageUrl"] = concept.get("heroImageUrl")
-            
-            # Inclure même sans vidéo (affichera placeholder)
-            partners_with_videos.append(partner_data)
-        
-        logger.info(f"[PARTNERS-CAROUSEL] {len(partners_with_videos)} partenaires uniques avec vidéos")
-        return partners_with_videos
-        
+        entry = await catalog_cache.get("partners", ALL_TENANTS, build_active_partners)
     except Exception as e:
         logger.error(f"[PARTNERS-CAROUSEL] Erreur: {e}")
         return []
+    response = entry_response(request.headers, entry, encode_body(entry.data[offset:offset + limit]))
+    response.headers["X-Total-Count"] = str(len(entry.data))
+    return response
 
 @coach_router.get("/coaches/public/{coach_id}")
 async def get_public_coach_profile(coach_id: str):
@@ -367,19 +419,20 @@ async def get_public_coach_profile(coach_id: str):
 # === VITRINE COACH ===
 @coach_router.get("/coach/vitrine/{username}")
 @coach_router.get("/partner/vitrine/{username}")
-async def get_coach_vitrine(username: str):
-    """Vitrine publique d'un partenaire (coach/vendeur) - v9.1.8: supporte /coach/ et /partner/"""
-    if username.lower() in ["bassi", "afroboost", SUPER_ADMIN_EMAIL.lower()]:
-        coach = {"id": "bassi", "name": "Bassi - Afroboost", "email": SUPER_ADMIN_EMAIL, "photo_url": None, "bio": "Coach Afroboost - Fitness & Bien-être", "platform_name": "Afroboost", "logo_url": None}
-        coach_id = DEFAULT_COACH_ID
-    else:
-        coach = await db.coaches.find_one({"$or": [{"name": {"$regex": f"^{username}$", "$options": "i"}}, {"email": username.lower()}, {"id": username}], "is_active": True}, {"_id": 0, "id": 1, "name": 1, "photo_url": 1, "bio": 1, "email": 1, "platform_name": 1, "logo_url": 1})
-        if not coach:
+async def get_coach_vitrine(username: str, request: Request):
+    """
+    Vitrine publique d'un partenaire (coach/vendeur) - v9.1.8: supporte /coach/ et /partner/
+    Document matérialisé (vitrine.py) lu par clé (slug, email, id ou nom), servi depuis le cache catalogue.
+    """
+    key = username.lower().strip()
+
+    async def build_vitrine():
+        vitrine = await find_vitrine(db, username)
+        if not vitrine:
             raise HTTPException(status_code=404, detail="Partenaire non trouvé")
-        coach_id = coach.get("email", "").lower()
-    offers = await db.offers.find({"$or": [{"coach_id": coach_id}, {"coach_id": {"$exists": False}}]}, {"_id": 0}).to_list(20)
-    courses = await db.courses.find({"$or": [{"coach_id": coach_id}, {"coach_id": {"$exists": False}}]}, {"_id": 0}).to_list(20)
-    return {"coach": coach, "offers": offers, "courses": courses, "courses_count": len(courses), "offers_count": len(offers)}
+        return vitrine
+
+    return await catalog_cache.respond(request.headers, "vitrine", build_vitrine, tenant=key)
 
 # === STRIPE CONNECT ===
 @coach_router.post("/coach/stripe-connect/onboard")
@@ -398,6 +451,7 @@ async def create_stripe_connect_onboard(request: Request):
         return {"url": link.url, "account_id": coach["stripe_connect_id"]}
     account = stripe.Account.create(type="express", email=coach_email, capabilities={"card_payments": {"requested": True}, "transfers": {"requested": True}}, metadata={"coach_id": coach.get("id"), "coach_email": coach_email})
     await db.coaches.update_one({"email": coach_email}, {"$set": {"stripe_connect_id": account.id, "updated_at": datetime.now(timezone.utc).isoformat()}})
+    coach_profiles.invalidate(coach_email)
     account_link = stripe.AccountLink.create(account=account.id, type="account_onboarding", refresh_url=f"{frontend_url}/coach/settings", return_url=f"{frontend_url}/coach/settings?stripe=success")
     logger.info(f"[STRIPE-CONNECT] Compte créé: {coach_email} -> {account.id}")
     return {"url": account_link.url, "account_id": account.id}
@@ -430,6 +484,7 @@ async def migrate_bassi_data(request: Request):
     results = {}
     r = await db.reservations.update_many({"coach_id": {"$exists": False}}, {"$set": {"coach_id": DEFAULT_COACH_ID}})
     results["reservations"] = r.modified_count
+    await reset_reservation_counters(db)
     c = await db.chat_participants.update_many({"coach_id": {"$exists": False}}, {"$set": {"coach_id": DEFAULT_COACH_ID}})
     results["contacts"] = c.modified_count
     p = await db.campaigns.update_many({"coach_id": {"$exists": False}}, {"$set": {"coach_id": DEFAULT_COACH_ID}})
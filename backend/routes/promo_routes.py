@@ -2,13 +2,26 @@
 # Extrait de server.py pour modularisation
 # v9.3.0: Ajout isolation par coach_id
 
-from fastapi import APIRouter, HTTPException, Request
+from fastapi import APIRouter, HTTPException, Request, Depends
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field, ConfigDict
 from typing import Optional, List
 from datetime import datetime, timezone
 import uuid
 import logging
 
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from response_cache import catalog_cache, ALL_TENANTS
+from promo_index import promo_index, normalize_code, code_error
+from promo_batch import (generate_discount_codes, codes_csv, normalize_prefix, CodeSpaceExhausted,
+                         DEFAULT_CODE_LENGTH, MAX_BATCH_SIZE)
+from identity import find_contact, identity_update
+from audience import normalize_email
+from segments import on_contact_changed
+from tenant_context import TenantContext, get_tenant, is_super_admin
+
 logger = logging.getLogger(__name__)
 
 # Super Admin email - pas de filtre
@@ -41,6 +54,7 @@ class DiscountCode(BaseModel):
     used: int = 0
     active: bool = True
     coach_id: Optional[str] = None  # v9.3.0: Isolation par coach
+    code_upper: Optional[str] = None  # Code normalisé (index unique, promo_index)
 
 
 class DiscountCodeCreate(BaseModel):
@@ -54,44 +68,105 @@ class DiscountCodeCreate(BaseModel):
     coach_id: Optional[str] = None  # v9.3.0: Isolation par coach
 
 
+class DiscountCodeBatch(BaseModel):
+    count: int = Field(ge=1, le=MAX_BATCH_SIZE)
+    prefix: str = ""
+    alphabet: Optional[str] = None  # défaut: promo_batch.DEFAULT_ALPHABET
+    length: int = Field(default=DEFAULT_CODE_LENGTH, ge=4, le=32)
+    type: str
+    value: float
+    assignedEmails: List[str] = []  # attribués de manière circulaire
+    expiresAt: Optional[str] = None
+    courses: List[str] = []
+    maxUses: Optional[int] = 1
+
+
 # === ROUTES ===
+def discount_codes_tenant(user_email: str) -> str:
+    """Entrée du cache catalogue: tous les codes (Super Admin) ou ceux d'un coach"""
+    return ALL_TENANTS if is_super_admin(user_email) else user_email
+
+
 @promo_router.get("")
-async def get_discount_codes(request: Request):
-    """Récupère les codes promo - filtrés par coach_id sauf Super Admin"""
-    user_email = request.headers.get('X-User-Email', '').lower().strip()
-    is_super_admin = user_email == SUPER_ADMIN_EMAIL.lower()
-    
+async def get_discount_codes(request: Request, tenant: TenantContext = Depends(get_tenant)):
+    """Récupère les codes promo - filtrés par coach_id sauf Super Admin (cache versionné, ETag / 304)"""
+    user_email = tenant.catalog_email
+    return await catalog_cache.respond(request.headers, "discount-codes", lambda: build_discount_codes(user_email),
+                                       tenant=discount_codes_tenant(user_email))
+
+
+async def build_discount_codes(user_email: str):
     # Super Admin voit tous les codes, coach voit seulement les siens
-    query = {} if is_super_admin else {"$or": [
+    query = {} if is_super_admin(user_email) else {"$or": [
         {"coach_id": user_email},
         {"coach_id": None},  # Codes sans coach_id (legacy)
         {"coach_id": {"$exists": False}}
     ]}
     
-    codes = await _db.discount_codes.find(query, {"_id": 0}).to_list(1000)
-    return codes
+    return await _db.discount_codes.find(query, {"_id": 0}).to_list(1000)
 
 
 @promo_router.post("")
-async def create_discount_code(code: DiscountCodeCreate, request: Request):
+async def create_discount_code(code: DiscountCodeCreate, tenant: TenantContext = Depends(get_tenant)):
     """Crée un nouveau code promo avec coach_id"""
-    user_email = request.headers.get('X-User-Email', '').lower().strip()
-    is_super_admin = user_email == SUPER_ADMIN_EMAIL.lower()
+    user_email = tenant.email
     
     code_data = code.model_dump()
     # v9.3.0: Assigner le coach_id si pas Super Admin
-    if not is_super_admin and user_email:
+    if not tenant.is_super_admin and user_email:
         code_data["coach_id"] = user_email
     
+    code_data["code_upper"] = normalize_code(code_data.get("code"))
     code_obj = DiscountCode(**code_data)
-    await _db.discount_codes.insert_one(code_obj.model_dump())
+    try:
+        await _db.discount_codes.insert_one(code_obj.model_dump())
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Ce code promo existe déjà")
+    catalog_cache.bump("discount-codes")
     return code_obj
 
 
+@promo_router.post("/batch")
+async def create_discount_codes_batch(batch: DiscountCodeBatch, tenant: TenantContext = Depends(get_tenant)):
+    """Génère N codes uniques (préfixe + alphabet) en une requête, renvoyés en CSV"""
+    user_email = tenant.email
+    
+    template = {"type": batch.type, "value": batch.value, "expiresAt": batch.expiresAt,
+                "courses": batch.courses, "maxUses": batch.maxUses, "coach_id": None}
+    # v9.3.0: Assigner le coach_id si pas Super Admin
+    if not tenant.is_super_admin and user_email:
+        template["coach_id"] = user_email
+    
+    try:
+        codes = await generate_discount_codes(
+            _db, batch.count, template, prefix=batch.prefix, alphabet=batch.alphabet, length=batch.length,
+            assigned_emails=[e.strip().lower() for e in batch.assignedEmails if e and e.strip()]
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except CodeSpaceExhausted as e:
+        raise HTTPException(status_code=409, detail=f"Espace de codes saturé ({e})")
+    catalog_cache.bump("discount-codes")
+    logger.info(f"[PROMO] {len(codes)} codes générés (préfixe '{batch.prefix}') par {user_email or 'anonyme'}")
+    
+    filename = f"codes-{normalize_prefix(batch.prefix) or 'promo'}-{len(codes)}.csv"
+    return StreamingResponse(codes_csv(codes), media_type="text/csv; charset=utf-8", headers={
+        "Content-Disposition": f'attachment; filename="{filename}"',
+        "X-Codes-Created": str(len(codes))
+    })
+
+
 @promo_router.put("/{code_id}")
 async def update_discount_code(code_id: str, updates: dict):
     """Met à jour un code promo"""
-    await _db.discount_codes.update_one({"id": code_id}, {"$set": updates})
+    updates.pop("used", None)  # décompte réservé à la rédemption atomique (promo_index.redeem)
+    if "code" in updates:
+        updates["code_upper"] = normalize_code(updates["code"])
+    try:
+        await _db.discount_codes.update_one({"id": code_id}, {"$set": updates})
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Ce code promo existe déjà")
+    catalog_cache.bump("discount-codes")
     updated = await _db.discount_codes.find_one({"id": code_id}, {"_id": 0})
     return updated
 
@@ -100,79 +175,48 @@ async def update_discount_code(code_id: str, updates: dict):
 async def delete_discount_code(code_id: str):
     """Supprime un code promo"""
     await _db.discount_codes.delete_one({"id": code_id})
+    catalog_cache.bump("discount-codes")
     return {"success": True}
 
 
 @promo_router.post("/validate")
 async def validate_discount_code(data: dict):
     """Valide un code promo pour une réservation"""
-    code_str = data.get("code", "").strip().upper()  # Normalize: trim + uppercase
+    code_str = normalize_code(data.get("code", ""))  # Normalize: trim + uppercase
     user_email = data.get("email", "").strip()
     course_id = data.get("courseId", "").strip() if data.get("courseId") else ""
     
-    # Case-insensitive search using regex
-    code = await _db.discount_codes.find_one({
-        "code": {"$regex": f"^{code_str}$", "$options": "i"},  # Case insensitive match
-        "active": True
-    }, {"_id": 0})
+    # Carte en mémoire des codes actifs (code_upper): pas de regex, pas d'accès base
+    code = await promo_index.lookup(_db, code_str)
     
     if not code:
         return {"valid": False, "message": "Code inconnu ou invalide"}
     
-    # Check expiration date
-    if code.get("expiresAt"):
-        try:
-            expiry = code["expiresAt"]
-            if isinstance(expiry, str):
-                # Handle various date formats
-                expiry = expiry.replace('Z', '+00:00')
-                if 'T' not in expiry:
-                    expiry = expiry + "T23:59:59+00:00"
-                expiry_date = datetime.fromisoformat(expiry)
-            else:
-                expiry_date = expiry
-            if expiry_date < datetime.now(timezone.utc):
-                return {"valid": False, "message": "Code promo expiré"}
-        except Exception as e:
-            logger.debug(f"Date parsing: {e}")
-    
-    # Check max uses
-    if code.get("maxUses") and code.get("used", 0) >= code["maxUses"]:
-        return {"valid": False, "message": "Code promo épuisé (nombre max d'utilisations atteint)"}
-    
-    # Check if course is allowed - SKIP if no courseId provided (identification flow)
-    # IMPORTANT: empty list = all courses allowed
-    allowed_courses = code.get("courses", [])
-    if course_id and allowed_courses and len(allowed_courses) > 0:
-        if course_id not in allowed_courses:
-            return {"valid": False, "message": "Code non applicable à ce cours"}
-    
-    # Check assigned email (only if assignedEmail is set AND email is provided)
-    assigned = code.get("assignedEmail") or ""
-    if assigned and isinstance(assigned, str):
-        assigned = assigned.strip()
-        if assigned and user_email:
-            if assigned.lower() != user_email.lower():
-                return {"valid": False, "message": "Code réservé à un autre compte"}
+    # Expiration, utilisations, cours autorisés, email assigné
+    error = code_error(code, user_email, course_id)
+    if error:
+        return {"valid": False, "message": error}
     
     # v8.7: Sync CRM si email fourni
     if user_email:
-        await _db.chat_participants.update_one(
-            {"email": user_email},
+        known = await find_contact(_db, email=user_email, projection={"_id": 0, "id": 1, "email": 1, "whatsapp": 1, "isSubscriber": 1})
+        contact = await _db.chat_participants.find_one_and_update(
+            {"id": known["id"]} if known else {"email_lc": normalize_email(user_email)},
             {
-                "$set": {
+                "$set": identity_update({
                     "email": user_email,
                     "name": data.get("name", user_email.split("@")[0]),
                     "source": "chat_login",
                     "updated_at": datetime.now(timezone.utc).isoformat()
-                },
+                }),
                 "$setOnInsert": {
                     "id": str(uuid.uuid4()),
                     "created_at": datetime.now(timezone.utc).isoformat()
                 }
             },
-            upsert=True
+            upsert=True, projection={"_id": 0}, return_document=ReturnDocument.AFTER
         )
+        await on_contact_changed(_db, contact, previous=known)
     
     return {"valid": True, "code": code}
 
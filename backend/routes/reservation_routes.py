@@ -1,30 +1,26 @@
 # reservation_routes.py - Routes réservations v9.5.8
-from fastapi import APIRouter, HTTPException, Request
+from fastapi import APIRouter, HTTPException, Query, Request, Depends
 from pydantic import BaseModel, Field
 from typing import Optional, List
 from datetime import datetime, timezone
 import uuid
 import logging
 
+from segments import on_reservation_created, on_reservation_deleted
+from promo_index import promo_index
+from export_stream import (RESERVATION_COLUMNS, RESERVATION_DERIVED, parse_columns, parse_labels, check_format,
+                           export_response)
+from bson_dates import utc_now, as_datetime, with_dates
+from reservation_pages import RESERVATION_SORT, keyset_page, reservation_total, on_reservation_counted, on_reservation_uncounted
+from availability import booked_dates, course_capacity, reserve_seats, release_seats, on_reservation_released
+from identity import find_contact
+# v9.5.8: Super Admins et filtre coach partagés (segment_routes importe ces noms d'ici)
+from tenant_context import TenantContext, get_tenant, is_super_admin, coach_filter as get_coach_filter
+
 logger = logging.getLogger(__name__)
 
-# v9.5.8: Liste des Super Admins
-SUPER_ADMIN_EMAILS = [
-    "contact.artboost@gmail.com",
-    "afroboost.bassi@gmail.com"
-]
 SUPER_ADMIN_EMAIL = "contact.artboost@gmail.com"  # Legacy
 
-def is_super_admin(email: str) -> bool:
-    """Vérifie si l'email est celui d'un Super Admin"""
-    return email and email.lower().strip() in [e.lower() for e in SUPER_ADMIN_EMAILS]
-
-def get_coach_filter(email: str) -> dict:
-    """Retourne le filtre MongoDB pour l'isolation des données coach"""
-    if is_super_admin(email):
-        return {}  # Super Admin voit tout
-    return {"coach_id": email.lower().strip()}
-
 # Router
 reservation_router = APIRouter(tags=["reservations"])
 
@@ -40,6 +36,7 @@ class ReservationBase(BaseModel):
     userName: str
     userEmail: str
     userWhatsapp: Optional[str] = None
+    courseId: Optional[str] = None
     courseName: Optional[str] = None
     courseTime: Optional[str] = None
     datetime: Optional[str] = None
@@ -70,11 +67,16 @@ class Reservation(ReservationBase):
     coach_id: Optional[str] = None
 
 # === ENDPOINTS RÉSERVATIONS ===
+def reservations_query(tenant: TenantContext) -> dict:
+    """Filtre coach: tout pour le Super Admin, rien sans email"""
+    return tenant.coach_filter if tenant.email else {"coach_id": "__no_access__"}
+
 @reservation_router.get("/reservations")
-async def get_reservations(request: Request, page: int = 1, limit: int = 20, all_data: bool = False):
-    """Get reservations with pagination - Filtré par coach_id"""
-    caller_email = request.headers.get("X-User-Email", "").lower().strip()
-    base_query = {} if is_super_admin(caller_email) else {"coach_id": caller_email} if caller_email else {"coach_id": "__no_access__"}
+async def get_reservations(page: int = 1, limit: int = 20, all_data: bool = False,
+                           after: Optional[str] = None, before: Optional[str] = None, exact: bool = False,
+                           tenant: TenantContext = Depends(get_tenant)):
+    """Get reservations with pagination - Filtré par coach_id (curseur after/before, total maintenu)"""
+    base_query = reservations_query(tenant)
     projection = {
         "_id": 0, "id": 1, "reservationCode": 1, "userName": 1, "userEmail": 1,
         "userWhatsapp": 1, "courseName": 1, "courseTime": 1, "datetime": 1,
@@ -83,39 +85,72 @@ async def get_reservations(request: Request, page: int = 1, limit: int = 20, all
         "selectedVariants": 1, "variantsText": 1, "isProduct": 1, "shippingStatus": 1,
         "trackingNumber": 1, "promoCode": 1, "source": 1, "type": 1
     }
+    limit = max(1, min(limit, 100))
+    next_cursor = prev_cursor = None
     if all_data:
         reservations = await db.reservations.find(base_query, {"_id": 0}).sort("createdAt", -1).to_list(10000)
+    elif after or before or page <= 1:
+        reservations, next_cursor, prev_cursor = await keyset_page(db.reservations, base_query, projection, limit,
+                                                                   after=after, before=before)
     else:
+        # Lien direct vers une page numérotée (sans curseur): ancien parcours skip
         skip = (page - 1) * limit
-        reservations = await db.reservations.find(base_query, projection).sort("createdAt", -1).skip(skip).limit(limit).to_list(limit)
-    total_count = await db.reservations.count_documents(base_query)
+        reservations = await db.reservations.find(base_query, projection).sort(RESERVATION_SORT).skip(skip).limit(limit).to_list(limit)
+    total_count, estimated = await reservation_total(db, base_query, exact=exact)
     for res in reservations:
-        if isinstance(res.get('createdAt'), str):
-            res['createdAt'] = datetime.fromisoformat(res['createdAt'].replace('Z', '+00:00'))
-    return {"data": reservations, "pagination": {"page": page, "limit": limit, "total": total_count, "pages": (total_count + limit - 1) // limit}}
+        # Date BSON (nouvelles réservations) ou chaîne ISO pas encore migrée
+        res['createdAt'] = as_datetime(res.get('createdAt')) or res.get('createdAt')
+    return {"data": reservations, "pagination": {
+        "page": page, "limit": limit, "total": total_count, "pages": (total_count + limit - 1) // limit,
+        "estimated": estimated, "next_cursor": next_cursor, "prev_cursor": prev_cursor
+    }}
+
+@reservation_router.get("/reservations/export")
+async def export_reservations(format: str = "csv", columns: Optional[str] = None,
+                              label: Optional[List[str]] = Query(None), tenant: TenantContext = Depends(get_tenant)):
+    """
+    Export CSV / NDJSON en flux (curseur, mémoire constante) - Filtré par coach_id.
+    Colonnes calculées: date, time (séance, heure suisse), qty, total (totalPrice ou price); `label` = en-têtes CSV.
+    """
+    fmt = check_format(format)
+    selected = parse_columns(columns, RESERVATION_COLUMNS, RESERVATION_DERIVED)
+    return export_response(db.reservations, reservations_query(tenant), selected, fmt,
+                           f"reservations_{datetime.now(timezone.utc).strftime('%Y-%m-%d')}",
+                           sort=[("createdAt", -1)], derived=RESERVATION_DERIVED,
+                           labels=parse_labels(label, selected))
 
 @reservation_router.post("/reservations", response_model=Reservation)
-async def create_reservation(reservation: ReservationCreate, request: Request):
-    """Créer une réservation - Vérifie la validité du code si fourni"""
+async def create_reservation(reservation: ReservationCreate, tenant: TenantContext = Depends(get_tenant)):
+    """Créer une réservation - Vérifie la validité du code si fourni et les places de chaque séance"""
     promo_code = reservation.promoCode or reservation.discountCode
     user_email = reservation.userEmail
-    if promo_code:
-        discount = await db.discount_codes.find_one({"code": {"$regex": f"^{promo_code}$", "$options": "i"}, "active": True}, {"_id": 0})
-        if not discount:
-            logger.info(f"[RESERVATION] Code promo invalide: {promo_code}")
+    discount = await promo_index.lookup(db, promo_code) if promo_code else None
+    if promo_code and not discount:
+        logger.info(f"[RESERVATION] Code promo invalide: {promo_code}")
+    # Places prises avant le code promo: une séance complète ne consomme pas d'utilisation
+    days = booked_dates(reservation.model_dump())
+    if days:
+        course = await db.courses.find_one({"id": reservation.courseId}, {"_id": 0, "capacity": 1})
+        await reserve_seats(db, reservation.courseId, days, course_capacity(course))
+    if discount and not await promo_index.redeem(db, discount):
+        # Garde used < maxUses en base: la dernière utilisation ne part qu'une fois
+        if days:
+            await release_seats(db, reservation.courseId, days)
+        raise HTTPException(status_code=400, detail="Code promo épuisé (nombre max d'utilisations atteint)")
     # Créer la réservation avec coach_id par défaut
-    caller_email = request.headers.get("X-User-Email", "").lower().strip() if request else None
     reservation_data = Reservation(
         userName=reservation.userName, userEmail=reservation.userEmail, userWhatsapp=reservation.userWhatsapp,
-        courseName=reservation.courseName, courseTime=reservation.courseTime, datetime=reservation.datetime,
+        courseId=reservation.courseId, courseName=reservation.courseName, courseTime=reservation.courseTime, datetime=reservation.datetime,
         offerName=reservation.offerName, totalPrice=reservation.totalPrice, quantity=reservation.quantity,
         selectedDates=reservation.selectedDates, selectedDatesText=reservation.selectedDatesText,
         selectedVariants=reservation.selectedVariants, variantsText=reservation.variantsText,
         isProduct=reservation.isProduct, promoCode=promo_code, source=reservation.source, type=reservation.type,
-        coach_id=caller_email if caller_email and not is_super_admin(caller_email) else "bassi_default"
+        coach_id=tenant.email if tenant.email and not tenant.is_super_admin else "bassi_default"
     ).model_dump()
-    await db.reservations.insert_one(reservation_data)
-    reservation_data.pop("_id", None)
+    # Stockage en dates BSON; la réponse (response_model) garde createdAt en chaîne ISO
+    await db.reservations.insert_one(with_dates(dict(reservation_data), "reservations"))
+    await on_reservation_counted(db, reservation_data)
+    await on_reservation_created(db, reservation_data)
     logger.info(f"[RESERVATION] Créée: {reservation_data.get('reservationCode')} pour {user_email}")
     return reservation_data
 
@@ -142,14 +177,18 @@ async def validate_reservation(reservation_code: str):
         raise HTTPException(status_code=404, detail="Réservation non trouvée")
     await db.reservations.update_one(
         {"reservationCode": reservation_code},
-        {"$set": {"validated": True, "validatedAt": datetime.now(timezone.utc).isoformat()}}
+        {"$set": {"validated": True, "validatedAt": utc_now()}}
     )
     return {"success": True, "message": "Réservation validée", "reservation": reservation}
 
 @reservation_router.delete("/reservations/{reservation_id}")
 async def delete_reservation(reservation_id: str):
     """Supprime une réservation"""
-    await db.reservations.delete_one({"id": reservation_id})
+    reservation = await db.reservations.find_one_and_delete({"id": reservation_id}, {"_id": 0})
+    if reservation:
+        await on_reservation_uncounted(db, reservation)
+        await on_reservation_released(db, reservation)
+        await on_reservation_deleted(db, reservation)
     return {"success": True}
 
 @reservation_router.post("/check-reservation-eligibility")
@@ -162,12 +201,12 @@ async def check_reservation_eligibility(request: Request):
         return {"eligible": False, "reason": "Email ou code requis"}
     # Chercher par code
     if code:
-        discount = await db.discount_codes.find_one({"code": {"$regex": f"^{code}$", "$options": "i"}, "active": True}, {"_id": 0})
+        discount = await promo_index.lookup(db, code)
         if discount:
             return {"eligible": True, "discount": discount, "type": "discount_code"}
     # Chercher par email (abonné actif)
     if email:
-        subscriber = await db.chat_participants.find_one({"email": {"$regex": f"^{email}$", "$options": "i"}}, {"_id": 0})
+        subscriber = await find_contact(db, email=email)
         if subscriber and subscriber.get("isSubscriber"):
             return {"eligible": True, "subscriber": {"name": subscriber.get("name"), "email": subscriber.get("email")}, "type": "subscriber"}
     return {"eligible": False, "reason": "Aucun abonnement ou code valide trouvé"}
@@ -0,0 +1,106 @@
+# segment_routes.py - Segments d'audience sauvegardés
+# Les membres sont matérialisés dans segment_members (voir segments.py)
+
+from fastapi import APIRouter, HTTPException, Request
+from pydantic import BaseModel, Field
+from typing import Optional, Dict, Any
+from datetime import datetime, timezone
+import uuid
+import logging
+
+from segments import validate_rule, rebuild_segment
+from routes.reservation_routes import is_super_admin, get_coach_filter
+
+logger = logging.getLogger(__name__)
+
+segment_router = APIRouter(tags=["segments"])
+
+# Variable db sera injectée depuis server.py
+db = None
+
+def init_segment_db(database):
+    global db
+    db = database
+
+# === MODÈLES ===
+class SegmentCreate(BaseModel):
+    name: str
+    rule: Dict[str, Any]  # {"type": "reserved_within_days", "days": 30} | {"type": "subscribers"} | ...
+
+class Segment(SegmentCreate):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    coach_id: Optional[str] = None  # None = segment Super Admin (toutes les données)
+    member_count: int = 0
+    created_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+    updated_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+    built_at: Optional[str] = None
+
+def _caller_email(request: Request) -> str:
+    return request.headers.get("X-User-Email", "").lower().strip()
+
+async def _get_owned_segment(segment_id: str, caller_email: str) -> dict:
+    if not caller_email:
+        raise HTTPException(status_code=401, detail="Authentification requise")
+    segment = await db.segments.find_one({"id": segment_id, **get_coach_filter(caller_email)}, {"_id": 0})
+    if not segment:
+        raise HTTPException(status_code=404, detail="Segment non trouvé")
+    return segment
+
+async def check_campaign_segment(segment_id: Optional[str], caller_email: str):
+    """Campagne ciblant un segment: le segment doit appartenir au coach appelant (Super Admin: tous)."""
+    if segment_id:
+        await _get_owned_segment(segment_id, caller_email)
+
+# === ENDPOINTS ===
+@segment_router.get("/segments")
+async def get_segments(request: Request):
+    """Liste les segments du coach (tous pour le Super Admin)"""
+    caller_email = _caller_email(request)
+    if not caller_email:
+        return []
+    return await db.segments.find(get_coach_filter(caller_email), {"_id": 0}).sort("created_at", -1).to_list(200)
+
+@segment_router.post("/segments")
+async def create_segment(segment: SegmentCreate, request: Request):
+    """Crée un segment et matérialise ses membres"""
+    caller_email = _caller_email(request)
+    if not caller_email:
+        raise HTTPException(status_code=401, detail="Authentification requise")
+    error = validate_rule(segment.rule)
+    if error:
+        raise HTTPException(status_code=400, detail=error)
+    segment_data = Segment(
+        name=segment.name, rule=segment.rule,
+        coach_id=None if is_super_admin(caller_email) else caller_email
+    ).model_dump()
+    await db.segments.insert_one(segment_data)
+    segment_data.pop("_id", None)
+    segment_data["member_count"] = await rebuild_segment(db, segment_data)
+    logger.info(f"[SEGMENTS] Créé: {segment.name} ({segment_data['member_count']} membres)")
+    return segment_data
+
+@segment_router.post("/segments/{segment_id}/rebuild")
+async def rebuild_segment_endpoint(segment_id: str, request: Request):
+    """Recalcule entièrement les membres (réparation après import massif)"""
+    segment = await _get_owned_segment(segment_id, _caller_email(request))
+    member_count = await rebuild_segment(db, segment)
+    return {"success": True, "member_count": member_count}
+
+@segment_router.get("/segments/{segment_id}/members")
+async def get_segment_members(segment_id: str, request: Request, page: int = 1, limit: int = 50):
+    """Aperçu paginé des membres d'un segment"""
+    await _get_owned_segment(segment_id, _caller_email(request))
+    limit = max(1, min(limit, 500))
+    query = {"segment_id": segment_id}
+    projection = {"_id": 0, "id": 1, "name": 1, "email": 1, "whatsapp": 1, "expires_at": 1}
+    members = await db.segment_members.find(query, projection).sort("contact_key", 1).skip((page - 1) * limit).limit(limit).to_list(limit)
+    total = await db.segment_members.count_documents(query)
+    return {"data": members, "pagination": {"page": page, "limit": limit, "total": total, "pages": (total + limit - 1) // limit}}
+
+@segment_router.delete("/segments/{segment_id}")
+async def delete_segment(segment_id: str, request: Request):
+    """Supprime un segment et ses membres matérialisés"""
+    await _get_owned_segment(segment_id, _caller_email(request))
+    await db.segments.delete_one({"id": segment_id})
+    await db.segment_members.delete_many({"segment_id": segment_id})
+    return {"success": True}
@@ -4,23 +4,9 @@ import logging
 
 logger = logging.getLogger(__name__)
 
-# v9.5.6: Liste des Super Admins autorisés
-SUPER_ADMIN_EMAILS = [
-    "contact.artboost@gmail.com",
-    "afroboost.bassi@gmail.com"
-]
+# v9.5.6: Super Admins, rôles et filtre coach: source unique dans tenant_context (ensemble figé)
+from tenant_context import (SUPER_ADMIN_EMAILS, ROLE_SUPER_ADMIN, ROLE_COACH, ROLE_USER, is_super_admin,
+                            coach_filter as get_coach_filter)
+
 SUPER_ADMIN_EMAIL = "contact.artboost@gmail.com"  # Legacy compatibilité
 DEFAULT_COACH_ID = "bassi_default"
-ROLE_SUPER_ADMIN = "super_admin"
-ROLE_COACH = "coach"
-ROLE_USER = "user"
-
-def is_super_admin(email: str) -> bool:
-    """Vérifie si l'email est celui d'un Super Admin"""
-    return email and email.lower().strip() in [e.lower() for e in SUPER_ADMIN_EMAILS]
-
-def get_coach_filter(email: str) -> dict:
-    """Retourne le filtre MongoDB pour l'isolation des données coach"""
-    if is_super_admin(email):
-        return {}
-    return {"coach_id": email.lower().strip()}
@@ -30,6 +30,8 @@ load_dotenv(ROOT_DIR / '.env')
 from pymongo import MongoClient
 import requests
 
+from audience import iter_audience, SyncCampaignResultWriter, ensure_campaign_result_indexes_sync
+
 # Configuration du logging
 logging.basicConfig(
     level=logging.INFO,
@@ -68,6 +70,8 @@ try:
     db = client[DB_NAME]
     client.admin.command('ping')
     logger.info(f"✅ Connexion MongoDB réussie: {DB_NAME}")
+    # Lookup "déjà envoyé" indexé sur campaign_results
+    ensure_campaign_result_indexes_sync(db)
 except Exception as e:
     logger.error(f"❌ Erreur connexion MongoDB: {e}")
     sys.exit(1)
@@ -260,25 +264,6 @@ def process_campaign(campaign, dry_run=False):
     
     logger.info(f"  📅 {len(dates_to_process)} date(s) à traiter: {dates_to_process}")
     
-    # === RÉCUPÉRER LES CONTACTS ===
-    target_type = campaign.get("targetType", "all")
-    selected_contacts = campaign.get("selectedContacts", [])
-    
-    if target_type == "all":
-        contacts = list(db.users.find({}, {"_id": 0}))
-    else:
-        contacts = list(db.users.find({"id": {"$in": selected_contacts}}, {"_id": 0}))
-    
-    if not contacts:
-        logger.warning(f"  ⚠️ Aucun contact trouvé pour cette campagne")
-        db.campaigns.update_one(
-            {"id": campaign_id},
-            {"$set": {"status": "completed", "updatedAt": now.isoformat()}}
-        )
-        return True, 0, 0
-    
-    logger.info(f"  👥 {len(contacts)} contact(s) ciblés")
-    
     # === VÉRIFIER LES CANAUX ===
     channels = campaign.get("channels", {})
     whatsapp_enabled = channels.get("whatsapp", False)
@@ -290,11 +275,16 @@ def process_campaign(campaign, dry_run=False):
     
     success_count = 0
     fail_count = 0
-    results = campaign.get("results", [])
+    # Issues écrites par lots dans campaign_results (compteurs + aperçu borné sur la campagne)
+    results = SyncCampaignResultWriter(db, campaign_id)
+    results.resume(campaign)
     retry_counts = campaign.get("retryCounts", {})
     
     # === ENVOYER AUX CONTACTS ===
-    for contact in contacts:
+    # Audience streamée par lots (users + CRM dédoublonnés), jamais chargée en entier
+    contact_count = 0
+    for contact in iter_audience(db, campaign):
+        contact_count += 1
         contact_id = contact.get("id", "")
         contact_email = contact.get("email", "")
         contact_name = contact.get("name", "")
@@ -306,12 +296,7 @@ def process_campaign(campaign, dry_run=False):
             current_retries = retry_counts.get(retry_key, 0)
             
             # Vérifier si déjà envoyé
-            already_sent = any(
-                r.get("contactId") == contact_id and 
-                r.get("channel") == "whatsapp" and 
-                r.get("status") == "sent"
-                for r in results
-            )
+            already_sent = results.already_sent(contact_id, "whatsapp")
             
             if already_sent:
                 logger.info(f"    ✓ WhatsApp {contact_phone} - Déjà envoyé")
@@ -346,16 +331,7 @@ def process_campaign(campaign, dry_run=False):
                         "sentAt": now.isoformat(),
                         "sid": sid
                     }
-                    
-                    # Mettre à jour ou ajouter le résultat
-                    result_found = False
-                    for i, r in enumerate(results):
-                        if r.get("contactId") == contact_id and r.get("channel") == "whatsapp":
-                            results[i] = result_entry
-                            result_found = True
-                            break
-                    if not result_found:
-                        results.append(result_entry)
+                    results.add(result_entry)
                 else:
                     logger.error(f"    ❌ WhatsApp {contact_phone} - Échec: {error}")
                     fail_count += 1
@@ -367,12 +343,7 @@ def process_campaign(campaign, dry_run=False):
             current_retries = retry_counts.get(retry_key, 0)
             
             # Vérifier si déjà envoyé
-            already_sent = any(
-                r.get("contactId") == contact_id and 
-                r.get("channel") == "email" and 
-                r.get("status") == "sent"
-                for r in results
-            )
+            already_sent = results.already_sent(contact_id, "email")
             
             if already_sent:
                 logger.info(f"    ✓ Email {contact_email} - Déjà envoyé")
@@ -407,20 +378,22 @@ def process_campaign(campaign, dry_run=False):
                         "status": "sent",
                         "sentAt": now.isoformat()
                     }
-                    
-                    result_found = False
-                    for i, r in enumerate(results):
-                        if r.get("contactId") == contact_id and r.get("channel") == "email":
-                            results[i] = result_entry
-                            result_found = True
-                            break
-                    if not result_found:
-                        results.append(result_entry)
+                    results.add(result_entry)
                 else:
                     logger.error(f"    ❌ Email {contact_email} - Échec: {error}")
                     fail_count += 1
                     retry_counts[retry_key] = current_retries + 1
     
+    if contact_count == 0:
+        logger.warning(f"  ⚠️ Aucun contact trouvé pour cette campagne")
+        db.campaigns.update_one(
+            {"id": campaign_id},
+            {"$set": {"status": "completed", "updatedAt": now}}
+        )
+        return True, 0, 0
+    
+    logger.info(f"  👥 {contact_count} contact(s) ciblés")
+    
     # === MISE À JOUR DE LA CAMPAGNE ===
     new_sent_dates = list(set(sent_dates + dates_to_process))
     all_dates_processed = set(new_sent_dates) >= set(scheduled_dates)
@@ -434,12 +407,14 @@ def process_campaign(campaign, dry_run=False):
         new_status = "scheduled"
     
     # Mettre à jour en base
+    results.flush()
     update_data = {
         "status": new_status,
-        "results": results,
+        "results": results.preview,
+        "resultsSummary": results.summary,
         "sentDates": new_sent_dates,
         "retryCounts": retry_counts,
-        "updatedAt": now.isoformat(),
+        "updatedAt": now,
         "lastProcessedAt": now.isoformat()
     }
     
@@ -12,10 +12,22 @@ import requests
 from datetime import datetime, timezone
 import logging
 
+from audience import iter_audience, SyncCampaignResultWriter
+from media_handler import annotate_message
+
 logger = logging.getLogger("scheduler_engine")
 
 PARIS_TZ = pytz.timezone('Europe/Paris')
 
+
+def utc_now():
+    """
+    Heure courante UTC (timezone-aware).
+    Point d'injection unique de l'horloge: scheduler_simulator.py la remplace
+    par une horloge virtuelle pour rejouer une journée en quelques secondes.
+    """
+    return datetime.now(timezone.utc)
+
 # ==================== PARSING & VALIDATION ====================
 
 def parse_campaign_date(date_str):
@@ -66,7 +78,7 @@ def store_scheduled_message(scheduler_db, session_id, message_text, mode="commun
     """
     try:
         message_id = str(uuid_module.uuid4())
-        now = datetime.now(timezone.utc).isoformat()
+        now = utc_now().isoformat()
         
         # Message à stocker
         message = {
@@ -81,7 +93,7 @@ def store_scheduled_message(scheduler_db, session_id, message_text, mode="commun
             "notified": False,
             "scheduled": True,
             "status": "stored",
-            "created_at": now,
+            "created_at": utc_now(),  # date BSON (bson_dates)
             "stored_at": now
         }
         
@@ -98,6 +110,8 @@ def store_scheduled_message(scheduler_db, session_id, message_text, mode="commun
             message["campaign_id"] = campaign_id
         if campaign_name:
             message["campaign_name"] = campaign_name
+        # Type de média et miniature fixés à l'écriture (jamais reclassés à la lecture)
+        annotate_message(message)
         
         # INSERTION EN DB - POINT DE VÉRITÉ
         result = scheduler_db.chat_messages.insert_one(message)
@@ -133,7 +147,7 @@ def emit_socket_signal(message_id, session_id, message_data):
         }
         
         # Ajouter les champs optionnels
-        for field in ["media_url", "cta_type", "cta_text", "cta_link"]:
+        for field in ["media_url", "media_type", "thumbnail_url", "cta_type", "cta_text", "cta_link"]:
             if message_data.get(field):
                 socket_payload[field] = message_data[field]
         
@@ -181,7 +195,7 @@ def send_internal_message(scheduler_db, conversation_id, message_text, conversat
                     "mode": conversation_id,
                     "is_ai_active": False,
                     "is_deleted": False,
-                    "created_at": datetime.now(timezone.utc).isoformat(),
+                    "created_at": utc_now(),  # date BSON (bson_dates)
                     "title": f"💬 Groupe {conversation_id.capitalize()}"
                 }
                 scheduler_db.chat_sessions.insert_one(new_session)
@@ -215,12 +229,13 @@ def send_internal_message(scheduler_db, conversation_id, message_text, conversat
         message_data = {
             "id": message_id,
             "content": processed_message,
-            "created_at": datetime.now(timezone.utc).isoformat(),
+            "created_at": utc_now().isoformat(),
             "media_url": media_url,
             "cta_type": cta_type,
             "cta_text": cta_text,
             "cta_link": validate_cta_link(cta_link) if cta_link else None
         }
+        annotate_message(message_data)  # LRU: même URL que le message stocké
         emit_socket_signal(message_id, conversation_id, message_data)
         
         return True, None, conversation_id
@@ -253,7 +268,7 @@ def send_group_message(scheduler_db, target_group_id, message_text,
                 "mode": "community",
                 "is_ai_active": False,
                 "is_deleted": False,
-                "created_at": datetime.now(timezone.utc).isoformat(),
+                "created_at": utc_now(),  # date BSON (bson_dates)
                 "title": "💬 Communauté Afroboost"
             }
             scheduler_db.chat_sessions.insert_one(new_session)
@@ -281,12 +296,13 @@ def send_group_message(scheduler_db, target_group_id, message_text,
         message_data = {
             "id": message_id,
             "content": processed_message,
-            "created_at": datetime.now(timezone.utc).isoformat(),
+            "created_at": utc_now().isoformat(),
             "media_url": media_url,
             "cta_type": cta_type,
             "cta_text": cta_text,
             "cta_link": validate_cta_link(cta_link) if cta_link else None
         }
+        annotate_message(message_data)  # LRU: même URL que le message stocké
         emit_socket_signal(message_id, session_id, message_data)
         
         return True, None, session_id
@@ -352,8 +368,8 @@ def scheduler_job(mongo_client_sync, scheduler_heartbeat_ref):
     scheduler_db = mongo_client_sync[os.environ.get('DB_NAME', 'test_database')]
     
     try:
-        now_utc = datetime.now(timezone.utc)
-        now_paris = datetime.now(PARIS_TZ)
+        now_utc = utc_now()
+        now_paris = now_utc.astimezone(PARIS_TZ)
         now_str_paris = now_paris.strftime('%H:%M:%S')
         
         # Mettre à jour le heartbeat
@@ -410,7 +426,9 @@ def scheduler_job(mongo_client_sync, scheduler_heartbeat_ref):
                 
                 success_count = 0
                 fail_count = 0
-                results = campaign.get("results", [])
+                # Issues écrites par lots dans campaign_results (compteurs + aperçu borné sur la campagne)
+                results = SyncCampaignResultWriter(scheduler_db, campaign_id)
+                results.resume(campaign)
                 
                 # ========== MESSAGERIE INTERNE ==========
                 if channels.get("internal"):
@@ -436,7 +454,7 @@ def scheduler_job(mongo_client_sync, scheduler_heartbeat_ref):
                                     campaign_name=campaign_name
                                 )
                                 
-                                results.append({
+                                results.add({
                                     "contactId": tid,
                                     "channel": "internal",
                                     "status": "sent" if success else "failed",
@@ -458,13 +476,15 @@ def scheduler_job(mongo_client_sync, scheduler_heartbeat_ref):
                     only_internal = not any([channels.get("whatsapp"), channels.get("email"), channels.get("group")])
                     if only_internal:
                         new_status = "completed" if success_count > 0 else "failed"
+                        results.flush()
                         scheduler_db.campaigns.update_one(
                             {"id": campaign_id},
                             {"$set": {
                                 "status": new_status,
-                                "results": results,
+                                "results": results.preview,
+                                "resultsSummary": results.summary,
                                 "sentDates": list(set(sent_dates + dates_to_process)),
-                                "updatedAt": now_utc.isoformat()
+                                "updatedAt": now_utc
                             }}
                         )
                         print(f"[SCHEDULER] {'🟢' if success_count > 0 else '🔴'} '{campaign_name}' → {new_status}")
@@ -485,7 +505,7 @@ def scheduler_job(mongo_client_sync, scheduler_heartbeat_ref):
                             campaign_name=campaign_name
                         )
                         
-                        results.append({
+                        results.add({
                             "contactId": "group",
                             "channel": "group",
                             "status": "sent" if success else "failed",
@@ -503,13 +523,8 @@ def scheduler_job(mongo_client_sync, scheduler_heartbeat_ref):
                         fail_count += 1
                 
                 # ========== EMAIL & WHATSAPP (contacts) ==========
-                target_type = campaign.get("targetType", "all")
-                selected_contacts = campaign.get("selectedContacts", [])
-                
-                if target_type == "all":
-                    contacts = list(scheduler_db.users.find({}, {"_id": 0}))
-                else:
-                    contacts = list(scheduler_db.users.find({"id": {"$in": selected_contacts}}, {"_id": 0}))
+                # Audience streamée par lots (users + CRM dédoublonnés), jamais chargée en entier
+                contacts = iter_audience(scheduler_db, campaign) if (channels.get("email") or channels.get("whatsapp")) else []
                 
                 for contact in contacts:
                     contact_email = contact.get("email", "")
@@ -525,7 +540,8 @@ def scheduler_job(mongo_client_sync, scheduler_heartbeat_ref):
                                 message=message,
                                 media_url=media_url if media_url else None
                             )
-                            results.append({
+                            results.add({
+                                "contactId": contact.get("id", ""),
                                 "contactEmail": contact_email,
                                 "channel": "email",
                                 "status": "sent" if success else "failed",
@@ -546,7 +562,8 @@ def scheduler_job(mongo_client_sync, scheduler_heartbeat_ref):
                                 message=message,
                                 media_url=media_url if media_url else None
                             )
-                            results.append({
+                            results.add({
+                                "contactId": contact.get("id", ""),
                                 "contactPhone": contact_phone,
                                 "channel": "whatsapp",
                                 "status": "sent" if success else "failed",
@@ -571,13 +588,15 @@ def scheduler_job(mongo_client_sync, scheduler_heartbeat_ref):
                 else:
                     new_status = "scheduled"
                 
+                results.flush()
                 scheduler_db.campaigns.update_one(
                     {"id": campaign_id},
                     {"$set": {
                         "status": new_status,
-                        "results": results,
+                        "results": results.preview,
+                        "resultsSummary": results.summary,
                         "sentDates": new_sent_dates,
-                        "updatedAt": now_utc.isoformat()
+                        "updatedAt": now_utc
                     }}
                 )
                 
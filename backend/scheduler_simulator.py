@@ -0,0 +1,759 @@
+#!/usr/bin/env python3
+"""
+SIMULATEUR DU SCHEDULER AFROBOOST
+=================================
+Rejoue une journée de campagnes programmées contre scheduler_engine.scheduler_job
+sans attendre l'horloge murale ni appeler les vrais fournisseurs:
+- horloge virtuelle (scheduler_engine.utc_now est remplacée le temps de la simulation)
+- base MongoDB en mémoire (ou base jetable sur un MongoDB local via --mongo-url)
+- connecteurs email / WhatsApp / Socket.IO factices qui enregistrent chaque envoi
+
+Usage:
+    python scheduler_simulator.py                                  # 50 campagnes, 1000 contacts, 24h
+    python scheduler_simulator.py --campaigns 500 --contacts 20000 # Test de charge
+    python scheduler_simulator.py --mongo-url mongodb://localhost:27017
+    python scheduler_simulator.py --json                           # Rapport JSON
+
+Rapport: latence par tick, débit d'envoi, retard de programmation et envois en double.
+"""
+
+import os
+import re
+import io
+import sys
+import json
+import marshal
+import time
+import uuid
+import random
+import logging
+import argparse
+import contextlib
+from types import SimpleNamespace
+from datetime import datetime, timezone, timedelta
+
+import scheduler_engine
+
+logger = logging.getLogger("scheduler_simulator")
+
+# Intervalle du job dans server.py (SCHEDULER_INTERVAL)
+DEFAULT_TICK_SECONDS = 30
+
+# Marqueur injecté dans chaque message de campagne pour retrouver la campagne côté connecteurs
+SIM_TAG_PATTERN = re.compile(r'#sim:([A-Za-z0-9_-]+)')
+
+_MISSING = object()
+
+
+# ==================== MONGODB EN MÉMOIRE ====================
+# Sous-ensemble de l'API pymongo utilisé par le scheduler (find/insert/update/delete).
+
+def _clone_slow(value):
+    if isinstance(value, dict):
+        return {k: _clone_slow(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_clone_slow(v) for v in value]
+    return value
+
+
+def _clone(value):
+    """Copie profonde des documents: marshal (C) puis repli Python si types non sérialisables (datetime)."""
+    try:
+        return marshal.loads(marshal.dumps(value))
+    except ValueError:
+        return _clone_slow(value)
+
+
+def _get_path(doc, path):
+    """Lit un champ (notation pointée supportée)."""
+    current = doc
+    for part in path.split('.'):
+        if isinstance(current, dict) and part in current:
+            current = current[part]
+        else:
+            return _MISSING
+    return current
+
+
+def _set_path(doc, path, value):
+    parts = path.split('.')
+    for part in parts[:-1]:
+        doc = doc.setdefault(part, {})
+    doc[parts[-1]] = value
+
+
+def _unset_path(doc, path):
+    parts = path.split('.')
+    for part in parts[:-1]:
+        doc = doc.get(part)
+        if not isinstance(doc, dict):
+            return
+    doc.pop(parts[-1], None)
+
+
+def _compare(value, op, operand):
+    try:
+        if op == "$gt":
+            return value > operand
+        if op == "$gte":
+            return value >= operand
+        if op == "$lt":
+            return value < operand
+        if op == "$lte":
+            return value <= operand
+    except TypeError:
+        return False
+    return False
+
+
+def _equals(value, expected):
+    if value is _MISSING:
+        return expected is None
+    if isinstance(value, list) and not isinstance(expected, list):
+        return expected in value
+    return value == expected
+
+
+def _match_condition(value, condition):
+    if not (isinstance(condition, dict) and condition and all(k.startswith('$') for k in condition)):
+        return _equals(value, condition)
+
+    for op, operand in condition.items():
+        if op == "$eq":
+            if not _equals(value, operand):
+                return False
+        elif op == "$ne":
+            if _equals(value, operand):
+                return False
+        elif op == "$in":
+            if not any(_equals(value, item) for item in operand):
+                return False
+        elif op == "$nin":
+            if any(_equals(value, item) for item in operand):
+                return False
+        elif op == "$exists":
+            if (value is not _MISSING) != bool(operand):
+                return False
+        elif op in ("$gt", "$gte", "$lt", "$lte"):
+            if value is _MISSING or not _compare(value, op, operand):
+                return False
+        elif op == "$regex":
+            flags = re.IGNORECASE if 'i' in condition.get("$options", "") else 0
+            if not isinstance(value, str) or not re.search(operand, value, flags):
+                return False
+        elif op == "$options":
+            continue
+        elif op == "$elemMatch":
+            if not isinstance(value, list) or not any(
+                    _match_condition(item, operand) if all(k.startswith('$') for k in operand)
+                    else isinstance(item, dict) and match_document(item, operand) for item in value):
+                return False
+        elif op == "$size":
+            if not isinstance(value, list) or len(value) != operand:
+                return False
+        else:
+            raise NotImplementedError(f"Opérateur non supporté en mémoire: {op}")
+    return True
+
+
+def match_document(doc, query):
+    """Évalue un filtre MongoDB sur un document."""
+    for key, condition in (query or {}).items():
+        if key == "$or":
+            if not any(match_document(doc, sub) for sub in condition):
+                return False
+        elif key == "$and":
+            if not all(match_document(doc, sub) for sub in condition):
+                return False
+        elif key == "$nor":
+            if any(match_document(doc, sub) for sub in condition):
+                return False
+        elif not _match_condition(_get_path(doc, key), condition):
+            return False
+    return True
+
+
+def _project(doc, projection):
+    if not projection:
+        return _clone(doc)
+    included = [k for k, v in projection.items() if v and k != "_id"]
+    if included:
+        result = {}
+        if projection.get("_id", 1):
+            result["_id"] = doc.get("_id")
+        for key in included:
+            value = _get_path(doc, key)
+            if value is not _MISSING:
+                _set_path(result, key, _clone(value))
+        return result
+    result = _clone(doc)
+    for key, value in projection.items():
+        if not value:
+            _unset_path(result, key)
+    return result
+
+
+def _apply_update(doc, update, inserting=False):
+    for op, fields in update.items():
+        if op == "$setOnInsert":
+            if not inserting:
+                continue
+            op = "$set"
+        for path, value in fields.items():
+            if op == "$set":
+                _set_path(doc, path, _clone(value))
+            elif op == "$unset":
+                _unset_path(doc, path)
+            elif op == "$inc":
+                current = _get_path(doc, path)
+                _set_path(doc, path, (0 if current is _MISSING else current) + value)
+            elif op in ("$max", "$min"):
+                current = _get_path(doc, path)
+                if current is _MISSING or current is None or (value > current if op == "$max" else value < current):
+                    _set_path(doc, path, _clone(value))
+            elif op in ("$push", "$addToSet"):
+                current = _get_path(doc, path)
+                if current is _MISSING:
+                    current = []
+                    _set_path(doc, path, current)
+                items = value["$each"] if isinstance(value, dict) and "$each" in value else [value]
+                for item in items:
+                    if op == "$push" or item not in current:
+                        current.append(_clone(item))
+            elif op == "$pull":
+                current = _get_path(doc, path)
+                if isinstance(current, list):
+                    current[:] = [item for item in current if not _match_condition(item, value)]
+            else:
+                raise NotImplementedError(f"Opérateur de mise à jour non supporté en mémoire: {op}")
+
+
+def _sort_key(value):
+    if isinstance(value, datetime):
+        return (3, value)
+    if isinstance(value, str):
+        return (2, value)
+    return (1, value)
+
+
+class InMemoryCursor:
+    """Curseur paresseux: sort/skip/limit/batch_size comme pymongo."""
+
+    def __init__(self, collection, query, projection):
+        self._collection = collection
+        self._query = query
+        self._projection = projection
+        self._sort = []
+        self._skip = 0
+        self._limit = 0
+
+    def sort(self, key_or_list, direction=1):
+        if isinstance(key_or_list, str):
+            self._sort = [(key_or_list, direction)]
+        else:
+            self._sort = list(key_or_list)
+        return self
+
+    def skip(self, count):
+        self._skip = count
+        return self
+
+    def limit(self, count):
+        self._limit = count
+        return self
+
+    def batch_size(self, size):
+        return self
+
+    def close(self):
+        pass
+
+    def __iter__(self):
+        docs = [d for d in self._collection._docs if match_document(d, self._query)]
+        for key, direction in reversed(self._sort):
+            present = [d for d in docs if _get_path(d, key) not in (_MISSING, None)]
+            absent = [d for d in docs if _get_path(d, key) in (_MISSING, None)]
+            # Ordre BSON entre types: nombres < chaînes < dates (migration bson_dates en cours)
+            present.sort(key=lambda d: _sort_key(_get_path(d, key)), reverse=direction < 0)
+            docs = absent + present if direction > 0 else present + absent
+        docs = docs[self._skip:]
+        if self._limit:
+            docs = docs[:self._limit]
+        for doc in docs:
+            yield _project(doc, self._projection)
+
+
+class InMemoryCollection:
+    """Collection MongoDB en mémoire (API synchrone pymongo)."""
+
+    def __init__(self, name):
+        self.name = name
+        self._docs = []
+
+    def find(self, query=None, projection=None):
+        return InMemoryCursor(self, query or {}, projection)
+
+    def find_one(self, query=None, projection=None):
+        for doc in self.find(query, projection).limit(1):
+            return doc
+        return None
+
+    def count_documents(self, query):
+        return sum(1 for d in self._docs if match_document(d, query))
+
+    def distinct(self, key, query=None):
+        values = []
+        for doc in self._docs:
+            if match_document(doc, query or {}):
+                value = _get_path(doc, key)
+                if value is not _MISSING and value not in values:
+                    values.append(value)
+        return values
+
+    def insert_one(self, document):
+        document.setdefault("_id", uuid.uuid4().hex)
+        self._docs.append(_clone(document))
+        return SimpleNamespace(inserted_id=document["_id"], acknowledged=True)
+
+    def insert_many(self, documents, ordered=True):
+        ids = [self.insert_one(doc).inserted_id for doc in documents]
+        return SimpleNamespace(inserted_ids=ids, acknowledged=True)
+
+    def _update(self, query, update, upsert, many):
+        matched = 0
+        for doc in self._docs:
+            if match_document(doc, query):
+                _apply_update(doc, update)
+                matched += 1
+                if not many:
+                    break
+        upserted_id = None
+        if matched == 0 and upsert:
+            new_doc = {k: v for k, v in query.items() if not k.startswith('$') and not isinstance(v, dict)}
+            _apply_update(new_doc, update, inserting=True)
+            upserted_id = self.insert_one(new_doc).inserted_id
+        return SimpleNamespace(matched_count=matched, modified_count=matched, upserted_id=upserted_id)
+
+    def update_one(self, query, update, upsert=False):
+        return self._update(query, update, upsert, many=False)
+
+    def update_many(self, query, update, upsert=False):
+        return self._update(query, update, upsert, many=True)
+
+    def delete_one(self, query):
+        for i, doc in enumerate(self._docs):
+            if match_document(doc, query):
+                del self._docs[i]
+                return SimpleNamespace(deleted_count=1)
+        return SimpleNamespace(deleted_count=0)
+
+    def delete_many(self, query):
+        before = len(self._docs)
+        self._docs = [d for d in self._docs if not match_document(d, query)]
+        return SimpleNamespace(deleted_count=before - len(self._docs))
+
+    def create_index(self, keys, **kwargs):
+        if isinstance(keys, str):
+            return f"{keys}_1"
+        return "_".join(f"{k}_{d}" for k, d in keys)
+
+    def drop(self):
+        self._docs = []
+
+
+class InMemoryDatabase:
+    def __init__(self, name="afroboost_sim"):
+        self.name = name
+        self._collections = {}
+
+    def __getitem__(self, name):
+        if name not in self._collections:
+            self._collections[name] = InMemoryCollection(name)
+        return self._collections[name]
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return self[name]
+
+
+class InMemoryClient:
+    """Remplace MongoClient: toute base demandée pointe vers la même base en mémoire."""
+
+    def __init__(self):
+        self._db = InMemoryDatabase()
+
+    def __getitem__(self, name):
+        return self._db
+
+    def drop_database(self, name):
+        self._db = InMemoryDatabase()
+
+    def close(self):
+        pass
+
+
+# ==================== HORLOGE & CONNECTEURS FACTICES ====================
+
+class VirtualClock:
+    """Horloge virtuelle avancée manuellement à chaque tick."""
+
+    def __init__(self, start):
+        self.current = start
+
+    def now(self):
+        return self.current
+
+    def advance(self, seconds):
+        self.current = self.current + timedelta(seconds=seconds)
+
+
+class StubSinks:
+    """Connecteurs email/WhatsApp/Socket.IO: enregistrent l'envoi au lieu d'appeler l'API."""
+
+    def __init__(self, clock, failure_rate=0.0, rng=None):
+        self.clock = clock
+        self.failure_rate = failure_rate
+        self.rng = rng or random.Random(0)
+        self.sends = []
+
+    def _record(self, channel, recipient, text):
+        match = SIM_TAG_PATTERN.search(text or "")
+        if self.failure_rate and self.rng.random() < self.failure_rate:
+            return False
+        self.sends.append({
+            "at": self.clock.now(),
+            "channel": channel,
+            "recipient": (recipient or "").strip().lower(),
+            "campaign_id": match.group(1) if match else None
+        })
+        return True
+
+    def send_email(self, to_email, to_name, subject, message, media_url=None):
+        if self._record("email", to_email, message):
+            return True, None
+        return False, "Échec simulé"
+
+    def send_whatsapp(self, to_phone, message, media_url=None):
+        if self._record("whatsapp", to_phone, message):
+            return True, None, f"SIM{uuid.uuid4().hex[:12]}"
+        return False, "Échec simulé", None
+
+    def emit_socket_signal(self, message_id, session_id, message_data):
+        return self._record("socket", session_id, message_data.get("content", ""))
+
+
+@contextlib.contextmanager
+def patched_engine(clock, sinks):
+    """Branche l'horloge et les connecteurs factices sur scheduler_engine, puis restaure."""
+    originals = {
+        name: getattr(scheduler_engine, name)
+        for name in ("utc_now", "send_email", "send_whatsapp", "emit_socket_signal")
+    }
+    scheduler_engine.utc_now = clock.now
+    scheduler_engine.send_email = sinks.send_email
+    scheduler_engine.send_whatsapp = sinks.send_whatsapp
+    scheduler_engine.emit_socket_signal = sinks.emit_socket_signal
+    try:
+        yield
+    finally:
+        for name, value in originals.items():
+            setattr(scheduler_engine, name, value)
+
+
+# ==================== JEU DE DONNÉES ====================
+
+def _format_schedule(dt_utc, rng):
+    """Mélange les formats envoyés par le frontend: heure de Paris sans fuseau ou ISO 'Z'."""
+    if rng.random() < 0.5:
+        return dt_utc.astimezone(scheduler_engine.PARIS_TZ).strftime('%Y-%m-%dT%H:%M')
+    return dt_utc.strftime('%Y-%m-%dT%H:%M:%S') + 'Z'
+
+
+def seed_dataset(db, campaigns, contacts, start, hours, rng, duplicate_ratio=0.0, sessions=20):
+    """
+    Peuple la base: M contacts (users + une partie dans chat_participants),
+    des conversations internes et N campagnes programmées sur la fenêtre simulée.
+    """
+    now_iso = start.isoformat()
+    users = []
+    for i in range(contacts):
+        users.append({
+            "id": str(uuid.uuid4()),
+            "name": f"Contact {i}",
+            "email": f"contact{i}@example.com",
+            "whatsapp": f"+4179{i:07d}" if rng.random() < 0.7 else "",
+            "createdAt": now_iso
+        })
+    # Doublons: même personne inscrite deux fois (casse/espaces différents)
+    for source in rng.sample(users, int(contacts * duplicate_ratio)):
+        users.append({
+            "id": str(uuid.uuid4()),
+            "name": source["name"],
+            "email": f"  {source['email'].upper()} ",
+            "whatsapp": source["whatsapp"],
+            "createdAt": now_iso
+        })
+    if users:
+        db.users.insert_many(users)
+
+    participants = [{
+        "id": str(uuid.uuid4()),
+        "name": user["name"],
+        "email": user["email"],
+        "whatsapp": user["whatsapp"],
+        "source": "simulation",
+        "created_at": now_iso
+    } for user in users[:contacts] if rng.random() < 0.3]
+    if participants:
+        db.chat_participants.insert_many(participants)
+
+    session_ids = []
+    for i in range(sessions):
+        session_id = str(uuid.uuid4())
+        session_ids.append(session_id)
+        db.chat_sessions.insert_one({
+            "id": session_id,
+            "participant_ids": [],
+            "mode": "user",
+            "is_ai_active": False,
+            "is_deleted": False,
+            "created_at": now_iso,
+            "title": f"Conversation {i}"
+        })
+
+    user_ids = [u["id"] for u in users]
+    window_seconds = int(hours * 3600)
+    for i in range(campaigns):
+        campaign_id = str(uuid.uuid4())
+        offsets = sorted(rng.randrange(window_seconds) for _ in range(rng.choice([1, 1, 2, 3])))
+        dates = [_format_schedule(start + timedelta(seconds=offset), rng) for offset in offsets]
+
+        channels = {"email": rng.random() < 0.6, "whatsapp": rng.random() < 0.4,
+                    "internal": rng.random() < 0.2, "group": rng.random() < 0.1}
+        if not any(channels.values()):
+            channels["email"] = True
+
+        campaign = {
+            "id": campaign_id,
+            "name": f"Campagne simulée {i}",
+            "message": f"Salut {{prénom}} ! Nouvelle séance Afroboost 🔥 #sim:{campaign_id}",
+            "mediaUrl": "",
+            "targetType": "all" if rng.random() < 0.2 else "selected",
+            "selectedContacts": rng.sample(user_ids, min(len(user_ids), rng.randint(1, 50))),
+            "channels": channels,
+            "targetIds": rng.sample(session_ids, min(len(session_ids), rng.randint(1, 3))) if channels["internal"] else [],
+            "status": "scheduled",
+            "results": [],
+            "createdAt": now_iso,
+            "updatedAt": now_iso
+        }
+        if len(dates) == 1:
+            campaign["scheduledAt"] = dates[0]
+        else:
+            campaign["scheduledDates"] = dates
+            campaign["sentDates"] = []
+        db.campaigns.insert_one(campaign)
+
+    return {"campaigns": campaigns, "contacts": len(users), "participants": len(participants), "sessions": sessions}
+
+
+# ==================== SIMULATION ====================
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def _distribution(values, scale=1.0):
+    return {
+        "count": len(values),
+        "mean": round(sum(values) / len(values) * scale, 3) if values else 0.0,
+        "p50": round(_percentile(values, 50) * scale, 3),
+        "p95": round(_percentile(values, 95) * scale, 3),
+        "p99": round(_percentile(values, 99) * scale, 3),
+        "max": round(max(values) * scale, 3) if values else 0.0
+    }
+
+
+def run_simulation(mongo_client=None, campaigns=50, contacts=1000, hours=24.0,
+                   tick_seconds=DEFAULT_TICK_SECONDS, seed=42, start=None,
+                   duplicate_ratio=0.0, failure_rate=0.0, verbose=False):
+    """
+    Rejoue `hours` heures de programmation tick par tick et retourne le rapport.
+
+    Args:
+        mongo_client: client pymongo (base jetable) ou None pour la base en mémoire
+    """
+    rng = random.Random(seed)
+    start = start or datetime(2026, 2, 6, tzinfo=timezone.utc)
+    end = start + timedelta(hours=hours)
+    mongo_client = mongo_client or InMemoryClient()
+    db = mongo_client[os.environ.get('DB_NAME', 'test_database')]
+
+    dataset = seed_dataset(db, campaigns, contacts, start, hours, rng, duplicate_ratio=duplicate_ratio)
+
+    clock = VirtualClock(start)
+    sinks = StubSinks(clock, failure_rate=failure_rate, rng=rng)
+    heartbeat_ref = [None]
+
+    tick_latencies = []
+    lags = []
+    processed_ticks = {}  # campaign_id -> nombre de ticks ayant traité au moins une date
+    known_sent = {}
+
+    quiet_loggers = [logging.getLogger(name) for name in ("scheduler_engine", "audience")]
+    previous_levels = [quiet.level for quiet in quiet_loggers]
+    if not verbose:
+        for quiet in quiet_loggers:
+            quiet.setLevel(logging.WARNING)
+
+    wall_start = time.perf_counter()
+    try:
+        with patched_engine(clock, sinks):
+            while clock.now() < end:
+                clock.advance(tick_seconds)
+                output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+                tick_start = time.perf_counter()
+                with output:
+                    scheduler_engine.scheduler_job(mongo_client, heartbeat_ref)
+                tick_latencies.append(time.perf_counter() - tick_start)
+
+                # Dates nouvellement marquées envoyées pendant ce tick -> retard de programmation
+                # updatedAt: date BSON écrite par le moteur (bson_dates)
+                for campaign in db.campaigns.find({"updatedAt": clock.now()}, {"_id": 0, "id": 1, "sentDates": 1}):
+                    sent = set(campaign.get("sentDates") or [])
+                    new_dates = sent - known_sent.get(campaign["id"], set())
+                    if not new_dates:
+                        continue
+                    known_sent[campaign["id"]] = sent
+                    processed_ticks[campaign["id"]] = processed_ticks.get(campaign["id"], 0) + 1
+                    for date_str in new_dates:
+                        scheduled = scheduler_engine.parse_campaign_date(date_str)
+                        if scheduled:
+                            lags.append((clock.now() - scheduled).total_seconds())
+    finally:
+        for quiet, level in zip(quiet_loggers, previous_levels):
+            quiet.setLevel(level)
+    wall_seconds = time.perf_counter() - wall_start
+
+    # Doublons: plus d'envois (campagne, canal, destinataire) que de ticks de traitement
+    send_counts = {}
+    for send in sinks.sends:
+        key = (send["campaign_id"], send["channel"], send["recipient"])
+        send_counts[key] = send_counts.get(key, 0) + 1
+    duplicate_sends = sum(
+        max(0, count - processed_ticks.get(campaign_id, 0))
+        for (campaign_id, _, _), count in send_counts.items()
+    )
+
+    statuses = {}
+    missed = 0
+    for campaign in db.campaigns.find({}, {"_id": 0, "status": 1, "scheduledAt": 1, "scheduledDates": 1, "sentDates": 1}):
+        statuses[campaign.get("status")] = statuses.get(campaign.get("status"), 0) + 1
+        dates = campaign.get("scheduledDates") or ([campaign["scheduledAt"]] if campaign.get("scheduledAt") else [])
+        done = set(campaign.get("sentDates") or [])
+        missed += sum(1 for d in dates if d not in done)
+
+    by_channel = {}
+    for send in sinks.sends:
+        by_channel[send["channel"]] = by_channel.get(send["channel"], 0) + 1
+
+    engine_seconds = sum(tick_latencies)
+    return {
+        "dataset": dataset,
+        "simulated_hours": hours,
+        "tick_seconds": tick_seconds,
+        "ticks": len(tick_latencies),
+        "wall_seconds": round(wall_seconds, 3),
+        "tick_latency_ms": _distribution(tick_latencies, scale=1000.0),
+        "sends": {
+            "total": len(sinks.sends),
+            "by_channel": by_channel,
+            "throughput_per_s": round(len(sinks.sends) / engine_seconds, 1) if engine_seconds else 0.0
+        },
+        "scheduling_lag_s": _distribution(lags),
+        "duplicate_sends": duplicate_sends,
+        "missed_occurrences": missed,
+        "campaign_status": statuses
+    }
+
+
+def format_report(report):
+    """Rapport lisible pour la console."""
+    latency = report["tick_latency_ms"]
+    lag = report["scheduling_lag_s"]
+    sends = report["sends"]
+    dataset = report["dataset"]
+    lines = [
+        "=" * 60,
+        f"📊 SIMULATION SCHEDULER - {report['simulated_hours']}h en {report['wall_seconds']}s",
+        "=" * 60,
+        f"Jeu de données: {dataset['campaigns']} campagne(s), {dataset['contacts']} contact(s), "
+        f"{dataset['participants']} participant(s) CRM",
+        f"Ticks: {report['ticks']} (toutes les {report['tick_seconds']}s virtuelles)",
+        f"⏱️  Latence tick (ms): moy {latency['mean']} | p50 {latency['p50']} | p95 {latency['p95']} "
+        f"| p99 {latency['p99']} | max {latency['max']}",
+        f"📤 Envois: {sends['total']} {sends['by_channel']} | débit {sends['throughput_per_s']}/s",
+        f"⏳ Retard programmation (s): moy {lag['mean']} | p95 {lag['p95']} | max {lag['max']}",
+        f"{'✅' if report['duplicate_sends'] == 0 else '❌'} Envois en double: {report['duplicate_sends']}",
+        f"{'✅' if report['missed_occurrences'] == 0 else '⚠️'} Dates non traitées: {report['missed_occurrences']}",
+        f"Statuts finaux: {report['campaign_status']}",
+        "=" * 60
+    ]
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulateur déterministe du scheduler de campagnes Afroboost")
+    parser.add_argument("--campaigns", type=int, default=50, help="Nombre de campagnes programmées (défaut: 50)")
+    parser.add_argument("--contacts", type=int, default=1000, help="Nombre de contacts (défaut: 1000)")
+    parser.add_argument("--hours", type=float, default=24.0, help="Durée simulée en heures (défaut: 24)")
+    parser.add_argument("--tick", type=int, default=DEFAULT_TICK_SECONDS, help=f"Intervalle du job en secondes (défaut: {DEFAULT_TICK_SECONDS})")
+    parser.add_argument("--seed", type=int, default=42, help="Graine aléatoire (défaut: 42)")
+    parser.add_argument("--duplicate-ratio", type=float, default=0.0, help="Part de contacts inscrits en double (défaut: 0)")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Taux d'échec simulé des connecteurs (défaut: 0)")
+    parser.add_argument("--mongo-url", default=None, help="MongoDB local (base jetable) au lieu de la base en mémoire")
+    parser.add_argument("--keep", action="store_true", help="Conserver la base MongoDB jetable après la simulation")
+    parser.add_argument("--json", action="store_true", help="Rapport au format JSON")
+    parser.add_argument("--verbose", action="store_true", help="Afficher les logs du scheduler")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - [SIMULATOR] %(levelname)s - %(message)s')
+
+    mongo_client = None
+    db_name = None
+    if args.mongo_url:
+        from pymongo import MongoClient
+        mongo_client = MongoClient(args.mongo_url)
+        db_name = f"afroboost_sim_{uuid.uuid4().hex[:8]}"
+        os.environ['DB_NAME'] = db_name
+        logger.info(f"Base jetable: {db_name}")
+
+    try:
+        report = run_simulation(
+            mongo_client=mongo_client,
+            campaigns=args.campaigns,
+            contacts=args.contacts,
+            hours=args.hours,
+            tick_seconds=args.tick,
+            seed=args.seed,
+            duplicate_ratio=args.duplicate_ratio,
+            failure_rate=args.failure_rate,
+            verbose=args.verbose
+        )
+    finally:
+        if mongo_client is not None:
+            if not args.keep:
+                mongo_client.drop_database(db_name)
+            mongo_client.close()
+
+    print(json.dumps(report, indent=2, ensure_ascii=False) if args.json else format_report(report))
+    return 1 if report["duplicate_sends"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,368 @@
+"""
+SEGMENTS - Audiences sauvegardées avec membres matérialisés
+Un segment (collection `segments`) porte une règle; ses membres sont matérialisés
+dans `segment_members` (un document par contact, clé = email/téléphone normalisé)
+et maintenus incrémentalement à chaque réservation, contact CRM ou adhésion de groupe.
+Une campagne ciblant un segment se résout alors avec un seul curseur indexé sur segment_id.
+segments.member_count suit chaque entrée / sortie par $inc (exact après rebuild_segment);
+les sorties par TTL de "réservé récemment" ne sont recomptées qu'à la reconstruction.
+
+Règles supportées:
+- reserved_within_days {"days": 30}  -> a réservé dans les N derniers jours (expire via TTL)
+- subscribers                        -> abonnés (réservation type abonné ou participant isSubscriber)
+- has_whatsapp                       -> contact joignable sur WhatsApp
+- group_member {"group_id": "..."}   -> membre d'un groupe de chat
+"""
+
+import uuid
+import logging
+from datetime import datetime, timezone, timedelta
+from typing import Dict, Any, Optional, List
+
+from pymongo import UpdateOne
+
+from audience import normalize_email, normalize_phone
+
+logger = logging.getLogger(__name__)
+
+RULE_RESERVED_WITHIN_DAYS = "reserved_within_days"
+RULE_SUBSCRIBERS = "subscribers"
+RULE_HAS_WHATSAPP = "has_whatsapp"
+RULE_GROUP_MEMBER = "group_member"
+RULE_TYPES = [RULE_RESERVED_WITHIN_DAYS, RULE_SUBSCRIBERS, RULE_HAS_WHATSAPP, RULE_GROUP_MEMBER]
+
+# Valeurs de Reservation.type correspondant à un abonnement
+SUBSCRIBER_RESERVATION_TYPES = ["abonné", "abonne", "subscriber", "abonnement"]
+
+# Champs contact recopiés dans segment_members (= audience.AUDIENCE_PROJECTION)
+MEMBER_FIELDS = ("id", "name", "email", "whatsapp")
+
+BULK_BATCH_SIZE = 500
+GROUP_IDS_CHUNK = 1000
+
+
+# ==================== RÈGLES (fonctions pures) ====================
+
+def validate_rule(rule: Dict[str, Any]) -> Optional[str]:
+    """Retourne un message d'erreur si la règle est invalide, sinon None."""
+    if not isinstance(rule, dict) or rule.get("type") not in RULE_TYPES:
+        return f"Type de règle inconnu (attendu: {', '.join(RULE_TYPES)})"
+    if rule["type"] == RULE_RESERVED_WITHIN_DAYS:
+        days = rule.get("days")
+        if not isinstance(days, int) or days <= 0:
+            return "days doit être un entier positif"
+    if rule["type"] == RULE_GROUP_MEMBER and not rule.get("group_id"):
+        return "group_id requis"
+    return None
+
+
+def contact_key(contact: Dict[str, Any]) -> str:
+    """Clé d'identité d'un contact: email normalisé, sinon téléphone, sinon id."""
+    email = normalize_email(contact.get("email"))
+    if email:
+        return "e:" + email
+    phone = normalize_phone(contact.get("whatsapp"))
+    if phone:
+        return "p:" + phone
+    return "i:" + (contact.get("id") or "")
+
+
+def contact_from_reservation(reservation: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": reservation.get("userId") or reservation.get("id"),
+        "name": reservation.get("userName", ""),
+        "email": reservation.get("userEmail", ""),
+        "whatsapp": reservation.get("userWhatsapp") or ""
+    }
+
+
+def parse_datetime(value) -> Optional[datetime]:
+    """createdAt peut être une chaîne ISO ('Z' ou '+00:00') ou un datetime BSON."""
+    if isinstance(value, datetime):
+        return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+    if isinstance(value, str) and value:
+        try:
+            parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+            return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+        except ValueError:
+            return None
+    return None
+
+
+def reservation_expiry(rule: Dict[str, Any], reservation: Dict[str, Any]) -> Optional[datetime]:
+    """Date de sortie du segment 'réservé récemment' pour une réservation (None si trop ancienne)."""
+    created = parse_datetime(reservation.get("createdAt")) or datetime.now(timezone.utc)
+    expires_at = created + timedelta(days=rule["days"])
+    return expires_at if expires_at > datetime.now(timezone.utc) else None
+
+
+def contact_matches(rule: Dict[str, Any], contact: Dict[str, Any]) -> bool:
+    """Règles évaluables sur le seul document contact (users / chat_participants)."""
+    if rule["type"] == RULE_HAS_WHATSAPP:
+        return bool(normalize_phone(contact.get("whatsapp")))
+    if rule["type"] == RULE_SUBSCRIBERS:
+        return bool(contact.get("isSubscriber"))
+    return False
+
+
+def is_subscriber_reservation(reservation: Dict[str, Any]) -> bool:
+    return (reservation.get("type") or "").strip().lower() in SUBSCRIBER_RESERVATION_TYPES
+
+
+def in_scope(segment: Dict[str, Any], doc: Dict[str, Any]) -> bool:
+    """Un segment de coach ne voit que ses données; un segment Super Admin (coach_id None) voit tout."""
+    coach_id = segment.get("coach_id")
+    return not coach_id or doc.get("coach_id") == coach_id
+
+
+def member_document(segment_id: str, contact: Dict[str, Any], expires_at: Optional[datetime] = None) -> Dict[str, Any]:
+    member = {field: contact.get(field) or "" for field in MEMBER_FIELDS}
+    member.update({
+        "segment_id": segment_id,
+        "contact_key": contact_key(contact),
+        "updated_at": datetime.now(timezone.utc).isoformat()
+    })
+    if expires_at:
+        member["expires_at"] = expires_at
+    return member
+
+
+# ==================== INDEX ====================
+
+async def ensure_segment_indexes(db):
+    """Index des membres: résolution par segment, unicité du contact, expiration TTL."""
+    await db.segment_members.create_index([("segment_id", 1), ("contact_key", 1)], unique=True)
+    await db.segment_members.create_index("id")
+    await db.segment_members.create_index("expires_at", expireAfterSeconds=0)
+    await db.segments.create_index("id", unique=True)
+    await db.segments.create_index([("rule.type", 1), ("rule.group_id", 1)])
+
+
+# ==================== MAINTENANCE INCRÉMENTALE ====================
+
+async def _segments_for(db, rule_types: List[str], extra: Dict[str, Any] = None):
+    """Segments concernés par un évènement, streamés depuis le curseur (aucune limite de nombre)."""
+    query = {"rule.type": {"$in": rule_types}}
+    if extra:
+        query.update(extra)
+    async for segment in db.segments.find(query, {"_id": 0, "id": 1, "coach_id": 1, "rule": 1}):
+        yield segment
+
+
+async def _count_members(db, segment_id: str, delta: int):
+    if delta:
+        await db.segments.update_one({"id": segment_id}, {"$inc": {"member_count": delta}})
+
+
+async def _upsert_member(db, segment: Dict[str, Any], contact: Dict[str, Any], expires_at: Optional[datetime] = None):
+    member = member_document(segment["id"], contact, expires_at)
+    update = {"$set": {k: v for k, v in member.items() if k != "expires_at"}}
+    if expires_at:
+        # Plusieurs réservations: on garde la sortie la plus tardive
+        update["$max"] = {"expires_at": expires_at}
+    result = await db.segment_members.update_one(
+        {"segment_id": segment["id"], "contact_key": member["contact_key"]}, update, upsert=True
+    )
+    await _count_members(db, segment["id"], 1 if result.upserted_id is not None else 0)
+
+
+async def _remove_member(db, segment: Dict[str, Any], contact: Dict[str, Any]):
+    result = await db.segment_members.delete_one({"segment_id": segment["id"], "contact_key": contact_key(contact)})
+    await _count_members(db, segment["id"], -result.deleted_count)
+
+
+async def on_reservation_created(db, reservation: Dict[str, Any]):
+    """Réservation créée: entre dans les segments 'réservé récemment' (et 'abonnés' si abonnement)."""
+    try:
+        contact = contact_from_reservation(reservation)
+        async for segment in _segments_for(db, [RULE_RESERVED_WITHIN_DAYS, RULE_SUBSCRIBERS]):
+            if not in_scope(segment, reservation):
+                continue
+            rule = segment["rule"]
+            if rule["type"] == RULE_RESERVED_WITHIN_DAYS:
+                expires_at = reservation_expiry(rule, reservation)
+                if expires_at:
+                    await _upsert_member(db, segment, contact, expires_at)
+            elif is_subscriber_reservation(reservation):
+                await _upsert_member(db, segment, contact)
+    except Exception as e:
+        logger.error(f"[SEGMENTS] Réservation créée: {e}")
+
+
+async def on_reservation_deleted(db, reservation: Dict[str, Any]):
+    """Réservation supprimée: recalcule l'appartenance du contact à partir de ses autres réservations."""
+    try:
+        contact = contact_from_reservation(reservation)
+        email = reservation.get("userEmail") or ""
+        async for segment in _segments_for(db, [RULE_RESERVED_WITHIN_DAYS, RULE_SUBSCRIBERS]):
+            if not in_scope(segment, reservation):
+                continue
+            rule = segment["rule"]
+            remaining_query = {"userEmail": email}
+            if segment.get("coach_id"):
+                remaining_query["coach_id"] = segment["coach_id"]
+            if rule["type"] == RULE_SUBSCRIBERS:
+                if not is_subscriber_reservation(reservation):
+                    continue
+                remaining_query["type"] = {"$in": SUBSCRIBER_RESERVATION_TYPES}
+                still_member = await db.reservations.find_one(remaining_query, {"_id": 1})
+                if not still_member:
+                    still_member = await db.chat_participants.find_one({"email": email, "isSubscriber": True}, {"_id": 1})
+                if not still_member:
+                    await _remove_member(db, segment, contact)
+                continue
+            latest = await db.reservations.find(remaining_query, {"_id": 0, "createdAt": 1}).sort("createdAt", -1).limit(1).to_list(1)
+            expires_at = reservation_expiry(rule, latest[0]) if latest else None
+            if expires_at:
+                await db.segment_members.update_one(
+                    {"segment_id": segment["id"], "contact_key": contact_key(contact)},
+                    {"$set": {"expires_at": expires_at}}
+                )
+            else:
+                await _remove_member(db, segment, contact)
+    except Exception as e:
+        logger.error(f"[SEGMENTS] Réservation supprimée: {e}")
+
+
+async def on_contact_changed(db, contact: Dict[str, Any], previous: Optional[Dict[str, Any]] = None, collection: str = "chat_participants"):
+    """Contact créé ou modifié: réévalue les règles 'abonnés' et 'WhatsApp' et suit les changements d'email."""
+    try:
+        if previous and contact_key(previous) != contact_key(contact):
+            await db.segment_members.update_many(
+                {"contact_key": contact_key(previous)},
+                {"$set": {**{f: contact.get(f) or "" for f in MEMBER_FIELDS}, "contact_key": contact_key(contact)}}
+            )
+        else:
+            await db.segment_members.update_many(
+                {"id": contact.get("id")},
+                {"$set": {f: contact.get(f) or "" for f in MEMBER_FIELDS}}
+            )
+        async for segment in _segments_for(db, [RULE_HAS_WHATSAPP, RULE_SUBSCRIBERS]):
+            # users n'a pas de coach_id: seuls les segments Super Admin les incluent
+            if collection == "users" and segment.get("coach_id"):
+                continue
+            if not in_scope(segment, contact):
+                continue
+            if contact_matches(segment["rule"], contact):
+                await _upsert_member(db, segment, contact)
+            elif segment["rule"]["type"] == RULE_HAS_WHATSAPP:
+                await _remove_member(db, segment, contact)
+            elif segment["rule"]["type"] == RULE_SUBSCRIBERS and previous and previous.get("isSubscriber"):
+                await _remove_member(db, segment, contact)
+    except Exception as e:
+        logger.error(f"[SEGMENTS] Contact modifié: {e}")
+
+
+async def on_contact_deleted(db, contact_id: str):
+    """Contact supprimé: il quitte tous les segments."""
+    try:
+        for segment_id in await db.segment_members.distinct("segment_id", {"id": contact_id}):
+            result = await db.segment_members.delete_many({"segment_id": segment_id, "id": contact_id})
+            await _count_members(db, segment_id, -result.deleted_count)
+    except Exception as e:
+        logger.error(f"[SEGMENTS] Contact supprimé: {e}")
+
+
+async def _find_contacts_by_ids(db, ids: List[str]) -> List[Dict[str, Any]]:
+    projection = {"_id": 0, **{f: 1 for f in MEMBER_FIELDS}}
+    contacts = []
+    for start in range(0, len(ids), GROUP_IDS_CHUNK):
+        chunk = ids[start:start + GROUP_IDS_CHUNK]
+        for collection in ("users", "chat_participants"):
+            contacts.extend(await db[collection].find({"id": {"$in": chunk}}, projection).to_list(None))
+    return contacts
+
+
+async def on_group_membership_changed(db, group_id: str, participant_id: str, joined: bool):
+    """Adhésion / départ d'un groupe de chat."""
+    try:
+        contact = None
+        async for segment in _segments_for(db, [RULE_GROUP_MEMBER], {"rule.group_id": group_id}):
+            if not joined:
+                result = await db.segment_members.delete_many({"segment_id": segment["id"], "id": participant_id})
+                await _count_members(db, segment["id"], -result.deleted_count)
+                continue
+            if contact is None:
+                # Contact chargé au premier segment concerné seulement
+                contact = next(iter(await _find_contacts_by_ids(db, [participant_id])), {})
+            if contact:
+                await _upsert_member(db, segment, contact)
+    except Exception as e:
+        logger.error(f"[SEGMENTS] Adhésion groupe: {e}")
+
+
+# ==================== RECONSTRUCTION COMPLÈTE ====================
+
+async def _iter_rule_members(db, segment: Dict[str, Any]):
+    """Génère (contact, expires_at) pour tous les membres d'un segment, depuis les collections sources."""
+    rule = segment["rule"]
+    scope = {"coach_id": segment["coach_id"]} if segment.get("coach_id") else {}
+    contact_projection = {"_id": 0, "isSubscriber": 1, **{f: 1 for f in MEMBER_FIELDS}}
+    reservation_projection = {"_id": 0, "id": 1, "userId": 1, "userName": 1, "userEmail": 1, "userWhatsapp": 1, "createdAt": 1, "type": 1}
+
+    if rule["type"] == RULE_RESERVED_WITHIN_DAYS:
+        cutoff = datetime.now(timezone.utc) - timedelta(days=rule["days"])
+        # createdAt est stocké en ISO (chaîne) ou en datetime selon l'historique: on filtre côté Python
+        async for reservation in db.reservations.find(scope, reservation_projection).batch_size(BULK_BATCH_SIZE):
+            created = parse_datetime(reservation.get("createdAt"))
+            if created and created >= cutoff:
+                yield contact_from_reservation(reservation), reservation_expiry(rule, reservation)
+
+    elif rule["type"] == RULE_SUBSCRIBERS:
+        query = {**scope, "type": {"$in": SUBSCRIBER_RESERVATION_TYPES}}
+        async for reservation in db.reservations.find(query, reservation_projection).batch_size(BULK_BATCH_SIZE):
+            yield contact_from_reservation(reservation), None
+        async for contact in db.chat_participants.find({**scope, "isSubscriber": True}, contact_projection).batch_size(BULK_BATCH_SIZE):
+            yield contact, None
+
+    elif rule["type"] == RULE_HAS_WHATSAPP:
+        query = {"whatsapp": {"$nin": ["", None]}}
+        collections = ["chat_participants"] if scope else ["users", "chat_participants"]
+        for collection in collections:
+            async for contact in db[collection].find({**scope, **query}, contact_projection).batch_size(BULK_BATCH_SIZE):
+                if contact_matches(rule, contact):
+                    yield contact, None
+
+    elif rule["type"] == RULE_GROUP_MEMBER:
+        group = await db.chat_sessions.find_one({"id": rule["group_id"]}, {"_id": 0, "participant_ids": 1})
+        for contact in await _find_contacts_by_ids(db, (group or {}).get("participant_ids", [])):
+            yield contact, None
+
+
+async def rebuild_segment(db, segment: Dict[str, Any]) -> int:
+    """
+    Recalcule entièrement les membres d'un segment (création, réparation).
+    Les membres sont réécrits avec un numéro de build puis les anciens sont purgés:
+    le segment n'est jamais vide pendant la reconstruction.
+    """
+    build_id = uuid.uuid4().hex
+    started = datetime.now(timezone.utc).isoformat()
+    operations = []
+    written = set()
+    async for contact, expires_at in _iter_rule_members(db, segment):
+        member = member_document(segment["id"], contact, expires_at)
+        member["build_id"] = build_id
+        if member["contact_key"] in written and not expires_at:
+            continue
+        written.add(member["contact_key"])
+        update = {"$set": {k: v for k, v in member.items() if k != "expires_at"}}
+        if expires_at:
+            update["$max"] = {"expires_at": expires_at}
+        operations.append(UpdateOne({"segment_id": segment["id"], "contact_key": member["contact_key"]}, update, upsert=True))
+        if len(operations) >= BULK_BATCH_SIZE:
+            await db.segment_members.bulk_write(operations, ordered=False)
+            operations = []
+    if operations:
+        await db.segment_members.bulk_write(operations, ordered=False)
+
+    # Purge des lignes antérieures au build: celles écrites par les hooks pendant la reconstruction restent
+    await db.segment_members.delete_many({
+        "segment_id": segment["id"], "build_id": {"$ne": build_id},
+        "$or": [{"updated_at": {"$lt": started}}, {"updated_at": {"$exists": False}}]
+    })
+    # Recompte exact: inclut les membres ajoutés par les hooks pendant la reconstruction
+    member_count = await db.segment_members.count_documents({"segment_id": segment["id"]})
+    now = datetime.now(timezone.utc).isoformat()
+    await db.segments.update_one({"id": segment["id"]}, {"$set": {"member_count": member_count, "built_at": now, "updated_at": now}})
+    logger.info(f"[SEGMENTS] Segment '{segment.get('name', segment['id'])}' reconstruit: {member_count} membre(s)")
+    return member_count
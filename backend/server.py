@@ -1,10 +1,10 @@
 # VERSION 7.0 - PRODUCTION READY - NE PAS MODIFIER login/tri/sync
-from fastapi import FastAPI, APIRouter, HTTPException, Request, Response, UploadFile, File, Form, BackgroundTasks
+from fastapi import FastAPI, APIRouter, Depends, HTTPException, Query, Request, Response, UploadFile, File, Form, BackgroundTasks
 from fastapi.responses import JSONResponse
-from fastapi.staticfiles import StaticFiles
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
 import os
 import logging
 from pathlib import Path
@@ -15,6 +15,7 @@ from datetime import datetime, timezone, timedelta
 import stripe
 import asyncio
 import json
+import hashlib
 import socketio
 
 # Web Push imports
@@ -40,7 +41,36 @@ from routes.reservation_routes import reservation_router, init_reservation_db
 # v9.1.9: Import routes auth
 from routes.auth_routes import auth_router, legacy_auth_router, init_auth_db
 # v9.2.0: Import routes promo codes
-from routes.promo_routes import promo_router, init_promo_db
+from routes.promo_routes import promo_router, init_promo_db, build_discount_codes, discount_codes_tenant
+from audience import (aiter_audience, normalize_email, CampaignResultWriter, CAMPAIGN_RESULTS,
+                      ensure_campaign_result_indexes)
+from routes.segment_routes import segment_router, init_segment_db, check_campaign_segment
+from segments import ensure_segment_indexes, on_contact_changed, on_contact_deleted, on_group_membership_changed
+from image_variants import process_image, variant_urls, primary_variant, shutdown_image_pool, VARIANT_SIZES, AVATAR_SIZES, LOGO_SIZES
+from streaming_upload import receive_multipart
+from blob_store import store_image, adjust_refs, BLOBS_DIR
+from media_files import MediaFiles, precompress, precompress_directory, PRECOMPRESS_EXTENSIONS
+from media_handler import annotate_message, annotate_messages, backfill_media_fields
+from thumb_proxy import ThumbnailCache, thumbnail_response
+from response_cache import catalog_cache, entry_response, encode_body, ALL_TENANTS
+from vitrine import ensure_vitrine_indexes, rebuild_vitrines, refresh_vitrines, vitrine_scope
+from session_auth import init_session_db, ensure_session_indexes
+from promo_index import ensure_promo_indexes
+from export_stream import CONTACT_COLUMNS, parse_columns, check_format, export_response
+from reservation_pages import reset_reservation_counters, ensure_reservation_page_indexes
+from availability import (parse_window, course_availability, drop_course_occurrences, ensure_availability_indexes,
+                          seed_course_occurrences, backfill_occurrences)
+from identity import with_identity, identity_update, find_contact, backfill_identity_keys, ensure_identity_indexes
+from contact_merge import merge_duplicates, ensure_merge_indexes, acquire_merge_lease, release_merge_lease, merge_lease_held
+from bson_dates import utc_now, iso, with_dates, time_after, time_before, migrate_dates, date_migration_status
+from tenant_context import (
+    init_tenant_db, get_tenant, TenantContext, resolve_tenant, coach_profiles, mongo_call_counter, mongo_calls_middleware,
+    is_super_admin as tenant_is_super_admin, coach_filter
+)
+from video_pipeline import enqueue_video_job, resolve_video_urls, resume_video_jobs, concept_fields, FFMPEG_AVAILABLE
+from emoji_store import (
+    EmojiManifest, DirectoryListing, decode_data_url, save_emoji_file, manifest_entry, migrate_base64_emojis
+)
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -69,7 +99,9 @@ mongo_url = os.environ.get('MONGO_URL')
 if not mongo_url:
     raise RuntimeError("MONGO_URL required")
 
-client = AsyncIOMotorClient(mongo_url)
+# mongo_call_counter: en-tête X-Mongo-Calls par requête (tenant_context)
+# tz_aware: les dates BSON (bson_dates) reviennent en UTC explicite -> JSON '+00:00' comme les anciennes chaînes
+client = AsyncIOMotorClient(mongo_url, event_listeners=[mongo_call_counter], tz_aware=True, tzinfo=timezone.utc)
 db = client[os.environ.get('DB_NAME', 'afroboost_db')]
 
 # v9.1.1: Initialiser la db pour les routes modulaires
@@ -80,6 +112,9 @@ init_reservation_db(db)
 init_auth_db(db)
 # v9.2.0: Initialiser la db pour promo routes
 init_promo_db(db)
+init_session_db(db)
+init_tenant_db(db)
+init_segment_db(db)
 
 # Configure logging FIRST (needed for socketio)
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -279,44 +314,37 @@ ROLE_USER = "user"
 
 def get_user_role(email: str) -> str:
     """Détermine le rôle d'un utilisateur basé sur son email"""
-    if email and email.lower().strip() in [e.lower() for e in SUPER_ADMIN_EMAILS]:
-        return ROLE_SUPER_ADMIN
-    return ROLE_USER
+    return ROLE_SUPER_ADMIN if tenant_is_super_admin(email) else ROLE_USER
 
 def is_super_admin(email: str) -> bool:
     """Vérifie si l'email est celui d'un Super Admin"""
-    return email and email.lower().strip() in [e.lower() for e in SUPER_ADMIN_EMAILS]
+    return tenant_is_super_admin(email)
 
 def get_coach_filter(email: str) -> dict:
     """Retourne le filtre MongoDB pour l'isolation des données coach"""
-    if is_super_admin(email):
-        return {}
-    return {"coach_id": email.lower().strip()}
+    return coach_filter(email)
 
 # v9.0.2: Helper pour déduire les crédits
 async def deduct_credit(coach_email: str, action: str = "action") -> dict:
-    """Déduit 1 crédit du compte coach. Retourne {success, credits_remaining, error}"""
+    """Déduit 1 crédit du compte coach (décrément atomique). Retourne {success, credits_remaining, error}"""
     if is_super_admin(coach_email):
         return {"success": True, "credits_remaining": -1, "bypassed": True}
-    coach = await db.coaches.find_one({"email": coach_email.lower()})
+    coach = await db.coaches.find_one_and_update(
+        {"email": coach_email.lower(), "credits": {"$gt": 0}},
+        {"$inc": {"credits": -1}, "$set": {"updated_at": datetime.now(timezone.utc).isoformat()}},
+        projection={"_id": 0, "credits": 1}, return_document=ReturnDocument.AFTER
+    )
+    coach_profiles.invalidate(coach_email)
     if not coach:
-        return {"success": False, "error": "Coach non trouvé", "credits_remaining": 0}
-    current_credits = coach.get("credits", 0)
-    if current_credits <= 0:
+        if not await coach_profiles.get(db, coach_email):
+            return {"success": False, "error": "Coach non trouvé", "credits_remaining": 0}
         return {"success": False, "error": "Crédits insuffisants", "credits_remaining": 0}
-    await db.coaches.update_one({"email": coach_email.lower()}, {"$inc": {"credits": -1}, "$set": {"updated_at": datetime.now(timezone.utc).isoformat()}})
-    logger.info(f"[CREDITS] {coach_email} -1 crédit ({action}) -> {current_credits - 1} restants")
-    return {"success": True, "credits_remaining": current_credits - 1}
+    logger.info(f"[CREDITS] {coach_email} -1 crédit ({action}) -> {coach['credits']} restants")
+    return {"success": True, "credits_remaining": coach["credits"]}
 
 async def check_credits(coach_email: str) -> dict:
-    """Vérifie le solde de crédits sans déduire"""
-    if is_super_admin(coach_email):
-        return {"has_credits": True, "credits": -1, "unlimited": True}
-    coach = await db.coaches.find_one({"email": coach_email.lower()})
-    if not coach:
-        return {"has_credits": False, "credits": 0, "error": "Coach non trouvé"}
-    credits = coach.get("credits", 0)
-    return {"has_credits": credits > 0, "credits": credits}
+    """Vérifie le solde de crédits sans déduire (profil coach en cache court)"""
+    return (await resolve_tenant(db, coach_email)).credits_snapshot()
 
 # ASGI app
 app = socketio.ASGIApp(sio, other_asgi_app=fastapi_app)
@@ -357,30 +385,50 @@ async def api_favicon():
 # Créer le dossier emojis s'il n'existe pas
 EMOJIS_DIR = ROOT_DIR / "uploads" / "emojis"
 EMOJIS_DIR.mkdir(parents=True, exist_ok=True)
+# Emojis uploadés via /chat/emojis, nommés par hash (servis sous /api/emojis/custom/)
+CUSTOM_EMOJIS_DIR = EMOJIS_DIR / "custom"
+CUSTOM_EMOJIS_DIR.mkdir(parents=True, exist_ok=True)
+emoji_manifest = EmojiManifest()
+emoji_listing = DirectoryListing(str(EMOJIS_DIR), ('.png', '.jpg', '.jpeg', '.gif', '.webp', '.svg'))
 
-# Monter les fichiers statiques pour les emojis
+# Monter les fichiers statiques pour les emojis (SVG servis précompressés .br/.gz)
 try:
-    fastapi_app.mount("/api/emojis", StaticFiles(directory=str(EMOJIS_DIR)), name="emojis")
+    precompress_directory(str(EMOJIS_DIR))
+    fastapi_app.mount("/api/emojis", MediaFiles(directory=str(EMOJIS_DIR), precompressed=True, max_age=86400), name="emojis")
     logger.info(f"[EMOJIS] Dossier monté: {EMOJIS_DIR}")
 except Exception as e:
     logger.warning(f"[EMOJIS] Impossible de monter le dossier: {e}")
 
 # Monter les fichiers statiques pour les photos de profil
+# MediaFiles: ETag fort + 304, cache immutable des noms hashés, Range pour les vidéos
 try:
     import os
     UPLOADS_DIR = "/app/backend/uploads/profiles"
     os.makedirs(UPLOADS_DIR, exist_ok=True)
-    fastapi_app.mount("/api/uploads/profiles", StaticFiles(directory=UPLOADS_DIR), name="profile_photos")
+    fastapi_app.mount("/api/uploads/profiles", MediaFiles(directory=UPLOADS_DIR), name="profile_photos")
     logger.info(f"[UPLOADS] Dossier photos de profil monté: {UPLOADS_DIR}")
     
     # v9.3.1: Monter le dossier d'uploads des coaches (isolé par coach_id)
     COACHES_UPLOADS_DIR = "/app/backend/uploads/coaches"
     os.makedirs(COACHES_UPLOADS_DIR, exist_ok=True)
-    fastapi_app.mount("/api/uploads/coaches", StaticFiles(directory=COACHES_UPLOADS_DIR), name="coach_assets")
+    fastapi_app.mount("/api/uploads/coaches", MediaFiles(directory=COACHES_UPLOADS_DIR), name="coach_assets")
     logger.info(f"[UPLOADS] Dossier assets coaches monté: {COACHES_UPLOADS_DIR}")
+    
+    # Blob store adressé par contenu (photos de profil dédoublonnées)
+    os.makedirs(BLOBS_DIR, exist_ok=True)
+    fastapi_app.mount("/api/uploads/blobs", MediaFiles(directory=BLOBS_DIR), name="blobs")
+    logger.info(f"[UPLOADS] Blob store monté: {BLOBS_DIR}")
 except Exception as e:
     logger.warning(f"[UPLOADS] Impossible de monter le dossier: {e}")
 
+# Proxy des miniatures YouTube / Drive (cache disque LRU, /api/media/thumb/{hash})
+thumb_cache = ThumbnailCache()
+
+@api_router.get("/media/thumb/{key}")
+async def get_media_thumbnail(key: str, request: Request):
+    """Miniature distante servie depuis le cache local (téléchargée une fois, requêtes simultanées fusionnées)."""
+    return await thumbnail_response(thumb_cache, key, request.headers)
+
 # === MODELS ===
 
 class Course(BaseModel):
@@ -395,6 +443,7 @@ class Course(BaseModel):
     visible: bool = True
     archived: bool = False  # Archive au lieu de supprimer
     playlist: Optional[List[str]] = None  # Liste des URLs audio pour ce cours
+    capacity: Optional[int] = None  # Places par séance (None = illimité)
 
 class CourseCreate(BaseModel):
     name: str
@@ -405,6 +454,7 @@ class CourseCreate(BaseModel):
     visible: bool = True
     archived: bool = False
     playlist: Optional[List[str]] = None  # Liste des URLs audio
+    capacity: Optional[int] = None  # Places par séance (None = illimité)
 
 class Offer(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -582,8 +632,9 @@ class Campaign(BaseModel):
     message: str
     mediaUrl: Optional[str] = ""
     mediaFormat: str = "16:9"  # "9:16" or "16:9"
-    targetType: str = "all"  # "all" or "selected"
+    targetType: str = "all"  # "all", "selected" or "segment"
     selectedContacts: List[str] = []
+    targetSegmentId: Optional[str] = None  # ID du segment sauvegardé (targetType "segment")
     channels: dict = Field(default_factory=lambda: {"whatsapp": True, "email": False, "instagram": False, "group": False, "internal": False})
     targetGroupId: Optional[str] = "community"  # ID du groupe cible pour le canal "group"
     targetIds: Optional[List[str]] = []  # Tableau des IDs du panier (nouveau système)
@@ -606,6 +657,7 @@ class CampaignCreate(BaseModel):
     mediaFormat: str = "16:9"
     targetType: str = "all"
     selectedContacts: List[str] = []
+    targetSegmentId: Optional[str] = None
     channels: dict = Field(default_factory=lambda: {"whatsapp": True, "email": False, "instagram": False, "group": False, "internal": False})
     targetGroupId: Optional[str] = "community"  # ID du groupe cible pour le canal "group"
     targetIds: Optional[List[str]] = []  # Tableau des IDs du panier (nouveau système)
@@ -624,6 +676,8 @@ class Concept(BaseModel):
     description: str = "Le concept Afroboost : cardio + danse afrobeat + casques audio immersifs. Un entraînement fun, énergétique et accessible à tous."
     heroImageUrl: str = ""
     heroVideoUrl: str = ""
+    heroPosterUrl: str = ""  # Affiche extraite de la vidéo hero (video_pipeline)
+    heroHlsUrl: str = ""  # Master playlist HLS (si VIDEO_HLS_LADDER)
     logoUrl: str = ""
     faviconUrl: str = ""
     termsText: str = ""  # CGV - Conditions Générales de Vente
@@ -653,6 +707,8 @@ class ConceptUpdate(BaseModel):
     description: Optional[str] = None
     heroImageUrl: Optional[str] = None
     heroVideoUrl: Optional[str] = None
+    heroPosterUrl: Optional[str] = None
+    heroHlsUrl: Optional[str] = None
     logoUrl: Optional[str] = None
     faviconUrl: Optional[str] = None
     termsText: Optional[str] = None  # CGV - Conditions Générales de Vente
@@ -929,6 +985,15 @@ class PrivateConversation(BaseModel):
     last_message_at: Optional[str] = None
     created_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
 
+# === FONCTION UTILITAIRE: Préparation d'un message avant insertion ===
+def prepare_chat_message(doc: dict) -> dict:
+    """Fixe media_type / thumbnail_url, created_at en date BSON, et précharge la miniature dans le cache local."""
+    annotate_message(doc)
+    with_dates(doc, "chat_messages")
+    if doc.get("thumbnail_url"):
+        thumb_cache.prefetch(doc["thumbnail_url"])
+    return doc
+
 # === FONCTION UTILITAIRE: Formatage unifie des messages ===
 def format_message_for_frontend(m: dict) -> dict:
     """Convertit un message MongoDB vers le format attendu par le frontend."""
@@ -936,8 +1001,8 @@ def format_message_for_frontend(m: dict) -> dict:
         "id": m.get("id"), "type": "user" if m.get("sender_type") == "user" else ("coach" if m.get("sender_type") == "coach" else "ai"),
         "text": m.get("content", "") or m.get("text", ""), "sender": (m.get("sender_name") or m.get("sender", "")).replace("💪 ", ""),
         "senderId": m.get("sender_id") or m.get("senderId", ""), "sender_type": m.get("sender_type", "ai"),
-        "created_at": m.get("created_at"), "media_url": m.get("media_url"), "media_type": m.get("media_type"),
-        "cta_type": m.get("cta_type"), "cta_text": m.get("cta_text"), "cta_link": m.get("cta_link"),
+        "created_at": iso(m.get("created_at")), "media_url": m.get("media_url"), "media_type": m.get("media_type"),
+        "thumbnail_url": thumb_cache.public_url(m.get("thumbnail_url")), "cta_type": m.get("cta_type"), "cta_text": m.get("cta_text"), "cta_link": m.get("cta_link"),
         "broadcast": m.get("broadcast", False), "scheduled": m.get("scheduled", False)
     }
 
@@ -947,7 +1012,11 @@ async def root():
     return {"message": "Afroboost API"}
 
 @api_router.get("/courses", response_model=List[Course])
-async def get_courses():
+async def get_courses(request: Request):
+    """Cours actifs (cache versionné, ETag / 304)."""
+    return await catalog_cache.respond(request.headers, "courses", build_courses)
+
+async def build_courses():
     courses_raw = await db.courses.find({"archived": {"$ne": True}}, {"_id": 0}).to_list(100)
     if not courses_raw:
         default_courses = [
@@ -964,18 +1033,21 @@ async def get_courses():
         course_copy = dict(course)
         if "locationName" in course_copy:
             course_copy["location"] = course_copy["locationName"]
-        courses.append(course_copy)
+        courses.append(Course.model_validate(course_copy).model_dump())
     
     return courses
 
 @api_router.post("/courses", response_model=Course)
-async def create_course(course: CourseCreate):
+async def create_course(course: CourseCreate, background_tasks: BackgroundTasks):
     course_obj = Course(**course.model_dump())
     await db.courses.insert_one(course_obj.model_dump())
+    catalog_cache.bump("courses")
+    background_tasks.add_task(refresh_vitrines, db, vitrine_scope(course_obj.model_dump()))
+    background_tasks.add_task(seed_course_occurrences, db, course_obj.model_dump())
     return course_obj
 
 @api_router.put("/courses/{course_id}", response_model=Course)
-async def update_course(course_id: str, course_update: dict):
+async def update_course(course_id: str, course_update: dict, background_tasks: BackgroundTasks):
     """Update a course - supports partial updates including playlist"""
     # Récupérer le cours existant
     existing = await db.courses.find_one({"id": course_id}, {"_id": 0})
@@ -984,20 +1056,38 @@ async def update_course(course_id: str, course_update: dict):
     
     # Fusionner les données (mise à jour partielle)
     update_data = {k: v for k, v in course_update.items() if v is not None}
+    update = {"$set": update_data}
+    if "capacity" in course_update and course_update["capacity"] is None:
+        update["$unset"] = {"capacity": ""}  # Champ vidé = places illimitées
     
-    await db.courses.update_one({"id": course_id}, {"$set": update_data})
+    await db.courses.update_one({"id": course_id}, update)
+    catalog_cache.bump("courses")
     updated = await db.courses.find_one({"id": course_id}, {"_id": 0})
+    background_tasks.add_task(refresh_vitrines, db, vitrine_scope(existing, updated))
+    background_tasks.add_task(seed_course_occurrences, db, updated)
     return updated
 
 @api_router.put("/courses/{course_id}/archive")
-async def archive_course(course_id: str):
+async def archive_course(course_id: str, background_tasks: BackgroundTasks):
     """Archive a course instead of deleting it"""
     await db.courses.update_one({"id": course_id}, {"$set": {"archived": True}})
+    catalog_cache.bump("courses")
     updated = await db.courses.find_one({"id": course_id}, {"_id": 0})
+    background_tasks.add_task(refresh_vitrines, db, vitrine_scope(updated))
     return {"success": True, "course": updated}
 
+@api_router.get("/courses/{course_id}/availability")
+async def get_course_availability(course_id: str, start: Optional[str] = Query(None, alias="from"),
+                                  end: Optional[str] = Query(None, alias="to")):
+    """Places par séance entre from et to (YYYY-MM-DD, 4 semaines par défaut) - lecture seule des compteurs course_occurrences"""
+    first, last = parse_window(start, end)
+    course = await db.courses.find_one({"id": course_id}, {"_id": 0, "id": 1, "weekday": 1, "time": 1, "capacity": 1})
+    if not course:
+        raise HTTPException(status_code=404, detail="Cours non trouvé")
+    return await course_availability(db, course, first, last)
+
 @api_router.delete("/courses/{course_id}")
-async def delete_course(course_id: str):
+async def delete_course(course_id: str, background_tasks: BackgroundTasks):
     """
     HARD DELETE - Supprime PHYSIQUEMENT un cours de toutes les tables.
     Aucune trace ne doit rester dans la base de données.
@@ -1009,12 +1099,17 @@ async def delete_course(course_id: str):
     }
     
     # 1. Supprimer le cours (y compris les archivés)
+    course = await db.courses.find_one({"id": course_id}, {"_id": 0, "coach_id": 1})
     result = await db.courses.delete_one({"id": course_id})
     deleted_counts["course"] = result.deleted_count
+    catalog_cache.bump("courses")
+    background_tasks.add_task(refresh_vitrines, db, vitrine_scope(course))
     
     # 2. Supprimer TOUTES les réservations liées à ce cours
     result = await db.reservations.delete_many({"courseId": course_id})
     deleted_counts["reservations"] = result.deleted_count
+    await reset_reservation_counters(db)
+    await drop_course_occurrences(db, [course_id])
     
     # 3. Supprimer les sessions/références potentielles liées au cours
     # (au cas où des sessions de chat sont liées à un cours spécifique)
@@ -1043,13 +1138,13 @@ async def delete_course(course_id: str):
     }
 
 @api_router.delete("/courses/purge/archived")
-async def purge_archived_courses():
+async def purge_archived_courses(background_tasks: BackgroundTasks):
     """
     PURGE TOTAL - Supprime tous les cours archivés et leurs données liées.
     Utilisé pour nettoyer la base de données des cours obsolètes.
     """
     # Trouver tous les cours archivés
-    archived_courses = await db.courses.find({"archived": True}, {"id": 1}).to_list(1000)
+    archived_courses = await db.courses.find({"archived": True}, {"id": 1, "coach_id": 1}).to_list(1000)
     archived_ids = [c["id"] for c in archived_courses]
     
     if not archived_ids:
@@ -1057,9 +1152,13 @@ async def purge_archived_courses():
     
     # Supprimer les cours archivés
     deleted_courses = await db.courses.delete_many({"archived": True})
+    catalog_cache.bump("courses")
+    background_tasks.add_task(refresh_vitrines, db, vitrine_scope(*archived_courses))
     
     # Supprimer les réservations liées
     deleted_reservations = await db.reservations.delete_many({"courseId": {"$in": archived_ids}})
+    await reset_reservation_counters(db)
+    await drop_course_occurrences(db, archived_ids)
     
     logger.info(f"[PURGE] Supprimé {deleted_courses.deleted_count} cours archivés et {deleted_reservations.deleted_count} réservations")
     
@@ -1081,7 +1180,11 @@ async def purge_archived_courses():
 
 # --- Offers ---
 @api_router.get("/offers", response_model=List[Offer])
-async def get_offers():
+async def get_offers(request: Request):
+    """Offres (cache versionné, ETag / 304)."""
+    return await catalog_cache.respond(request.headers, "offers", build_offers)
+
+async def build_offers():
     offers = await db.offers.find({}, {"_id": 0}).to_list(100)
     if not offers:
         default_offers = [
@@ -1090,38 +1193,50 @@ async def get_offers():
             {"id": str(uuid.uuid4()), "name": "Abonnement 1 mois", "price": 109, "thumbnail": "", "videoUrl": "", "description": "", "visible": True}
         ]
         await db.offers.insert_many(default_offers)
-        return default_offers
-    return offers
+        offers = default_offers
+    return [Offer.model_validate(offer).model_dump() for offer in offers]
 
 @api_router.post("/offers", response_model=Offer)
-async def create_offer(offer: OfferCreate):
+async def create_offer(offer: OfferCreate, background_tasks: BackgroundTasks):
     offer_obj = Offer(**offer.model_dump())
     await db.offers.insert_one(offer_obj.model_dump())
+    catalog_cache.bump("offers")
+    background_tasks.add_task(refresh_vitrines, db, vitrine_scope(offer_obj.model_dump()))
     return offer_obj
 
 @api_router.put("/offers/{offer_id}", response_model=Offer)
-async def update_offer(offer_id: str, offer: OfferCreate):
+async def update_offer(offer_id: str, offer: OfferCreate, background_tasks: BackgroundTasks):
     await db.offers.update_one({"id": offer_id}, {"$set": offer.model_dump()})
+    catalog_cache.bump("offers")
     updated = await db.offers.find_one({"id": offer_id}, {"_id": 0})
+    background_tasks.add_task(refresh_vitrines, db, vitrine_scope(updated))
     return updated
 
 @api_router.delete("/offers/{offer_id}")
-async def delete_offer(offer_id: str):
+async def delete_offer(offer_id: str, background_tasks: BackgroundTasks):
     """Supprime une offre et nettoie les références dans les codes promo"""
     # 1. Supprimer l'offre
+    offer = await db.offers.find_one({"id": offer_id}, {"_id": 0, "coach_id": 1})
     await db.offers.delete_one({"id": offer_id})
+    catalog_cache.bump("offers")
+    background_tasks.add_task(refresh_vitrines, db, vitrine_scope(offer))
     
     # 2. Nettoyer les références dans les codes promo (retirer l'offre des 'courses'/articles autorisés)
     await db.discount_codes.update_many(
         {"courses": offer_id},
         {"$pull": {"courses": offer_id}}
     )
+    catalog_cache.bump("discount-codes")
     
     return {"success": True, "message": "Offre supprimée et références nettoyées"}
 
 # --- Product Categories ---
 @api_router.get("/categories")
-async def get_categories():
+async def get_categories(request: Request):
+    """Catégories produits (cache versionné, ETag / 304)."""
+    return await catalog_cache.respond(request.headers, "categories", build_categories)
+
+async def build_categories():
     categories = await db.categories.find({}, {"_id": 0}).to_list(100)
     return categories if categories else [
         {"id": "service", "name": "Services & Cours", "icon": "🎧"},
@@ -1135,6 +1250,7 @@ async def get_categories():
 async def create_category(category: dict):
     category["id"] = category.get("id") or str(uuid.uuid4())[:8]
     await db.categories.insert_one(category)
+    catalog_cache.bump("categories")
     return category
 
 # --- Users ---
@@ -1151,7 +1267,8 @@ async def create_user(user: UserCreate):
     user_obj = User(**user.model_dump())
     doc = user_obj.model_dump()
     doc['createdAt'] = doc['createdAt'].isoformat()
-    await db.users.insert_one(doc)
+    await db.users.insert_one(with_identity(doc))
+    await on_contact_changed(db, doc, collection="users")
     return user_obj
 
 @api_router.get("/users/{user_id}", response_model=User)
@@ -1171,8 +1288,9 @@ async def update_user(user_id: str, user: UserCreate):
         raise HTTPException(status_code=404, detail="User not found")
     
     update_data = user.model_dump()
-    await db.users.update_one({"id": user_id}, {"$set": update_data})
+    await db.users.update_one({"id": user_id}, {"$set": identity_update(update_data)})
     updated = await db.users.find_one({"id": user_id}, {"_id": 0})
+    await on_contact_changed(db, updated, previous=existing, collection="users")
     if isinstance(updated.get('createdAt'), str):
         updated['createdAt'] = datetime.fromisoformat(updated['createdAt'].replace('Z', '+00:00'))
     return updated
@@ -1189,6 +1307,7 @@ async def delete_user(user_id: str):
     
     # 2. Supprimer l'utilisateur
     await db.users.delete_one({"id": user_id})
+    await on_contact_deleted(db, user_id)
     
     # 3. Nettoyer les références dans les codes promo (retirer l'email des assignedEmail)
     if user_email:
@@ -1196,6 +1315,7 @@ async def delete_user(user_id: str):
             {"assignedEmail": user_email},
             {"$set": {"assignedEmail": None}}
         )
+        catalog_cache.bump("discount-codes")
     
     return {"success": True, "message": "Contact supprimé et références nettoyées"}
 
@@ -1205,15 +1325,13 @@ async def upload_user_photo(file: UploadFile = File(...), participant_id: str =
     """
     MOTEUR D'UPLOAD RÉEL - Sauvegarde physique + DB
     1. Reçoit l'image via UploadFile
-    2. Redimensionne à 200x200 max
-    3. Sauvegarde dans /app/backend/uploads/profiles/
-    4. Met à jour photo_url dans la collection 'users' ET 'chat_participants'
+    2. Génère les variantes 64/200 px (JPEG + WebP) dans le pool d'images, hors boucle
+    3. Sauvegarde dans le blob store (uploads/blobs/, adressé par SHA-256: une photo
+       identique n'est ni réécrite ni retraitée)
+    4. Met à jour photo_url (+ photo_variants) dans la collection 'users' ET 'chat_participants'
+       et les compteurs de références des blobs (ancienne photo libérée pour le GC)
     5. Retourne l'URL pour synchronisation
     """
-    from PIL import Image
-    import io
-    import uuid
-    import os
     
     # Validation du type MIME
     if not file.content_type or not file.content_type.startswith("image/"):
@@ -1227,51 +1345,49 @@ async def upload_user_photo(file: UploadFile = File(...), participant_id: str =
         raise HTTPException(status_code=400, detail="Fichier trop volumineux (max 2MB)")
     
     try:
-        # Ouvrir et traiter l'image
-        img = Image.open(io.BytesIO(contents))
-        
-        # Convertir en RGB si nécessaire (RGBA, P modes)
-        if img.mode in ('RGBA', 'P'):
-            img = img.convert('RGB')
-        
-        # Redimensionner à max 200x200 en conservant les proportions
-        img.thumbnail((200, 200), Image.LANCZOS)
-        
-        # Créer le dossier s'il n'existe pas
-        upload_dir = "/app/backend/uploads/profiles"
-        os.makedirs(upload_dir, exist_ok=True)
-        
-        # Générer un nom de fichier unique
-        filename = f"{participant_id}_{uuid.uuid4().hex[:8]}.jpg"
-        filepath = os.path.join(upload_dir, filename)
-        
-        # Sauvegarder l'image PHYSIQUEMENT sur le serveur
-        img.save(filepath, "JPEG", quality=85)
+        # Décodage + variantes dans le pool de processus (un seul décodage, sauté si déjà connu)
+        blob = await store_image(db, contents, AVATAR_SIZES)
+        variants = blob["variants"]
         
-        # URL relative pour accès via l'API
-        photo_url = f"/api/uploads/profiles/{filename}"
+        # URL relative historique = variante 200 px JPEG
+        photo_url = primary_variant(blob, 200)["jpeg"]
+        filename = photo_url.rsplit("/", 1)[-1]
         
         # === MISE À JOUR BASE DE DONNÉES ===
+        photo_fields = {"photo_url": photo_url, "photoUrl": photo_url, "photo_variants": variants}
+        user_query = {"$or": [{"id": participant_id}, {"participant_id": participant_id}]}
+        previous_user = await db.users.find_one(user_query, {"_id": 0})
+        previous_participant = await db.chat_participants.find_one({"id": participant_id}, {"_id": 0})
         # 1. Mettre à jour dans la collection 'users' (par participant_id OU email)
         update_result_users = await db.users.update_one(
-            {"$or": [{"id": participant_id}, {"participant_id": participant_id}]},
-            {"$set": {"photo_url": photo_url, "photoUrl": photo_url}},
+            user_query,
+            {"$set": photo_fields},
             upsert=False
         )
         
         # 2. Mettre à jour dans 'chat_participants' si existe
         update_result_participants = await db.chat_participants.update_one(
             {"id": participant_id},
-            {"$set": {"photo_url": photo_url, "photoUrl": photo_url}},
+            {"$set": photo_fields},
             upsert=False
         )
         
-        logger.info(f"[UPLOAD] ✅ Photo uploadée: {filename} | users={update_result_users.modified_count}, participants={update_result_participants.modified_count}")
+        # 3. Références: +1 par document pointant vers la nouvelle photo, -1 pour l'ancienne
+        previous = [doc.get("photo_url") for doc in (previous_user, previous_participant) if doc]
+        await adjust_refs(db, added=[photo_url] * len(previous), removed=previous)
+        # 4. Segments: champs recopiés des membres tenus à jour
+        if previous_user:
+            await on_contact_changed(db, {**previous_user, **photo_fields}, previous=previous_user, collection="users")
+        if previous_participant:
+            await on_contact_changed(db, {**previous_participant, **photo_fields}, previous=previous_participant)
+        
+        logger.info(f"[UPLOAD] ✅ Photo uploadée: {filename}{' (dédoublonnée)' if blob['deduplicated'] else ''} | users={update_result_users.modified_count}, participants={update_result_participants.modified_count}")
         
         return {
             "success": True,
             "url": photo_url,
             "filename": filename,
+            "variants": variants,
             "participant_id": participant_id,
             "db_updated": {
                 "users": update_result_users.modified_count,
@@ -1285,18 +1401,15 @@ async def upload_user_photo(file: UploadFile = File(...), participant_id: str =
 
 # === v9.3.1: UPLOAD ISOLÉ PAR COACH ===
 @api_router.post("/coach/upload-asset")
-async def upload_coach_asset(
-    request: Request,
-    file: UploadFile = File(...), 
-    asset_type: str = Form("image")  # "image", "video", "logo"
-):
+async def upload_coach_asset(request: Request, asset_type: Optional[str] = None):
     """
     Upload d'assets pour les coaches - ISOLÉ par coach_id
     Les fichiers sont stockés dans /uploads/coaches/{coach_id}/
+    Corps multipart (file + asset_type "image"|"video"|"logo", aussi accepté en query) reçu
+    EN FLUX (streaming_upload): limite de taille vérifiée à chaque chunk, SHA-256 calculé
+    au passage, publication par rename atomique. Mémoire bornée même pour 50 MB de vidéo.
+    Images et logos: variantes responsives JPEG + WebP générées hors boucle (image_variants)
     """
-    from PIL import Image
-    import io
-    import uuid
     import os
     
     coach_email = request.headers.get('X-User-Email', '').lower().strip()
@@ -1312,24 +1425,32 @@ async def upload_coach_asset(
         "video": ["video/mp4", "video/webm", "video/quicktime"],
         "logo": ["image/jpeg", "image/png", "image/webp", "image/svg+xml"]
     }
+    # Limite de taille selon le type
+    max_sizes = {"image": 5*1024*1024, "video": 50*1024*1024, "logo": 2*1024*1024}
     
-    if asset_type not in allowed_types:
-        raise HTTPException(status_code=400, detail=f"Type d'asset invalide: {asset_type}")
+    def validate_asset(asset_type: str, content_type: str) -> int:
+        if asset_type not in allowed_types:
+            raise HTTPException(status_code=400, detail=f"Type d'asset invalide: {asset_type}")
+        if content_type not in allowed_types[asset_type]:
+            raise HTTPException(status_code=400, detail=f"Type MIME non autorisé pour {asset_type}: {content_type}")
+        return max_sizes[asset_type]
     
-    if file.content_type not in allowed_types[asset_type]:
-        raise HTTPException(status_code=400, detail=f"Type MIME non autorisé pour {asset_type}: {file.content_type}")
+    def check_file(fields: dict, content_type: str):
+        # asset_type reçu avant le fichier: refus / limite exacte dès les en-têtes du fichier
+        known_type = asset_type or fields.get("asset_type")
+        return validate_asset(known_type, content_type) if known_type else None
     
-    contents = await file.read()
-    
-    # Limite de taille selon le type
-    max_sizes = {"image": 5*1024*1024, "video": 50*1024*1024, "logo": 2*1024*1024}
-    if len(contents) > max_sizes.get(asset_type, 5*1024*1024):
-        raise HTTPException(status_code=400, detail=f"Fichier trop volumineux (max {max_sizes[asset_type]//1024//1024}MB)")
+    # v9.3.1: Dossier isolé par coach (le temporaire y est créé pour un rename atomique)
+    upload_dir = f"/app/backend/uploads/coaches/{coach_folder}"
+    fields, upload = await receive_multipart(request, upload_dir, max(max_sizes.values()), check_file=check_file)
+    if upload is None:
+        raise HTTPException(status_code=400, detail="Fichier requis")
     
     try:
-        # v9.3.1: Dossier isolé par coach
-        upload_dir = f"/app/backend/uploads/coaches/{coach_folder}"
-        os.makedirs(upload_dir, exist_ok=True)
+        asset_type = asset_type or fields.get("asset_type") or "image"
+        limit = validate_asset(asset_type, upload.content_type)
+        if upload.size > limit:
+            raise HTTPException(status_code=413, detail=f"Fichier trop volumineux (max {limit//1024//1024}MB)")
         
         # Extension basée sur le type MIME
         ext_map = {
@@ -1337,43 +1458,55 @@ async def upload_coach_asset(
             "video/mp4": ".mp4", "video/webm": ".webm", "video/quicktime": ".mov",
             "image/svg+xml": ".svg"
         }
-        ext = ext_map.get(file.content_type, ".bin")
-        
-        filename = f"{asset_type}_{uuid.uuid4().hex[:12]}{ext}"
-        filepath = os.path.join(upload_dir, filename)
-        
-        # Pour les images, optimiser
-        if asset_type in ["image", "logo"] and file.content_type.startswith("image/") and file.content_type != "image/svg+xml":
-            img = Image.open(io.BytesIO(contents))
-            if img.mode in ('RGBA', 'P'):
-                img = img.convert('RGB')
-            
-            # Redimensionner selon le type
-            max_dim = 1920 if asset_type == "image" else 400
-            img.thumbnail((max_dim, max_dim), Image.LANCZOS)
-            
-            img.save(filepath, "JPEG" if ext == ".jpg" else "PNG", quality=85)
+        ext = ext_map.get(upload.content_type, ".bin")
+        
+        # Nom dérivé du contenu: un même fichier renvoyé deux fois n'est pas dupliqué
+        basename = f"{asset_type}_{upload.sha256[:12]}"
+        filename = f"{basename}{ext}"
+        variants = None
+        
+        # Pour les images, optimiser: variantes responsives dans le pool d'images
+        if asset_type in ["image", "logo"] and upload.content_type.startswith("image/") and upload.content_type != "image/svg+xml":
+            sizes = VARIANT_SIZES if asset_type == "image" else LOGO_SIZES
+            result = await process_image(upload.path, upload_dir, basename, sizes)
+            variants = variant_urls(result, f"/api/uploads/coaches/{coach_folder}")
+            filename = primary_variant(result, max(sizes))["jpeg"]
         else:
-            # Vidéos et SVG: sauvegarder tel quel
-            with open(filepath, 'wb') as f:
-                f.write(contents)
+            # Vidéos et SVG: publication atomique du fichier reçu
+            upload.commit(os.path.join(upload_dir, filename))
         
         # URL publique
         asset_url = f"/api/uploads/coaches/{coach_folder}/{filename}"
         
-        logger.info(f"[COACH-UPLOAD] ✅ Asset uploadé pour {coach_email}: {filename} ({asset_type})")
+        # Vidéos: faststart + affiche (+ HLS) en arrière-plan, le concept est mis à jour à la fin
+        media_job_id = None
+        if asset_type == "video":
+            media_job_id = await enqueue_video_job(
+                db, os.path.join(upload_dir, filename), asset_url, upload_dir,
+                f"/api/uploads/coaches/{coach_folder}", upload.sha256[:12], owner=coach_email
+            )
+        
+        logger.info(f"[COACH-UPLOAD] ✅ Asset uploadé pour {coach_email}: {filename} ({asset_type}, {upload.size} octets)")
         
         return {
             "success": True,
             "url": asset_url,
             "filename": filename,
+            "variants": variants,
+            "sha256": upload.sha256,
+            "size": upload.size,
             "asset_type": asset_type,
+            "media_job_id": media_job_id,
             "coach_id": coach_email
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"[COACH-UPLOAD] ❌ Erreur: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Erreur upload: {str(e)}")
+    finally:
+        upload.discard()
 
 # === v9.3.1: VÉRIFICATION PARTENAIRE (CÔTÉ SERVEUR) ===
 @api_router.get("/check-partner/{email}")
@@ -1397,8 +1530,8 @@ async def check_if_partner(email: str):
             "is_super_admin": True
         }
     
-    # Vérifier si l'email a un profil coach
-    coach = await db.coaches.find_one({"email": email}, {"_id": 0, "email": 1, "name": 1, "credits": 1})
+    # Vérifier si l'email a un profil coach (cache court, invalidé par les écritures coach)
+    coach = await coach_profiles.get(db, email)
     
     if coach:
         return {
@@ -1412,7 +1545,7 @@ async def check_if_partner(email: str):
 
 # === v9.5.8: ENDPOINT DÉDUCTION CRÉDITS ===
 @api_router.post("/credits/deduct")
-async def api_deduct_credit(request: Request):
+async def api_deduct_credit(request: Request, tenant: TenantContext = Depends(get_tenant)):
     """
     Déduit 1 crédit du compte partenaire.
     Utilisé par le frontend pour les actions consommant des crédits.
@@ -1424,12 +1557,10 @@ async def api_deduct_credit(request: Request):
     except:
         action = "action"
     
-    user_email = request.headers.get('X-User-Email', '').lower().strip()
-    
-    if not user_email:
+    if not tenant.email:
         raise HTTPException(status_code=400, detail="Email non fourni")
     
-    result = await deduct_credit(user_email, action)
+    result = await deduct_credit(tenant.email, action)
     
     if not result.get("success"):
         raise HTTPException(status_code=402, detail=result.get("error", "Crédits insuffisants"))
@@ -1437,16 +1568,14 @@ async def api_deduct_credit(request: Request):
     return result
 
 @api_router.get("/credits/check")
-async def api_check_credits(request: Request):
+async def api_check_credits(tenant: TenantContext = Depends(get_tenant)):
     """
     Vérifie le solde de crédits d'un partenaire.
     """
-    user_email = request.headers.get('X-User-Email', '').lower().strip()
-    
-    if not user_email:
+    if not tenant.email:
         return {"has_credits": False, "credits": 0, "error": "Email non fourni"}
     
-    return await check_credits(user_email)
+    return tenant.credits_snapshot()
 
 @api_router.get("/users/{participant_id}/profile")
 async def get_user_profile(participant_id: str):
@@ -1611,11 +1740,14 @@ async def sanitize_data():
             await db.discount_codes.update_one({"id": code["id"]}, {"$set": updates})
             cleaned_count += 1
     
+    if cleaned_count:
+        catalog_cache.bump("discount-codes")
     return {"success": True, "codes_cleaned": cleaned_count}
     return campaign
 
 @api_router.post("/campaigns")
-async def create_campaign(campaign: CampaignCreate):
+async def create_campaign(campaign: CampaignCreate, request: Request):
+    await check_campaign_segment(campaign.targetSegmentId, request.headers.get("X-User-Email", "").lower().strip())
     campaign_data = Campaign(
         name=campaign.name,
         message=campaign.message,
@@ -1623,6 +1755,7 @@ async def create_campaign(campaign: CampaignCreate):
         mediaFormat=campaign.mediaFormat,
         targetType=campaign.targetType,
         selectedContacts=campaign.selectedContacts,
+        targetSegmentId=campaign.targetSegmentId,
         channels=campaign.channels,
         targetGroupId=campaign.targetGroupId,
         targetIds=campaign.targetIds or [],
@@ -1634,8 +1767,7 @@ async def create_campaign(campaign: CampaignCreate):
         ctaText=campaign.ctaText,
         ctaLink=campaign.ctaLink
     ).model_dump()
-    await db.campaigns.insert_one(campaign_data)
-    campaign_data.pop("_id", None)
+    await db.campaigns.insert_one(with_dates(dict(campaign_data), "campaigns"))
     return campaign_data
 
 @api_router.post("/campaigns/{campaign_id}/launch")
@@ -1653,8 +1785,9 @@ async def launch_campaign(campaign_id: str):
     if not campaign:
         raise HTTPException(status_code=404, detail="Campaign not found")
     
-    # Prepare results and tracking
-    results = []
+    # Issues écrites par lots dans campaign_results: compteurs + aperçu seulement en mémoire
+    results = CampaignResultWriter(db, campaign_id)
+    await results.reset()
     channels = campaign.get("channels", {})
     message_content = campaign.get("message", "")
     media_url = campaign.get("mediaUrl", "")
@@ -1693,16 +1826,17 @@ async def launch_campaign(campaign_id: str):
                         "id": session_id,
                         "mode": "user",
                         "participant_ids": [target_id],
-                        "created_at": datetime.now(timezone.utc).isoformat(),
-                        "updated_at": datetime.now(timezone.utc).isoformat()
+                        "created_at": utc_now(),
+                        "updated_at": utc_now()
                     })
                     logger.info(f"[CAMPAIGN-LAUNCH] 📝 Session créée pour {target_id}: {session_id}")
                 
                 # Insérer le message dans la conversation
                 msg_id = str(uuid.uuid4())
-                msg_timestamp = datetime.now(timezone.utc).isoformat()
+                msg_moment = utc_now()
+                msg_timestamp = msg_moment.isoformat()
                 
-                await db.chat_messages.insert_one({
+                await db.chat_messages.insert_one(prepare_chat_message({
                     "id": msg_id,
                     "session_id": session_id,
                     "content": message_content,
@@ -1712,12 +1846,12 @@ async def launch_campaign(campaign_id: str):
                     "sender_id": "coach-campaign",
                     "timestamp": msg_timestamp,
                     "created_at": msg_timestamp
-                })
+                }))
                 
                 # Mettre à jour la session
                 await db.chat_sessions.update_one(
                     {"id": session_id},
-                    {"$set": {"last_message_at": msg_timestamp, "updated_at": msg_timestamp}}
+                    {"$set": {"last_message_at": msg_moment, "updated_at": msg_moment}}
                 )
                 
                 internal_result["status"] = "sent"
@@ -1733,88 +1867,80 @@ async def launch_campaign(campaign_id: str):
                 fail_count += 1
                 logger.error(f"[CAMPAIGN-LAUNCH] ❌ Erreur envoi interne à {target_id}: {str(e)}")
             
-            results.append(internal_result)
+            await results.add(internal_result)
     
     # ==================== ENVOI WHATSAPP/EMAIL (via contacts CRM) ====================
-    # Get contacts based on targetType (pour les canaux WhatsApp/Email)
-    contacts = []
+    # Audience streamée par lots (users + CRM dédoublonnés), sans plafond ni liste en mémoire
     if channels.get("whatsapp") or channels.get("email"):
-        if campaign.get("targetType") == "all":
-            contacts = await db.users.find({}, {"_id": 0}).to_list(1000)
-        else:
-            selected_ids = campaign.get("selectedContacts", [])
-            if selected_ids:
-                contacts = await db.users.find({"id": {"$in": selected_ids}}, {"_id": 0}).to_list(1000)
-    
-    for contact in contacts:
-        contact_id = contact.get("id", "")
-        contact_name = contact.get("name", "")
-        contact_email = contact.get("email", "")
-        contact_phone = contact.get("whatsapp", "")
-        
-        # ==================== ENVOI WHATSAPP (INDÉPENDANT) ====================
-        if channels.get("whatsapp") and contact_phone:
-            whatsapp_result = {
-                "contactId": contact_id,
-                "contactName": contact_name,
-                "contactEmail": contact_email,
-                "contactPhone": contact_phone,
-                "channel": "whatsapp",
-                "status": "pending",
-                "sentAt": None
-            }
+        async for contact in aiter_audience(db, campaign):
+            contact_id = contact.get("id", "")
+            contact_name = contact.get("name", "")
+            contact_email = contact.get("email", "")
+            contact_phone = contact.get("whatsapp", "")
+        
+            # ==================== ENVOI WHATSAPP (INDÉPENDANT) ====================
+            if channels.get("whatsapp") and contact_phone:
+                whatsapp_result = {
+                    "contactId": contact_id,
+                    "contactName": contact_name,
+                    "contactEmail": contact_email,
+                    "contactPhone": contact_phone,
+                    "channel": "whatsapp",
+                    "status": "pending",
+                    "sentAt": None
+                }
             
-            try:
-                # Envoi DIRECT via Twilio
-                wa_response = await send_whatsapp_direct(
-                    to_phone=contact_phone,
-                    message=message_content,
-                    media_url=media_url if media_url else None
-                )
+                try:
+                    # Envoi DIRECT via Twilio
+                    wa_response = await send_whatsapp_direct(
+                        to_phone=contact_phone,
+                        message=message_content,
+                        media_url=media_url if media_url else None
+                    )
                 
-                if wa_response.get("status") == "success":
-                    whatsapp_result["status"] = "sent"
-                    whatsapp_result["sentAt"] = datetime.now(timezone.utc).isoformat()
-                    whatsapp_result["sid"] = wa_response.get("sid")
-                    success_count += 1
-                    logger.info(f"[CAMPAIGN-LAUNCH] ✅ WhatsApp envoyé à {contact_name} ({contact_phone})")
-                elif wa_response.get("status") == "simulated":
-                    whatsapp_result["status"] = "simulated"
-                    whatsapp_result["sentAt"] = datetime.now(timezone.utc).isoformat()
-                    logger.info(f"[CAMPAIGN-LAUNCH] 🧪 WhatsApp simulé pour {contact_name} ({contact_phone})")
-                else:
+                    if wa_response.get("status") == "success":
+                        whatsapp_result["status"] = "sent"
+                        whatsapp_result["sentAt"] = datetime.now(timezone.utc).isoformat()
+                        whatsapp_result["sid"] = wa_response.get("sid")
+                        success_count += 1
+                        logger.info(f"[CAMPAIGN-LAUNCH] ✅ WhatsApp envoyé à {contact_name} ({contact_phone})")
+                    elif wa_response.get("status") == "simulated":
+                        whatsapp_result["status"] = "simulated"
+                        whatsapp_result["sentAt"] = datetime.now(timezone.utc).isoformat()
+                        logger.info(f"[CAMPAIGN-LAUNCH] 🧪 WhatsApp simulé pour {contact_name} ({contact_phone})")
+                    else:
+                        whatsapp_result["status"] = "failed"
+                        whatsapp_result["error"] = wa_response.get("error", "Unknown error")
+                        fail_count += 1
+                        logger.error(f"[CAMPAIGN-LAUNCH] ❌ WhatsApp échoué pour {contact_name}: {wa_response.get('error')}")
+                except Exception as e:
                     whatsapp_result["status"] = "failed"
-                    whatsapp_result["error"] = wa_response.get("error", "Unknown error")
+                    whatsapp_result["error"] = str(e)
                     fail_count += 1
-                    logger.error(f"[CAMPAIGN-LAUNCH] ❌ WhatsApp échoué pour {contact_name}: {wa_response.get('error')}")
-            except Exception as e:
-                whatsapp_result["status"] = "failed"
-                whatsapp_result["error"] = str(e)
-                fail_count += 1
-                logger.error(f"[CAMPAIGN-LAUNCH] ❌ Exception WhatsApp pour {contact_name}: {str(e)}")
+                    logger.error(f"[CAMPAIGN-LAUNCH] ❌ Exception WhatsApp pour {contact_name}: {str(e)}")
             
-            results.append(whatsapp_result)
-        
-        # ==================== ENVOI EMAIL (INDÉPENDANT) ====================
-        if channels.get("email") and contact_email:
-            email_result = {
-                "contactId": contact_id,
-                "contactName": contact_name,
-                "contactEmail": contact_email,
-                "contactPhone": contact_phone,
-                "channel": "email",
-                "status": "pending",
-                "sentAt": None
-            }
+                await results.add(whatsapp_result)
+        
+            # ==================== ENVOI EMAIL (INDÉPENDANT) ====================
+            if channels.get("email") and contact_email:
+                email_result = {
+                    "contactId": contact_id,
+                    "contactName": contact_name,
+                    "contactEmail": contact_email,
+                    "contactPhone": contact_phone,
+                    "channel": "email",
+                    "status": "pending",
+                    "sentAt": None
+                }
             
-            try:
-                # Envoi via l'endpoint interne (Resend)
-                if RESEND_AVAILABLE and RESEND_API_KEY:
-                    # Préparer le template email
-                    subject = f"📢 {campaign_name}"
-                    first_name = contact_name.split()[0] if contact_name else "ami(e)"
+                try:
+                    # Envoi via l'endpoint interne (Resend)
+                    if RESEND_AVAILABLE and RESEND_API_KEY:
+                        # Préparer le template email
+                        subject = f"📢 {campaign_name}"
+                        first_name = contact_name.split()[0] if contact_name else "ami(e)"
                     
-                    html_content = f"""<!DOCTYPE html>
+                        html_content = f"""<!DOCTYPE html>
 <html lang="fr">
 <head><meta charset="utf-8"><title>Message Afroboost</title></head>
 <body style="margin:0;padding:20px;background:#f5f5f5;font-family:Arial,sans-serif;">
@@ -1833,55 +1959,58 @@ async def launch_campaign(campaign_id: str):
 </body>
 </html>"""
                     
-                    params = {
-                        "from": "Afroboost <notifications@afroboosteur.com>",
-                        "to": [contact_email],
-                        "subject": subject,
-                        "html": html_content
-                    }
+                        params = {
+                            "from": "Afroboost <notifications@afroboosteur.com>",
+                            "to": [contact_email],
+                            "subject": subject,
+                            "html": html_content
+                        }
                     
-                    email_response = await asyncio.to_thread(resend.Emails.send, params)
-                    email_result["status"] = "sent"
-                    email_result["sentAt"] = datetime.now(timezone.utc).isoformat()
-                    email_result["email_id"] = email_response.get("id")
-                    success_count += 1
-                    logger.info(f"[CAMPAIGN-LAUNCH] ✅ Email envoyé à {contact_name} ({contact_email})")
-                else:
-                    email_result["status"] = "simulated"
-                    email_result["sentAt"] = datetime.now(timezone.utc).isoformat()
-                    logger.info(f"[CAMPAIGN-LAUNCH] 🧪 Email simulé pour {contact_name} ({contact_email})")
-            except Exception as e:
-                email_result["status"] = "failed"
-                email_result["error"] = str(e)
-                fail_count += 1
-                logger.error(f"[CAMPAIGN-LAUNCH] ❌ Email échoué pour {contact_name}: {str(e)}")
+                        email_response = await asyncio.to_thread(resend.Emails.send, params)
+                        email_result["status"] = "sent"
+                        email_result["sentAt"] = datetime.now(timezone.utc).isoformat()
+                        email_result["email_id"] = email_response.get("id")
+                        success_count += 1
+                        logger.info(f"[CAMPAIGN-LAUNCH] ✅ Email envoyé à {contact_name} ({contact_email})")
+                    else:
+                        email_result["status"] = "simulated"
+                        email_result["sentAt"] = datetime.now(timezone.utc).isoformat()
+                        logger.info(f"[CAMPAIGN-LAUNCH] 🧪 Email simulé pour {contact_name} ({contact_email})")
+                except Exception as e:
+                    email_result["status"] = "failed"
+                    email_result["error"] = str(e)
+                    fail_count += 1
+                    logger.error(f"[CAMPAIGN-LAUNCH] ❌ Email échoué pour {contact_name}: {str(e)}")
             
-            results.append(email_result)
-        
-        # ==================== INSTAGRAM (NON SUPPORTÉ - MANUEL) ====================
-        if channels.get("instagram"):
-            results.append({
-                "contactId": contact_id,
-                "contactName": contact_name,
-                "contactEmail": contact_email,
-                "contactPhone": contact_phone,
-                "channel": "instagram",
-                "status": "manual",
-                "sentAt": None,
-                "note": "Envoi manuel requis"
-            })
+                await results.add(email_result)
+        
+            # ==================== INSTAGRAM (NON SUPPORTÉ - MANUEL) ====================
+            if channels.get("instagram"):
+                await results.add({
+                    "contactId": contact_id,
+                    "contactName": contact_name,
+                    "contactEmail": contact_email,
+                    "contactPhone": contact_phone,
+                    "channel": "instagram",
+                    "status": "manual",
+                    "sentAt": None,
+                    "note": "Envoi manuel requis"
+                })
+    
+    await results.flush()
     
     # Déterminer le statut final
-    all_sent = all(r.get("status") in ["sent", "simulated", "manual"] for r in results)
+    all_sent = not results.counts.get("failed") and not results.counts.get("pending")
     final_status = "completed" if all_sent else "sending"
     
-    # Update campaign
+    # Update campaign: aperçu borné sur le document, détail complet dans campaign_results
     await db.campaigns.update_one(
         {"id": campaign_id},
         {"$set": {
             "status": final_status,
-            "results": results,
-            "updatedAt": datetime.now(timezone.utc).isoformat(),
+            "results": results.preview,
+            "resultsSummary": results.summary,
+            "updatedAt": utc_now(),
             "launchedAt": datetime.now(timezone.utc).isoformat()
         }}
     )
@@ -1896,42 +2025,71 @@ async def mark_campaign_sent(campaign_id: str, data: dict):
     contact_id = data.get("contactId")
     channel = data.get("channel")
     
+    sent_at = datetime.now(timezone.utc).isoformat()
     await db.campaigns.update_one(
         {"id": campaign_id, "results.contactId": contact_id, "results.channel": channel},
         {"$set": {
             "results.$.status": "sent",
-            "results.$.sentAt": datetime.now(timezone.utc).isoformat()
+            "results.$.sentAt": sent_at
         }}
     )
     
     # Check if all results are sent
-    campaign = await db.campaigns.find_one({"id": campaign_id}, {"_id": 0})
-    if campaign:
-        all_sent = all(r.get("status") == "sent" for r in campaign.get("results", []))
-        if all_sent:
+    campaign = await db.campaigns.find_one({"id": campaign_id}, {"_id": 0, "results": 1, "resultsSummary": 1})
+    if campaign and campaign.get("resultsSummary") is not None:
+        # Détail dans campaign_results (aperçu seulement sur le document)
+        previous = await db[CAMPAIGN_RESULTS].find_one_and_update(
+            {"campaign_id": campaign_id, "contactId": contact_id, "channel": channel, "status": {"$ne": "sent"}},
+            {"$set": {"status": "sent", "sentAt": sent_at}}
+        )
+        if previous:
             await db.campaigns.update_one(
                 {"id": campaign_id},
-                {"$set": {"status": "completed", "updatedAt": datetime.now(timezone.utc).isoformat()}}
+                {"$inc": {f"resultsSummary.{previous.get('status', 'pending')}": -1, "resultsSummary.sent": 1}}
             )
+        all_sent = not await db[CAMPAIGN_RESULTS].count_documents(
+            {"campaign_id": campaign_id, "status": {"$ne": "sent"}}, limit=1)
+    elif campaign:
+        all_sent = all(r.get("status") == "sent" for r in campaign.get("results", []))
+    if campaign and all_sent:
+        await db.campaigns.update_one(
+            {"id": campaign_id},
+            {"$set": {"status": "completed", "updatedAt": utc_now()}}
+        )
     
     return {"success": True}
 
+@api_router.get("/campaigns/{campaign_id}/results")
+async def get_campaign_results(campaign_id: str, status: Optional[str] = None, skip: int = 0, limit: int = 100):
+    """Issues par contact d'un lancement (campaign_results), paginées."""
+    query = {"campaign_id": campaign_id}
+    if status:
+        query["status"] = status
+    limit = max(1, min(limit, 500))
+    cursor = db[CAMPAIGN_RESULTS].find(query, {"_id": 0, "campaign_id": 0}).sort("_id", 1).skip(max(skip, 0)).limit(limit)
+    return {"results": await cursor.to_list(limit), "total": await db[CAMPAIGN_RESULTS].count_documents(query)}
+
 # --- Payment Links ---
 # v9.3.0: Isolation par coach_id
 @api_router.get("/payment-links")
-async def get_payment_links(request: Request):
-    user_email = request.headers.get('X-User-Email', '').lower().strip()
-    is_admin = is_super_admin(user_email)  # v9.5.6
+async def get_payment_links(request: Request, tenant: TenantContext = Depends(get_tenant)):
+    # Email inconnu: vue partagée (pas une entrée de cache par en-tête arbitraire)
+    user_email = tenant.catalog_email
+    is_admin = tenant.is_super_admin  # v9.5.6
     
     # ID de lien selon le coach
     link_id = "payment_links" if is_admin else f"payment_links_{user_email}"
     
+    return await catalog_cache.respond(request.headers, "payment-links",
+                                       lambda: build_payment_links(link_id, user_email, is_admin), tenant=link_id)
+
+async def build_payment_links(link_id: str, user_email: str, is_admin: bool):
     links = await db.payment_links.find_one({"id": link_id}, {"_id": 0})
     if not links:
         default_links = PaymentLinks().model_dump()
         default_links["id"] = link_id
         default_links["coach_id"] = user_email if not is_admin else None
-        await db.payment_links.insert_one(default_links)
+        await db.payment_links.insert_one(default_links.copy())
         return default_links
     return links
 
@@ -1951,6 +2109,7 @@ async def update_payment_links(links: PaymentLinksUpdate, request: Request):
         {"$set": link_data}, 
         upsert=True
     )
+    catalog_cache.bump("payment-links", link_id)
     return await db.payment_links.find_one({"id": link_id}, {"_id": 0})
 
 # v9.3.0: Endpoint public pour récupérer les payment links d'un coach (vitrine)
@@ -2184,6 +2343,9 @@ async def stripe_webhook(request: Request):
                     {"$setOnInsert": coach_doc},
                     upsert=True
                 )
+                catalog_cache.bump("partners")
+                coach_profiles.invalidate(coach_email)
+                await rebuild_vitrines(db, [coach_email])
                 logger.info(f"[WEBHOOK] Coach créé: {coach_email} avec {credits} crédits")
                 
                 # v9.0.2: Notifier Bassi de l'achat de pack
@@ -2232,8 +2394,9 @@ async def stripe_webhook(request: Request):
                 product_name = metadata.get("product_name", "Abonnement Afroboost")
                 sessions_count = 10 if "10" in product_name else (5 if "5" in product_name else 1)
                 new_code = f"AFR-{str(uuid.uuid4())[:6].upper()}"
-                discount_doc = {"id": str(uuid.uuid4()), "code": new_code, "type": "100%", "value": 100, "assignedEmail": customer_email, "maxUses": sessions_count, "used": 0, "active": True, "courses": [], "created_at": datetime.now(timezone.utc).isoformat(), "source": "stripe_payment", "session_id": session.id}
+                discount_doc = {"id": str(uuid.uuid4()), "code": new_code, "code_upper": new_code, "type": "100%", "value": 100, "assignedEmail": customer_email, "maxUses": sessions_count, "used": 0, "active": True, "courses": [], "created_at": datetime.now(timezone.utc).isoformat(), "source": "stripe_payment", "session_id": session.id}
                 await db.discount_codes.insert_one(discount_doc)
+                catalog_cache.bump("discount-codes")
                 logger.info(f"[PAYMENT] Code {new_code} cree pour {customer_email} ({sessions_count} seances)")
                 # v8.1: EMAIL AVEC QR CODE + CODE TEXTE
                 if RESEND_AVAILABLE and RESEND_API_KEY and customer_email:
@@ -2245,7 +2408,9 @@ async def stripe_webhook(request: Request):
                     except Exception as mail_err:
                         logger.warning(f"[PAYMENT] Email error: {mail_err}")
                 # v8.7: Sync CRM - Creer/MAJ contact (email unique)
-                await db.chat_participants.update_one({"email": customer_email}, {"$set": {"email": customer_email, "name": metadata.get("customer_name", customer_email.split("@")[0]), "source": "stripe_payment", "updated_at": datetime.now(timezone.utc).isoformat()}, "$setOnInsert": {"id": str(uuid.uuid4()), "created_at": datetime.now(timezone.utc).isoformat()}}, upsert=True)
+                known = await find_contact(db, email=customer_email, projection={"_id": 0, "id": 1, "email": 1, "whatsapp": 1, "isSubscriber": 1})
+                contact = await db.chat_participants.find_one_and_update({"id": known["id"]} if known else {"email_lc": normalize_email(customer_email)}, {"$set": identity_update({"email": customer_email, "name": metadata.get("customer_name", customer_email.split("@")[0]), "source": "stripe_payment", "updated_at": datetime.now(timezone.utc).isoformat()}), "$setOnInsert": {"id": str(uuid.uuid4()), "created_at": datetime.now(timezone.utc).isoformat()}}, upsert=True, projection={"_id": 0}, return_document=ReturnDocument.AFTER)
+                await on_contact_changed(db, contact, previous=known)
         elif event.type == 'checkout.session.expired':
             session = event.data.object
             await db.payment_transactions.update_one({"session_id": session.id}, {"$set": {"status": "expired", "webhook_received_at": datetime.now(timezone.utc).isoformat()}})
@@ -2330,22 +2495,25 @@ async def create_coach_checkout(request: Request):
 # --- Concept ---
 # v9.3.0: Isolation par coach_id - chaque coach a sa propre configuration
 @api_router.get("/concept", response_model=Concept)
-async def get_concept(request: Request):
-    user_email = request.headers.get('X-User-Email', '').lower().strip()
-    is_admin = is_super_admin(user_email)  # v9.5.6
+async def get_concept(request: Request, tenant: TenantContext = Depends(get_tenant)):
+    # Email inconnu: vue partagée (pas une entrée de cache par en-tête arbitraire)
+    user_email = tenant.catalog_email
+    is_admin = tenant.is_super_admin  # v9.5.6
     
     # Super Admin: concept global, Coach: concept personnel
     concept_id = "concept" if is_admin else f"concept_{user_email}"
-    
+    return await catalog_cache.respond(request.headers, "concept", lambda: build_concept(concept_id, user_email, is_admin), tenant=concept_id)
+
+async def build_concept(concept_id: str, user_email: str, is_admin: bool):
     concept = await db.concept.find_one({"id": concept_id}, {"_id": 0})
     if not concept:
         # Créer un concept par défaut pour ce coach
         default_concept = Concept().model_dump()
         default_concept["id"] = concept_id
         default_concept["coach_id"] = user_email if not is_admin else None
-        await db.concept.insert_one(default_concept)
-        return default_concept
-    return concept
+        await db.concept.insert_one(default_concept.copy())
+        concept = default_concept
+    return Concept.model_validate(concept).model_dump()
 
 @api_router.put("/concept")
 async def update_concept(concept: ConceptUpdate, request: Request):
@@ -2358,7 +2526,13 @@ async def update_concept(concept: ConceptUpdate, request: Request):
     try:
         updates = {k: v for k, v in concept.model_dump().items() if v is not None}
         updates["coach_id"] = user_email if not is_admin else None
+        # Vidéo déjà traitée par le pipeline: enregistrer directement ses dérivés (faststart, affiche, HLS)
+        if updates.get("heroVideoUrl"):
+            updates.update(concept_fields(await resolve_video_urls(db, updates["heroVideoUrl"])))
         result = await db.concept.update_one({"id": concept_id}, {"$set": updates}, upsert=True)
+        catalog_cache.bump("concept", concept_id)
+        catalog_cache.bump("manifest")  # le manifeste PWA lit le nom / logo du concept
+        catalog_cache.bump("partners")  # le carousel lit la vidéo du concept
         updated = await db.concept.find_one({"id": concept_id}, {"_id": 0})
         return updated
     except Exception as e:
@@ -2367,17 +2541,21 @@ async def update_concept(concept: ConceptUpdate, request: Request):
 
 # --- Config ---
 @api_router.get("/config", response_model=AppConfig)
-async def get_config():
+async def get_config(request: Request):
+    """Configuration d'apparence (cache versionné, ETag / 304)."""
+    return await catalog_cache.respond(request.headers, "config", build_config)
+
+async def build_config():
     config = await db.config.find_one({"id": "app_config"}, {"_id": 0})
     if not config:
-        default_config = AppConfig().model_dump()
-        await db.config.insert_one(default_config)
-        return default_config
-    return config
+        config = AppConfig().model_dump()
+        await db.config.insert_one(config.copy())
+    return AppConfig.model_validate(config).model_dump()
 
 @api_router.put("/config")
 async def update_config(config_update: dict):
     await db.config.update_one({"id": "app_config"}, {"$set": config_update}, upsert=True)
+    catalog_cache.bump("config")
     return await db.config.find_one({"id": "app_config"}, {"_id": 0})
 
 # === GOOGLE OAUTH AUTHENTICATION ===
@@ -2422,11 +2600,15 @@ class GoogleUser(BaseModel):
 # Business: Seul le Super Admin peut activer/désactiver les services globaux
 
 @api_router.get("/feature-flags")
-async def get_feature_flags():
+async def get_feature_flags(request: Request):
     """
     Récupère la configuration des feature flags
     Par défaut, tous les services additionnels sont désactivés
+    Servie depuis le cache versionné (ETag / 304)
     """
+    return await catalog_cache.respond(request.headers, "feature-flags", build_feature_flags)
+
+async def build_feature_flags():
     flags = await db.feature_flags.find_one({"id": "feature_flags"}, {"_id": 0})
     if not flags:
         # Créer la config par défaut (tout désactivé)
@@ -2458,8 +2640,44 @@ async def update_feature_flags(update: FeatureFlagsUpdate):
         {"$set": update_data}, 
         upsert=True
     )
+    catalog_cache.bump("feature-flags")
     return await db.feature_flags.find_one({"id": "feature_flags"}, {"_id": 0})
 
+# === BOOTSTRAP (chargement initial du frontend) ===
+# Un seul document versionné à la place de 9 requêtes (concept, config, cours, offres, catégories,
+# feature flags, liens de paiement, codes promo, manifeste), assemblé depuis le cache catalogue
+
+def bootstrap_parts(user_email: str) -> dict:
+    """Composants du bootstrap: (endpoint, tenant, builder) avec le même scoping que chaque GET."""
+    is_admin = is_super_admin(user_email)
+    concept_id = "concept" if is_admin else f"concept_{user_email}"
+    link_id = "payment_links" if is_admin else f"payment_links_{user_email}"
+    return {
+        "concept": ("concept", concept_id, lambda: build_concept(concept_id, user_email, is_admin)),
+        "config": ("config", ALL_TENANTS, build_config),
+        "courses": ("courses", ALL_TENANTS, build_courses),
+        "offers": ("offers", ALL_TENANTS, build_offers),
+        "categories": ("categories", ALL_TENANTS, build_categories),
+        "featureFlags": ("feature-flags", ALL_TENANTS, build_feature_flags),
+        "paymentLinks": ("payment-links", link_id, lambda: build_payment_links(link_id, user_email, is_admin)),
+        "discountCodes": ("discount-codes", discount_codes_tenant(user_email), lambda: build_discount_codes(user_email)),
+        "manifest": ("manifest", ALL_TENANTS, build_dynamic_manifest),
+    }
+
+@api_router.get("/bootstrap")
+async def get_bootstrap(request: Request, tenant: TenantContext = Depends(get_tenant)):
+    """Données initiales du frontend en un document (ETag / 304); composants manquants lus en parallèle."""
+    user_email = tenant.catalog_email
+    entry = await catalog_cache.bundle("bootstrap", user_email, bootstrap_parts(user_email))
+    return entry_response(request.headers, entry, entry.body, tenant_scoped=True)
+
+@api_router.get("/bootstrap/version")
+async def get_bootstrap_version(request: Request, tenant: TenantContext = Depends(get_tenant)):
+    """Version courante du bootstrap (même ETag), sans accès base tant que le cache est à jour."""
+    user_email = tenant.catalog_email
+    entry = await catalog_cache.bundle_version("bootstrap", user_email, bootstrap_parts(user_email))
+    return entry_response(request.headers, entry, encode_body({"version": entry.data["version"]}), tenant_scoped=True)
+
 # === COACH SUBSCRIPTION API ===
 # Business: Gestion des abonnements et droits des coachs
 
@@ -2705,8 +2923,10 @@ async def migrate_localstorage_to_mongodb(data: MigrationData):
             if res.get("reservationCode"):
                 existing = await db.reservations.find_one({"reservationCode": res["reservationCode"]})
                 if not existing:
-                    await db.reservations.insert_one(res)
+                    await db.reservations.insert_one(with_dates(res, "reservations"))
                     migrated["reservations"] += 1
+        await reset_reservation_counters(db)
+        await drop_course_occurrences(db)
     
     # Migration Coach Auth
     if data.coachAuth:
@@ -2886,7 +3106,7 @@ async def handle_whatsapp_webhook(webhook: WhatsAppWebhook):
             aiResponse=ai_response,
             responseTime=response_time
         ).model_dump()
-        await db.ai_logs.insert_one(log_entry)
+        await db.ai_logs.insert_one(with_dates(log_entry, "ai_logs"))
         
         logger.info(f"AI responded to {from_phone} in {response_time:.2f}s")
         
@@ -3318,19 +3538,8 @@ async def chat_with_ai(data: ChatMessage):
     # Enregistrer le prospect dans chat_participants si email ou whatsapp fourni
     if email or whatsapp:
         try:
-            # Vérifier si le contact existe déjà (par email OU whatsapp)
-            existing_contact = None
-            if email:
-                existing_contact = await db.chat_participants.find_one({"email": email}, {"_id": 0})
-            if not existing_contact and whatsapp:
-                # Normaliser le numéro WhatsApp
-                clean_whatsapp = whatsapp.replace(" ", "").replace("-", "")
-                existing_contact = await db.chat_participants.find_one({
-                    "$or": [
-                        {"whatsapp": whatsapp},
-                        {"whatsapp": clean_whatsapp}
-                    ]
-                }, {"_id": 0})
+            # Vérifier si le contact existe déjà (par email OU whatsapp normalisés)
+            existing_contact = await find_contact(db, email=email, phone=whatsapp)
             
             if not existing_contact:
                 # Créer le nouveau contact
@@ -3344,7 +3553,8 @@ async def chat_with_ai(data: ChatMessage):
                     "created_at": datetime.now(timezone.utc).isoformat(),
                     "last_seen_at": datetime.now(timezone.utc).isoformat()
                 }
-                await db.chat_participants.insert_one(new_participant)
+                await db.chat_participants.insert_one(with_identity(new_participant))
+                await on_contact_changed(db, new_participant)
                 logger.info(f"[CRM-AUTO] Nouveau contact créé: {first_name or 'Visiteur'} ({email or whatsapp}) - Source: {source}")
             else:
                 # Mettre à jour last_seen_at
@@ -3352,6 +3562,7 @@ async def chat_with_ai(data: ChatMessage):
                     {"id": existing_contact.get("id")},
                     {"$set": {"last_seen_at": datetime.now(timezone.utc).isoformat()}}
                 )
+                await on_contact_changed(db, existing_contact)
                 logger.info(f"[CRM-AUTO] Contact existant mis à jour: {existing_contact.get('name')}")
         except Exception as crm_error:
             logger.warning(f"[CRM-AUTO] Erreur enregistrement CRM (non bloquant): {crm_error}")
@@ -3711,7 +3922,7 @@ Si la question ne concerne pas un produit ou un cours Afroboost, réponds:
         
         # Log la conversation
         await db.ai_logs.insert_one({
-            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "timestamp": utc_now(),
             "from": f"widget_{first_name or 'anonymous'}",
             "email": email or "",
             "whatsapp": whatsapp or "",
@@ -3749,6 +3960,18 @@ async def get_chat_participants(request: Request):
         ).to_list(1000) if caller_email else []
     return participants
 
+@api_router.get("/chat/participants/export")
+async def export_chat_participants(request: Request, format: str = "csv", columns: Optional[str] = None):
+    """Export CRM CSV / NDJSON en flux (curseur, sans limite de 1000) - Filtré par coach_id"""
+    caller_email = request.headers.get("X-User-Email", "").lower().strip()
+    fmt = check_format(format)
+    selected = parse_columns(columns, CONTACT_COLUMNS)
+    # RÈGLE ANTI-CASSE BASSI: Super Admin voit TOUT
+    query = {} if is_super_admin(caller_email) else {"coach_id": caller_email or "__no_access__"}
+    return export_response(db.chat_participants, query, selected, fmt,
+                           f"contacts_{datetime.now(timezone.utc).strftime('%Y-%m-%d')}",
+                           sort=[("created_at", -1)])
+
 @api_router.get("/chat/participants/{participant_id}")
 async def get_chat_participant(participant_id: str):
     """Récupère un participant par son ID"""
@@ -3771,14 +3994,16 @@ async def create_chat_participant(participant: ChatParticipantCreate, request: R
     if coach_email:
         participant_data = participant_obj.model_dump()
         participant_data["coach_id"] = coach_email if not is_super_admin(coach_email) else DEFAULT_COACH_ID
-        await db.chat_participants.insert_one(participant_data)
+        await db.chat_participants.insert_one(with_identity(participant_data))
         # Fix: exclude _id from response
         participant_data.pop("_id", None)
+        await on_contact_changed(db, participant_data)
         return participant_data
     doc = participant_obj.model_dump()
-    await db.chat_participants.insert_one(doc)
+    await db.chat_participants.insert_one(with_identity(doc))
     # Fix: exclude _id from response
     doc.pop("_id", None)
+    await on_contact_changed(db, doc)
     return doc
 
 @api_router.get("/chat/participants/find")
@@ -3788,35 +4013,23 @@ async def find_participant(
     whatsapp: Optional[str] = None
 ):
     """
-    Recherche un participant par nom, email ou WhatsApp.
+    Recherche un participant par email, WhatsApp ou nom (dans cet ordre).
     Utilisé pour la reconnaissance automatique des utilisateurs.
     """
-    query = {"$or": []}
-    
-    if name:
-        query["$or"].append({"name": {"$regex": name, "$options": "i"}})
-    if email:
-        query["$or"].append({"email": {"$regex": f"^{email}$", "$options": "i"}})
-    if whatsapp:
-        # Nettoyer le numéro WhatsApp pour la recherche
-        clean_whatsapp = whatsapp.replace(" ", "").replace("-", "").replace("+", "")
-        query["$or"].append({"whatsapp": {"$regex": clean_whatsapp}})
-    
-    if not query["$or"]:
-        return None
-    
-    participant = await db.chat_participants.find_one(query, {"_id": 0})
-    return participant
+    return await find_contact(db, email=email, phone=whatsapp, name=name)
 
 @api_router.put("/chat/participants/{participant_id}")
 async def update_chat_participant(participant_id: str, update_data: dict):
     """Met à jour un participant"""
     update_data["last_seen_at"] = datetime.now(timezone.utc).isoformat()
+    previous = await db.chat_participants.find_one({"id": participant_id}, {"_id": 0})
     await db.chat_participants.update_one(
         {"id": participant_id},
-        {"$set": update_data}
+        {"$set": identity_update(update_data)}
     )
     updated = await db.chat_participants.find_one({"id": participant_id}, {"_id": 0})
+    if updated:
+        await on_contact_changed(db, updated, previous=previous)
     return updated
 
 @api_router.delete("/chat/participants/{participant_id}")
@@ -3852,6 +4065,7 @@ async def delete_chat_participant(participant_id: str):
     # 4. Supprimer le participant
     result = await db.chat_participants.delete_one({"id": participant_id})
     logger.info(f"[DELETE] Participant supprime: {result.deleted_count}")
+    await on_contact_deleted(db, participant_id)
     
     logger.info(f"[DELETE] Participant {participant_name} et donnees associees supprimes")
     return {
@@ -4060,7 +4274,7 @@ async def join_group_automatically(request: GroupJoinRequest):
                     "mode": group_id,
                     "title": mode_titles.get(group_id, f"Groupe {group_id}"),
                     "participant_ids": [],
-                    "created_at": datetime.now(timezone.utc).isoformat()
+                    "created_at": utc_now()
                 }
                 await db.chat_sessions.insert_one(group_session)
                 logger.info(f"[GROUP-JOIN] ✅ Nouveau groupe créé: {group_session['id']}")
@@ -4071,7 +4285,7 @@ async def join_group_automatically(request: GroupJoinRequest):
         participant_id = user_id
         if not participant_id:
             # Chercher l'utilisateur par email
-            existing_user = await db.users.find_one({"email": email}, {"_id": 0})
+            existing_user = await find_contact(db, email=email, collection="users")
             if existing_user:
                 participant_id = existing_user.get("id")
             else:
@@ -4083,7 +4297,8 @@ async def join_group_automatically(request: GroupJoinRequest):
                     "email": email,
                     "created_at": datetime.now(timezone.utc).isoformat()
                 }
-                await db.users.insert_one(new_user)
+                await db.users.insert_one(with_identity(new_user))
+                await on_contact_changed(db, new_user, collection="users")
                 logger.info(f"[GROUP-JOIN] ✅ Nouvel utilisateur créé: {name} ({email})")
         
         # Ajouter l'utilisateur au groupe s'il n'y est pas déjà
@@ -4095,9 +4310,10 @@ async def join_group_automatically(request: GroupJoinRequest):
                 {"id": session_id},
                 {
                     "$addToSet": {"participant_ids": participant_id},
-                    "$set": {"updated_at": datetime.now(timezone.utc).isoformat()}
+                    "$set": {"updated_at": utc_now()}
                 }
             )
+            await on_group_membership_changed(db, session_id, participant_id, joined=True)
             logger.info(f"[GROUP-JOIN] ✅ {name} ajouté au groupe {session_id}")
         else:
             logger.info(f"[GROUP-JOIN] ℹ️ {name} déjà membre du groupe {session_id}")
@@ -4294,7 +4510,7 @@ async def get_chat_session_by_token(link_token: str):
 async def create_chat_session(session: ChatSessionCreate):
     """Crée une nouvelle session de chat"""
     session_obj = ChatSession(**session.model_dump())
-    await db.chat_sessions.insert_one(session_obj.model_dump())
+    await db.chat_sessions.insert_one(with_dates(session_obj.model_dump(), "chat_sessions"))
     return session_obj.model_dump()
 
 @api_router.put("/chat/sessions/{session_id}")
@@ -4306,7 +4522,7 @@ async def update_chat_session(session_id: str, update: ChatSessionUpdate):
     logger.info(f"[DELETE] Mise à jour session {session_id}: {update.model_dump()}")
     
     update_data = {k: v for k, v in update.model_dump().items() if v is not None}
-    update_data["updated_at"] = datetime.now(timezone.utc).isoformat()
+    update_data["updated_at"] = utc_now()
     
     # Si suppression logique, ajouter la date
     if update_data.get("is_deleted"):
@@ -4340,9 +4556,10 @@ async def add_participant_to_session(session_id: str, participant_id: str):
             {"id": session_id},
             {
                 "$push": {"participant_ids": participant_id},
-                "$set": {"updated_at": datetime.now(timezone.utc).isoformat()}
+                "$set": {"updated_at": utc_now()}
             }
         )
+        await on_group_membership_changed(db, session_id, participant_id, joined=True)
     
     updated = await db.chat_sessions.find_one({"id": session_id}, {"_id": 0})
     return updated
@@ -4365,7 +4582,7 @@ async def toggle_session_ai(session_id: str):
         {"$set": {
             "is_ai_active": new_state,
             "mode": new_mode,
-            "updated_at": datetime.now(timezone.utc).isoformat()
+            "updated_at": utc_now()
         }}
     )
     
@@ -4379,7 +4596,7 @@ async def get_session_messages(session_id: str, include_deleted: bool = False):
     query = {"session_id": session_id}
     if not include_deleted: query["is_deleted"] = {"$ne": True}
     raw = await db.chat_messages.find(query, {"_id": 0}).sort("created_at", 1).to_list(500)
-    return [format_message_for_frontend(m) for m in raw]
+    return [format_message_for_frontend(m) for m in annotate_messages(raw)]
 
 # v8.6: Endpoint messages de groupe
 @api_router.get("/chat/group/messages")
@@ -4387,23 +4604,18 @@ async def get_group_messages(limit: int = 100):
     """Recupere les messages de groupe (is_group=True ou session_id=group)"""
     query = {"$or": [{"is_group": True}, {"session_id": "group"}], "is_deleted": {"$ne": True}}
     raw = await db.chat_messages.find(query, {"_id": 0}).sort("created_at", -1).limit(limit).to_list(limit)
-    return [format_message_for_frontend(m) for m in reversed(raw)]
+    return [format_message_for_frontend(m) for m in reversed(annotate_messages(raw))]
 # === ENDPOINT SYNC "RAMASSER" ===
 @api_router.get("/messages/sync")
 async def sync_messages(session_id: str, since: Optional[str] = None, limit: int = 100):
     """RAMASSER: Messages de la session OU messages de groupe (broadcast). Tri deterministe."""
     base_query = {"is_deleted": {"$ne": True}, "$or": [{"session_id": session_id}, {"broadcast": True}, {"type": "group"}]}
-    if since:
-        try:
-            if 'Z' in since: since = since.replace('Z', '+00:00')
-            parsed = datetime.fromisoformat(since)
-            if parsed.tzinfo is None: parsed = parsed.replace(tzinfo=timezone.utc)
-            base_query["created_at"] = {"$gt": parsed.astimezone(timezone.utc).isoformat()}
-        except Exception:
-            base_query["created_at"] = {"$gt": since}
+    since_filter = time_after("created_at", since) if since else None
+    if since_filter:
+        base_query = {"$and": [base_query, since_filter]}
     # Tri deterministe: created_at puis id pour garantir un ordre stable
     raw = await db.chat_messages.find(base_query, {"_id": 0}).sort([("created_at", 1), ("id", 1)]).to_list(limit)
-    messages = [format_message_for_frontend(m) for m in raw]
+    messages = [format_message_for_frontend(m) for m in annotate_messages(raw)]
     sync_ts = datetime.now(timezone.utc).isoformat()
     return {"success": True, "session_id": session_id, "count": len(messages), "messages": messages, "synced_at": sync_ts, "server_time_utc": sync_ts}
 @api_router.get("/messages/sync/all")
@@ -4428,13 +4640,16 @@ async def sync_all_messages(participant_id: str, since: Optional[str] = None, li
         "is_deleted": {"$ne": True}
     }
     
-    if since:
-        query["created_at"] = {"$gt": since}
+    since_filter = time_after("created_at", since) if since else None
+    if since_filter:
+        query = {"$and": [query, since_filter]}
     
     messages = await db.chat_messages.find(
         query,
         {"_id": 0}
     ).sort("created_at", -1).to_list(limit)
+    for m in annotate_messages(messages):
+        m["thumbnail_url"] = thumb_cache.public_url(m.get("thumbnail_url"))
     
     logger.info(f"[SYNC-ALL] 📱 Ramassé {len(messages)} message(s) pour {participant_id[:8]}...")
     
@@ -4461,7 +4676,7 @@ async def create_chat_message(message: EnhancedChatMessageCreate):
         **message.model_dump(),
         mode=session.get("mode", "ai")
     )
-    await db.chat_messages.insert_one(message_obj.model_dump())
+    await db.chat_messages.insert_one(prepare_chat_message(message_obj.model_dump()))
     return message_obj.model_dump()
 
 @api_router.put("/chat/messages/{message_id}/delete")
@@ -4478,6 +4693,44 @@ async def soft_delete_message(message_id: str):
 
 # === ROUTES ADMIN SÉCURISÉES ===
 
+@api_router.get("/admin/date-migration")
+async def admin_date_migration(tenant: TenantContext = Depends(get_tenant)):
+    """Avancement de la migration des dates ISO en dates BSON - Super Admin"""
+    if not tenant.is_super_admin:
+        raise HTTPException(status_code=403, detail="Super Admin requis")
+    return await date_migration_status(db)
+
+async def run_contact_merge(owner: str):
+    try:
+        await merge_duplicates(db, dry_run=False, lease_owner=owner)
+    except Exception as e:
+        logger.error(f"[MERGE] Fusion interrompue (relancer: les groupes restants seront repris): {e}")
+    finally:
+        await release_merge_lease(db, owner)
+
+@api_router.post("/admin/contacts/merge-duplicates")
+async def admin_merge_duplicates(dry_run: bool = True, tenant: TenantContext = Depends(get_tenant)):
+    """Doublons CRM par email / téléphone normalisés - dry_run: rapport seul, sinon fusion en tâche de fond - Super Admin"""
+    if not tenant.is_super_admin:
+        raise HTTPException(status_code=403, detail="Super Admin requis")
+    if dry_run:
+        return await merge_duplicates(db, dry_run=True)
+    # Bail MongoDB: un seul passage à la fois, quel que soit le worker qui reçoit la requête
+    owner = str(uuid.uuid4())
+    if not await acquire_merge_lease(db, owner):
+        raise HTTPException(status_code=409, detail="Fusion déjà en cours")
+    fastapi_app.state.contact_merge = asyncio.create_task(run_contact_merge(owner))
+    return {"success": True, "started": True}
+
+@api_router.get("/admin/contacts/merges")
+async def admin_contact_merges(limit: int = 50, tenant: TenantContext = Depends(get_tenant)):
+    """Journal des fusions (contact_merges), plus récentes d'abord - Super Admin"""
+    if not tenant.is_super_admin:
+        raise HTTPException(status_code=403, detail="Super Admin requis")
+    limit = max(1, min(limit, 200))
+    merges = await db.contact_merges.find({}, {"_id": 0}).sort("merged_at", -1).limit(limit).to_list(limit)
+    return {"running": await merge_lease_held(db), "merges": merges}
+
 @api_router.post("/admin/delete-history")
 async def admin_delete_history(request: Request):
     """
@@ -4748,25 +5001,26 @@ async def get_unread_notifications(
 
 # === EMOJIS PERSONNALISÉS DU COACH ===
 @api_router.get("/custom-emojis/list")
-async def list_custom_emojis():
+async def list_custom_emojis(request: Request):
     """
     Liste tous les emojis personnalisés disponibles dans /uploads/emojis/
+    Listing mis en cache (recalculé quand le dossier change) + ETag pour les 304.
     """
     emojis = []
+    etag = '"emoji-dir-empty"'
     try:
-        emoji_files = list(EMOJIS_DIR.glob("*.*"))
-        for f in emoji_files:
-            if f.suffix.lower() in ['.png', '.jpg', '.jpeg', '.gif', '.webp', '.svg']:
-                emojis.append({
-                    "name": f.stem,
-                    "url": f"/api/emojis/{f.name}",
-                    "filename": f.name
-                })
-        logger.info(f"[EMOJIS] {len(emojis)} emojis trouvés")
+        filenames = emoji_listing.files()
+        emojis = [
+            {"name": os.path.splitext(name)[0], "url": f"/api/emojis/{name}", "filename": name}
+            for name in filenames
+        ]
+        etag = f'"emoji-dir-{hashlib.sha1("|".join(filenames).encode()).hexdigest()[:16]}"'
     except Exception as e:
         logger.error(f"[EMOJIS] Erreur listing: {e}")
     
-    return {"emojis": emojis, "count": len(emojis)}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    return JSONResponse({"emojis": emojis, "count": len(emojis)}, headers={"ETag": etag, "Cache-Control": "no-cache"})
 
 @api_router.post("/custom-emojis/upload")
 async def upload_custom_emoji(request: Request):
@@ -4794,6 +5048,8 @@ async def upload_custom_emoji(request: Request):
         
         with open(filepath, "wb") as f:
             f.write(image_bytes)
+        if filename.endswith(PRECOMPRESS_EXTENSIONS):
+            precompress(str(filepath))
         
         logger.info(f"[EMOJIS] Emoji uploadé: {filename}")
         
@@ -4888,7 +5144,7 @@ async def generate_shareable_link(request: Request):
         title=title,
         custom_prompt=custom_prompt
     )
-    await db.chat_sessions.insert_one(session.model_dump())
+    await db.chat_sessions.insert_one(with_dates(session.model_dump(), "chat_sessions"))
     
     # Construire l'URL de partage
     # Note: L'URL de base sera configurée côté frontend
@@ -4973,22 +5229,8 @@ async def smart_chat_entry(request: Request):
     if not name:
         raise HTTPException(status_code=400, detail="Le nom est requis")
     
-    # Rechercher un participant existant
-    existing_participant = None
-    search_query = {"$or": []}
-    
-    if email:
-        search_query["$or"].append({"email": {"$regex": f"^{email}$", "$options": "i"}})
-    if whatsapp:
-        clean_whatsapp = whatsapp.replace(" ", "").replace("-", "").replace("+", "")
-        if clean_whatsapp:
-            search_query["$or"].append({"whatsapp": {"$regex": clean_whatsapp}})
-    
-    # Recherche aussi par nom exact
-    search_query["$or"].append({"name": {"$regex": f"^{name}$", "$options": "i"}})
-    
-    if search_query["$or"]:
-        existing_participant = await db.chat_participants.find_one(search_query, {"_id": 0})
+    # Rechercher un participant existant (email, puis WhatsApp, puis nom exact - clés indexées)
+    existing_participant = await find_contact(db, email=email, phone=whatsapp, name=name)
     
     # Déterminer la source
     source = f"link_{link_token}" if link_token else "chat_afroboost"
@@ -5006,10 +5248,11 @@ async def smart_chat_entry(request: Request):
         
         await db.chat_participants.update_one(
             {"id": participant_id},
-            {"$set": update_fields}
+            {"$set": identity_update(update_fields)}
         )
         
         participant = await db.chat_participants.find_one({"id": participant_id}, {"_id": 0})
+        await on_contact_changed(db, participant, previous=existing_participant)
         is_returning = True
     else:
         # Nouveau participant
@@ -5020,8 +5263,9 @@ async def smart_chat_entry(request: Request):
             source=source,
             link_token=link_token
         )
-        await db.chat_participants.insert_one(participant_obj.model_dump())
         participant = participant_obj.model_dump()
+        await db.chat_participants.insert_one(with_identity(dict(participant)))
+        await on_contact_changed(db, participant)
         participant_id = participant["id"]
         is_returning = False
     
@@ -5055,7 +5299,7 @@ async def smart_chat_entry(request: Request):
             is_ai_active=True,
             participant_ids=[participant_id]
         )
-        await db.chat_sessions.insert_one(session_obj.model_dump())
+        await db.chat_sessions.insert_one(with_dates(session_obj.model_dump(), "chat_sessions"))
         session = session_obj.model_dump()
     else:
         # Ajouter le participant à la session s'il n'y est pas
@@ -5064,9 +5308,10 @@ async def smart_chat_entry(request: Request):
                 {"id": session["id"]},
                 {
                     "$push": {"participant_ids": participant_id},
-                    "$set": {"updated_at": datetime.now(timezone.utc).isoformat()}
+                    "$set": {"updated_at": utc_now()}
                 }
             )
+            await on_group_membership_changed(db, session["id"], participant_id, joined=True)
             session = await db.chat_sessions.find_one({"id": session["id"]}, {"_id": 0})
     
     # Récupérer l'historique des messages si participant existant
@@ -5131,7 +5376,7 @@ async def get_ai_response_with_session(request: Request):
         content=message_text,
         mode=session.get("mode", "ai")
     )
-    await db.chat_messages.insert_one(user_message.model_dump())
+    await db.chat_messages.insert_one(prepare_chat_message(user_message.model_dump()))
     
     # === SOCKET.IO: Émettre le message utilisateur en temps réel ===
     await emit_new_message(session_id, {
@@ -5547,7 +5792,7 @@ Si la question ne concerne pas un produit ou un cours Afroboost, réponds:
             content=ai_response_text,
             mode="ai"
         )
-        await db.chat_messages.insert_one(ai_message.model_dump())
+        await db.chat_messages.insert_one(prepare_chat_message(ai_message.model_dump()))
         
         # === SOCKET.IO: Émettre la réponse IA en temps réel ===
         await emit_new_message(session_id, {
@@ -5562,7 +5807,7 @@ Si la question ne concerne pas un produit ou un cours Afroboost, réponds:
         
         # Log
         await db.ai_logs.insert_one({
-            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "timestamp": utc_now(),
             "session_id": session_id,
             "from": participant_name,
             "message": message_text,
@@ -5615,7 +5860,7 @@ async def send_coach_response(request: Request):
         content=message_text,
         mode=session.get("mode", "human")
     )
-    await db.chat_messages.insert_one(coach_message.model_dump())
+    await db.chat_messages.insert_one(prepare_chat_message(coach_message.model_dump()))
     
     # === SOCKET.IO: Émettre le message coach en temps réel ===
     await emit_new_message(session_id, {
@@ -5659,7 +5904,7 @@ async def send_group_message(request: Request):
         session_id="group", sender_id="coach", sender_name=coach_name,
         sender_type="coach", content=message_text, mode="community", is_group=True
     )
-    await db.chat_messages.insert_one(group_msg.model_dump())
+    await db.chat_messages.insert_one(prepare_chat_message(group_msg.model_dump()))
     
     # Emettre via Socket.IO a tous
     await sio.emit('group_message', {
@@ -5728,7 +5973,7 @@ async def start_private_chat(request: Request):
         participant_ids=[initiator_id, target_id],
         title=f"Discussion privée: {initiator.get('name', '')} & {target.get('name', '')}"
     )
-    await db.chat_sessions.insert_one(private_session.model_dump())
+    await db.chat_sessions.insert_one(with_dates(private_session.model_dump(), "chat_sessions"))
     
     # Message d'accueil
     welcome_message = EnhancedChatMessage(
@@ -5739,7 +5984,7 @@ async def start_private_chat(request: Request):
         content=f"💬 Discussion privée créée entre {initiator.get('name', '')} et {target.get('name', '')}.",
         mode="human"
     )
-    await db.chat_messages.insert_one(welcome_message.model_dump())
+    await db.chat_messages.insert_one(prepare_chat_message(welcome_message.model_dump()))
     
     return {
         "session": private_session.model_dump(),
@@ -5749,10 +5994,16 @@ async def start_private_chat(request: Request):
 
 # --- Custom Emojis/Stickers ---
 @api_router.get("/chat/emojis")
-async def get_custom_emojis():
-    """Récupère tous les emojis personnalisés uploadés par le coach"""
-    emojis = await db.custom_emojis.find({"active": True}, {"_id": 0}).sort("created_at", -1).to_list(100)
-    return emojis
+async def get_custom_emojis(request: Request):
+    """
+    Récupère tous les emojis personnalisés uploadés par le coach.
+    Manifeste compact servi depuis la mémoire (id, name, url, thumb_url, hash): les images
+    sont chargées à part, en cache immutable. ETag -> 304 si rien n'a changé.
+    """
+    emojis, etag = await emoji_manifest.get(db)
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    return JSONResponse(emojis, headers={"ETag": etag, "Cache-Control": "no-cache"})
 
 @api_router.post("/chat/emojis")
 async def upload_custom_emoji(request: Request):
@@ -5774,31 +6025,39 @@ async def upload_custom_emoji(request: Request):
     if not name or not image_data:
         raise HTTPException(status_code=400, detail="name et image_data sont requis")
     
-    # Valider le format base64
-    if not image_data.startswith("data:image/"):
-        raise HTTPException(status_code=400, detail="Format d'image invalide. Utilisez base64 (data:image/...)")
+    # Décoder le base64 UNE fois: fichier nommé par hash + miniature, rien de lourd en base
+    try:
+        contents, mime = decode_data_url(image_data)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    stored = await save_emoji_file(contents, mime, str(CUSTOM_EMOJIS_DIR))
     
     emoji_obj = {
         "id": str(uuid.uuid4()),
         "name": name,
-        "image_data": image_data,
         "category": category,
         "active": True,
+        "mime": mime,
+        "size": len(contents),
+        **stored,
         "created_at": datetime.now(timezone.utc).isoformat()
     }
     
     await db.custom_emojis.insert_one(emoji_obj)
+    emoji_manifest.invalidate()
     
-    # Retourner sans _id (MongoDB l'ajoute automatiquement)
-    emoji_obj.pop("_id", None)
-    return emoji_obj
+    return manifest_entry(emoji_obj)
 
 @api_router.delete("/chat/emojis/{emoji_id}")
 async def delete_custom_emoji(emoji_id: str):
-    """Supprime un emoji personnalisé"""
-    result = await db.custom_emojis.delete_one({"id": emoji_id})
-    if result.deleted_count == 0:
+    """Supprime un emoji personnalisé (et ses fichiers s'ils ne servent plus à aucun emoji)"""
+    emoji = await db.custom_emojis.find_one_and_delete({"id": emoji_id}, {"_id": 0, "hash": 1})
+    if not emoji:
         raise HTTPException(status_code=404, detail="Emoji non trouvé")
+    emoji_manifest.invalidate()
+    if emoji.get("hash") and not await db.custom_emojis.count_documents({"hash": emoji["hash"]}):
+        for path in CUSTOM_EMOJIS_DIR.glob(f"{emoji['hash']}*"):
+            path.unlink(missing_ok=True)
     return {"success": True, "message": "Emoji supprimé"}
 
 # --- Get Session Participants (for community chat) ---
@@ -6402,9 +6661,11 @@ async def scheduler_emit_group_message(request: Request):
             "scheduled": True
         }
         # Ajouter champs optionnels media/CTA seulement s'ils existent
-        for field in ["media_url", "media_type", "cta_type", "cta_text", "cta_link"]:
+        for field in ["media_url", "media_type", "thumbnail_url", "cta_type", "cta_text", "cta_link"]:
             if message_data.get(field):
                 safe_message[field] = message_data[field]
+        if safe_message.get("thumbnail_url"):
+            safe_message["thumbnail_url"] = thumb_cache.public_url(safe_message["thumbnail_url"])
         try:
             if broadcast:
                 await sio.emit('message_received', safe_message)
@@ -6515,6 +6776,12 @@ fastapi_app.include_router(legacy_auth_router, prefix="/api")
 # v9.2.0: Include promo routes (modularisation)
 fastapi_app.include_router(promo_router, prefix="/api")
 
+# Segments d'audience sauvegardés
+fastapi_app.include_router(segment_router, prefix="/api")
+
+# Compteur d'appels Mongo par requête (X-Mongo-Calls)
+fastapi_app.middleware("http")(mongo_calls_middleware)
+
 fastapi_app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -6525,8 +6792,12 @@ fastapi_app.add_middleware(
 
 # Dynamic manifest.json endpoint for PWA
 @fastapi_app.get("/api/manifest.json")
-async def get_dynamic_manifest():
-    """Serve dynamic manifest.json with logo and name from coach settings"""
+async def get_dynamic_manifest(request: Request):
+    """Serve dynamic manifest.json with logo and name from coach settings (versioned cache, ETag / 304)"""
+    return await catalog_cache.respond(request.headers, "manifest", build_dynamic_manifest,
+                                       media_type="application/manifest+json")
+
+async def build_dynamic_manifest():
     concept = await db.concept.find_one({})
     
     # Use coach-configured favicon (priority) or logo as fallback
@@ -6600,8 +6871,7 @@ async def get_dynamic_manifest():
             }
         ]
     
-    from fastapi.responses import JSONResponse
-    return JSONResponse(content=manifest, media_type="application/manifest+json")
+    return manifest
 
 # === SCHEDULER INTÉGRÉ (APSCHEDULER AVEC PERSISTANCE) ===
 
@@ -6656,7 +6926,7 @@ async def startup_scheduler():
     # Nettoyage zombie campaigns (bloquées > 30 min)
     try:
         thirty_minutes_ago = datetime.now(timezone.utc) - timedelta(minutes=30)
-        zombie_filter = {"status": "sending", "updatedAt": {"$lt": thirty_minutes_ago.isoformat()}}
+        zombie_filter = {"status": "sending", **time_before("updatedAt", thirty_minutes_ago)}
         zombie_campaigns = await db.campaigns.find(zombie_filter, {"_id": 0, "id": 1, "name": 1}).to_list(100)
         
         if zombie_campaigns:
@@ -6666,7 +6936,7 @@ async def startup_scheduler():
                 await db.campaigns.update_one(
                     {"id": zombie_id},
                     {
-                        "$set": {"status": "failed", "updatedAt": datetime.now(timezone.utc).isoformat()},
+                        "$set": {"status": "failed", "updatedAt": utc_now()},
                         "$push": {"results": {
                                 "contactId": "system",
                                 "channel": "system",
@@ -6684,6 +6954,126 @@ async def startup_scheduler():
     except Exception as e:
         logger.error(f"[ZOMBIE] Erreur: {e}")
     
+    # Issues des campagnes: (campaign_id, contactId, channel)
+    try:
+        await ensure_campaign_result_indexes(db)
+        logger.info("[INDEX] campaign_results OK")
+    except Exception as e:
+        logger.warning(f"[INDEX] campaign_results: {e}")
+    
+    # Index des segments d'audience (membres matérialisés + TTL)
+    try:
+        await ensure_segment_indexes(db)
+        logger.info("[INDEX] segment_members OK")
+    except Exception as e:
+        logger.warning(f"[INDEX] segment_members: {e}")
+    
+    # Emojis base64 encore en base -> fichiers (idempotent)
+    try:
+        await migrate_base64_emojis(db, str(CUSTOM_EMOJIS_DIR))
+        emoji_manifest.invalidate()
+    except Exception as e:
+        logger.warning(f"[EMOJIS] Migration: {e}")
+    
+    # Pipeline vidéo: index + reprise des jobs interrompus par le redémarrage
+    try:
+        await db.media_jobs.create_index("id", unique=True)
+        await db.media_jobs.create_index([("source_url", 1), ("status", 1)])
+        resumed = await resume_video_jobs(db)
+        logger.info(f"[VIDEO] ffmpeg {'disponible' if FFMPEG_AVAILABLE else 'absent (vidéos servies telles quelles)'}, {resumed} job(s) repris")
+    except Exception as e:
+        logger.warning(f"[VIDEO] media_jobs: {e}")
+    
+    # Sessions coach: expires_at en date BSON + index TTL (remplace la suppression à la lecture)
+    try:
+        converted = await ensure_session_indexes(db)
+        logger.info(f"[INDEX] coach_sessions TTL OK ({converted} session(s) converties)")
+    except Exception as e:
+        logger.warning(f"[INDEX] coach_sessions: {e}")
+    
+    # Vitrines matérialisées: index (username_slug, keys) + reconstruction (slugs des coachs existants)
+    try:
+        await ensure_vitrine_indexes(db)
+        await rebuild_vitrines(db)
+    except Exception as e:
+        logger.warning(f"[VITRINE] {e}")
+    
+    # Carousel partenaires: coachs actifs + concepts résolus en un seul $in
+    try:
+        await db.coaches.create_index("is_active")
+        await db.concept.create_index("id")
+        await db.concept.create_index("coach_id")
+        logger.info("[INDEX] coaches.is_active / concept.id / concept.coach_id OK")
+    except Exception as e:
+        logger.warning(f"[INDEX] partenaires: {e}")
+    
+    # Dates ISO -> dates BSON: migration en ligne par lots, reprise après redémarrage
+    async def run_date_migration():
+        try:
+            await migrate_dates(db)
+        except Exception as e:
+            logger.warning(f"[DATES] Migration interrompue (reprise au prochain démarrage): {e}")
+    fastapi_app.state.date_migration = asyncio.create_task(run_date_migration())
+    
+    # Anciens messages: media_type / thumbnail_url persistés une fois, par lots
+    async def run_media_backfill():
+        try:
+            annotated = await backfill_media_fields(db)
+            if annotated:
+                logger.info(f"[MEDIA] {annotated} ancien(s) message(s) annotés (media_type)")
+        except Exception as e:
+            logger.warning(f"[MEDIA] Rattrapage interrompu (repris au prochain démarrage): {e}")
+    fastapi_app.state.media_backfill = asyncio.create_task(run_media_backfill())
+    
+    # Réservations: pagination par curseur (coach_id, createdAt, id)
+    try:
+        await ensure_reservation_page_indexes(db)
+        logger.info("[INDEX] reservations (coach_id, createdAt, id) OK")
+    except Exception as e:
+        logger.warning(f"[INDEX] reservations: {e}")
+    
+    # Séances: compteurs de places par (course, date)
+    try:
+        await ensure_availability_indexes(db)
+        logger.info("[INDEX] course_occurrences (course_id, date) OK")
+    except Exception as e:
+        logger.warning(f"[INDEX] course_occurrences: {e}")
+    async def run_occurrence_backfill():
+        try:
+            seeded = await backfill_occurrences(db)
+            if seeded:
+                logger.info(f"[SEATS] {seeded} compteur(s) de séance amorcé(s)")
+        except Exception as e:
+            logger.warning(f"[SEATS] Rattrapage des compteurs interrompu: {e}")
+    fastapi_app.state.occurrence_backfill = asyncio.create_task(run_occurrence_backfill())
+    
+    # Contacts: clés email_lc / phone_e164 / name_key indexées, rattrapage des anciens documents en tâche de fond
+    try:
+        await ensure_identity_indexes(db)
+        logger.info("[INDEX] chat_participants / users (email_lc, phone_e164, name_key) OK")
+    except Exception as e:
+        logger.warning(f"[INDEX] identité contacts: {e}")
+    async def run_identity_backfill():
+        try:
+            await backfill_identity_keys(db)
+        except Exception as e:
+            logger.warning(f"[IDENTITY] Rattrapage interrompu (repris au prochain démarrage): {e}")
+    fastapi_app.state.identity_backfill = asyncio.create_task(run_identity_backfill())
+    
+    # Fusion des doublons CRM: champs de référence réécrits par index
+    try:
+        await ensure_merge_indexes(db)
+        logger.info("[INDEX] références contacts (sessions, messages, contact_merges) OK")
+    except Exception as e:
+        logger.warning(f"[INDEX] fusion contacts: {e}")
+    
+    # Codes promo: code_upper normalisé (index unique) pour la carte en mémoire de promo_index
+    try:
+        backfilled = await ensure_promo_indexes(db)
+        logger.info(f"[INDEX] discount_codes.code_upper OK ({backfilled} code(s) rattrapés)")
+    except Exception as e:
+        logger.warning(f"[INDEX] discount_codes: {e}")
+    
     # Index unique pour push_subscriptions (evite doublons)
     try:
         await db.push_subscriptions.create_index("endpoint", unique=True, sparse=True)
@@ -6724,6 +7114,8 @@ async def shutdown_db_client():
     if apscheduler.running:
         apscheduler.shutdown(wait=False)
         logger.info("[SCHEDULER] Arrêté (jobs persistés)")
+    shutdown_image_pool()
+    await thumb_cache.close()
     client.close()
     mongo_client_sync.close()
     logger.info("[SYSTEM] Arrete")
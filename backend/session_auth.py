@@ -0,0 +1,169 @@
+"""
+SESSION AUTH - Résolution des sessions coach (cookie coach_session_token / Bearer)
+/api/auth/me lisait coach_sessions puis google_users et re-parsait expires_at à chaque appel,
+alors que le dashboard l'appelle en permanence.
+
+- cache LRU borné token -> utilisateur (SESSION_CACHE_SIZE), durée bornée (SESSION_CACHE_TTL_SECONDS)
+  et jamais au-delà de l'expiration de la session
+- invalidé à la déconnexion et à la reconnexion (anciennes sessions supprimées)
+- expires_at stocké en date BSON: l'index TTL de coach_sessions supprime les sessions expirées
+  (plus de suppression au moment de la lecture)
+- dépendances FastAPI réutilisables: require_session (401) et optional_session (None)
+"""
+
+import os
+import time
+import logging
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, Any, Optional, Tuple
+
+from fastapi import HTTPException, Request
+
+logger = logging.getLogger(__name__)
+
+SESSION_COOKIE = "coach_session_token"
+SESSION_CACHE_SIZE = int(os.environ.get('SESSION_CACHE_SIZE', '2048'))
+# Plusieurs workers: une déconnexion sur un autre processus est vue au plus tard après ce délai
+SESSION_CACHE_TTL_SECONDS = int(os.environ.get('SESSION_CACHE_TTL_SECONDS', '60'))
+
+# Référence DB (initialisée depuis server.py)
+_db = None
+
+
+def init_session_db(database):
+    """Initialise la référence DB"""
+    global _db
+    _db = database
+
+
+def parse_expiry(value) -> Optional[datetime]:
+    """expires_at: date BSON (nouvelles sessions) ou chaîne ISO (anciennes)."""
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            return None
+    if not isinstance(value, datetime):
+        return None
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def session_token_from(request: Request) -> Optional[str]:
+    """Token depuis le cookie httpOnly, ou le header Authorization: Bearer."""
+    token = request.cookies.get(SESSION_COOKIE)
+    if not token:
+        auth_header = request.headers.get("Authorization", "")
+        if auth_header.startswith("Bearer "):
+            token = auth_header[7:]
+    return token or None
+
+
+def public_user(user: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "user_id": user.get("user_id"),
+        "email": user.get("email"),
+        "name": user.get("name"),
+        "picture": user.get("picture"),
+        "is_coach": user.get("is_coach", True)
+    }
+
+
+class SessionCache:
+    """LRU token -> (utilisateur, expiration de la session, instant de mise en cache)."""
+
+    def __init__(self, max_entries: int = SESSION_CACHE_SIZE, ttl_seconds: int = SESSION_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[Dict[str, Any], datetime, float]]" = OrderedDict()
+        self.db_reads = 0
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(token)
+        if entry is None:
+            return None
+        user, expires_at, cached_at = entry
+        if time.monotonic() - cached_at > self.ttl_seconds or expires_at <= datetime.now(timezone.utc):
+            del self._entries[token]
+            return None
+        self._entries.move_to_end(token)
+        return user
+
+    def put(self, token: str, user: Dict[str, Any], expires_at: datetime):
+        self._entries[token] = (user, expires_at, time.monotonic())
+        self._entries.move_to_end(token)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, token: Optional[str]):
+        if token:
+            self._entries.pop(token, None)
+
+    def invalidate_user(self, user_id: Optional[str]):
+        """Toutes les sessions en cache d'un utilisateur (reconnexion, profil Google mis à jour)."""
+        for token in [t for t, (user, _, _) in self._entries.items() if user.get("user_id") == user_id]:
+            del self._entries[token]
+
+    def clear(self):
+        self._entries.clear()
+
+    async def resolve(self, db, token: str) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """(utilisateur, None) ou (None, motif du refus). Aucun accès base si le token est en cache."""
+        user = self.get(token)
+        if user is not None:
+            return user, None
+        self.db_reads += 1
+        session = await db.coach_sessions.find_one({"session_token": token}, {"_id": 0, "user_id": 1, "expires_at": 1})
+        if not session:
+            return None, "Session invalide"
+        expires_at = parse_expiry(session.get("expires_at"))
+        # L'index TTL supprime la session (passe toutes les ~60 s): refuser dès l'expiration
+        if expires_at is None or expires_at <= datetime.now(timezone.utc):
+            return None, "Session expirée"
+        user = await db.google_users.find_one({"user_id": session.get("user_id")}, {"_id": 0})
+        if not user:
+            return None, "Utilisateur non trouvé"
+        user = public_user(user)
+        self.put(token, user, expires_at)
+        return user, None
+
+
+# Instance partagée: auth_routes (connexion / déconnexion) et dépendances des routes coach
+session_cache = SessionCache()
+
+
+async def ensure_session_indexes(db):
+    """Convertit les expires_at ISO en dates BSON puis crée l'index TTL et l'index du token."""
+    converted = 0
+    async for session in db.coach_sessions.find({"expires_at": {"$type": "string"}}, {"_id": 1, "expires_at": 1}):
+        expires_at = parse_expiry(session.get("expires_at"))
+        if expires_at is None:
+            await db.coach_sessions.delete_one({"_id": session["_id"]})
+        else:
+            await db.coach_sessions.update_one({"_id": session["_id"]}, {"$set": {"expires_at": expires_at}})
+        converted += 1
+    await db.coach_sessions.create_index("expires_at", expireAfterSeconds=0)
+    await db.coach_sessions.create_index("session_token")
+    await db.coach_sessions.create_index("user_id")
+    await db.google_users.create_index("user_id")
+    return converted
+
+
+async def optional_session(request: Request) -> Optional[Dict[str, Any]]:
+    """Dépendance: utilisateur de la session, ou None si absente / invalide."""
+    token = session_token_from(request)
+    if not token:
+        return None
+    user, _ = await session_cache.resolve(_db, token)
+    return user
+
+
+async def require_session(request: Request) -> Dict[str, Any]:
+    """Dépendance: utilisateur de la session, 401 sinon."""
+    token = session_token_from(request)
+    if not token:
+        raise HTTPException(status_code=401, detail="Non authentifié")
+    user, error = await session_cache.resolve(_db, token)
+    if user is None:
+        raise HTTPException(status_code=401, detail=error)
+    return user
@@ -7,6 +7,7 @@
 #   ./start_scheduler.sh           # Mode DAEMON (boucle toutes les 30s)
 #   ./start_scheduler.sh --once    # Exécution unique
 #   ./start_scheduler.sh --dry-run # Mode test sans envoi réel
+#   ./start_scheduler.sh --simulate [options]  # Simulation d'une journée (horloge virtuelle)
 #   ./start_scheduler.sh &         # Lancer en arrière-plan
 
 cd /app/backend
@@ -17,6 +18,9 @@ if [ "$1" == "--once" ]; then
 elif [ "$1" == "--dry-run" ]; then
     echo "🧪 Mode test (dry-run)..."
     python3 scheduler.py --dry-run --once
+elif [ "$1" == "--simulate" ]; then
+    echo "🧪 Simulation du scheduler (horloge virtuelle, connecteurs factices)..."
+    python3 scheduler_simulator.py "${@:2}"
 else
     echo "🔄 Démarrage du scheduler en MODE DAEMON (CTRL+C pour arrêter)..."
     echo "📱 Les campagnes programmées seront vérifiées toutes les 30 secondes."
@@ -0,0 +1,200 @@
+"""
+STREAMING UPLOAD - Réception multipart en flux, sans charger le fichier en mémoire
+Le corps de la requête est parsé au fil des chunks ASGI: les données du fichier partent
+directement dans un fichier temporaire, la taille est contrôlée à chaque chunk (abandon
+dès le dépassement) et le SHA-256 est calculé au passage. Le temporaire est créé dans
+le dossier de destination: os.replace() le publie ensuite de façon atomique.
+
+Mémoire par upload bornée par la taille d'un chunk (≈64 KB avec uvicorn), quelle que
+soit la taille du fichier. Utilisé par server.upload_coach_asset (vidéos jusqu'à 50 MB).
+"""
+
+import os
+import hashlib
+import tempfile
+import logging
+from typing import Dict, Optional, Callable, Tuple
+
+from fastapi import HTTPException, Request
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+
+logger = logging.getLogger(__name__)
+
+# Marge tolérée au-dessus de la limite fichier pour les en-têtes et champs multipart
+MULTIPART_OVERHEAD = 64 * 1024
+# Taille max d'un champ texte (asset_type, etc.)
+MAX_FIELD_SIZE = 16 * 1024
+
+
+class StreamedFile:
+    """Fichier reçu en flux: temporaire tant que commit() n'a pas été appelé."""
+
+    def __init__(self, field_name: str, filename: str, content_type: str, path: str):
+        self.field_name = field_name
+        self.filename = filename
+        self.content_type = content_type
+        self.path = path
+        self.size = 0
+        self.sha256 = ""
+        self.committed = False
+
+    def commit(self, final_path: str) -> str:
+        """Publication atomique (même système de fichiers que le temporaire)."""
+        os.replace(self.path, final_path)
+        self.path = final_path
+        self.committed = True
+        return final_path
+
+    def discard(self):
+        if not self.committed:
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+
+
+class _MultipartSink:
+    """Callbacks du parser: un fichier écrit en flux, les autres champs gardés en mémoire (bornés)."""
+
+    def __init__(self, temp_dir: str, max_bytes: int, file_field: str,
+                 check_file: Optional[Callable[[Dict[str, str], str], Optional[int]]]):
+        self.temp_dir = temp_dir
+        self.max_bytes = max_bytes
+        self.file_field = file_field
+        self.check_file = check_file
+        self.fields: Dict[str, str] = {}
+        self.file: Optional[StreamedFile] = None
+        self._headers = {}
+        self._header_field = b""
+        self._header_value = b""
+        self._part = None  # ("file", StreamedFile) | ("field", name) | ("skip", None)
+        self._buffer = bytearray()
+        self._handle = None
+        self._hash = None
+
+    def callbacks(self):
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+        }
+
+    def on_part_begin(self):
+        self._headers = {}
+        self._part = None
+
+    def on_header_field(self, data: bytes, start: int, end: int):
+        self._header_field += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def on_header_end(self):
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = b""
+        self._header_value = b""
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        name = options.get(b"name", b"").decode("utf-8", "replace")
+        filename = options.get(b"filename")
+
+        if filename is None:
+            self._part = ("field", name)
+            self._buffer = bytearray()
+            return
+        if name != self.file_field or self.file is not None:
+            # Fichier inattendu: ignoré sans être stocké
+            self._part = ("skip", None)
+            return
+
+        content_type = self._headers.get(b"content-type", b"application/octet-stream").decode("latin-1").strip()
+        if self.check_file:
+            limit = self.check_file(self.fields, content_type)
+            if limit is not None:
+                self.max_bytes = limit
+        fd, path = tempfile.mkstemp(dir=self.temp_dir, prefix=".upload_", suffix=".part")
+        self._handle = os.fdopen(fd, "wb")
+        self._hash = hashlib.sha256()
+        self.file = StreamedFile(name, filename.decode("utf-8", "replace"), content_type, path)
+        self._part = ("file", self.file)
+
+    def on_part_data(self, data: bytes, start: int, end: int):
+        kind = self._part[0] if self._part else "skip"
+        if kind == "file":
+            self.file.size += end - start
+            if self.file.size > self.max_bytes:
+                raise HTTPException(status_code=413, detail=f"Fichier trop volumineux (max {self.max_bytes // 1024 // 1024}MB)")
+            chunk = data[start:end]
+            self._hash.update(chunk)
+            self._handle.write(chunk)
+        elif kind == "field":
+            if len(self._buffer) + end - start > MAX_FIELD_SIZE:
+                raise HTTPException(status_code=400, detail="Champ de formulaire trop long")
+            self._buffer += data[start:end]
+
+    def on_part_end(self):
+        kind = self._part[0] if self._part else "skip"
+        if kind == "file":
+            self._handle.close()
+            self._handle = None
+            self.file.sha256 = self._hash.hexdigest()
+        elif kind == "field":
+            self.fields[self._part[1]] = self._buffer.decode("utf-8", "replace")
+        self._part = None
+
+    def abort(self):
+        if self._handle:
+            self._handle.close()
+            self._handle = None
+        if self.file:
+            self.file.discard()
+
+
+async def receive_multipart(
+    request: Request,
+    temp_dir: str,
+    max_bytes: int,
+    file_field: str = "file",
+    check_file: Optional[Callable[[Dict[str, str], str], Optional[int]]] = None
+) -> Tuple[Dict[str, str], Optional[StreamedFile]]:
+    """
+    Parse un corps multipart/form-data en flux.
+    - max_bytes: limite du fichier, vérifiée à chaque chunk (HTTP 413 dès le dépassement)
+    - check_file(fields, content_type): appelé à la réception des en-têtes du fichier avec
+      les champs déjà reçus; peut lever HTTPException (type refusé) ou retourner une limite plus précise
+    Retourne (champs texte, StreamedFile temporaire ou None). L'appelant doit commit() ou discard().
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    boundary = params.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise HTTPException(status_code=400, detail="multipart/form-data requis")
+
+    # Content-Length annoncé trop grand: refus avant de lire le moindre octet
+    declared = request.headers.get("content-length", "")
+    if declared.isdigit() and int(declared) > max_bytes + MULTIPART_OVERHEAD:
+        raise HTTPException(status_code=413, detail=f"Fichier trop volumineux (max {max_bytes // 1024 // 1024}MB)")
+
+    os.makedirs(temp_dir, exist_ok=True)
+    sink = _MultipartSink(temp_dir, max_bytes, file_field, check_file)
+    parser = MultipartParser(boundary, sink.callbacks())
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+        parser.finalize()
+    except BaseException:
+        sink.abort()
+        raise
+    if sink.file and not sink.file.sha256:
+        # Corps tronqué: la partie fichier n'a jamais été terminée
+        sink.abort()
+        raise HTTPException(status_code=400, detail="Upload incomplet")
+    return sink.fields, sink.file
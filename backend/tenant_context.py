@@ -0,0 +1,203 @@
+"""
+TENANT CONTEXT - Appelant résolu une fois par requête
+Chaque route relisait X-User-Email, appelait is_super_admin (liste reconstruite à chaque appel)
+puis find_one du coach pour ses crédits ou son rôle (check_credits, check_if_partner, /credits/check).
+
+- get_tenant: dépendance FastAPI, TenantContext (rôle, coach, crédits, filtre Mongo) mémorisé sur request.state
+- coach_profiles: cache court (COACH_PROFILE_TTL_SECONDS) email -> document coach, invalidé par
+  chaque écriture sur un coach (crédits, statut, profil)
+- MongoCallCounter: écouteur de commandes pymongo; le middleware compte les appels Mongo
+  de chaque requête (en-tête X-Mongo-Calls) pour mesurer la réduction
+"""
+
+import os
+import time
+import logging
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Dict, Any, Optional, Tuple, List
+
+from fastapi import Request
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+SUPER_ADMIN_EMAILS = frozenset({"contact.artboost@gmail.com", "afroboost.bassi@gmail.com"})
+ROLE_SUPER_ADMIN = "super_admin"
+ROLE_COACH = "coach"
+ROLE_USER = "user"
+COACH_PROFILE_TTL_SECONDS = float(os.environ.get('COACH_PROFILE_TTL_SECONDS', '30'))
+COACH_PROFILE_CACHE_SIZE = int(os.environ.get('COACH_PROFILE_CACHE_SIZE', '1024'))
+MONGO_CALLS_HEADER = "X-Mongo-Calls"
+
+# Référence DB (initialisée depuis server.py)
+_db = None
+
+
+def init_tenant_db(database):
+    """Initialise la référence DB"""
+    global _db
+    _db = database
+
+
+def normalize_email(email: Optional[str]) -> str:
+    return (email or "").lower().strip()
+
+
+def is_super_admin(email: Optional[str]) -> bool:
+    """Vérifie si l'email est celui d'un Super Admin (ensemble figé, pas de liste reconstruite)"""
+    return normalize_email(email) in SUPER_ADMIN_EMAILS
+
+
+def coach_filter(email: Optional[str]) -> Dict[str, Any]:
+    """Filtre MongoDB pour l'isolation des données coach ({} pour le Super Admin)"""
+    return {} if is_super_admin(email) else {"coach_id": normalize_email(email)}
+
+
+# ==================== CACHE DES PROFILS COACH ====================
+
+class CoachProfileCache:
+    """LRU email -> (document coach ou None, instant de lecture)."""
+
+    def __init__(self, ttl_seconds: float = COACH_PROFILE_TTL_SECONDS, max_entries: int = COACH_PROFILE_CACHE_SIZE):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[Optional[Dict[str, Any]], float]]" = OrderedDict()
+        self.db_reads = 0
+
+    async def get(self, db, email: str) -> Optional[Dict[str, Any]]:
+        """Document coach (lecture seule, partagé), lu au plus une fois par TTL."""
+        email = normalize_email(email)
+        if not email:
+            return None
+        entry = self._entries.get(email)
+        if entry is not None and time.monotonic() - entry[1] <= self.ttl_seconds:
+            self._entries.move_to_end(email)
+            return entry[0]
+        self.db_reads += 1
+        coach = await db.coaches.find_one({"email": email}, {"_id": 0})
+        self._entries[email] = (coach, time.monotonic())
+        self._entries.move_to_end(email)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return coach
+
+    def invalidate(self, email: Optional[str] = None):
+        """Écriture sur un coach; None = tous (update_many)."""
+        if email is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(normalize_email(email), None)
+
+    def clear(self):
+        self._entries.clear()
+
+
+# Instance partagée: server.py, coach_routes, auth_routes, video_pipeline
+coach_profiles = CoachProfileCache()
+
+
+# ==================== CONTEXTE DE REQUÊTE ====================
+
+class TenantContext:
+    """Appelant d'une requête: rôle, coach, crédits et filtre d'isolation."""
+    __slots__ = ("email", "is_super_admin", "coach")
+
+    def __init__(self, email: str, coach: Optional[Dict[str, Any]] = None):
+        self.email = normalize_email(email)
+        self.is_super_admin = self.email in SUPER_ADMIN_EMAILS
+        self.coach = coach
+
+    @property
+    def role(self) -> str:
+        if self.is_super_admin:
+            return ROLE_SUPER_ADMIN
+        return ROLE_COACH if self.coach else ROLE_USER
+
+    @property
+    def credits(self) -> int:
+        """-1 = illimité (Super Admin)"""
+        if self.is_super_admin:
+            return -1
+        return (self.coach or {}).get("credits", 0) or 0
+
+    @property
+    def has_credits(self) -> bool:
+        return self.is_super_admin or self.credits > 0
+
+    @property
+    def coach_filter(self) -> Dict[str, Any]:
+        return {} if self.is_super_admin else {"coach_id": self.email}
+
+    @property
+    def catalog_email(self) -> str:
+        """Email de scoping du catalogue public: un email inconnu partage la vue anonyme (clé de cache bornée)."""
+        return self.email if self.is_super_admin or self.coach else ""
+
+    def credits_snapshot(self) -> Dict[str, Any]:
+        """Réponse historique de check_credits"""
+        if self.is_super_admin:
+            return {"has_credits": True, "credits": -1, "unlimited": True}
+        if not self.coach:
+            return {"has_credits": False, "credits": 0, "error": "Coach non trouvé"}
+        return {"has_credits": self.credits > 0, "credits": self.credits}
+
+
+async def resolve_tenant(db, email: Optional[str]) -> TenantContext:
+    email = normalize_email(email)
+    coach = None if not email or email in SUPER_ADMIN_EMAILS else await coach_profiles.get(db, email)
+    return TenantContext(email, coach)
+
+
+async def get_tenant(request: Request) -> TenantContext:
+    """Dépendance: contexte de l'appelant (X-User-Email), résolu une seule fois par requête."""
+    tenant = getattr(request.state, "tenant", None)
+    if tenant is None:
+        tenant = await resolve_tenant(_db, request.headers.get("X-User-Email"))
+        request.state.tenant = tenant
+    return tenant
+
+
+# ==================== COMPTEUR D'APPELS MONGO ====================
+
+_mongo_calls: ContextVar[Optional[List[int]]] = ContextVar("mongo_calls", default=None)
+
+
+class MongoCallCounter(monitoring.CommandListener):
+    """
+    Compte les commandes envoyées par la requête courante. Motor exécute pymongo dans un thread
+    avec une copie du contexte: le compteur (liste mutable) est partagé avec la requête.
+    """
+
+    def started(self, event):
+        counter = _mongo_calls.get()
+        if counter is not None:
+            counter[0] += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+mongo_call_counter = MongoCallCounter()
+
+
+def start_request_count() -> List[int]:
+    counter = [0]
+    _mongo_calls.set(counter)
+    return counter
+
+
+def count_mongo_call():
+    """Incrément manuel (bases sans écouteur de commandes, ex: tests en mémoire)."""
+    mongo_call_counter.started(None)
+
+
+async def mongo_calls_middleware(request: Request, call_next):
+    """Middleware HTTP: en-tête X-Mongo-Calls = commandes Mongo émises pendant la requête."""
+    counter = start_request_count()
+    response = await call_next(request)
+    response.headers[MONGO_CALLS_HEADER] = str(counter[0])
+    return response
@@ -0,0 +1,193 @@
+"""
+Adaptateur Motor (async) au-dessus de la base en mémoire du simulateur.
+Permet de tester les modules async (blob_store, segments...) sans MongoDB.
+"""
+
+import sys
+from types import SimpleNamespace
+
+from pymongo import InsertOne, UpdateOne, UpdateMany, DeleteOne, DeleteMany, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+sys.path.insert(0, '/app/backend')
+from scheduler_simulator import InMemoryClient, _project, _get_path, _MISSING, match_document
+
+
+def _expression(doc, expr):
+    """'$champ', liste ou dict d'expressions, littéral."""
+    if isinstance(expr, str) and expr.startswith("$"):
+        value = _get_path(doc, expr[1:])
+        return None if value is _MISSING else value
+    if isinstance(expr, list):
+        return [_expression(doc, item) for item in expr]
+    if isinstance(expr, dict):
+        return {key: value for key, value in ((k, _expression(doc, v)) for k, v in expr.items()) if value is not None}
+    return expr
+
+
+def run_pipeline(docs, pipeline):
+    """Sous-ensemble d'agrégation: $match, $project, $unwind, $group ($push, $addToSet, $sum), $sort, $limit."""
+    for stage in pipeline:
+        (op, spec), = stage.items()
+        if op == "$match":
+            docs = [d for d in docs if match_document(d, spec)]
+        elif op == "$project":
+            projected = []
+            for doc in docs:
+                out = {} if spec.get("_id", 1) == 0 else {"_id": doc.get("_id")}
+                for key, value in spec.items():
+                    if key == "_id":
+                        continue
+                    found = _get_path(doc, key) if value in (1, True) else _expression(doc, value)
+                    if found is not _MISSING and found is not None:
+                        out[key] = found
+                projected.append(out)
+            docs = projected
+        elif op == "$unwind":
+            field = spec[1:]
+            docs = [{**d, field: item} for d in docs for item in (d.get(field) or [])]
+        elif op == "$group":
+            groups = {}
+            for doc in docs:
+                key = _expression(doc, spec["_id"])
+                group = groups.setdefault(repr(key), {"_id": key})
+                for name, accumulator in spec.items():
+                    if name == "_id":
+                        continue
+                    (acc, expr), = accumulator.items()
+                    value = _expression(doc, expr)
+                    if acc == "$sum":
+                        group[name] = group.get(name, 0) + value
+                    elif acc == "$push" or (acc == "$addToSet" and value not in group.get(name, [])):
+                        group.setdefault(name, []).append(value)
+                    else:
+                        group.setdefault(name, [])
+            docs = list(groups.values())
+        elif op == "$sort":
+            for key, direction in reversed(list(spec.items())):
+                docs.sort(key=lambda d: _get_path(d, key), reverse=direction < 0)
+        elif op == "$limit":
+            docs = docs[:spec]
+        else:
+            raise NotImplementedError(f"Étape d'agrégation non supportée en mémoire: {op}")
+    return docs
+
+
+class AsyncInMemoryCursor:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def sort(self, *args, **kwargs):
+        self._cursor.sort(*args, **kwargs)
+        return self
+
+    def skip(self, count):
+        self._cursor.skip(count)
+        return self
+
+    def limit(self, count):
+        self._cursor.limit(count)
+        return self
+
+    def batch_size(self, size):
+        return self
+
+    async def to_list(self, length=None):
+        docs = list(self._cursor)
+        return docs[:length] if length else docs
+
+    async def close(self):
+        pass
+
+    def __aiter__(self):
+        self._iterator = iter(list(self._cursor))
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._iterator)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class AsyncInMemoryCollection:
+    def __init__(self, collection):
+        self.sync = collection
+
+    def find(self, query=None, projection=None):
+        return AsyncInMemoryCursor(self.sync.find(query, projection))
+
+    async def bulk_write(self, requests, ordered=True):
+        """Opérations pymongo (InsertOne, UpdateOne/Many, DeleteOne/Many) appliquées dans l'ordre."""
+        counts = {"inserted": 0, "matched": 0, "modified": 0, "deleted": 0, "upserted": 0}
+        for op in requests:
+            if isinstance(op, InsertOne):
+                self.sync.insert_one(op._doc)
+                counts["inserted"] += 1
+            elif isinstance(op, (UpdateOne, UpdateMany)):
+                method = self.sync.update_one if isinstance(op, UpdateOne) else self.sync.update_many
+                result = method(op._filter, op._doc, upsert=op._upsert)
+                counts["matched"] += result.matched_count
+                counts["modified"] += result.modified_count
+                counts["upserted"] += 1 if getattr(result, "upserted_id", None) is not None else 0
+            elif isinstance(op, (DeleteOne, DeleteMany)):
+                method = self.sync.delete_one if isinstance(op, DeleteOne) else self.sync.delete_many
+                counts["deleted"] += method(op._filter).deleted_count
+            else:
+                raise NotImplementedError(type(op).__name__)
+        return SimpleNamespace(inserted_count=counts["inserted"], matched_count=counts["matched"],
+                               modified_count=counts["modified"], deleted_count=counts["deleted"],
+                               upserted_count=counts["upserted"], acknowledged=True)
+
+    def aggregate(self, pipeline, **kwargs):
+        return AsyncInMemoryCursor(run_pipeline(list(self.sync.find({})), pipeline))
+
+    async def find_one_and_delete(self, query, projection=None):
+        doc = self.sync.find_one(query)
+        if doc is not None:
+            self.sync.delete_one({"_id": doc["_id"]})
+        return _project(doc, projection) if doc is not None else None
+
+    async def find_one_and_update(self, query, update, projection=None, upsert=False,
+                                  return_document=ReturnDocument.BEFORE, **kwargs):
+        """Comme MongoDB: un upsert sur un _id existant (filtre non satisfait) lève DuplicateKeyError."""
+        doc = self.sync.find_one(query)
+        if doc is None:
+            if not upsert:
+                return None
+            if "_id" in query and self.sync.find_one({"_id": query["_id"]}) is not None:
+                raise DuplicateKeyError("E11000 duplicate key error")
+            doc_id = self.sync.update_one(query, update, upsert=True).upserted_id
+            after = self.sync.find_one({"_id": doc_id})
+            return _project(after, projection) if return_document == ReturnDocument.AFTER else None
+        self.sync.update_one({"_id": doc["_id"]}, update)
+        if return_document == ReturnDocument.AFTER:
+            doc = self.sync.find_one({"_id": doc["_id"]})
+        return _project(doc, projection)
+
+    def __getattr__(self, name):
+        method = getattr(self.sync, name)
+
+        async def call(*args, **kwargs):
+            return method(*args, **kwargs)
+        return call
+
+
+class AsyncInMemoryDatabase:
+    def __init__(self, database):
+        self.sync = database
+        self._collections = {}
+
+    def __getitem__(self, name):
+        if name not in self._collections:
+            self._collections[name] = AsyncInMemoryCollection(self.sync[name])
+        return self._collections[name]
+
+    def __getattr__(self, name):
+        if name.startswith('_') or name == "sync":
+            raise AttributeError(name)
+        return self[name]
+
+
+def async_memory_db():
+    return AsyncInMemoryDatabase(InMemoryClient()["test"])
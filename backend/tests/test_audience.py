@@ -0,0 +1,135 @@
+"""
+Test Suite: Résolution d'audience des campagnes (audience.py)
+Contacts streamés par lots avec projection minimale, dédoublonnés entre
+users et chat_participants par email ou téléphone normalisé.
+
+Features to test:
+1. Normalisation email / téléphone (convention Twilio +41)
+2. targetType "all": users + chat_participants, sans plafond à 1000
+3. selectedContacts: ids users OU participants CRM
+4. Dédoublonnage par email ou téléphone normalisé
+5. Projection: seuls id/name/email/whatsapp sont rapatriés
+6. Issues de lancement: écrites par lots dans campaign_results, compteurs + aperçu borné
+7. Scheduler (pymongo): reprise des issues précédentes, ancien format recopié une fois, "déjà envoyé" indexé
+"""
+
+import sys
+import asyncio
+
+# Add backend to path for audience import
+sys.path.insert(0, '/app/backend')
+from audience import (normalize_email, normalize_phone, iter_audience, AUDIENCE_PROJECTION, CampaignResultWriter,
+                      SyncCampaignResultWriter)
+from scheduler_simulator import InMemoryClient
+from motor_memory import async_memory_db
+
+
+def _db(users=(), participants=()):
+    db = InMemoryClient()["test"]
+    if users:
+        db.users.insert_many([dict(u) for u in users])
+    if participants:
+        db.chat_participants.insert_many([dict(p) for p in participants])
+    return db
+
+
+class TestNormalization:
+    """Clés de dédoublonnage"""
+
+    def test_normalize_email(self):
+        assert normalize_email("  Jane.Doe@Example.COM ") == "jane.doe@example.com"
+        assert normalize_email(None) == ""
+
+    def test_normalize_phone(self):
+        assert normalize_phone("079 123 45 67") == "+41791234567"
+        assert normalize_phone("+41 79-123-45-67") == "+41791234567"
+        assert normalize_phone("0041791234567") == "+41791234567"
+        assert normalize_phone("33612345678") == "+33612345678"
+        assert normalize_phone("") == ""
+
+
+class TestAudienceResolution:
+    """Streaming + dédoublonnage"""
+
+    def test_all_streams_beyond_1000_contacts(self):
+        users = [{"id": f"u{i}", "name": f"U{i}", "email": f"u{i}@test.com"} for i in range(1500)]
+        contacts = list(iter_audience(_db(users), {"targetType": "all"}))
+        assert len(contacts) == 1500
+
+    def test_all_includes_crm_participants_and_dedupes(self):
+        users = [{"id": "u1", "name": "Awa", "email": "awa@test.com", "whatsapp": ""}]
+        participants = [
+            {"id": "p1", "name": "Awa", "email": " AWA@test.com", "whatsapp": "0791234567"},
+            {"id": "p2", "name": "Kofi", "email": "", "whatsapp": "+41 79 765 43 21"},
+            {"id": "p3", "name": "Kofi bis", "email": "kofi@test.com", "whatsapp": "0797654321"}
+        ]
+        ids = [c["id"] for c in iter_audience(_db(users, participants), {"targetType": "all"})]
+        assert ids == ["u1", "p2"]
+
+    def test_selected_contacts_from_both_collections(self):
+        users = [{"id": "u1", "email": "a@test.com"}, {"id": "u2", "email": "b@test.com"}]
+        participants = [{"id": "p1", "email": "c@test.com"}]
+        campaign = {"targetType": "selected", "selectedContacts": ["u2", "p1"]}
+        ids = sorted(c["id"] for c in iter_audience(_db(users, participants), campaign))
+        assert ids == ["p1", "u2"]
+
+    def test_selected_empty_yields_nothing(self):
+        users = [{"id": "u1", "email": "a@test.com"}]
+        assert list(iter_audience(_db(users), {"targetType": "selected", "selectedContacts": []})) == []
+
+    def test_projection_only_needed_fields(self):
+        users = [{"id": "u1", "name": "Awa", "email": "a@test.com", "whatsapp": "", "notes": "x" * 1000}]
+        contact = next(iter_audience(_db(users), {"targetType": "all"}))
+        assert set(contact) <= {k for k, v in AUDIENCE_PROJECTION.items() if v}
+
+
+class TestCampaignResults:
+    """Issues par contact écrites par lots"""
+
+    def test_batched_writes_and_summary(self):
+        db = async_memory_db()
+        db.sync.campaign_results.insert_one({"campaign_id": "c1", "contactId": "old", "status": "sent"})
+        db.sync.campaign_results.insert_one({"campaign_id": "c2", "contactId": "x", "status": "sent"})
+        writes = []
+
+        async def scenario():
+            writer = CampaignResultWriter(db, "c1", batch_size=4, preview=3)
+            insert_many = db.campaign_results.insert_many
+            db.campaign_results.insert_many = lambda docs, **kw: writes.append(len(docs)) or insert_many(docs, **kw)
+            await writer.reset()
+            for i in range(10):
+                await writer.add({"contactId": f"u{i}", "channel": "email", "status": "failed" if i == 3 else "sent"})
+            persisted_before_flush = db.sync.campaign_results.count_documents({"campaign_id": "c1"})
+            await writer.flush()
+            return writer, persisted_before_flush
+
+        writer, before_flush = asyncio.run(scenario())
+        assert writes == [4, 4, 2] and before_flush == 8
+        assert writer.summary == {"total": 10, "sent": 9, "failed": 1}
+        assert [r["contactId"] for r in writer.preview] == ["u0", "u1", "u2"]
+        assert db.sync.campaign_results.count_documents({"campaign_id": "c1"}) == 10  # lancement précédent remplacé
+        assert db.sync.campaign_results.count_documents({"campaign_id": "c2"}) == 1
+
+    def test_sync_writer_resumes_and_checks_sent(self):
+        db = InMemoryClient()["test"]
+        legacy = {"id": "c1", "results": [{"contactId": f"u{i}", "channel": "email", "status": "sent"} for i in range(5)]}
+        db.campaigns.insert_one(dict(legacy))
+
+        writer = SyncCampaignResultWriter(db, "c1", batch_size=2, preview=3)
+        writer.resume(legacy)
+        # Ancien format recopié une fois, document converti (aperçu borné + compteurs)
+        campaign = db.campaigns.find_one({"id": "c1"})
+        assert campaign["resultsSummary"] == {"total": 5, "sent": 5} and len(campaign["results"]) == 3
+        assert writer.already_sent("u4", "email") and not writer.already_sent("u4", "whatsapp")
+        writer.add({"contactId": "u9", "channel": "whatsapp", "status": "sent"})
+        assert writer.already_sent("u9", "whatsapp")  # encore dans le tampon
+        writer.flush()
+        db.campaigns.update_one({"id": "c1"}, {"$set": {"results": writer.preview, "resultsSummary": writer.summary}})
+
+        # Date suivante d'une campagne récurrente: compteurs repris depuis le document
+        again = SyncCampaignResultWriter(db, "c1", batch_size=2, preview=3)
+        again.resume(db.campaigns.find_one({"id": "c1"}))
+        again.add({"contactId": "u10", "channel": "email", "status": "failed"})
+        again.flush()
+        assert again.summary == {"total": 7, "sent": 6, "failed": 1}
+        assert db.campaign_results.count_documents({"campaign_id": "c1"}) == 7
@@ -0,0 +1,172 @@
+"""
+Test Suite: Places par séance de cours (availability.py)
+Compteurs course_occurrences maintenus à la création / suppression de réservation,
+capacité garantie par un $inc conditionnel, séances calculées depuis weekday.
+
+Features to test:
+1. Dates: selectedDates (ISO UTC du frontend) -> jour local, séances weekday (0 = dimanche), fenêtre from/to
+2. Capacité: séance complète -> 409, rollback des autres dates, libération à la suppression
+3. Amorçage à l'écriture (réservation, cours, rattrapage): comptage exact des réservations existantes;
+   lecture publique sans écriture
+4. Route /api/reservations: courseId conservé, séance complète sans consommer le code promo
+"""
+
+import sys
+import asyncio
+from datetime import date
+
+import pytest
+
+# Add backend to path for availability import
+sys.path.insert(0, '/app/backend')
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from motor_memory import async_memory_db
+from availability import (occurrence_date, booked_dates, occurrences, parse_window, reserve_seats, release_seats,
+                          course_availability, drop_course_occurrences, seed_course_occurrences,
+                          backfill_occurrences, OCCURRENCES)
+from promo_index import promo_index
+import tenant_context
+from routes import reservation_routes
+from routes.reservation_routes import reservation_router
+
+COURSE = {"id": "c1", "name": "Cardio", "weekday": 3, "time": "18:30", "capacity": 2}  # mercredi
+
+
+@pytest.fixture
+def db():
+    database = async_memory_db()
+    database.sync.courses.insert_one(dict(COURSE))
+    # Réservation existante avant les compteurs: minuit local Paris envoyé en UTC
+    database.sync.reservations.insert_one({"id": "old", "courseId": "c1", "selectedDates": ["2026-03-03T23:00:00.000Z"]})
+    return database
+
+
+class TestDates:
+    """Séances et fenêtres"""
+
+    def test_occurrence_date(self):
+        assert occurrence_date("2026-03-03T23:00:00.000Z") == "2026-03-04"  # hiver UTC+1
+        assert occurrence_date("2026-07-07T22:00:00.000Z") == "2026-07-08"  # été UTC+2
+        assert occurrence_date("2026-03-04") == "2026-03-04"
+        assert occurrence_date("n/a") is None
+        assert booked_dates({"courseId": "c1", "selectedDates": ["2026-03-04", "2026-03-03T23:00:00.000Z"]}) == ["2026-03-04"]
+        assert booked_dates({"courseId": "N/A", "selectedDates": ["2026-03-04"]}) == []
+        assert booked_dates({"courseId": "c1", "isProduct": True, "selectedDates": ["2026-03-04"]}) == []
+
+    def test_occurrences(self):
+        wednesdays = occurrences(3, date(2026, 3, 1), date(2026, 3, 18))
+        assert [d.isoformat() for d in wednesdays] == ["2026-03-04", "2026-03-11", "2026-03-18"]
+        assert occurrences(0, date(2026, 3, 1), date(2026, 3, 1)) == [date(2026, 3, 1)]  # dimanche
+        assert parse_window("2026-03-01", None) == (date(2026, 3, 1), date(2026, 3, 28))
+        for bad in [("2026-03-10", "2026-03-01"), ("2026-01-01", "2026-12-31"), ("hier", None)]:
+            with pytest.raises(HTTPException) as exc:
+                parse_window(*bad)
+            assert exc.value.status_code == 400
+
+
+class TestCapacity:
+    """Compteurs et capacité"""
+
+    def test_fill_rollback_release(self, db):
+        async def scenario():
+            await reserve_seats(db, "c1", ["2026-03-11"], 2)
+            await reserve_seats(db, "c1", ["2026-03-04"], 2)  # amorcé à 1 (réservation existante) -> 2
+            with pytest.raises(HTTPException) as exc:
+                await reserve_seats(db, "c1", ["2026-03-11", "2026-03-04"], 2)
+            window = await course_availability(db, dict(COURSE), date(2026, 3, 1), date(2026, 3, 14))
+            await release_seats(db, "c1", ["2026-03-04", "2026-03-04", "2026-03-04"])
+            released = db.sync[OCCURRENCES].find_one({"_id": "c1:2026-03-04"})["booked"]
+            return exc.value, window, released
+
+        error, window, released = asyncio.run(scenario())
+        assert error.status_code == 409 and "2026-03-04" in error.detail
+        rows = {row["date"]: row for row in window["occurrences"]}
+        assert rows["2026-03-11"]["booked"] == 1  # rollback: la place prise avant l'échec est rendue
+        assert rows["2026-03-04"] == {"date": "2026-03-04", "startsAt": "2026-03-04T18:30:00+01:00",
+                                      "booked": 2, "remaining": 0, "full": True}
+        assert released == 0  # jamais négatif
+
+    def test_concurrent_last_seat(self, db):
+        async def attempt():
+            try:
+                await reserve_seats(db, "c1", ["2026-03-18"], 2)
+                return True
+            except HTTPException:
+                return False
+
+        async def scenario():
+            return await asyncio.gather(*(attempt() for _ in range(5)))
+
+        assert sum(asyncio.run(scenario())) == 2
+
+    def test_unlimited_and_drop(self, db):
+        async def scenario():
+            await reserve_seats(db, "c1", ["2026-03-04"], None)
+            unlimited = await course_availability(db, {"id": "c1", "weekday": 3, "time": "18:30"},
+                                                  date(2026, 3, 4), date(2026, 3, 4))
+            await drop_course_occurrences(db, ["c1"])
+            return unlimited, db.sync[OCCURRENCES].count_documents({})
+
+        unlimited, remaining = asyncio.run(scenario())
+        assert unlimited["capacity"] is None
+        assert unlimited["occurrences"][0]["remaining"] is None and unlimited["occurrences"][0]["booked"] == 2
+        assert remaining == 0
+
+
+class TestSeeding:
+    """Amorçage à l'écriture, lecture seule"""
+
+    def test_read_path_never_writes(self, db):
+        window = asyncio.run(course_availability(db, dict(COURSE), date(2026, 3, 1), date(2026, 3, 14)))
+        assert [(row["date"], row["booked"]) for row in window["occurrences"]] == [("2026-03-04", 1), ("2026-03-11", 0)]
+        assert db.sync[OCCURRENCES].count_documents({}) == 0
+
+    def test_seed_on_course_write_and_backfill(self, db):
+        db.sync.courses.insert_one({"id": "c2", "weekday": 3, "time": "10:00"})  # sans capacité
+        db.sync.courses.insert_one({"id": "c3", "weekday": 3, "capacity": 5, "archived": True})
+
+        async def scenario():
+            seeded = await seed_course_occurrences(db, dict(COURSE), date(2026, 3, 1), date(2026, 3, 14))
+            again = await seed_course_occurrences(db, dict(COURSE), date(2026, 3, 1), date(2026, 3, 14))
+            backfilled = await backfill_occurrences(db)
+            return seeded, again, backfilled
+
+        seeded, again, backfilled = asyncio.run(scenario())
+        assert (seeded, again) == (2, 0)
+        assert db.sync[OCCURRENCES].find_one({"_id": "c1:2026-03-04"})["booked"] == 1
+        assert backfilled == 4  # 4 prochaines semaines du seul cours actif avec capacité
+        assert db.sync[OCCURRENCES].count_documents({"course_id": {"$ne": "c1"}}) == 0
+
+
+class TestRoute:
+    """/api/reservations"""
+
+    def test_full_session_keeps_promo(self, db, monkeypatch):
+        db.sync.courses.update_one({"id": "c1"}, {"$set": {"capacity": 1}})
+        redeemed = []
+
+        async def lookup(_db, code):
+            return {"id": "d1", "code": code}
+
+        async def redeem(_db, discount):
+            redeemed.append(discount["id"])
+            return discount
+
+        monkeypatch.setattr(promo_index, "lookup", lookup)
+        monkeypatch.setattr(promo_index, "redeem", redeem)
+        reservation_routes.init_reservation_db(db)
+        tenant_context.init_tenant_db(db)
+        app = FastAPI()
+        app.include_router(reservation_router, prefix="/api")
+        body = {"userName": "A", "userEmail": "a@x.ch", "offerName": "Séance", "totalPrice": 0, "courseId": "c1",
+                "selectedDates": ["2026-03-10T23:00:00.000Z"], "promoCode": "FREE"}
+        with TestClient(app) as client:
+            first = client.post("/api/reservations", json=body)
+            full = client.post("/api/reservations", json=body)
+            deleted = client.delete(f"/api/reservations/{first.json()['id']}")
+            again = client.post("/api/reservations", json=body)
+        assert first.status_code == 200 and first.json()["courseId"] == "c1"
+        assert full.status_code == 409
+        assert deleted.status_code == 200 and again.status_code == 200
+        assert redeemed == ["d1", "d1"]  # pas d'utilisation du code pour la séance complète
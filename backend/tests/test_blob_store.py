@@ -0,0 +1,143 @@
+"""
+Test Suite: Blob store adressé par contenu (blob_store.py)
+Les photos sont rangées sous leur SHA-256, dédoublonnées, comptées par
+référence depuis users / chat_participants / coaches et ramassées par le GC.
+
+Features to test:
+1. Upload identique: aucun retraitement, même URL
+2. URL de blob -> hash, compteurs ajoutés / retirés
+3. GC: recalcul des compteurs (marquage) puis suppression des blobs orphelins
+4. Délai de grâce et fichiers sans document
+5. Anciens fichiers uploads/profiles non référencés (--legacy)
+"""
+
+import io
+import os
+import sys
+import time
+import asyncio
+
+# Add backend to path for blob_store import
+sys.path.insert(0, '/app/backend')
+sys.path.insert(0, os.path.dirname(__file__))
+from PIL import Image
+from blob_store import store_image, adjust_refs, sha_from_url, collect_garbage, sha256_hex
+from image_variants import shutdown_image_pool
+from motor_memory import async_memory_db
+
+
+def _jpeg(color):
+    buffer = io.BytesIO()
+    Image.new("RGB", (400, 300), color=color).save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+def _run(coro):
+    try:
+        return asyncio.run(coro)
+    finally:
+        shutdown_image_pool()
+
+
+def _age(root, seconds):
+    old = time.time() - seconds
+    for dirpath, _, names in os.walk(root):
+        for name in names:
+            os.utime(os.path.join(dirpath, name), (old, old))
+
+
+class TestBlobStore:
+    """Stockage et dédoublonnage"""
+
+    def test_identical_upload_is_deduplicated(self, tmp_path):
+        db = async_memory_db()
+        contents = _jpeg((10, 120, 200))
+
+        async def scenario():
+            first = await store_image(db, contents, root=str(tmp_path))
+            second = await store_image(db, contents, root=str(tmp_path))
+            return first, second
+
+        first, second = _run(scenario())
+        sha = sha256_hex(contents)
+        assert not first["deduplicated"] and second["deduplicated"]
+        assert second["variants"]["200"]["jpeg"] == f"/api/uploads/blobs/{sha[:2]}/{sha}_200.jpg"
+        assert sorted(os.listdir(tmp_path / sha[:2])) == sorted(first["files"])
+        assert db.sync.blobs.count_documents({}) == 1
+
+    def test_sha_from_url_and_ref_counting(self):
+        db = async_memory_db()
+        sha = "a" * 64
+        url = f"/api/uploads/blobs/aa/{sha}_200.jpg"
+        assert sha_from_url(url) == sha
+        assert sha_from_url("/api/uploads/profiles/guest_1234.jpg") is None
+        db.sync.blobs.insert_one({"sha256": sha, "ref_count": 0})
+
+        asyncio.run(adjust_refs(db, added=[url, url, None]))
+        asyncio.run(adjust_refs(db, removed=[url, "https://lh3.googleusercontent.com/x"]))
+        assert db.sync.blobs.find_one({"sha256": sha})["ref_count"] == 1
+
+
+class TestGarbageCollector:
+    """Marquage / balayage"""
+
+    def test_gc_recounts_and_removes_unreferenced(self, tmp_path):
+        db = async_memory_db()
+        kept_bytes, dropped_bytes = _jpeg((1, 2, 3)), _jpeg((200, 10, 10))
+
+        async def scenario():
+            kept = await store_image(db, kept_bytes, root=str(tmp_path))
+            dropped = await store_image(db, dropped_bytes, root=str(tmp_path))
+            url = kept["variants"]["200"]["jpeg"]
+            await db.users.insert_one({"id": "u1", "photo_url": url, "photoUrl": url})
+            await db.chat_participants.insert_one({"id": "p1", "photo_url": url})
+            await db.coaches.insert_one({"id": "c1", "logo_url": dropped["variants"]["64"]["webp"]})
+            # Coach qui change de logo: l'ancien n'est plus référencé
+            await db.coaches.update_one({"id": "c1"}, {"$set": {"logo_url": None}})
+            young = await collect_garbage(db, root=str(tmp_path), grace_seconds=3600)
+            await db.blobs.update_many({}, {"$set": {"created_at": "2020-01-01T00:00:00+00:00"}})
+            # Ancien blob dont la dernière référence vient de tomber: encore protégé
+            recent = await collect_garbage(db, root=str(tmp_path), grace_seconds=3600)
+            await db.blobs.update_many({}, {"$set": {"last_ref_at": "2020-01-01T00:00:00+00:00"}})
+            dry = await collect_garbage(db, root=str(tmp_path), grace_seconds=3600, dry_run=True)
+            real = await collect_garbage(db, root=str(tmp_path), grace_seconds=3600)
+            return kept, dropped, young, recent, dry, real
+
+        kept, dropped, young, recent, dry, real = _run(scenario())
+        assert young["deleted_blobs"] == 0  # délai de grâce
+        assert recent["deleted_blobs"] == 0  # compté depuis last_ref_at
+        assert dry["deleted_blobs"] == 1 and os.path.exists(tmp_path / dropped["sha256"][:2])
+        assert real["deleted_blobs"] == 1 and real["freed_bytes"] > 0
+        assert db.sync.blobs.find_one({"sha256": kept["sha256"]})["ref_count"] == 2
+        assert db.sync.blobs.find_one({"sha256": dropped["sha256"]}) is None
+        assert not any(name.startswith(dropped["sha256"]) for _, _, names in os.walk(tmp_path) for name in names)
+
+    def test_dedup_upload_refreshes_grace(self, tmp_path):
+        db = async_memory_db()
+        contents = _jpeg((90, 90, 90))
+
+        async def scenario():
+            await store_image(db, contents, root=str(tmp_path))
+            old = "2020-01-01T00:00:00+00:00"
+            await db.blobs.update_many({}, {"$set": {"created_at": old, "last_ref_at": old, "ref_count": 0}})
+            # Upload concurrent du même contenu, pas encore enregistré sur le profil
+            await store_image(db, contents, root=str(tmp_path))
+            return await collect_garbage(db, root=str(tmp_path), grace_seconds=3600)
+
+        report = _run(scenario())
+        assert report["deleted_blobs"] == 0 and db.sync.blobs.count_documents({}) == 1
+
+    def test_orphan_and_legacy_files(self, tmp_path):
+        db = async_memory_db()
+        blobs, legacy = tmp_path / "blobs", tmp_path / "profiles"
+        (blobs / "ff").mkdir(parents=True)
+        legacy.mkdir()
+        (blobs / "ff" / ("f" * 64 + "_200.jpg")).write_bytes(b"x" * 10)
+        (legacy / "p1_old.jpg").write_bytes(b"x" * 20)
+        (legacy / "p1_current.jpg").write_bytes(b"x" * 30)
+        db.sync.users.insert_one({"id": "p1", "photo_url": "/api/uploads/profiles/p1_current.jpg"})
+        _age(tmp_path, 7200)
+
+        report = asyncio.run(collect_garbage(db, root=str(blobs), grace_seconds=3600, legacy_dir=str(legacy)))
+        assert report["deleted_files"] == 1 and report["deleted_legacy"] == 1
+        assert os.listdir(legacy) == ["p1_current.jpg"]
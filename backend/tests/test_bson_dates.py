@@ -0,0 +1,117 @@
+"""
+Test Suite: Dates BSON natives et migration en ligne (bson_dates.py)
+Écriture en dates BSON, lecture tolérante (chaînes 'Z' / '+00:00' / dates),
+migration par lots reprenant au dernier _id traité.
+
+Features to test:
+1. as_datetime / iso / with_dates sur les deux formats
+2. time_after: fenêtre correcte sur une collection mixte (dates + anciennes chaînes)
+3. Migration: lots, reprise après interruption, garde sur la valeur d'origine, état "done"
+4. Keyset réservations pendant la migration (curseur date -> chaînes restantes)
+"""
+
+import sys
+import asyncio
+from datetime import datetime, timezone, timedelta
+
+import pytest
+
+# Add backend to path for bson_dates import
+sys.path.insert(0, '/app/backend')
+from motor_memory import async_memory_db
+from bson_dates import (as_datetime, iso, with_dates, time_after, time_before, migrate_collection,
+                        migrate_dates, date_migration_status, MIGRATIONS)
+from reservation_pages import keyset_page
+
+T0 = datetime(2026, 3, 1, 12, 0, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def db():
+    database = async_memory_db()
+    for i in range(7):
+        moment = T0 + timedelta(minutes=i)
+        # Ancien stockage: 'Z' ou '+00:00' selon le chemin d'écriture
+        created = moment.isoformat().replace("+00:00", "Z") if i % 2 else moment.isoformat()
+        database.sync.chat_messages.insert_one({"_id": f"m{i}", "id": f"m{i}", "session_id": "s1", "created_at": created})
+    database.sync.chat_messages.insert_one({"_id": "m9", "id": "m9", "created_at": "pas une date"})
+    return database
+
+
+class TestConversions:
+    """Lecture tolérante"""
+
+    def test_formats(self):
+        assert as_datetime("2026-03-01T12:00:00Z") == as_datetime("2026-03-01T12:00:00+00:00") == T0
+        assert as_datetime("2026-03-01T13:00:00+01:00") == T0
+        assert as_datetime("2026-03-01 12:00:00") == T0  # sans fuseau = UTC
+        assert as_datetime(datetime(2026, 3, 1, 12)) == T0  # date BSON naïve (client non tz_aware)
+        assert as_datetime("") is None and as_datetime("nope") is None and as_datetime(None) is None
+        assert iso(T0) == "2026-03-01T12:00:00+00:00" and iso("x") == "x" and iso(None) is None
+
+    def test_with_dates(self):
+        doc = with_dates({"createdAt": "2026-03-01T12:00:00Z", "validatedAt": None, "courseTime": "18:30"}, "reservations")
+        assert doc == {"createdAt": T0, "validatedAt": None, "courseTime": "18:30"}
+        assert with_dates({"created_at": "x"}, "chat_messages") == {"created_at": "x"}
+        assert with_dates({"createdAt": "2026-03-01T12:00:00Z"}, "leads") == {"createdAt": "2026-03-01T12:00:00Z"}
+
+    def test_window_on_mixed_collection(self, db):
+        db.sync.chat_messages.update_one({"id": "m5"}, {"$set": {"created_at": T0 + timedelta(minutes=5)}})
+        db.sync.chat_messages.update_one({"id": "m6"}, {"$set": {"created_at": T0 + timedelta(minutes=6)}})
+        since = (T0 + timedelta(minutes=2)).isoformat().replace("+00:00", "Z")
+        found = db.sync.chat_messages.find({"$and": [{"session_id": "s1"}, time_after("created_at", since)]})
+        assert sorted(m["id"] for m in found) == ["m3", "m4", "m5", "m6"]
+        before = db.sync.chat_messages.find(time_before("created_at", T0 + timedelta(minutes=1)))
+        assert [m["id"] for m in before] == ["m0"]
+        assert time_after("created_at", "garbage") is None
+
+
+class TestMigration:
+    """Migration en ligne"""
+
+    def test_resumable(self, db):
+        async def scenario():
+            first = await migrate_collection(db, "chat_messages", ("created_at",), batch_size=3, pause=0, max_batches=1)
+            state = db.sync[MIGRATIONS].find_one({"_id": "chat_messages"})
+            # Écriture concurrente sur un document pas encore migré: jamais écrasée
+            db.sync.chat_messages.update_one({"id": "m4"}, {"$set": {"created_at": T0}})
+            rest = await migrate_collection(db, "chat_messages", ("created_at",), batch_size=3, pause=0)
+            again = await migrate_collection(db, "chat_messages", ("created_at",), batch_size=3, pause=0)
+            return first, state, rest, again
+
+        first, state, rest, again = asyncio.run(scenario())
+        assert first == 3 and state["last_id"] == "m2" and not state.get("done")
+        assert rest == 3 and again == 0  # m4 déjà en date, m9 illisible laissé tel quel
+        docs = {d["id"]: d["created_at"] for d in db.sync.chat_messages.find({})}
+        assert docs["m1"] == T0 + timedelta(minutes=1) and docs["m4"] == T0
+        assert docs["m9"] == "pas une date"
+        assert db.sync[MIGRATIONS].find_one({"_id": "chat_messages"})["converted"] == 6
+
+    def test_all_collections(self, db):
+        db.sync.reservations.insert_one({"_id": "r1", "id": "r1", "createdAt": "2026-03-01T12:00:00Z", "validatedAt": None})
+        results = asyncio.run(migrate_dates(db, batch_size=50, pause=0))
+        assert results["chat_messages"] == 7 and results["reservations"] == 1 and results["ai_logs"] == 0
+        status = asyncio.run(date_migration_status(db))
+        assert status["reservations"] == {"done": True, "converted": 1}
+        assert db.sync.reservations.find_one({"id": "r1"})["validatedAt"] is None
+
+
+class TestKeysetDuringMigration:
+    """Curseur date -> les chaînes pas encore migrées suivent"""
+
+    def test_mixed_pages(self):
+        db = async_memory_db()
+        for i in range(4):
+            created = T0 + timedelta(days=i)
+            db.sync.reservations.insert_one({"id": f"r{i}", "createdAt": created if i >= 2 else created.isoformat()})
+
+        async def scenario():
+            first, next_cursor, _ = await keyset_page(db.reservations, {}, {"_id": 0}, 2)
+            second, _, prev_cursor = await keyset_page(db.reservations, {}, {"_id": 0}, 2, after=next_cursor)
+            back, _, _ = await keyset_page(db.reservations, {}, {"_id": 0}, 2, before=prev_cursor)
+            return first, second, back
+
+        first, second, back = asyncio.run(scenario())
+        assert [d["id"] for d in first] == ["r3", "r2"]
+        assert [d["id"] for d in second] == ["r1", "r0"]
+        assert [d["id"] for d in back] == ["r3", "r2"]
@@ -0,0 +1,175 @@
+"""
+Test Suite: Fusion des doublons CRM (contact_merge.py)
+Une agrégation groupe les contacts par email / téléphone normalisés (par coach),
+les références sont réécrites par bulk_write et chaque fusion est journalisée.
+
+Features to test:
+1. Groupes: email OU téléphone commun (transitif), jamais entre deux coachs, anciens documents sans clés
+2. dry_run: rapport des groupes (emails distincts reliés par le téléphone), aucune écriture
+   (pas même le rattrapage des clés d'identité)
+3. Fusion: contact le plus ancien conservé et complété, sessions / messages / messages privés /
+   cibles de campagnes (targetIds, selectedContacts) réécrits,
+   réservations du même email et du même coach seulement, segments reconstruits (pas de ligne
+   en double, member_count exact), audit contact_merges, seconde passe sans effet
+4. Bail job_leases: un seul passage à la fois, repris après libération ou expiration
+5. 100k contacts en une passe d'agrégation
+"""
+
+import sys
+import time
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+
+# Add backend to path for contact_merge import
+sys.path.insert(0, '/app/backend')
+from motor_memory import async_memory_db
+from identity import with_identity, backfill_identity_keys
+from contact_merge import (merge_duplicates, duplicate_clusters, plan_merge, acquire_merge_lease, release_merge_lease,
+                           merge_lease_held, MERGES, LEASES, MERGE_LEASE)
+
+
+def contact(contact_id, created, coach="c1", **fields):
+    return with_identity({"id": contact_id, "name": fields.pop("name", contact_id), "email": "", "whatsapp": "",
+                          "coach_id": coach, "created_at": created, **fields})
+
+
+@pytest.fixture
+def db():
+    database = async_memory_db()
+    participants = database.sync.chat_participants
+    participants.insert_one(contact("a1", "2025-01-01T10:00:00+00:00", email="Ana@x.ch"))
+    participants.insert_one(contact("a2", "2025-02-01T10:00:00+00:00", email="ana@x.ch", whatsapp="0761111111",
+                                    isSubscriber=True))
+    # Relié à a2 par le téléphone seulement
+    participants.insert_one(contact("a3", "2025-03-01T10:00:00+00:00", email="other@x.ch", whatsapp="+41 76 111 11 11"))
+    participants.insert_one(contact("b1", "2025-01-01T10:00:00+00:00", coach="c2", email="ana@x.ch"))  # autre coach
+    participants.insert_one(contact("solo", "2025-01-01T10:00:00+00:00", email="solo@x.ch"))
+    # Anciens documents sans clés d'identité
+    participants.insert_one({"id": "z1", "name": "Zed", "email": "zed@x.ch", "coach_id": "c1", "created_at": "2024-01-01T00:00:00Z"})
+    participants.insert_one({"id": "z2", "name": "Zed", "email": "ZED@x.ch ", "coach_id": "c1", "created_at": "2024-06-01T00:00:00Z"})
+    database.sync.chat_sessions.insert_one({"id": "s1", "participant_ids": ["a2", "coach"], "participant_id": "a3"})
+    database.sync.chat_sessions.insert_one({"id": "s2", "participant_ids": ["a1", "a3"]})
+    database.sync.chat_messages.insert_one({"id": "m1", "session_id": "s1", "sender_id": "a2"})
+    database.sync.private_messages.insert_one({"id": "pm1", "sender_id": "a3", "recipient_id": "b1"})
+    database.sync.campaigns.insert_one({"id": "cp1", "targetIds": ["a2", "x", "a3"], "selectedContacts": ["a1", "a3"]})
+    database.sync.segments.insert_one({"id": "g1", "coach_id": "c1", "rule": {"type": "subscribers"}, "member_count": 1})
+    database.sync.segment_members.insert_one({"segment_id": "g1", "id": "a2", "contact_key": "e:ana@x.ch"})
+    database.sync.reservations.insert_many([
+        {"id": "r1", "userEmail": "other@x.ch", "coach_id": "c1"},  # a3: autre email, relié par le téléphone
+        {"id": "r2", "userEmail": "ana@x.ch", "coach_id": "c1"},
+        {"id": "r3", "userEmail": "ana@x.ch", "coach_id": "c2"},  # b1, autre coach
+    ])
+    return database
+
+
+class TestClusters:
+    """Groupes de doublons"""
+
+    def test_clusters(self, db):
+        asyncio.run(backfill_identity_keys(db))  # rattrapage des clés des anciens documents
+        clusters = {tuple(c["ids"]): c for c in asyncio.run(duplicate_clusters(db))}
+        assert set(clusters) == {("a1", "a2", "a3"), ("z1", "z2")}
+        assert clusters[("a1", "a2", "a3")]["keys"] == ["+41761111111", "ana@x.ch"]  # clés partagées
+        assert clusters[("a1", "a2", "a3")]["coach_id"] == "c1"
+
+    def test_plan(self):
+        survivor, duplicates, fill = plan_merge([
+            {"id": "new", "created_at": "2025-05-01T00:00:00Z", "whatsapp": "+41", "isSubscriber": True},
+            {"id": "old", "created_at": "2025-01-01T00:00:00Z", "name": "Old"},
+            {"id": "undated", "name": "X", "photo_url": "/p.jpg"},
+        ])
+        assert survivor["id"] == "old" and [d["id"] for d in duplicates] == ["new", "undated"]
+        assert fill == {"whatsapp": "+41", "photo_url": "/p.jpg", "isSubscriber": True}
+
+    def test_dry_run(self, db):
+        result = asyncio.run(merge_duplicates(db, dry_run=True))
+        # Anciens documents z1 / z2 sans clés: ni rattrapés ni groupés par un dry_run
+        assert result["dry_run"] and result["clusters"] == 1 and result["duplicates"] == 2
+        assert "email_lc" not in db.sync.chat_participants.find_one({"id": "z1"})
+        entry = next(r for r in result["report"] if r["survivor_id"] == "a1")
+        assert entry["duplicate_ids"] == ["a2", "a3"]
+        assert entry["fill"] == {"whatsapp": "0761111111", "isSubscriber": True}
+        assert entry["distinct_emails"] == ["other@x.ch"]
+        assert db.sync.chat_participants.count_documents({}) == 7
+        assert db.sync[MERGES].count_documents({}) == 0
+        assert db.sync.chat_sessions.find_one({"id": "s1"})["participant_ids"] == ["a2", "coach"]
+        assert db.sync.campaigns.find_one({"id": "cp1"})["targetIds"] == ["a2", "x", "a3"]
+
+
+class TestMerge:
+    """Fusion et réécriture des références"""
+
+    def test_merge(self, db):
+        result = asyncio.run(merge_duplicates(db, dry_run=False, batch_size=1))
+        again = asyncio.run(merge_duplicates(db, dry_run=False))
+        assert result["clusters"] == 2 and again["clusters"] == 0
+        assert sorted(c["id"] for c in db.sync.chat_participants.find({})) == ["a1", "b1", "solo", "z1"]
+        survivor = db.sync.chat_participants.find_one({"id": "a1"})
+        assert survivor["whatsapp"] == "0761111111" and survivor["phone_e164"] == "+41761111111"
+        assert survivor["isSubscriber"] is True
+        sessions = {s["id"]: s for s in db.sync.chat_sessions.find({})}
+        assert sessions["s1"]["participant_ids"] == ["coach", "a1"] and sessions["s1"]["participant_id"] == "a1"
+        assert sessions["s2"]["participant_ids"] == ["a1"]
+        assert db.sync.chat_messages.find_one({"id": "m1"})["sender_id"] == "a1"
+        private = db.sync.private_messages.find_one({"id": "pm1"})
+        assert (private["sender_id"], private["recipient_id"]) == ("a1", "b1")
+        campaign = db.sync.campaigns.find_one({"id": "cp1"})
+        assert campaign["targetIds"] == ["x", "a1"] and campaign["selectedContacts"] == ["a1"]
+        members = list(db.sync.segment_members.find({"segment_id": "g1"}))
+        assert [(m["id"], m["contact_key"]) for m in members] == [("a1", "e:ana@x.ch")]
+        assert db.sync.segments.find_one({"id": "g1"})["member_count"] == 1
+        reservations = {r["id"]: r["userEmail"] for r in db.sync.reservations.find({})}
+        assert reservations == {"r1": "other@x.ch", "r2": "Ana@x.ch", "r3": "ana@x.ch"}
+        audit = db.sync[MERGES].find_one({"survivor_id": "a1"})
+        assert audit["merged_ids"] == ["a2", "a3"] and audit["run_id"] == result["run_id"]
+        assert [c["id"] for c in audit["merged_contacts"]] == ["a2", "a3"]
+        assert audit["distinct_emails"] == ["other@x.ch"]
+        assert db.sync[MERGES].count_documents({}) == 2
+
+
+class TestLease:
+    """Un seul passage à la fois"""
+
+    def test_lease(self):
+        db = async_memory_db()
+
+        async def scenario():
+            first = await acquire_merge_lease(db, "w1")
+            renewed = await acquire_merge_lease(db, "w1")
+            other = await acquire_merge_lease(db, "w2")
+            held = await merge_lease_held(db)
+            await release_merge_lease(db, "w2")  # pas le détenteur: sans effet
+            still = await acquire_merge_lease(db, "w2")
+            await release_merge_lease(db, "w1")
+            after_release = await acquire_merge_lease(db, "w2")
+            # Worker arrêté sans libérer: le bail expiré est repris
+            await db[LEASES].update_one({"_id": MERGE_LEASE}, {"$set": {"expires_at": datetime(2020, 1, 1, tzinfo=timezone.utc)}})
+            expired = await merge_lease_held(db)
+            after_expiry = await acquire_merge_lease(db, "w3")
+            return first, renewed, other, held, still, after_release, expired, after_expiry
+
+        assert asyncio.run(scenario()) == (True, True, False, True, False, True, False, True)
+        assert db.sync[LEASES].find_one({"_id": MERGE_LEASE})["owner"] == "w3"
+
+
+class TestScale:
+    """100k contacts"""
+
+    def test_single_pass(self):
+        db = async_memory_db()
+        db.sync.chat_participants.insert_many([
+            with_identity({"id": f"c{i}", "name": f"C{i}", "coach_id": "c1",
+                           "email": f"user{i % 90000}@x.ch", "whatsapp": ""})
+            for i in range(100000)
+        ])
+        calls = []
+        aggregate = db.chat_participants.aggregate
+        db.chat_participants.aggregate = lambda *args, **kwargs: calls.append(args) or aggregate(*args, **kwargs)
+        start = time.perf_counter()
+        clusters = asyncio.run(duplicate_clusters(db))
+        elapsed = time.perf_counter() - start
+        assert len(calls) == 1
+        assert len(clusters) == 10000 and all(len(c["ids"]) == 2 for c in clusters)
+        assert elapsed < 30
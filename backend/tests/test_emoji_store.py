@@ -0,0 +1,162 @@
+"""
+Test Suite: Emojis personnalisés en fichiers (emoji_store.py)
+Les data URLs base64 sont décodées une fois en fichiers nommés par hash,
+le manifeste compact est servi depuis la mémoire et invalidé à l'écriture.
+
+Features to test:
+1. Décodage / validation des data URLs
+2. Fichier dédoublonné + miniature WebP transparente, original gardé pour les GIF animés
+3. Manifeste: un seul chargement, invalidation, ETag, pas de base64
+4. Migration des anciens documents base64 (idempotente, échecs gardés dans le manifeste)
+5. Listing de dossier recalculé seulement quand le dossier change
+"""
+
+import io
+import os
+import sys
+import base64
+import asyncio
+
+import pytest
+
+# Add backend to path for emoji_store import
+sys.path.insert(0, '/app/backend')
+sys.path.insert(0, os.path.dirname(__file__))
+from PIL import Image
+from emoji_store import decode_data_url, save_emoji_file, EmojiManifest, DirectoryListing, migrate_base64_emojis
+import emoji_store
+from image_variants import shutdown_image_pool
+from motor_memory import async_memory_db
+
+
+def _png_data_url(color=(255, 0, 0, 128)):
+    buffer = io.BytesIO()
+    Image.new("RGBA", (128, 128), color=color).save(buffer, "PNG")
+    return "data:image/png;base64," + base64.b64encode(buffer.getvalue()).decode()
+
+
+def _run(coro):
+    try:
+        return asyncio.run(coro)
+    finally:
+        shutdown_image_pool()
+
+
+class TestDecode:
+    """Validation des data URLs"""
+
+    def test_decode_data_url(self):
+        contents, mime = decode_data_url(_png_data_url())
+        assert mime == "image/png" and contents.startswith(b"\x89PNG")
+        for invalid in ("", "https://example.com/x.png", "data:text/html;base64,PGI+", "data:image/png;base64,"):
+            with pytest.raises(ValueError):
+                decode_data_url(invalid)
+
+
+class TestEmojiFiles:
+    """Stockage fichier"""
+
+    def test_file_is_deduplicated_with_transparent_thumbnail(self, tmp_path):
+        contents, mime = decode_data_url(_png_data_url())
+
+        async def scenario():
+            return await save_emoji_file(contents, mime, str(tmp_path)), await save_emoji_file(contents, mime, str(tmp_path))
+
+        first, second = _run(scenario())
+        assert first == second
+        assert first["url"] == f"/api/emojis/custom/{first['hash']}.png"
+        assert first["thumb_url"] == f"/api/emojis/custom/{first['hash']}_64.webp"
+        assert sorted(os.listdir(tmp_path)) == sorted([f"{first['hash']}.png", f"{first['hash']}_64.webp"])
+        thumb = Image.open(tmp_path / f"{first['hash']}_64.webp")
+        assert thumb.size == (64, 64) and thumb.mode == "RGBA"
+
+    def test_animated_gif_keeps_original(self, tmp_path):
+        frames = [Image.new("RGB", (96, 96), color=color) for color in ((255, 0, 0), (0, 255, 0), (0, 0, 255))]
+        buffer = io.BytesIO()
+        frames[0].save(buffer, "GIF", save_all=True, append_images=frames[1:], duration=100, loop=0)
+        stored = _run(save_emoji_file(buffer.getvalue(), "image/gif", str(tmp_path)))
+        assert stored["thumb_url"] == stored["url"] == f"/api/emojis/custom/{stored['hash']}.gif"
+        assert os.listdir(tmp_path) == [f"{stored['hash']}.gif"]
+
+    def test_thumbnail_failure_falls_back_to_original(self, tmp_path, monkeypatch):
+        contents, mime = decode_data_url(_png_data_url((0, 255, 0, 255)))
+
+        async def failing(*args, **kwargs):
+            raise OSError("pool indisponible")
+
+        monkeypatch.setattr(emoji_store, "process_image", failing)
+        stored = _run(save_emoji_file(contents, mime, str(tmp_path)))
+        assert stored["thumb_url"] == stored["url"]
+
+    def test_svg_is_precompressed(self, tmp_path):
+        svg = b'<svg xmlns="http://www.w3.org/2000/svg">' + b'<path d="M0 0h1"/>' * 100 + b"</svg>"
+        stored = _run(save_emoji_file(svg, "image/svg+xml", str(tmp_path)))
+        assert stored["thumb_url"] == stored["url"]
+        assert os.path.exists(tmp_path / f"{stored['hash']}.svg.gz")
+
+
+class TestManifest:
+    """Manifeste en mémoire"""
+
+    def test_loaded_once_and_invalidated(self):
+        db = async_memory_db()
+        db.sync.custom_emojis.insert_one({"id": "e1", "name": "fire", "category": "custom", "active": True,
+                                          "url": "/api/emojis/custom/a.png", "thumb_url": "/api/emojis/custom/a_64.webp",
+                                          "hash": "a", "created_at": "2026-01-01"})
+        manifest = EmojiManifest()
+        calls = []
+        original_find = db.custom_emojis.find
+        db.custom_emojis.find = lambda *args, **kwargs: calls.append(1) or original_find(*args, **kwargs)
+
+        async def scenario():
+            first, etag = await manifest.get(db)
+            again, same_etag = await manifest.get(db)
+            db.sync.custom_emojis.insert_one({"id": "e2", "name": "star", "active": True, "url": "/api/emojis/custom/b.png",
+                                              "thumb_url": "/api/emojis/custom/b_64.webp", "hash": "b", "created_at": "2026-02-01"})
+            manifest.invalidate()
+            updated, new_etag = await manifest.get(db)
+            return first, etag, same_etag, updated, new_etag
+
+        first, etag, same_etag, updated, new_etag = asyncio.run(scenario())
+        assert len(calls) == 2
+        assert etag == same_etag != new_etag
+        assert first[0]["image_data"] == "/api/emojis/custom/a.png"
+        assert [e["id"] for e in updated] == ["e2", "e1"]
+
+
+class TestMigration:
+    """Documents base64 existants"""
+
+    def test_migrates_base64_documents_once(self, tmp_path):
+        db = async_memory_db()
+        db.sync.custom_emojis.insert_many([
+            {"id": "old1", "name": "happy", "active": True, "image_data": _png_data_url()},
+            {"id": "old2", "name": "broken", "active": True, "image_data": "data:image/png;base64,!!!"},
+        ])
+
+        async def scenario():
+            return await migrate_base64_emojis(db, str(tmp_path)), await migrate_base64_emojis(db, str(tmp_path))
+
+        report, second = _run(scenario())
+        assert report == {"migrated": 1, "failed": 1}
+        assert second == {"migrated": 0, "failed": 1}
+        migrated = db.sync.custom_emojis.find_one({"id": "old1"})
+        assert "image_data" not in migrated and migrated["url"].endswith(".png") and migrated["size"] > 0
+        broken = db.sync.custom_emojis.find_one({"id": "old2"})
+        assert broken["url"] == broken["image_data"] and broken["migration_error"]
+        entries, _ = asyncio.run(EmojiManifest().get(db))
+        assert sorted(e["id"] for e in entries) == ["old1", "old2"]
+
+
+class TestDirectoryListing:
+    """Listing /custom-emojis/list"""
+
+    def test_listing_follows_directory_changes(self, tmp_path):
+        (tmp_path / "fire.svg").write_text("<svg/>")
+        (tmp_path / "fire.svg.gz").write_bytes(b"gz")
+        (tmp_path / "custom").mkdir()
+        listing = DirectoryListing(str(tmp_path), (".svg", ".png"))
+        assert listing.files() == ["fire.svg"]
+        (tmp_path / "heart.png").write_bytes(b"png")
+        os.utime(tmp_path, ns=(os.stat(tmp_path).st_atime_ns, os.stat(tmp_path).st_mtime_ns + 1000))
+        assert listing.files() == ["fire.svg", "heart.png"]
@@ -0,0 +1,133 @@
+"""
+Test Suite: Exports CSV / NDJSON en flux (export_stream.py)
+Curseur itéré par blocs derrière une StreamingResponse, colonnes en liste blanche,
+isolation coach sur /api/reservations/export.
+
+Features to test:
+1. CSV: en-tête envoyé avant toute ligne, blocs de taille bornée, cellules (listes, dates, None)
+2. NDJSON: un objet par ligne, limité aux colonnes demandées
+3. Colonnes / format invalides -> 400
+4. Route réservations: filtrage coach, tri createdAt décroissant, projection
+5. Colonnes calculées (date / heure suisses, total avec repli sur price) et en-têtes traduits
+"""
+
+import sys
+import csv
+import json
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+
+# Add backend to path for export_stream import
+sys.path.insert(0, '/app/backend')
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from motor_memory import async_memory_db
+from export_stream import (stream_rows, parse_columns, parse_labels, check_format, projection_for, RESERVATION_COLUMNS,
+                           RESERVATION_DERIVED)
+import tenant_context
+from routes import reservation_routes
+from routes.reservation_routes import reservation_router
+
+
+@pytest.fixture
+def db():
+    database = async_memory_db()
+    for i in range(5):
+        database.sync.reservations.insert_one({
+            "id": f"r{i}", "reservationCode": f"AF{i}", "userName": f"Client {i}", "userEmail": f"c{i}@x.ch",
+            "selectedDates": ["2026-01-05", "2026-01-12"], "totalPrice": 30.0, "createdAt": f"2026-01-0{i + 1}T10:00:00+00:00",
+            "coach_id": "coach@x.ch" if i % 2 == 0 else "autre@x.ch", "internal": "secret"
+        })
+    return database
+
+
+def collect(cursor, columns, fmt, chunk_rows=2):
+    async def run():
+        return [chunk async for chunk in stream_rows(cursor, columns, fmt, chunk_rows=chunk_rows)]
+    return asyncio.run(run())
+
+
+class TestStream:
+    """Flux par blocs"""
+
+    def test_csv_chunks(self, db):
+        columns = ["reservationCode", "selectedDates", "validatedAt"]
+        chunks = collect(db.reservations.find({}, projection_for(columns)).sort("createdAt", 1), columns, "csv")
+        assert chunks[0] == "reservationCode,selectedDates,validatedAt\r\n"  # en-tête seul, immédiatement
+        assert len(chunks) == 4  # en-tête + 2 + 2 + 1
+        rows = list(csv.reader("".join(chunks).splitlines()))
+        assert rows[1] == ["AF0", "2026-01-05|2026-01-12", ""]
+        assert len(rows) == 6
+
+    def test_ndjson(self, db):
+        db.sync.reservations.update_one({"id": "r0"}, {"$set": {"validatedAt": datetime(2026, 1, 5, tzinfo=timezone.utc)}})
+        chunks = collect(db.reservations.find({"id": "r0"}, {"_id": 0}), ["id", "validatedAt"], "ndjson")
+        lines = "".join(chunks).splitlines()
+        assert [json.loads(line) for line in lines] == [{"id": "r0", "validatedAt": "2026-01-05T00:00:00+00:00"}]
+
+    def test_validation(self):
+        assert parse_columns(None, ["a", "b"]) == ["a", "b"]
+        assert parse_columns(" b,a,b ", ["a", "b"]) == ["b", "a"]
+        with pytest.raises(HTTPException) as exc:
+            parse_columns("a,internal", ["a"])
+        assert exc.value.status_code == 400
+        assert check_format("NDJSON") == "ndjson"
+        with pytest.raises(HTTPException):
+            check_format("xlsx")
+        assert projection_for(["a"]) == {"_id": 0, "a": 1}
+
+
+class TestRoute:
+    """/api/reservations/export"""
+
+    def test_coach_scoping(self, db):
+        reservation_routes.init_reservation_db(db)
+        tenant_context.init_tenant_db(db)
+        app = FastAPI()
+        app.include_router(reservation_router, prefix="/api")
+        with TestClient(app) as client:
+            coach = client.get("/api/reservations/export?columns=reservationCode,userEmail",
+                               headers={"X-User-Email": "Coach@x.ch"})
+            admin = client.get("/api/reservations/export?format=ndjson",
+                               headers={"X-User-Email": "contact.artboost@gmail.com"})
+            anonymous = client.get("/api/reservations/export")
+            bad = client.get("/api/reservations/export?columns=internal", headers={"X-User-Email": "coach@x.ch"})
+        assert coach.headers["content-type"].startswith("text/csv")
+        assert "reservations_" in coach.headers["content-disposition"]
+        assert coach.text.splitlines() == ["reservationCode,userEmail", "AF4,c4@x.ch", "AF2,c2@x.ch", "AF0,c0@x.ch"]
+        admin_rows = [json.loads(line) for line in admin.text.splitlines()]
+        assert len(admin_rows) == 5 and set(admin_rows[0]) == set(RESERVATION_COLUMNS)
+        assert anonymous.text.splitlines() == [",".join(RESERVATION_COLUMNS)]
+        assert bad.status_code == 400
+
+
+class TestDashboardColumns:
+    """Export du dashboard coach"""
+
+    def test_derived_columns_and_labels(self, db):
+        db.sync.reservations.update_one({"id": "r0"}, {"$set": {"datetime": "2026-07-01T16:30:00.000Z"}})
+        db.sync.reservations.update_one({"id": "r2"}, {"$set": {"datetime": "2026-01-05T09:00:00.000Z",
+                                                                  "price": 25.0, "totalPrice": 0}})
+        reservation_routes.init_reservation_db(db)
+        tenant_context.init_tenant_db(db)
+        app = FastAPI()
+        app.include_router(reservation_router, prefix="/api")
+        labels = ["Code", "Date", "Heure", "Total"]
+        query = "columns=reservationCode,date,time,total&" + "&".join(f"label={label}" for label in labels)
+        with TestClient(app) as client:
+            response = client.get(f"/api/reservations/export?{query}", headers={"X-User-Email": "coach@x.ch"})
+            mismatch = client.get("/api/reservations/export?columns=date&label=A&label=B",
+                                  headers={"X-User-Email": "coach@x.ch"})
+        rows = list(csv.reader(response.text.splitlines()))
+        assert rows[0] == labels
+        assert rows[2] == ["AF2", "05.01.2026", "10:00", "25.0"]  # CET, repli sur price
+        assert rows[3] == ["AF0", "01.07.2026", "18:30", "30.0"]  # CEST
+        assert rows[1][1:3] == ["", ""]  # séance sans datetime
+        assert mismatch.status_code == 400
+
+    def test_derived_projection(self):
+        assert projection_for(["date", "total"], RESERVATION_DERIVED) == {"_id": 0, "datetime": 1, "totalPrice": 1, "price": 1}
+        assert parse_columns(None, ["a"], RESERVATION_DERIVED) == ["a"]
+        assert parse_labels(None, ["a", "b"]) == ["a", "b"]
@@ -0,0 +1,100 @@
+"""
+Test Suite: Clés d'identité normalisées et recherche des contacts (identity.py)
+email_lc / phone_e164 / name_key sur chat_participants et users, résolution unique
+par find_contact (email > téléphone > nom) avec repli sur les documents pas encore rattrapés.
+
+Features to test:
+1. Clés: normalisation email / téléphone (convention audience) / nom, $set partiel
+2. find_contact: priorité email > téléphone > nom, formats de numéro différents, caractères spéciaux
+3. Documents sans clés: trouvés par l'ancienne comparaison puis rattrapés par lots
+4. Route /api/check-reservation-eligibility: abonné retrouvé quelle que soit la casse
+"""
+
+import sys
+import asyncio
+
+import pytest
+
+# Add backend to path for identity import
+sys.path.insert(0, '/app/backend')
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from motor_memory import async_memory_db
+from identity import name_key, identity_keys, with_identity, identity_update, find_contact, backfill_identity_keys
+import tenant_context
+from routes import reservation_routes
+from routes.reservation_routes import reservation_router
+
+
+@pytest.fixture
+def db():
+    database = async_memory_db()
+    database.sync.chat_participants.insert_one(with_identity(
+        {"id": "p1", "name": "Léa  Martin", "email": "Lea.Martin@Mail.ch", "whatsapp": "076 123 45 67", "isSubscriber": True}))
+    database.sync.chat_participants.insert_one(with_identity(
+        {"id": "p2", "name": "Marc", "email": "", "whatsapp": "+41 79 000 00 00"}))
+    # Ancien document: aucune clé calculée
+    database.sync.chat_participants.insert_one({"id": "old", "name": "Zoé (admin)", "email": "a+b@x.ch", "whatsapp": "41780001122"})
+    database.sync.users.insert_one({"id": "u1", "name": "Lea", "email": "LEA.MARTIN@mail.ch"})
+    return database
+
+
+def find(db, **kwargs):
+    return asyncio.run(find_contact(db, **kwargs))
+
+
+class TestKeys:
+    """Normalisation"""
+
+    def test_keys(self):
+        assert identity_keys({"email": " A@B.ch ", "whatsapp": "0041 76-123 45 67", "name": " Léa   MARTIN "}) == {
+            "email_lc": "a@b.ch", "phone_e164": "+41761234567", "name_key": "léa martin"}
+        assert identity_keys({}) == {"email_lc": "", "phone_e164": "", "name_key": ""}
+        assert name_key("Straße") == name_key("STRASSE")
+        assert identity_update({"email": "X@Y.ch", "last_seen_at": "t"}) == {"email": "X@Y.ch", "last_seen_at": "t",
+                                                                             "email_lc": "x@y.ch"}
+
+
+class TestLookup:
+    """find_contact"""
+
+    def test_priority_and_formats(self, db):
+        assert find(db, email="lea.martin@mail.ch")["id"] == "p1"
+        assert find(db, phone="+41791234567", name="Marc")["id"] == "p2"  # téléphone inconnu -> nom
+        assert find(db, phone="0041 79 000 00 00")["id"] == "p2"
+        assert find(db, email="autre@x.ch", phone="+41761234567")["id"] == "p1"
+        assert find(db, email="lea.martin@mail.ch", collection="users")["id"] == "u1"
+        assert find(db, name="  léa martin ")["id"] == "p1"
+        assert find(db) is None and find(db, email="  ") is None
+
+    def test_legacy_document(self, db):
+        # Caractères spéciaux échappés: '+' et '(' ne sont pas des opérateurs regex
+        assert find(db, email="A+B@x.ch")["id"] == "old"
+        assert find(db, name="zoé (ADMIN)")["id"] == "old"
+        assert find(db, phone="+41780001122")["id"] == "old"
+        assert find(db, name="Zoé (admin") is None
+
+    def test_backfill(self, db):
+        db.sync.users.insert_one({"id": "u2", "name": "Sam", "email": "sam@x.ch", "whatsapp": "0781112233"})
+        first = asyncio.run(backfill_identity_keys(db, batch_size=1))
+        again = asyncio.run(backfill_identity_keys(db, batch_size=1))
+        assert first == 3 and again == 0
+        old = db.sync.chat_participants.find_one({"id": "old"})
+        assert (old["email_lc"], old["phone_e164"], old["name_key"]) == ("a+b@x.ch", "+41780001122", "zoé (admin)")
+        assert db.sync.users.find_one({"id": "u2"})["phone_e164"] == "+41781112233"
+        assert find(db, phone="078 111 22 33", collection="users")["id"] == "u2"
+
+
+class TestRoute:
+    """/api/check-reservation-eligibility"""
+
+    def test_subscriber(self, db):
+        reservation_routes.init_reservation_db(db)
+        tenant_context.init_tenant_db(db)
+        app = FastAPI()
+        app.include_router(reservation_router, prefix="/api")
+        with TestClient(app) as client:
+            subscriber = client.post("/api/check-reservation-eligibility", json={"email": "LEA.martin@mail.ch"}).json()
+            unknown = client.post("/api/check-reservation-eligibility", json={"email": "nobody@x.ch"}).json()
+        assert subscriber["eligible"] is True and subscriber["subscriber"]["email"] == "Lea.Martin@Mail.ch"
+        assert unknown["eligible"] is False
@@ -0,0 +1,96 @@
+"""
+Test Suite: Variantes d'images hors boucle (image_variants.py)
+Un seul décodage produit les tailles 64/200/800/1920 en JPEG et WebP,
+dans un pool de processus qui ne bloque pas la boucle d'événements.
+
+Features to test:
+1. Variantes JPEG + WebP, proportions conservées, pas d'agrandissement
+2. Images RGBA / palette converties
+3. URL historique = plus grande variante autorisée
+4. La boucle d'événements reste réactive pendant le traitement
+"""
+
+import io
+import os
+import sys
+import time
+import asyncio
+
+# Add backend to path for image_variants import
+sys.path.insert(0, '/app/backend')
+from PIL import Image
+from image_variants import render_variants, process_image, variant_urls, primary_variant, shutdown_image_pool, VARIANT_SIZES
+
+
+def _png_bytes(width, height, mode="RGB"):
+    buffer = io.BytesIO()
+    Image.new(mode, (width, height), color=(200, 80, 40) if mode == "RGB" else None).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+class TestRenderVariants:
+    """Génération des variantes (exécution directe, hors pool)"""
+
+    def test_all_sizes_in_jpeg_and_webp(self, tmp_path):
+        result = render_variants(_png_bytes(2400, 1200), str(tmp_path), "img", VARIANT_SIZES)
+        assert result["width"] == 2400 and result["height"] == 1200
+        assert sorted(result["variants"], key=int) == ["64", "200", "800", "1920"]
+        for label, variant in result["variants"].items():
+            assert variant["width"] == int(label)
+            assert variant["height"] == int(label) // 2
+            assert Image.open(tmp_path / variant["jpeg"]).format == "JPEG"
+            assert Image.open(tmp_path / variant["webp"]).format == "WEBP"
+
+    def test_small_original_is_not_upscaled(self, tmp_path):
+        result = render_variants(_png_bytes(500, 300), str(tmp_path), "small", VARIANT_SIZES)
+        assert sorted(result["variants"], key=int) == ["64", "200", "800"]
+        assert result["variants"]["800"]["width"] == 500
+        assert primary_variant(result, 1920) == result["variants"]["800"]
+        assert primary_variant(result, 200) == result["variants"]["200"]
+
+    def test_alpha_and_palette_images(self, tmp_path):
+        render_variants(_png_bytes(300, 300, "RGBA"), str(tmp_path), "rgba", (64,))
+        render_variants(_png_bytes(300, 300, "P"), str(tmp_path), "pal", (64,))
+        assert Image.open(tmp_path / "rgba_64.jpg").mode == "RGB"
+        assert Image.open(tmp_path / "pal_64.webp").size == (64, 64)
+
+    def test_variant_urls(self, tmp_path):
+        result = render_variants(_png_bytes(100, 100), str(tmp_path), "u", (64,))
+        urls = variant_urls(result, "/api/uploads/profiles")
+        assert urls["64"]["webp"] == "/api/uploads/profiles/u_64.webp"
+
+
+class TestProcessPool:
+    """Traitement dans le pool de processus"""
+
+    def test_event_loop_stays_responsive(self, tmp_path):
+        contents = _png_bytes(4000, 3000)
+
+        async def scenario():
+            gaps = []
+
+            async def ticker(stop):
+                last = time.perf_counter()
+                while not stop.is_set():
+                    await asyncio.sleep(0.005)
+                    now = time.perf_counter()
+                    gaps.append(now - last)
+                    last = now
+
+            stop = asyncio.Event()
+            tick_task = asyncio.create_task(ticker(stop))
+            results = await asyncio.gather(*[
+                process_image(contents, str(tmp_path), f"big{i}", VARIANT_SIZES) for i in range(3)
+            ])
+            stop.set()
+            await tick_task
+            return results, gaps
+
+        try:
+            results, gaps = asyncio.run(scenario())
+        finally:
+            shutdown_image_pool()
+        assert all(len(r["variants"]) == 4 for r in results)
+        assert len(os.listdir(tmp_path)) == 3 * 4 * 2
+        # Jamais bloquée le temps d'un décodage + 8 encodages
+        assert max(gaps) < 0.25
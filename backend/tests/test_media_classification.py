@@ -0,0 +1,166 @@
+"""
+Test Suite: Classification des médias en lot (media_handler.py)
+Patterns précompilés, LRU borné par URL, API batch sur une liste de messages
+et annotation media_type / thumbnail_url à l'écriture.
+
+Features to test:
+1. Résultat en cache jamais modifié par l'appelant
+2. classify_messages: media_url prioritaire, sinon premier lien média du texte
+3. annotate_message / annotate_messages (anciens documents seulement)
+4. backfill_media_fields: anciens messages annotés une fois, par lots, sans écraser
+5. Microbenchmark: 10 000 messages mixtes, ancien chemin vs lot mémoïsé
+"""
+
+import os
+import re
+import sys
+import time
+import random
+import asyncio
+
+# Add backend to path for media_handler import
+sys.path.insert(0, '/app/backend')
+sys.path.insert(0, os.path.dirname(__file__))
+import media_handler
+from media_handler import (get_media_type, detect_media_in_text, classify_messages, annotate_message,
+                           annotate_messages, media_cache_info, backfill_media_fields)
+from motor_memory import async_memory_db
+
+YOUTUBE = "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
+DRIVE = "https://drive.google.com/file/d/1BxiMVs0XRA5nFMdKvBdBZjgmUUqptlbs/view"
+
+
+def _mixed_messages(count, distinct_urls=200, seed=42):
+    """Messages de chat réalistes: texte seul, liens médias répétés, media_url de campagne."""
+    rng = random.Random(seed)
+    urls = []
+    for i in range(distinct_urls):
+        kind = i % 4
+        if kind == 0:
+            urls.append(f"https://youtu.be/{i:011d}")
+        elif kind == 1:
+            urls.append(f"https://drive.google.com/file/d/file{i}/view")
+        elif kind == 2:
+            urls.append(f"https://cdn.example.com/img/{i}.jpg?w=400")
+        else:
+            urls.append(f"https://afroboost.com/page/{i}")
+    messages = []
+    for i in range(count):
+        roll = rng.random()
+        if roll < 0.5:
+            messages.append({"id": str(i), "content": "Salut, on se voit au cours de mercredi ?"})
+        elif roll < 0.85:
+            messages.append({"id": str(i), "content": f"Regarde ça {rng.choice(urls)} trop bien"})
+        else:
+            messages.append({"id": str(i), "content": "Nouvelle vidéo", "media_url": rng.choice(urls)})
+    return messages
+
+
+def _legacy_classify(message):
+    """Ancien chemin: regex recompilée et classification à chaque rendu."""
+    classify = media_handler._classify.__wrapped__  # sans LRU
+    if message.get("media_url"):
+        return classify(message["media_url"].strip())
+    for url in re.compile(r'https?://[^\s<>"{}|\\^`\[\]]+').findall(message["content"]):
+        info = classify(url)
+        if info["type"] in media_handler.MEDIA_TYPES:
+            return info
+    return None
+
+
+class TestClassification:
+    """Cache et API batch"""
+
+    def test_cached_result_is_not_shared_with_callers(self):
+        first = get_media_type(YOUTUBE)
+        first["type"] = "corrupted"
+        detected = detect_media_in_text(f"voir {YOUTUBE}")
+        assert detected["original_url"] == YOUTUBE
+        assert get_media_type(YOUTUBE)["type"] == "youtube"
+        assert "original_url" not in get_media_type(YOUTUBE)
+
+    def test_classify_messages(self):
+        messages = [
+            {"content": f"lien {DRIVE} et {YOUTUBE}"},
+            {"content": "https://afroboost.com/cours puis https://x.com/a.png"},
+            {"content": YOUTUBE, "media_url": "https://afroboost.com/promo"},
+            {"content": "bonjour"},
+            {"text": f"ancien champ {YOUTUBE}"},
+        ]
+        drive, image, link, none, legacy = classify_messages(messages)
+        assert drive["type"] == "drive" and drive["file_id"] == "1BxiMVs0XRA5nFMdKvBdBZjgmUUqptlbs"
+        assert image["type"] == "image" and image["thumbnail_url"] == "https://x.com/a.png"
+        assert link["type"] == "link"  # media_url explicite, même sans média reconnu
+        assert none is None
+        assert legacy["video_id"] == "dQw4w9WgXcQ"
+
+
+class TestAnnotation:
+    """Champs persistés"""
+
+    def test_annotate_at_write_time(self):
+        message = annotate_message({"content": f"cours en vidéo {YOUTUBE}"})
+        assert message["media_type"] == "youtube"
+        assert message["thumbnail_url"] == "https://img.youtube.com/vi/dQw4w9WgXcQ/hqdefault.jpg"
+        assert annotate_message({"content": "texte"}) == {"content": "texte", "media_type": None, "thumbnail_url": None}
+        assert annotate_message({"content": YOUTUBE, "media_type": "video"})["media_type"] == "video"
+
+    def test_read_path_only_classifies_legacy_documents(self, monkeypatch):
+        stored = annotate_message({"id": "new", "content": YOUTUBE})
+        seen = []
+        original = media_handler.classify_messages
+        monkeypatch.setattr(media_handler, "classify_messages", lambda msgs, *a: seen.extend(msgs) or original(msgs, *a))
+        legacy = {"id": "old", "content": DRIVE}
+        annotate_messages([stored, legacy])
+        assert [m["id"] for m in seen] == ["old"]
+        assert legacy["media_type"] == "drive"
+
+    def test_backfill_persists_legacy_documents_once(self):
+        db = async_memory_db()
+        db.sync.chat_messages.insert_many([
+            {"id": "m1", "content": f"cours {YOUTUBE}"},
+            {"id": "m2", "content": "texte"},
+            {"id": "m3", "content": "campagne", "media_url": DRIVE},
+            {"id": "m4", "content": YOUTUBE, "media_type": "video", "thumbnail_url": None},
+        ])
+
+        async def scenario():
+            first = await backfill_media_fields(db, batch_size=2, pause=0, max_batches=1)
+            rest = await backfill_media_fields(db, batch_size=2, pause=0)
+            again = await backfill_media_fields(db, batch_size=2, pause=0)
+            return first, rest, again
+
+        assert asyncio.run(scenario()) == (2, 1, 0)
+        stored = {m["id"]: m for m in db.sync.chat_messages.find({})}
+        assert stored["m1"]["media_type"] == "youtube" and stored["m1"]["thumbnail_url"]
+        assert "media_type" in stored["m2"] and stored["m2"]["media_type"] is None
+        assert stored["m3"]["media_type"] == "drive"
+        assert stored["m4"]["media_type"] == "video"
+
+
+class TestBenchmark:
+    """Microbenchmark 10k messages mixtes"""
+
+    def test_batch_memoized_vs_legacy(self):
+        messages = _mixed_messages(10_000)
+        media_handler._classify.cache_clear()
+
+        start = time.perf_counter()
+        legacy = [_legacy_classify(m) for m in messages]
+        legacy_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        batch = classify_messages(messages)
+        cold_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        classify_messages(messages)
+        warm_seconds = time.perf_counter() - start
+
+        info = media_cache_info()
+        print(f"\n10k messages: legacy {legacy_seconds * 1000:.1f} ms, batch froid {cold_seconds * 1000:.1f} ms, "
+              f"batch chaud {warm_seconds * 1000:.1f} ms, cache {info.currsize}/{info.maxsize}")
+        assert [b and b["type"] for b in batch] == [l and l["type"] for l in legacy]
+        # Chaque URL distincte n'est classée qu'une fois malgré 5000 messages avec lien
+        assert info.misses <= 200 and info.currsize <= info.maxsize
+        assert warm_seconds < legacy_seconds
@@ -0,0 +1,139 @@
+"""
+Test Suite: Service des médias statiques (media_files.py)
+Montages /api/uploads/* et /api/emojis avec ETag fort, 304, cache immutable,
+Range pour les vidéos et variantes SVG précompressées.
+
+Features to test:
+1. Noms adressés par contenu -> Cache-Control immutable, autres -> max-age
+2. If-None-Match / If-Modified-Since -> 304
+3. Range simple (206), suffixe, If-Range périmé, hors fichier (416)
+4. .svg.gz servi selon Accept-Encoding (Vary, ETag distinct)
+5. Envoi zéro-copie quand le serveur annonce l'extension pathsend
+"""
+
+import os
+import sys
+import gzip
+import asyncio
+
+# Add backend to path for media_files import
+sys.path.insert(0, '/app/backend')
+from starlette.applications import Starlette
+from starlette.testclient import TestClient
+from media_files import MediaFiles, precompress_directory, parse_range, is_content_addressed
+
+SHA = "ab" * 32
+
+
+def _client(tmp_path, **kwargs):
+    app = Starlette()
+    app.mount("/media", MediaFiles(directory=str(tmp_path), **kwargs), name="media")
+    return TestClient(app)
+
+
+class TestCachePolicy:
+    """ETag, 304 et Cache-Control"""
+
+    def test_content_addressed_names(self):
+        assert is_content_addressed(f"{SHA}_200.jpg") and is_content_addressed(f"{SHA}.png")
+        assert is_content_addressed("video_0123456789ab.mp4") and is_content_addressed("poster_0123456789ab_480.jpg")
+        assert is_content_addressed("video_fs_0123456789ab.mp4")
+        assert not is_content_addressed("heart.svg")
+        # Dates, horodatages et fragments de longueur libre: pas adressés par contenu
+        assert not is_content_addressed("promo_20250101.jpg")
+        assert not is_content_addressed("export_202501011230.csv")
+        assert not is_content_addressed("c2a458ca-ac4d-471b-9e5d-3033ceeeddda_21cf6158.jpg")
+        assert not is_content_addressed(f"x{SHA}.jpg")
+
+    def test_immutable_and_conditional_requests(self, tmp_path):
+        (tmp_path / f"{SHA}_200.jpg").write_bytes(b"\xff\xd8jpeg")
+        (tmp_path / "logo.png").write_bytes(b"png")
+        client = _client(tmp_path)
+
+        response = client.get(f"/media/{SHA}_200.jpg")
+        assert response.status_code == 200
+        assert response.headers["cache-control"] == "public, max-age=31536000, immutable"
+        etag = response.headers["etag"]
+        assert etag.startswith('"') and not etag.startswith("W/")
+
+        not_modified = client.get(f"/media/{SHA}_200.jpg", headers={"If-None-Match": f'W/{etag}, "other"'})
+        assert not_modified.status_code == 304 and not_modified.content == b""
+        assert not_modified.headers["etag"] == etag
+
+        plain = client.get("/media/logo.png")
+        assert plain.headers["cache-control"] == "public, max-age=3600"
+        since = client.get("/media/logo.png", headers={"If-Modified-Since": plain.headers["last-modified"]})
+        assert since.status_code == 304
+
+
+class TestRange:
+    """Lecture partielle des vidéos"""
+
+    def test_parse_range(self):
+        assert parse_range("bytes=0-99", 1000) == (0, 99)
+        assert parse_range("bytes=900-", 1000) == (900, 999)
+        assert parse_range("bytes=-100", 1000) == (900, 999)
+        assert parse_range("bytes=0-5000", 1000) == (0, 999)
+        assert parse_range("bytes=1000-", 1000) == "unsatisfiable"
+        assert parse_range("bytes=0-1,5-6", 1000) is None
+
+    def test_partial_content(self, tmp_path):
+        payload = bytes(range(256)) * 4096  # 1 MB
+        (tmp_path / "video_0123456789ab.mp4").write_bytes(payload)
+        client = _client(tmp_path)
+
+        response = client.get("/media/video_0123456789ab.mp4", headers={"Range": "bytes=1000-1999"})
+        assert response.status_code == 206
+        assert response.content == payload[1000:2000]
+        assert response.headers["content-range"] == f"bytes 1000-1999/{len(payload)}"
+        assert response.headers["content-type"] == "video/mp4"
+        assert response.headers["accept-ranges"] == "bytes"
+
+        stale = client.get("/media/video_0123456789ab.mp4", headers={"Range": "bytes=0-9", "If-Range": '"stale"'})
+        assert stale.status_code == 200 and len(stale.content) == len(payload)
+
+        outside = client.get("/media/video_0123456789ab.mp4", headers={"Range": f"bytes={len(payload)}-"})
+        assert outside.status_code == 416
+
+
+class TestPrecompressed:
+    """Emojis SVG précompressés"""
+
+    def test_gzip_sibling_served_when_accepted(self, tmp_path):
+        svg = b'<svg xmlns="http://www.w3.org/2000/svg">' + b'<circle r="1"/>' * 200 + b"</svg>"
+        (tmp_path / "heart.svg").write_bytes(svg)
+        assert precompress_directory(str(tmp_path)) == 1
+        assert precompress_directory(str(tmp_path)) == 0  # déjà à jour
+        client = _client(tmp_path, precompressed=True, max_age=86400)
+
+        raw_response = client.get("/media/heart.svg", headers={"Accept-Encoding": "identity"})
+        assert raw_response.content == svg and "content-encoding" not in raw_response.headers
+
+        compressed = client.get("/media/heart.svg", headers={"Accept-Encoding": "gzip, br;q=0"})
+        assert compressed.headers["content-encoding"] == "gzip"
+        assert compressed.headers["content-type"] == "image/svg+xml"
+        assert compressed.headers["vary"] == "Accept-Encoding"
+        assert int(compressed.headers["content-length"]) == os.path.getsize(tmp_path / "heart.svg.gz")
+        assert compressed.headers["etag"] != raw_response.headers["etag"]
+        assert compressed.content == svg  # décompressé par le client
+
+
+class TestZeroCopy:
+    """Extension ASGI pathsend"""
+
+    def test_pathsend_used_when_supported(self, tmp_path):
+        (tmp_path / "clip.webm").write_bytes(b"x" * 5000)
+        app = MediaFiles(directory=str(tmp_path))
+        messages = []
+        scope = {"type": "http", "method": "GET", "path": "/clip.webm", "root_path": "", "headers": [],
+                 "query_string": b"", "extensions": {"http.response.pathsend": {}}}
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            messages.append(message)
+
+        asyncio.run(app(scope, receive, send))
+        assert messages[0]["status"] == 200
+        assert messages[1] == {"type": "http.response.pathsend", "path": str(tmp_path / "clip.webm")}
@@ -0,0 +1,109 @@
+"""
+Test Suite: Carousel partenaires (coach_routes.get_active_partners)
+Concepts résolus en un seul $in au lieu d'un find_one par coach,
+liste mise en cache (catalog_cache "partners") et paginée au-delà de 20.
+
+Features to test:
+1. Nombre de requêtes constant quel que soit le nombre de coachs
+2. Résolution du concept: id brut, id assaini (ancien), coach_id
+3. Déduplication par email, Bassi en premier (sa carte coach gardée sans concept principal)
+4. Pagination offset/limit + X-Total-Count, invalidation par bump
+"""
+
+import sys
+import asyncio
+
+import pytest
+
+# Add backend to path for coach_routes import
+sys.path.insert(0, '/app/backend')
+from motor_memory import async_memory_db
+from starlette.requests import Request
+from response_cache import catalog_cache
+from routes import coach_routes
+
+
+def _request(query=""):
+    return Request({"type": "http", "method": "GET", "path": "/api/partners/active",
+                    "query_string": query.encode(), "headers": []})
+
+
+@pytest.fixture
+def db():
+    database = async_memory_db()
+    coach_routes.init_db(database)
+    catalog_cache.clear()
+    catalog_cache.bump("partners")
+    return database
+
+
+def _seed(db, count):
+    db.sync.concept.insert_one({"id": "concept", "heroVideoUrl": "/api/files/bassi.mp4", "heroPosterUrl": "/p.jpg"})
+    for i in range(count):
+        email = f"coach{i}@afroboost.ch"
+        db.sync.coaches.insert_one({"id": f"c{i}", "email": email, "name": f"Coach {i}", "is_active": True})
+        if i % 3 == 0:
+            db.sync.concept.insert_one({"id": f"concept_{email}", "heroVideoUrl": f"/v{i}.mp4"})
+        elif i % 3 == 1:
+            db.sync.concept.insert_one({"id": f"concept_coach{i}_afroboost_ch", "heroImageUrl": f"/i{i}.jpg"})
+        else:
+            db.sync.concept.insert_one({"id": f"legacy_{i}", "coach_id": email, "heroVideoUrl": f"/l{i}.mp4"})
+    db.sync.coaches.insert_one({"id": "dup", "email": "COACH0@afroboost.ch", "is_active": True})
+    db.sync.coaches.insert_one({"id": "off", "email": "off@afroboost.ch", "is_active": False})
+
+
+def _count_finds(db, monkeypatch):
+    calls = []
+    for name in ("coaches", "concept"):
+        collection = db[name]
+        original = collection.find
+        monkeypatch.setattr(collection, "find", lambda *a, _o=original, _n=name, **k: calls.append(_n) or _o(*a, **k))
+    return calls
+
+
+class TestBatchedLookup:
+    """Plus de N+1"""
+
+    def test_constant_queries(self, db, monkeypatch):
+        _seed(db, 30)
+        calls = _count_finds(db, monkeypatch)
+        partners = asyncio.run(coach_routes.build_active_partners())
+        assert calls == ["coaches", "concept"]
+        assert len(partners) == 31  # Bassi + 30 coachs uniques actifs
+        assert partners[0]["id"] == "bassi_main" and partners[0]["poster_url"] == "/p.jpg"
+        by_id = {p["id"]: p for p in partners}
+        assert by_id["c0"]["video_url"] == "/v0.mp4"
+        assert by_id["c1"]["video_url"] == "/i1.jpg" and by_id["c1"]["heroImageUrl"] == "/i1.jpg"
+        assert by_id["c2"]["video_url"] == "/l2.mp4"
+        assert "dup" not in by_id and "off" not in by_id
+
+    def test_super_admin_card_without_main_concept(self, db):
+        admin = coach_routes.SUPER_ADMIN_EMAIL
+        db.sync.coaches.insert_one({"id": "admin", "email": admin, "name": "Bassi", "is_active": True})
+        db.sync.coaches.insert_one({"id": "c1", "email": "coach1@afroboost.ch", "is_active": True})
+        assert [p["id"] for p in asyncio.run(coach_routes.build_active_partners())] == ["admin", "c1"]
+        db.sync.concept.insert_one({"id": "concept", "heroVideoUrl": "/api/files/bassi.mp4"})
+        assert [p["id"] for p in asyncio.run(coach_routes.build_active_partners())] == ["bassi_main", "c1"]
+
+
+class TestEndpoint:
+    """Pagination et cache"""
+
+    def test_pagination_and_invalidation(self, db, monkeypatch):
+        _seed(db, 30)
+        calls = _count_finds(db, monkeypatch)
+
+        async def scenario():
+            first = await coach_routes.get_active_partners(_request(), offset=0, limit=20)
+            second = await coach_routes.get_active_partners(_request(), offset=20, limit=20)
+            builds = len(calls)
+            db.sync.coaches.update_one({"id": "c5"}, {"$set": {"is_active": False}})
+            catalog_cache.bump("partners")
+            after = await coach_routes.get_active_partners(_request(), offset=0, limit=100)
+            return first, second, builds, after
+
+        first, second, builds, after = asyncio.run(scenario())
+        assert first.headers["x-total-count"] == "31" and first.body.count(b'"id"') == 20
+        assert second.body.count(b'"id"') == 11
+        assert builds == 2  # deuxième page servie depuis le cache
+        assert after.headers["x-total-count"] == "30" and b'"c5"' not in after.body
@@ -0,0 +1,131 @@
+"""
+Test Suite: Génération en série de codes promo (promo_batch.py)
+N codes uniques (préfixe + alphabet), collisions vérifiées en bloc,
+insert_many(ordered=False) avec régénération des seuls codes rejetés, export CSV.
+
+Features to test:
+1. Lot de 10 000 codes uniques, préfixés, bénéficiaires circulaires
+2. Codes déjà en base écartés par la vérification $in
+3. Collision à l'insertion (index unique): seul le sous-ensemble rejeté est régénéré
+4. Espace de codes trop petit / saturé (lot incomplet retiré), préfixe [A-Z0-9_-]
+5. CSV: en-tête + une ligne par code, par blocs
+"""
+
+import sys
+import csv
+import time
+import asyncio
+
+import pytest
+from pymongo.errors import BulkWriteError
+
+# Add backend to path for promo_batch import
+sys.path.insert(0, '/app/backend')
+from motor_memory import async_memory_db
+import promo_batch
+from promo_batch import generate_discount_codes, codes_csv, CodeSpaceExhausted, CSV_COLUMNS
+
+TEMPLATE = {"type": "100%", "value": 100, "maxUses": 1, "courses": ["c1"], "expiresAt": None, "coach_id": "coach@x.ch"}
+
+
+class RacingCollection:
+    """insert_many dont les premiers codes sont pris par une création concurrente (erreur 11000)."""
+
+    def __init__(self, collection, collisions):
+        self._collection = collection
+        self.collisions = collisions
+        self.inserted_batches = []
+
+    def __getattr__(self, name):
+        return getattr(self._collection, name)
+
+    async def insert_many(self, docs, ordered=True):
+        assert ordered is False
+        self.inserted_batches.append(len(docs))
+        errors = []
+        for i, doc in enumerate(docs):
+            if self.collisions > 0:
+                self.collisions -= 1
+                errors.append({"index": i, "code": 11000, "errmsg": "E11000 duplicate key"})
+            else:
+                self._collection.sync.insert_one(doc)
+        if errors:
+            raise BulkWriteError({"writeErrors": errors, "nInserted": len(docs) - len(errors)})
+
+
+class TestGenerate:
+    """Génération et unicité"""
+
+    def test_ten_thousand_codes(self):
+        db = async_memory_db()
+        started = time.perf_counter()
+        codes = asyncio.run(generate_discount_codes(db, 10000, TEMPLATE, prefix=" vip ",
+                                                    assigned_emails=["a@x.ch", "b@x.ch"]))
+        elapsed = time.perf_counter() - started
+        values = [c["code"] for c in codes]
+        assert len(values) == len(set(values)) == 10000
+        assert all(v.startswith("VIP-") and len(v) == 12 and c["code_upper"] == v for v, c in zip(values, codes))
+        assert not set("".join(v[4:] for v in values)) & set("01IO")
+        assert [c["assignedEmail"] for c in codes[:3]] == ["a@x.ch", "b@x.ch", "a@x.ch"]
+        assert codes[0]["coach_id"] == "coach@x.ch" and codes[0]["used"] == 0 and "_id" not in codes[0]
+        assert db.sync.discount_codes.count_documents({"source": "batch"}) == 10000
+        assert elapsed < 1
+
+    def test_existing_codes_skipped(self, monkeypatch):
+        db = async_memory_db()
+        db.sync.discount_codes.insert_one({"id": "old", "code": "EV-AAAA", "code_upper": "EV-AAAA"})
+        draws = iter(["EV-AAAA", "EV-BBBB", "EV-CCCC"])
+        monkeypatch.setattr(promo_batch, "random_codes",
+                            lambda count, *args: [next(draws) for _ in range(count)])
+        codes = asyncio.run(generate_discount_codes(db, 2, TEMPLATE, prefix="ev", length=4))
+        assert sorted(c["code"] for c in codes) == ["EV-BBBB", "EV-CCCC"]
+        assert db.sync.discount_codes.count_documents({"code_upper": "EV-AAAA"}) == 1
+
+    def test_only_collided_subset_retried(self):
+        db = async_memory_db()
+        racing = RacingCollection(db["discount_codes"], collisions=3)
+        db._collections["discount_codes"] = racing
+        codes = asyncio.run(generate_discount_codes(db, 50, TEMPLATE))
+        assert racing.inserted_batches == [50, 3]
+        assert len({c["code"] for c in codes}) == 50
+        assert db.sync.discount_codes.count_documents({}) == 50
+
+    def test_code_space(self):
+        db = async_memory_db()
+        with pytest.raises(ValueError):
+            asyncio.run(generate_discount_codes(db, 100, TEMPLATE, alphabet="AB", length=4))
+        racing = RacingCollection(db["discount_codes"], collisions=10 ** 6)
+        db._collections["discount_codes"] = racing
+        with pytest.raises(CodeSpaceExhausted):
+            asyncio.run(generate_discount_codes(db, 5, TEMPLATE))
+        assert len(racing.inserted_batches) == promo_batch.MAX_ROUNDS
+
+    def test_incomplete_batch_is_rolled_back(self, monkeypatch):
+        db = async_memory_db()
+        db.sync.discount_codes.insert_one({"id": "old", "code": "EV-AAAA", "code_upper": "EV-AAAA"})
+        racing = RacingCollection(db["discount_codes"], collisions=2)
+        db._collections["discount_codes"] = racing
+        monkeypatch.setattr(promo_batch, "MAX_ROUNDS", 1)
+        with pytest.raises(CodeSpaceExhausted):
+            asyncio.run(generate_discount_codes(db, 5, TEMPLATE, prefix="ev"))
+        assert [c["id"] for c in db.sync.discount_codes.find({})] == ["old"]
+
+    def test_prefix_charset(self):
+        db = async_memory_db()
+        codes = asyncio.run(generate_discount_codes(db, 2, TEMPLATE, prefix="ete_2026-a"))
+        assert all(c["code"].startswith("ETE_2026-A-") for c in codes)
+        for prefix in ('x"; filename="evil', "a/b", "été"):
+            with pytest.raises(ValueError):
+                asyncio.run(generate_discount_codes(db, 1, TEMPLATE, prefix=prefix))
+
+
+class TestCsv:
+    """Export"""
+
+    def test_rows(self):
+        codes = [{"code": f"X-{i}", "type": "%", "value": 10, "maxUses": None, "courses": ["a", "b"]} for i in range(7)]
+        chunks = list(codes_csv(codes, chunk_size=3))
+        rows = list(csv.reader("".join(chunks).splitlines()))
+        assert len(chunks) == 3
+        assert rows[0] == CSV_COLUMNS and len(rows) == 8
+        assert rows[1] == ["X-0", "%", "10", "", "", "", "a|b"]
@@ -0,0 +1,144 @@
+"""
+Test Suite: Codes promo en mémoire et rédemption atomique (promo_index.py)
+Carte code_upper -> code actif versionnée par le cache catalogue,
+rédemption par find_one_and_update gardé par used < maxUses.
+
+Features to test:
+1. Recherche insensible à la casse, sans regex (caractères spéciaux littéraux)
+2. Rechargement après une écriture promo (bump "discount-codes"), pas avant
+3. Rédemptions simultanées: exactement une réussit pour la dernière utilisation
+4. Messages de refus identiques à /discount-codes/validate
+5. Rattrapage code_upper au démarrage
+"""
+
+import sys
+import asyncio
+from datetime import datetime, timezone, timedelta
+
+import pytest
+
+# Add backend to path for promo_index import
+sys.path.insert(0, '/app/backend')
+from motor_memory import async_memory_db
+from response_cache import catalog_cache
+from promo_index import PromoCodeIndex, code_error, ensure_promo_indexes, normalize_code
+
+
+class AtomicCollection:
+    """discount_codes avec find_one_and_update (absent de la base du simulateur)."""
+
+    def __init__(self, collection):
+        self._collection = collection
+
+    def __getattr__(self, name):
+        return getattr(self._collection, name)
+
+    async def find_one_and_update(self, query, update, projection=None, return_document=None):
+        await asyncio.sleep(0)  # laisse les autres rédemptions s'entrelacer
+        # Lecture + écriture sans point de suspension: atomique comme côté MongoDB
+        doc = self._collection.sync.find_one(query)
+        if doc is None:
+            return None
+        self._collection.sync.update_one({"id": doc["id"]}, update)
+        return self._collection.sync.find_one({"id": doc["id"]}, projection)
+
+
+@pytest.fixture
+def db():
+    database = async_memory_db()
+    database.sync.discount_codes.insert_one({"id": "p1", "code": "Promo10", "code_upper": "PROMO10", "active": True,
+                                             "maxUses": 1, "used": 0, "courses": []})
+    database.sync.discount_codes.insert_one({"id": "p2", "code": "A.B+", "code_upper": "A.B+", "active": True, "used": 0})
+    database.sync.discount_codes.insert_one({"id": "p3", "code": "OFF", "code_upper": "OFF", "active": False})
+    database._collections["discount_codes"] = AtomicCollection(database["discount_codes"])
+    return database
+
+
+class TestLookup:
+    """Carte en mémoire"""
+
+    def test_case_insensitive_without_regex(self, db):
+        index = PromoCodeIndex()
+
+        async def scenario():
+            return [await index.lookup(db, code) for code in (" promo10 ", "a.b+", "AXB+", "off", "", None)]
+
+        promo, literal, regex_like, inactive, empty, none = asyncio.run(scenario())
+        assert promo["id"] == "p1" and literal["id"] == "p2"
+        assert regex_like is None and inactive is None and empty is None and none is None
+        assert index.loads == 1
+
+    def test_reload_on_bump(self, db):
+        index = PromoCodeIndex()
+
+        async def scenario():
+            await index.lookup(db, "PROMO10")
+            db.sync.discount_codes.insert_one({"id": "p4", "code": "new", "code_upper": "NEW", "active": True})
+            stale = await index.lookup(db, "NEW")
+            catalog_cache.bump("discount-codes")
+            fresh = await index.lookup(db, "NEW")
+            return stale, fresh
+
+        stale, fresh = asyncio.run(scenario())
+        assert stale is None and fresh["id"] == "p4"
+        assert index.loads == 2
+
+    def test_concurrent_loads_coalesced(self, db):
+        index = PromoCodeIndex()
+
+        async def scenario():
+            return await asyncio.gather(*[index.lookup(db, "PROMO10") for _ in range(10)])
+
+        assert all(code["id"] == "p1" for code in asyncio.run(scenario()))
+        assert index.loads == 1
+
+
+class TestRedeem:
+    """Rédemption atomique"""
+
+    def test_last_use_redeemed_once(self, db):
+        index = PromoCodeIndex()
+
+        async def scenario():
+            code = await index.lookup(db, "promo10")
+            results = await asyncio.gather(*[index.redeem(db, code) for _ in range(5)])
+            return results, await index.lookup(db, "promo10")
+
+        results, after = asyncio.run(scenario())
+        assert sum(1 for r in results if r) == 1
+        assert db.sync.discount_codes.find_one({"id": "p1"})["used"] == 1
+        assert code_error(after) == "Code promo épuisé (nombre max d'utilisations atteint)"
+        assert index.loads == 1  # carte mise à jour en place, pas de rechargement
+
+    def test_unlimited_code(self, db):
+        index = PromoCodeIndex()
+
+        async def scenario():
+            code = await index.lookup(db, "A.B+")
+            for _ in range(3):
+                assert await index.redeem(db, code)
+
+        asyncio.run(scenario())
+        assert db.sync.discount_codes.find_one({"id": "p2"})["used"] == 3
+
+
+class TestRules:
+    """Messages de refus et rattrapage"""
+
+    def test_code_error(self):
+        yesterday = (datetime.now(timezone.utc) - timedelta(days=1)).strftime("%Y-%m-%d")
+        today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+        assert code_error({"expiresAt": yesterday}) == "Code promo expiré"
+        assert code_error({"expiresAt": today}) is None  # valable jusqu'à la fin de la journée
+        assert code_error({"courses": ["c1"]}, course_id="c2") == "Code non applicable à ce cours"
+        assert code_error({"courses": ["c1"]}) is None  # identification sans cours
+        assert code_error({"assignedEmail": "a@x.ch"}, email="B@x.ch") == "Code réservé à un autre compte"
+        assert code_error({"assignedEmail": "a@x.ch", "maxUses": 2, "used": 1}, email="A@X.ch") is None
+
+    def test_backfill(self):
+        database = async_memory_db()
+        database.sync.discount_codes.insert_one({"id": "old", "code": " vieux "})
+        assert asyncio.run(ensure_promo_indexes(database)) == 1
+        assert database.sync.discount_codes.find_one({"id": "old"})["code_upper"] == "VIEUX"
+        assert asyncio.run(ensure_promo_indexes(database)) == 0
+        assert normalize_code(None) == ""
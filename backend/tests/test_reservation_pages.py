@@ -0,0 +1,171 @@
+"""
+Test Suite: Pagination par curseur des réservations (reservation_pages.py)
+Keyset sur (createdAt, id) avec curseur opaque, totaux par coach maintenus
+dans reservation_counters à la création / suppression.
+
+Features to test:
+1. Parcours avant / arrière: toutes les réservations une seule fois, égalités de createdAt départagées par id
+2. Curseur invalide -> 400
+3. Compteurs: amorçage exact ($setOnInsert), $inc à la création / suppression, estimated, remise à zéro,
+   création pendant l'amorçage comptée (recomptage par le lecteur qui crée le compteur)
+4. Route /api/reservations: curseurs dans la pagination, total lu dans le compteur
+"""
+
+import sys
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+
+# Add backend to path for reservation_pages import
+sys.path.insert(0, '/app/backend')
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from motor_memory import async_memory_db
+from reservation_pages import (keyset_page, encode_cursor, decode_cursor, reservation_total,
+                               on_reservation_counted, on_reservation_uncounted, reset_reservation_counters, COUNTERS)
+import tenant_context
+from routes import reservation_routes
+from routes.reservation_routes import reservation_router
+
+
+@pytest.fixture
+def db():
+    database = async_memory_db()
+    for i in range(11):
+        database.sync.reservations.insert_one({
+            "id": f"r{i:02d}", "userName": f"Client {i}",
+            "createdAt": f"2026-01-{(i // 2) + 1:02d}T10:00:00+00:00",  # deux réservations par instant
+            "coach_id": "coach@x.ch" if i < 9 else "autre@x.ch"
+        })
+    return database
+
+
+def walk(db, query, limit):
+    async def scenario():
+        pages, cursor = [], None
+        while True:
+            docs, next_cursor, prev_cursor = await keyset_page(db.reservations, query, {"_id": 0}, limit, after=cursor)
+            pages.append(([d["id"] for d in docs], prev_cursor))
+            if not next_cursor:
+                return pages
+            cursor = next_cursor
+    return asyncio.run(scenario())
+
+
+class TestKeyset:
+    """Parcours par curseur"""
+
+    def test_forward(self, db):
+        pages = walk(db, {"coach_id": "coach@x.ch"}, 4)
+        ids = [i for page, _ in pages for i in page]
+        assert ids == [f"r{i:02d}" for i in range(8, -1, -1)]
+        assert [len(page) for page, _ in pages] == [4, 4, 1]
+        assert pages[0][1] is None and pages[1][1] is not None
+
+    def test_backward(self, db):
+        async def scenario():
+            first, next_cursor, _ = await keyset_page(db.reservations, {}, {"_id": 0}, 3)
+            second, _, prev_cursor = await keyset_page(db.reservations, {}, {"_id": 0}, 3, after=next_cursor)
+            back, forward_again, before_first = await keyset_page(db.reservations, {}, {"_id": 0}, 3, before=prev_cursor)
+            return first, back, forward_again, before_first, second
+
+        first, back, forward_again, before_first, second = asyncio.run(scenario())
+        assert [d["id"] for d in back] == [d["id"] for d in first] == ["r10", "r09", "r08"]
+        assert before_first is None  # première page: pas de page précédente
+        assert encode_cursor(back[-1]) == forward_again
+        assert [d["id"] for d in second] == ["r07", "r06", "r05"]
+
+    def test_cursor_roundtrip(self):
+        when = datetime(2026, 1, 5, 10, tzinfo=timezone.utc)
+        assert decode_cursor(encode_cursor({"createdAt": when, "id": "a"})) == (when, "a")
+        assert decode_cursor(encode_cursor({"createdAt": "2026-01-05T10:00:00Z", "id": "b"})) == ("2026-01-05T10:00:00Z", "b")
+        with pytest.raises(HTTPException) as exc:
+            decode_cursor("pas-un-curseur")
+        assert exc.value.status_code == 400
+
+
+class TestCounters:
+    """Totaux maintenus"""
+
+    def test_seed_increment_reset(self, db):
+        query = {"coach_id": "coach@x.ch"}
+
+        async def scenario():
+            seeded = await reservation_total(db, query)
+            await on_reservation_counted(db, {"coach_id": "coach@x.ch"})
+            after_create = await reservation_total(db, query)
+            await on_reservation_uncounted(db, {"coach_id": "coach@x.ch"})
+            await on_reservation_uncounted(db, {"coach_id": "coach@x.ch"})
+            drift = await reservation_total(db, query)
+            exact = await reservation_total(db, query, exact=True)
+            await reservation_total(db, {})
+            await on_reservation_counted(db, {"coach_id": "autre@x.ch"})
+            everyone = await reservation_total(db, {})
+            await reset_reservation_counters(db)
+            reseeded = await reservation_total(db, {})
+            return seeded, after_create, drift, exact, everyone, reseeded
+
+        seeded, after_create, drift, exact, everyone, reseeded = asyncio.run(scenario())
+        assert seeded == (9, False)
+        assert after_create == (10, True)
+        assert drift == (8, True) and exact == (9, False)  # exact=True recompte et corrige
+        assert everyone == (12, True)  # "*" incrémenté par toute création
+        assert reseeded == (11, False)
+
+    def test_lazy_seed_never_overwrites_live_counter(self, db, monkeypatch):
+        query = {"coach_id": "coach@x.ch"}
+        original = db.reservations.count_documents
+
+        async def slow_count(*args, **kwargs):
+            total = await original(*args, **kwargs)
+            # Pendant le comptage: un autre lecteur amorce, puis une création incrémente
+            db.sync[COUNTERS].insert_one({"_id": "coach@x.ch", "count": total})
+            await on_reservation_counted(db, {"coach_id": "coach@x.ch"})
+            return total
+
+        monkeypatch.setattr(db.reservations, "count_documents", slow_count)
+        assert asyncio.run(reservation_total(db, query)) == (9, False)
+        assert db.sync[COUNTERS].find_one({"_id": "coach@x.ch"})["count"] == 10
+
+    def test_increment_during_seed_is_not_lost(self, db, monkeypatch):
+        query = {"coach_id": "coach@x.ch"}
+        original = db.reservations.count_documents
+        counts = []
+
+        async def slow_count(*args, **kwargs):
+            total = await original(*args, **kwargs)
+            if not counts:
+                # Pendant le premier comptage: création dont le $inc ne trouve aucun compteur
+                db.sync.reservations.insert_one({"id": "late", "createdAt": "2026-01-09T10:00:00+00:00",
+                                                 "coach_id": "coach@x.ch"})
+                await on_reservation_counted(db, {"coach_id": "coach@x.ch"})
+            counts.append(total)
+            return total
+
+        monkeypatch.setattr(db.reservations, "count_documents", slow_count)
+        assert asyncio.run(reservation_total(db, query)) == (10, False)
+        assert counts == [9, 10]
+        assert db.sync[COUNTERS].find_one({"_id": "coach@x.ch"})["count"] == 10
+
+
+class TestRoute:
+    """/api/reservations"""
+
+    def test_pagination_payload(self, db):
+        reservation_routes.init_reservation_db(db)
+        tenant_context.init_tenant_db(db)
+        app = FastAPI()
+        app.include_router(reservation_router, prefix="/api")
+        headers = {"X-User-Email": "coach@x.ch"}
+        with TestClient(app) as client:
+            first = client.get("/api/reservations?limit=5", headers=headers).json()
+            second = client.get(f"/api/reservations?page=2&limit=5&after={first['pagination']['next_cursor']}",
+                                headers=headers).json()
+            legacy = client.get("/api/reservations?page=2&limit=5", headers=headers).json()
+            bad = client.get("/api/reservations?after=xyz", headers=headers)
+        assert first["pagination"]["total"] == 9 and first["pagination"]["pages"] == 2
+        assert first["pagination"]["estimated"] is False and first["pagination"]["prev_cursor"] is None
+        assert second["pagination"]["estimated"] is True and second["pagination"]["next_cursor"] is None
+        assert [r["id"] for r in second["data"]] == [r["id"] for r in legacy["data"]] == ["r03", "r02", "r01", "r00"]
+        assert bad.status_code == 400
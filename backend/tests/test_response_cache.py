@@ -0,0 +1,195 @@
+"""
+Test Suite: Cache versionné des endpoints du catalogue (response_cache.py)
+Entrées par (endpoint, tenant), version incrémentée par les écritures,
+ETag fort + 304 sans accès base, constructions simultanées fusionnées.
+
+Features to test:
+1. Un seul build tant que la version ne change pas
+2. bump par tenant / pour tous les tenants, entrées bornées (LRU), lecture de version sans insertion
+3. If-None-Match -> 304 sans appeler le builder
+4. Ruée: 20 requêtes simultanées -> 1 build
+5. Écriture pendant un build: l'état périmé n'est pas mémorisé
+6. bundle (GET /bootstrap): composants en parallèle, version suivant leurs ETags
+"""
+
+import sys
+import asyncio
+from datetime import datetime, timezone
+
+# Add backend to path for response_cache import
+sys.path.insert(0, '/app/backend')
+import json
+from response_cache import ResponseCache, entry_response
+
+
+class _Source:
+    """Collection simulée: compte les lectures"""
+
+    def __init__(self, value, delay=0):
+        self.value = value
+        self.reads = 0
+        self.delay = delay
+
+    async def build(self):
+        self.reads += 1
+        value = self.value  # lecture "en base" avant la latence réseau
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return {"value": value, "updatedAt": datetime(2026, 1, 1, tzinfo=timezone.utc)}
+
+
+class TestVersioning:
+    """Versions et tenants"""
+
+    def test_built_once_until_bumped(self):
+        cache, source = ResponseCache(), _Source("a")
+
+        async def scenario():
+            first = await cache.get("offers", "*", source.build)
+            second = await cache.get("offers", "*", source.build)
+            source.value = "b"
+            cache.bump("offers")
+            third = await cache.get("offers", "*", source.build)
+            return first, second, third
+
+        first, second, third = asyncio.run(scenario())
+        assert source.reads == 2
+        assert first.etag == second.etag != third.etag
+        assert first.data == {"value": "a", "updatedAt": "2026-01-01T00:00:00+00:00"}
+        assert third.data["value"] == "b"
+
+    def test_tenant_scoping(self):
+        cache = ResponseCache()
+        coach_a, coach_b = _Source("A"), _Source("B")
+
+        async def scenario():
+            await cache.get("concept", "concept_a", coach_a.build)
+            await cache.get("concept", "concept_b", coach_b.build)
+            cache.bump("concept", "concept_a")
+            await cache.get("concept", "concept_a", coach_a.build)
+            await cache.get("concept", "concept_b", coach_b.build)
+            cache.bump("concept")  # écriture globale (ex: pipeline vidéo)
+            await cache.get("concept", "concept_b", coach_b.build)
+
+        asyncio.run(scenario())
+        assert coach_a.reads == 2 and coach_b.reads == 2
+
+    def test_entries_are_bounded(self):
+        cache, source = ResponseCache(max_entries=3), _Source("a")
+
+        async def scenario():
+            await cache.get("concept", "concept_keep", source.build)
+            for i in range(10):
+                cache.version("concept", f"concept_{i}@x.ch")  # lecture seule: aucune clé créée
+                await cache.get("concept", f"concept_{i}@x.ch", source.build)
+                await cache.get("concept", "concept_keep", source.build)  # la plus utilisée reste
+            for i in range(10):
+                await cache.bundle("bootstrap", f"{i}@x.ch", {"concept": ("concept", "concept_keep", source.build)})
+
+        asyncio.run(scenario())
+        assert len(cache._entries) == 3 and ("concept", "concept_keep") in cache._entries
+        assert len(cache._bundles) == 3
+        assert cache._versions == {}
+        assert source.reads == 11
+
+    def test_ttl_expiry(self):
+        cache, source = ResponseCache(ttl_seconds=0), _Source("a")
+        asyncio.run(cache.get("config", "*", source.build))
+        asyncio.run(cache.get("config", "*", source.build))
+        assert source.reads == 2
+
+
+class TestConditional:
+    """ETag / 304"""
+
+    def test_not_modified_without_builder(self):
+        cache, source = ResponseCache(), _Source("a")
+
+        async def scenario():
+            full = await cache.respond({}, "courses", source.build)
+            etag = full.headers["etag"]
+            reads = source.reads
+            conditional = await cache.respond({"if-none-match": etag}, "courses", source.build)
+            tenant = await cache.respond({}, "payment-links", _Source("links").build, tenant="payment_links_a@x.ch")
+            return full, conditional, reads, tenant
+
+        full, conditional, reads, tenant = asyncio.run(scenario())
+        assert full.status_code == 200 and full.body == b'{"value":"a","updatedAt":"2026-01-01T00:00:00+00:00"}'
+        assert full.headers["cache-control"] == "no-cache"
+        assert not full.headers["etag"].startswith("W/")
+        assert conditional.status_code == 304 and conditional.body == b""
+        assert source.reads == reads == 1
+        assert tenant.headers["vary"] == "X-User-Email"
+
+
+class TestStampede:
+    """Fusion des constructions"""
+
+    def test_concurrent_misses_build_once(self):
+        cache, source = ResponseCache(), _Source("a", delay=0.05)
+
+        async def scenario():
+            return await asyncio.gather(*[cache.respond({}, "categories", source.build) for _ in range(20)])
+
+        responses = asyncio.run(scenario())
+        assert source.reads == 1 and cache.builds == 1
+        assert len({r.headers["etag"] for r in responses}) == 1
+
+    def test_write_during_build_is_not_cached(self):
+        cache, source = ResponseCache(), _Source("old", delay=0.05)
+
+        async def scenario():
+            pending = asyncio.ensure_future(cache.get("offers", "*", source.build))
+            await asyncio.sleep(0.01)
+            source.value = "new"
+            cache.bump("offers")
+            stale = await pending
+            fresh = await cache.get("offers", "*", source.build)
+            return stale, fresh
+
+        stale, fresh = asyncio.run(scenario())
+        assert stale.data["value"] == "old" and fresh.data["value"] == "new"
+        assert source.reads == 2
+
+
+class TestBundle:
+    """Document bootstrap assemblé"""
+
+    def _parts(self, sources):
+        return {key: (key, "*", source.build) for key, source in sources.items()}
+
+    def test_parts_built_concurrently(self):
+        cache = ResponseCache()
+        sources = {name: _Source(name, delay=0.05) for name in ("concept", "courses", "offers", "manifest")}
+
+        async def scenario():
+            start = asyncio.get_running_loop().time()
+            entry = await cache.bundle("bootstrap", "*", self._parts(sources))
+            return entry, asyncio.get_running_loop().time() - start
+
+        entry, elapsed = asyncio.run(scenario())
+        assert elapsed < 0.15  # 4 x 50 ms en parallèle
+        document = json.loads(entry.body)
+        assert document == entry.data
+        assert list(document) == ["version", "concept", "courses", "offers", "manifest"]
+        assert document["offers"]["value"] == "offers"
+        assert entry.etag == f'"bootstrap-{document["version"]}"'
+
+    def test_version_follows_components(self):
+        cache = ResponseCache()
+        sources = {"config": _Source("a"), "courses": _Source("c")}
+        parts = self._parts(sources)
+
+        async def scenario():
+            first = await cache.bundle("bootstrap", "*", parts)
+            probe = await cache.bundle_version("bootstrap", "*", parts)
+            not_modified = entry_response({"if-none-match": first.etag}, probe, b"{}")
+            sources["config"].value = "b"
+            cache.bump("config")
+            changed = await cache.bundle_version("bootstrap", "*", parts)
+            return first, probe, not_modified, changed
+
+        first, probe, not_modified, changed = asyncio.run(scenario())
+        assert probe is first and not_modified.status_code == 304
+        assert sources["courses"].reads == 1 and sources["config"].reads == 2
+        assert changed.etag != first.etag and changed.data["config"]["value"] == "b"
@@ -0,0 +1,236 @@
+"""
+Test Suite: Segments d'audience sauvegardés (segments.py)
+Règles évaluées sur les contacts / réservations et résolution d'une
+campagne targetType "segment" depuis segment_members.
+
+Features to test:
+1. Validation des règles
+2. Clé contact (email > téléphone > id) alignée sur le dédoublonnage audience
+3. Fenêtre "réservé dans les N jours" (expires_at)
+4. Règles abonnés / WhatsApp sur le document contact
+5. Campagne "segment": un seul curseur sur segment_members
+6. Hooks incrémentaux (réservation, contact, groupe) et rebuild_segment: membres et member_count ($inc),
+   membres ajoutés par un hook pendant la reconstruction conservés
+7. Campagne: segment d'un autre coach refusé
+"""
+
+import sys
+import asyncio
+from datetime import datetime, timezone, timedelta
+
+# Add backend to path for segments import
+sys.path.insert(0, '/app/backend')
+import pytest
+from fastapi import HTTPException
+from segments import (
+    validate_rule, contact_key, contact_from_reservation, reservation_expiry,
+    contact_matches, is_subscriber_reservation, in_scope, member_document,
+    on_reservation_created, on_reservation_deleted, on_contact_changed, on_contact_deleted,
+    on_group_membership_changed, rebuild_segment
+)
+from audience import audience_queries, iter_audience
+from scheduler_simulator import InMemoryClient
+from motor_memory import async_memory_db
+from routes import segment_routes
+import segments
+
+
+class TestRules:
+    """Validation et évaluation des règles"""
+
+    def test_validate_rule(self):
+        assert validate_rule({"type": "reserved_within_days", "days": 30}) is None
+        assert validate_rule({"type": "reserved_within_days", "days": 0}) is not None
+        assert validate_rule({"type": "group_member"}) is not None
+        assert validate_rule({"type": "group_member", "group_id": "g1"}) is None
+        assert validate_rule({"type": "unknown"}) is not None
+
+    def test_contact_key_matches_audience_normalization(self):
+        assert contact_key({"email": " Jane@Example.com ", "whatsapp": "0791234567"}) == "e:jane@example.com"
+        assert contact_key({"email": "", "whatsapp": "079 123 45 67"}) == "p:+41791234567"
+        assert contact_key({"id": "u1"}) == "i:u1"
+
+    def test_reservation_window(self):
+        rule = {"type": "reserved_within_days", "days": 30}
+        recent = {"createdAt": (datetime.now(timezone.utc) - timedelta(days=2)).isoformat()}
+        old = {"createdAt": (datetime.now(timezone.utc) - timedelta(days=45)).isoformat().replace("+00:00", "Z")}
+        expires_at = reservation_expiry(rule, recent)
+        assert expires_at and timedelta(days=27) < expires_at - datetime.now(timezone.utc) < timedelta(days=29)
+        assert reservation_expiry(rule, old) is None
+
+    def test_contact_rules(self):
+        assert contact_matches({"type": "has_whatsapp"}, {"whatsapp": "+41 79 123 45 67"})
+        assert not contact_matches({"type": "has_whatsapp"}, {"whatsapp": " "})
+        assert contact_matches({"type": "subscribers"}, {"isSubscriber": True})
+        assert is_subscriber_reservation({"type": "abonné"})
+        assert not is_subscriber_reservation({"type": "achat_direct"})
+
+    def test_coach_scope(self):
+        assert in_scope({"coach_id": None}, {"coach_id": "coach@test.com"})
+        assert in_scope({"coach_id": "coach@test.com"}, {"coach_id": "coach@test.com"})
+        assert not in_scope({"coach_id": "coach@test.com"}, {"coach_id": "bassi_default"})
+
+
+class TestSegmentCampaign:
+    """Résolution des destinataires d'une campagne ciblant un segment"""
+
+    def test_segment_query_is_single_indexed_lookup(self):
+        campaign = {"targetType": "segment", "targetSegmentId": "seg1"}
+        assert list(audience_queries(campaign)) == [("segment_members", {"segment_id": "seg1"})]
+        assert list(audience_queries({"targetType": "segment"})) == []
+
+    def test_iter_audience_reads_materialized_members(self):
+        db = InMemoryClient()["test"]
+        reservation = {"userId": "u1", "userName": "Jane", "userEmail": "jane@test.com", "userWhatsapp": "0791234567"}
+        db.segment_members.insert_many([
+            member_document("seg1", contact_from_reservation(reservation)),
+            member_document("seg1", {"id": "p2", "name": "Bob", "email": "bob@test.com"}),
+            member_document("seg2", {"id": "p3", "name": "Other", "email": "other@test.com"}),
+        ])
+        contacts = list(iter_audience(db, {"targetType": "segment", "targetSegmentId": "seg1"}))
+        assert sorted(c["email"] for c in contacts) == ["bob@test.com", "jane@test.com"]
+        assert set(contacts[0]) == {"id", "name", "email", "whatsapp"}
+
+
+SEGMENTS = [
+    {"id": "recent", "coach_id": "coach@test.com", "rule": {"type": "reserved_within_days", "days": 30}, "member_count": 0},
+    {"id": "subs", "coach_id": None, "rule": {"type": "subscribers"}, "member_count": 0},
+    {"id": "wa", "coach_id": None, "rule": {"type": "has_whatsapp"}, "member_count": 0},
+    {"id": "grp", "coach_id": None, "rule": {"type": "group_member", "group_id": "g1"}, "member_count": 0},
+]
+
+
+@pytest.fixture
+def db():
+    database = async_memory_db()
+    database.sync.segments.insert_many([dict(segment) for segment in SEGMENTS])
+    return database
+
+
+def members(db, segment_id):
+    return sorted(m["contact_key"] for m in db.sync.segment_members.find({"segment_id": segment_id}))
+
+
+def count(db, segment_id):
+    return db.sync.segments.find_one({"id": segment_id})["member_count"]
+
+
+def reservation(rid, email, days_ago=1, **fields):
+    created = (datetime.now(timezone.utc) - timedelta(days=days_ago)).isoformat()
+    return {"id": rid, "userName": "Jane", "userEmail": email, "coach_id": "coach@test.com", "createdAt": created, **fields}
+
+
+class TestIncrementalHooks:
+    """Maintenance incrémentale de segment_members et de member_count"""
+
+    def test_reservation_created_and_deleted(self, db):
+        first = reservation("r1", "jane@test.com", type="abonné")
+        second = reservation("r2", "jane@test.com")
+
+        async def scenario():
+            for r in (first, second, reservation("r3", "bob@test.com", coach_id="other@test.com")):
+                db.sync.reservations.insert_one(dict(r))
+                await on_reservation_created(db, r)
+            created = members(db, "recent"), members(db, "subs"), count(db, "recent"), count(db, "subs")
+            db.sync.reservations.delete_one({"id": "r1"})
+            await on_reservation_deleted(db, first)
+            still = members(db, "recent"), members(db, "subs"), count(db, "recent"), count(db, "subs")
+            db.sync.reservations.delete_one({"id": "r2"})
+            await on_reservation_deleted(db, second)
+            return created, still, (members(db, "recent"), count(db, "recent"))
+
+        created, still, gone = asyncio.run(scenario())
+        # Deux réservations du même contact: un seul membre, compté une fois; autre coach hors segment
+        assert created == (["e:jane@test.com"], ["e:jane@test.com"], 1, 1)
+        assert still == (["e:jane@test.com"], [], 1, 0)
+        assert gone == ([], 0)
+
+    def test_contact_changed_and_deleted(self, db):
+        contact = {"id": "p1", "name": "Bob", "email": "bob@test.com", "whatsapp": "", "isSubscriber": False}
+
+        async def scenario():
+            await on_contact_changed(db, contact)
+            steps = [(members(db, "wa"), count(db, "wa"))]
+            updated = {**contact, "whatsapp": "079 123 45 67", "isSubscriber": True}
+            await on_contact_changed(db, updated, previous=contact)
+            await on_contact_changed(db, updated, previous=updated)  # idempotent
+            steps.append((members(db, "wa"), count(db, "wa"), members(db, "subs"), count(db, "subs")))
+            await on_contact_changed(db, {**updated, "whatsapp": ""}, previous=updated)
+            steps.append((members(db, "wa"), count(db, "wa")))
+            await on_contact_deleted(db, "p1")
+            steps.append((members(db, "subs"), count(db, "subs")))
+            return steps
+
+        empty, joined, left_wa, deleted = asyncio.run(scenario())
+        assert empty == ([], 0)
+        assert joined == (["e:bob@test.com"], 1, ["e:bob@test.com"], 1)
+        assert left_wa == ([], 0)
+        assert deleted == ([], 0)
+
+    def test_group_membership(self, db):
+        db.sync.chat_participants.insert_one({"id": "p1", "name": "Ana", "email": "ana@test.com"})
+
+        async def scenario():
+            await on_group_membership_changed(db, "g1", "p1", joined=True)
+            await on_group_membership_changed(db, "g1", "p1", joined=True)
+            await on_group_membership_changed(db, "g2", "p1", joined=True)  # aucun segment concerné
+            joined = members(db, "grp"), count(db, "grp")
+            await on_group_membership_changed(db, "g1", "p1", joined=False)
+            return joined, (members(db, "grp"), count(db, "grp"))
+
+        joined, left = asyncio.run(scenario())
+        assert joined == (["e:ana@test.com"], 1)
+        assert left == ([], 0)
+
+    def test_rebuild_resets_count(self, db):
+        db.sync.reservations.insert_many([reservation("r1", "a@test.com"), reservation("r2", "A@test.com "),
+                                          reservation("r3", "b@test.com"), reservation("r4", "old@test.com", days_ago=60)])
+        db.sync.segment_members.insert_one(member_document("recent", {"id": "stale", "email": "stale@test.com"}))
+        db.sync.segments.update_one({"id": "recent"}, {"$set": {"member_count": 7}})
+        segment = db.sync.segments.find_one({"id": "recent"})
+        assert asyncio.run(rebuild_segment(db, segment)) == 2
+        assert members(db, "recent") == ["e:a@test.com", "e:b@test.com"]
+        assert count(db, "recent") == 2
+
+    def test_rebuild_keeps_members_added_by_hooks(self, db, monkeypatch):
+        db.sync.reservations.insert_one(reservation("r1", "a@test.com"))
+        db.sync.segment_members.insert_one(member_document("recent", {"id": "stale", "email": "stale@test.com"}))
+        iter_rule_members = segments._iter_rule_members
+
+        async def racing(database, segment):
+            async for item in iter_rule_members(database, segment):
+                yield item
+            # Réservation créée pendant la reconstruction: ajoutée par le hook, absente du curseur
+            late = reservation("r2", "late@test.com")
+            database.sync.reservations.insert_one(dict(late))
+            await on_reservation_created(database, late)
+
+        monkeypatch.setattr(segments, "_iter_rule_members", racing)
+        segment = db.sync.segments.find_one({"id": "recent"})
+        assert asyncio.run(rebuild_segment(db, segment)) == 2
+        assert members(db, "recent") == ["e:a@test.com", "e:late@test.com"]
+
+    def test_many_segments_not_truncated(self, db):
+        db.sync.segments.insert_many([{"id": f"wa{i}", "coach_id": None, "rule": {"type": "has_whatsapp"}} for i in range(1200)])
+        asyncio.run(on_contact_changed(db, {"id": "p1", "email": "x@test.com", "whatsapp": "0791234567"}))
+        assert db.sync.segment_members.count_documents({"id": "p1"}) == 1201
+
+
+class TestCampaignSegmentOwnership:
+    """targetSegmentId limité aux segments du coach"""
+
+    def test_other_coach_segment_rejected(self, db):
+        segment_routes.init_segment_db(db)
+
+        async def check(segment_id, caller):
+            try:
+                await segment_routes.check_campaign_segment(segment_id, caller)
+                return 200
+            except HTTPException as exc:
+                return exc.status_code
+
+        assert asyncio.run(check("recent", "coach@test.com")) == 200
+        assert asyncio.run(check("recent", "other@test.com")) == 404
+        assert asyncio.run(check("recent", "")) == 401
+        assert asyncio.run(check(None, "")) == 200
+        assert asyncio.run(check("recent", "contact.artboost@gmail.com")) == 200  # Super Admin
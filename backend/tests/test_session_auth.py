@@ -0,0 +1,98 @@
+"""
+Test Suite: Résolution des sessions coach (session_auth.py)
+Cache borné token -> utilisateur devant coach_sessions / google_users,
+dépendance FastAPI require_session réutilisée par /api/auth/me.
+
+Features to test:
+1. Deuxième appel: zéro lecture base
+2. Expiration (date BSON ou ancienne chaîne ISO), jamais servie depuis le cache
+3. Invalidation: déconnexion, reconnexion (invalidate_user), LRU borné
+4. Dépendance: 401 sans token / token inconnu, Bearer accepté
+"""
+
+import sys
+import asyncio
+from datetime import datetime, timezone, timedelta
+
+import pytest
+
+# Add backend to path for session_auth import
+sys.path.insert(0, '/app/backend')
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from motor_memory import async_memory_db
+import session_auth
+from session_auth import SessionCache, require_session, session_cache
+
+
+@pytest.fixture
+def db():
+    database = async_memory_db()
+    in_week = datetime.now(timezone.utc) + timedelta(days=7)
+    database.sync.google_users.insert_one({"user_id": "u1", "email": "coach@x.ch", "name": "Coach", "picture": None})
+    database.sync.coach_sessions.insert_one({"session_token": "tok", "user_id": "u1", "expires_at": in_week})
+    database.sync.coach_sessions.insert_one({"session_token": "legacy", "user_id": "u1", "expires_at": in_week.isoformat()})
+    database.sync.coach_sessions.insert_one({"session_token": "old", "user_id": "u1",
+                                             "expires_at": datetime.now(timezone.utc) - timedelta(seconds=1)})
+    return database
+
+
+class TestCache:
+    """Lectures évitées"""
+
+    def test_second_call_is_free(self, db):
+        cache = SessionCache()
+
+        async def scenario():
+            return [await cache.resolve(db, token) for token in ("tok", "tok", "legacy", "old", "nope")]
+
+        tok, again, legacy, old, nope = asyncio.run(scenario())
+        assert tok == again == ({"user_id": "u1", "email": "coach@x.ch", "name": "Coach", "picture": None, "is_coach": True}, None)
+        assert legacy[0]["email"] == "coach@x.ch"
+        assert old == (None, "Session expirée") and nope == (None, "Session invalide")
+        assert cache.db_reads == 4  # "tok" une seule fois
+        assert db.sync.coach_sessions.count_documents({"session_token": "old"}) == 1  # supprimée par l'index TTL
+
+    def test_expiry_and_invalidation(self, db):
+        cache = SessionCache(max_entries=2)
+        soon = datetime.now(timezone.utc) + timedelta(milliseconds=50)
+
+        async def scenario():
+            cache.put("short", {"user_id": "u2"}, soon)
+            await cache.resolve(db, "tok")
+            await cache.resolve(db, "legacy")
+            evicted = cache.get("short") is None  # LRU: 3 entrées pour 2 places
+            cache.invalidate("tok")
+            reads = cache.db_reads
+            await cache.resolve(db, "tok")
+            cache.invalidate_user("u1")
+            return evicted, reads, cache.get("tok"), cache.get("legacy")
+
+        evicted, reads, tok, legacy = asyncio.run(scenario())
+        assert evicted and cache.db_reads == reads + 1
+        assert tok is None and legacy is None
+
+        expiring = SessionCache()
+        expiring.put("short", {"user_id": "u2"}, datetime.now(timezone.utc) - timedelta(seconds=1))
+        assert expiring.get("short") is None
+
+
+class TestDependency:
+    """require_session"""
+
+    def test_require_session(self, db):
+        session_auth.init_session_db(db)
+        session_cache.clear()
+        app = FastAPI()
+
+        @app.get("/me")
+        async def me(user: dict = Depends(require_session)):
+            return user
+
+        with TestClient(app) as client:
+            assert client.get("/me").status_code == 401
+            assert client.get("/me", headers={"Authorization": "Bearer nope"}).json()["detail"] == "Session invalide"
+            assert client.get("/me", headers={"Authorization": "Bearer tok"}).json()["email"] == "coach@x.ch"
+            client.cookies.set("coach_session_token", "tok")
+            assert client.get("/me").status_code == 200
+        assert session_cache.db_reads == 2  # "nope" + "tok"; l'appel par cookie sort du cache
@@ -0,0 +1,131 @@
+"""
+Test Suite: Uploads multipart en flux (streaming_upload.py)
+Le fichier est écrit chunk par chunk dans un temporaire, la limite de taille est
+vérifiée au fil de l'eau et le SHA-256 calculé au passage.
+
+Features to test:
+1. Champs + fichier reçus, hash et taille corrects, publication atomique
+2. Dépassement de taille: abandon en cours de flux (413), temporaire supprimé
+3. Content-Length annoncé trop grand: refus sans lire le corps
+4. Type MIME refusé dès les en-têtes du fichier
+5. Mémoire de pointe bornée par la taille d'un chunk (fichier de 20 MB)
+"""
+
+import os
+import sys
+import asyncio
+import hashlib
+import tracemalloc
+
+import pytest
+
+# Add backend to path for streaming_upload import
+sys.path.insert(0, '/app/backend')
+from fastapi import HTTPException
+from starlette.requests import Request
+from streaming_upload import receive_multipart
+
+BOUNDARY = "----afroboostTestBoundary"
+CHUNK = 64 * 1024
+
+
+def _part_headers(name, filename=None, content_type=None):
+    disposition = f'form-data; name="{name}"' + (f'; filename="{filename}"' if filename else "")
+    headers = f"--{BOUNDARY}\r\nContent-Disposition: {disposition}\r\n"
+    if content_type:
+        headers += f"Content-Type: {content_type}\r\n"
+    return (headers + "\r\n").encode()
+
+
+def _request(chunks, content_length=None):
+    """Request Starlette alimentée par un générateur de chunks (comme uvicorn)."""
+    headers = [(b"content-type", f"multipart/form-data; boundary={BOUNDARY}".encode())]
+    if content_length is not None:
+        headers.append((b"content-length", str(content_length).encode()))
+    iterator = iter(chunks)
+    state = {"received": 0}
+
+    async def receive():
+        chunk = next(iterator, None)
+        if chunk is None:
+            return {"type": "http.request", "body": b"", "more_body": False}
+        state["received"] += len(chunk)
+        return {"type": "http.request", "body": chunk, "more_body": True}
+
+    request = Request({"type": "http", "method": "POST", "headers": headers}, receive)
+    return request, state
+
+
+def _body(payload_chunks, content_type="video/mp4", fields=(("asset_type", "video"),)):
+    for name, value in fields:
+        yield _part_headers(name) + value.encode() + b"\r\n"
+    yield _part_headers("file", "clip.mp4", content_type)
+    yield from payload_chunks
+    yield f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+class TestStreamingUpload:
+    """Réception multipart en flux"""
+
+    def test_fields_file_hash_and_atomic_commit(self, tmp_path):
+        payload = os.urandom(300 * 1024)
+        chunks = [payload[i:i + CHUNK] for i in range(0, len(payload), CHUNK)]
+        request, _ = _request(_body(chunks))
+
+        fields, upload = asyncio.run(receive_multipart(request, str(tmp_path), 1024 * 1024))
+        assert fields == {"asset_type": "video"}
+        assert upload.size == len(payload)
+        assert upload.sha256 == hashlib.sha256(payload).hexdigest()
+        assert upload.content_type == "video/mp4" and upload.filename == "clip.mp4"
+
+        final_path = upload.commit(str(tmp_path / "video_final.mp4"))
+        assert open(final_path, "rb").read() == payload
+        assert os.listdir(tmp_path) == ["video_final.mp4"]
+
+    def test_oversize_aborts_mid_stream(self, tmp_path):
+        request, state = _request(_body(b"\0" * CHUNK for _ in range(200)))
+        with pytest.raises(HTTPException) as exc:
+            asyncio.run(receive_multipart(request, str(tmp_path), 256 * 1024))
+        assert exc.value.status_code == 413
+        assert state["received"] < 512 * 1024
+        assert os.listdir(tmp_path) == []
+
+    def test_declared_content_length_rejected_before_reading(self, tmp_path):
+        request, state = _request(_body([b"\0"]), content_length=60 * 1024 * 1024)
+        with pytest.raises(HTTPException) as exc:
+            asyncio.run(receive_multipart(request, str(tmp_path), 50 * 1024 * 1024))
+        assert exc.value.status_code == 413
+        assert state["received"] == 0
+
+    def test_check_file_rejects_mime_and_tightens_limit(self, tmp_path):
+        def check_file(fields, content_type):
+            if content_type != "video/mp4":
+                raise HTTPException(status_code=400, detail="Type MIME non autorisé")
+            return 64 * 1024 if fields.get("asset_type") == "logo" else None
+
+        request, _ = _request(_body([b"\0" * 10], content_type="application/x-msdownload"))
+        with pytest.raises(HTTPException) as exc:
+            asyncio.run(receive_multipart(request, str(tmp_path), CHUNK * 10, check_file=check_file))
+        assert exc.value.status_code == 400
+
+        request, _ = _request(_body([b"\0" * CHUNK, b"\0"], fields=(("asset_type", "logo"),)))
+        with pytest.raises(HTTPException) as exc:
+            asyncio.run(receive_multipart(request, str(tmp_path), CHUNK * 10, check_file=check_file))
+        assert exc.value.status_code == 413
+        assert os.listdir(tmp_path) == []
+
+    def test_peak_memory_bounded_by_chunk_size(self, tmp_path):
+        payload_chunk = b"\xAB" * CHUNK
+        total = 20 * 1024 * 1024
+        request, _ = _request(_body(payload_chunk for _ in range(total // CHUNK)))
+
+        tracemalloc.start()
+        try:
+            _, upload = asyncio.run(receive_multipart(request, str(tmp_path), 50 * 1024 * 1024))
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        upload.discard()
+        assert upload.size == total
+        # 20 MB reçus, quelques chunks au plus en mémoire à un instant donné
+        assert peak < 8 * CHUNK
@@ -0,0 +1,122 @@
+"""
+Test Suite: Contexte appelant par requête (tenant_context.py)
+X-User-Email résolu une fois en TenantContext (rôle, coach, crédits, filtre),
+profil coach en cache court invalidé par les écritures, compteur d'appels Mongo.
+
+Features to test:
+1. Rôles, crédits, filtre et clé du catalogue (Super Admin / coach / inconnu)
+2. Cache des profils: une lecture par TTL, invalidation, "non trouvé" aussi mis en cache
+3. get_tenant: une seule résolution même si plusieurs dépendances la demandent
+4. Middleware X-Mongo-Calls (y compris depuis un thread, comme Motor)
+"""
+
+import sys
+import asyncio
+
+import pytest
+
+# Add backend to path for tenant_context import
+sys.path.insert(0, '/app/backend')
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from motor_memory import async_memory_db
+import tenant_context
+from tenant_context import (TenantContext, CoachProfileCache, resolve_tenant, get_tenant, coach_profiles,
+                            count_mongo_call, mongo_calls_middleware, is_super_admin, coach_filter)
+
+
+@pytest.fixture
+def db():
+    database = async_memory_db()
+    database.sync.coaches.insert_one({"id": "c1", "email": "coach@x.ch", "credits": 3, "is_active": True})
+    database.sync.coaches.insert_one({"id": "c2", "email": "vide@x.ch", "credits": 0, "is_active": True})
+    coach_profiles.clear()  # cache partagé: d'autres suites résolvent les mêmes emails
+    return database
+
+
+class TestContext:
+    """Rôle, crédits, filtre"""
+
+    def test_roles(self, db):
+        async def scenario():
+            return [await resolve_tenant(db, email) for email in
+                    (" Afroboost.Bassi@gmail.com", "coach@x.ch", "vide@x.ch", "inconnu@x.ch", "")]
+
+        admin, coach, empty, unknown, anonymous = asyncio.run(scenario())
+        assert admin.role == "super_admin" and admin.credits == -1 and admin.coach_filter == {}
+        assert admin.credits_snapshot() == {"has_credits": True, "credits": -1, "unlimited": True}
+        assert coach.role == "coach" and coach.coach_filter == {"coach_id": "coach@x.ch"}
+        assert coach.credits_snapshot() == {"has_credits": True, "credits": 3}
+        assert not empty.has_credits
+        assert unknown.role == "user" and unknown.credits_snapshot()["error"] == "Coach non trouvé"
+        assert anonymous.email == "" and anonymous.coach is None
+        # Clé du catalogue public: un email inconnu partage la vue anonyme
+        assert [t.catalog_email for t in (admin, coach, unknown, anonymous)] == [
+            "afroboost.bassi@gmail.com", "coach@x.ch", "", ""]
+        assert is_super_admin("CONTACT.artboost@gmail.com") and not is_super_admin(None)
+        assert coach_filter("Coach@X.ch") == {"coach_id": "coach@x.ch"}
+
+
+class TestProfileCache:
+    """Lectures évitées et invalidation"""
+
+    def test_read_once_until_invalidated(self, db):
+        cache = CoachProfileCache(ttl_seconds=60)
+
+        async def scenario():
+            for _ in range(5):
+                await cache.get(db, "coach@x.ch")
+                await cache.get(db, "inconnu@x.ch")
+            db.sync.coaches.update_one({"email": "coach@x.ch"}, {"$set": {"credits": 2}})
+            stale = (await cache.get(db, "coach@x.ch"))["credits"]
+            cache.invalidate("COACH@x.ch")
+            fresh = (await cache.get(db, "coach@x.ch"))["credits"]
+            return stale, fresh
+
+        stale, fresh = asyncio.run(scenario())
+        assert (stale, fresh) == (3, 2)
+        assert cache.db_reads == 3
+
+    def test_ttl(self, db):
+        cache = CoachProfileCache(ttl_seconds=0)
+        asyncio.run(cache.get(db, "coach@x.ch"))
+        asyncio.run(cache.get(db, "coach@x.ch"))
+        assert cache.db_reads == 2
+
+
+class TestRequest:
+    """Dépendance et compteur par requête"""
+
+    def test_resolved_once_and_counted(self, db):
+        tenant_context.init_tenant_db(db)
+        coach_profiles.clear()
+        resolutions = []
+        original = tenant_context.resolve_tenant
+
+        async def counting_resolve(database, email):
+            resolutions.append(email)
+            count_mongo_call()
+            return await original(database, email)
+
+        app = FastAPI()
+        app.middleware("http")(mongo_calls_middleware)
+
+        async def credits(tenant: TenantContext = Depends(get_tenant)):
+            return tenant.credits
+
+        @app.get("/check")
+        async def check(tenant: TenantContext = Depends(get_tenant), remaining: int = Depends(credits)):
+            await asyncio.to_thread(count_mongo_call)  # commande exécutée dans un thread, comme Motor
+            return {"role": tenant.role, "credits": remaining}
+
+        tenant_context.resolve_tenant = counting_resolve
+        try:
+            with TestClient(app) as client:
+                response = client.get("/check", headers={"X-User-Email": "coach@x.ch"})
+                anonymous = client.get("/check")
+        finally:
+            tenant_context.resolve_tenant = original
+        assert response.json() == {"role": "coach", "credits": 3}
+        assert response.headers["x-mongo-calls"] == "2"
+        assert anonymous.headers["x-mongo-calls"] == "2"
+        assert resolutions == ["coach@x.ch", None]
@@ -0,0 +1,188 @@
+"""
+Test Suite: Proxy local des miniatures (thumb_proxy.py)
+Les miniatures YouTube / Drive sont servies par /api/media/thumb/{hash}
+depuis un cache disque borné, alimenté par une origine HTTP locale (stub).
+
+Features to test:
+1. Seules les URLs enregistrées d'hôtes autorisés sont relayées, enregistrement hors boucle,
+   registre mémoire borné (relu depuis <key>.json)
+2. Requêtes simultanées sur la même miniature -> une seule requête à l'origine
+3. Éviction LRU quand la taille limite (miniatures + <key>.json) est dépassée
+4. Préchargement en arrière-plan
+5. Route: 200 + ETag, 304, redirection vers l'origine en cas d'échec
+"""
+
+import os
+import sys
+import time
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+# Add backend to path for thumb_proxy import
+sys.path.insert(0, '/app/backend')
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.routing import Route
+from starlette.testclient import TestClient
+from thumb_proxy import ThumbnailCache, thumbnail_response, thumb_key
+
+IMAGE = b"\xff\xd8\xff" + b"j" * 1000
+
+
+class _StubOrigin(BaseHTTPRequestHandler):
+    """Origine lente: /vi/<id>.jpg -> JPEG, /missing -> 404"""
+    hits = []
+
+    def do_GET(self):
+        self.hits.append(self.path)
+        time.sleep(0.2)
+        if self.path.startswith("/vi/"):
+            self.send_response(200)
+            self.send_header("Content-Type", "image/jpeg")
+            self.send_header("Content-Length", str(len(IMAGE)))
+            self.end_headers()
+            self.wfile.write(IMAGE)
+        else:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def origin():
+    _StubOrigin.hits = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubOrigin)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+def _cache(tmp_path, **kwargs):
+    return ThumbnailCache(str(tmp_path), allowed_hosts=("127.0.0.1",), timeout=5, **kwargs)
+
+
+class TestRegistry:
+    """Pas de proxy ouvert"""
+
+    def test_only_allowed_hosts(self, tmp_path):
+        cache = ThumbnailCache(str(tmp_path))
+        url = "https://img.youtube.com/vi/dQw4w9WgXcQ/hqdefault.jpg"
+        assert cache.public_url(url) == f"/api/media/thumb/{thumb_key(url)}"
+        assert cache.public_url("https://evil.example.com/x.jpg") == "https://evil.example.com/x.jpg"
+        assert cache.public_url(None) is None
+        # Enregistrement persistant: une nouvelle instance (redémarrage) retrouve l'URL
+        assert ThumbnailCache(str(tmp_path)).source_url(thumb_key(url)) == url
+        assert cache.source_url("0" * 32) is None
+
+    def test_registration_is_flushed_in_background(self, tmp_path):
+        cache = ThumbnailCache(str(tmp_path))
+        urls = [f"https://img.youtube.com/vi/{i}/hqdefault.jpg" for i in range(3)]
+
+        async def scenario():
+            public = [cache.public_url(url) for url in urls]
+            written_before_flush = os.listdir(tmp_path)
+            await cache.close()
+            return public, written_before_flush
+
+        public, written_before_flush = asyncio.run(scenario())
+        assert written_before_flush == []  # rendu des messages: aucune écriture sur la boucle
+        assert public == [f"/api/media/thumb/{thumb_key(url)}" for url in urls]
+        assert sorted(os.listdir(tmp_path)) == sorted(f"{thumb_key(url)}.json" for url in urls)
+        assert ThumbnailCache(str(tmp_path)).source_url(thumb_key(urls[2])) == urls[2]
+
+    def test_registry_is_bounded(self, tmp_path):
+        cache = ThumbnailCache(str(tmp_path), registry_size=2)
+        urls = [f"https://img.youtube.com/vi/{i}/hqdefault.jpg" for i in range(5)]
+
+        async def scenario():
+            for url in urls:
+                cache.public_url(url)
+            in_memory = list(cache._registered)
+            await cache.close()
+            return in_memory
+
+        assert asyncio.run(scenario()) == [thumb_key(urls[3]), thumb_key(urls[4])]
+        # Sortie du registre: relue depuis le disque, puis gardée comme la plus récente
+        assert cache.source_url(thumb_key(urls[0])) == urls[0]
+        assert list(cache._registered) == [thumb_key(urls[4]), thumb_key(urls[0])]
+
+
+class TestCache:
+    """Téléchargement, fusion et éviction"""
+
+    def test_concurrent_misses_are_coalesced(self, tmp_path, origin):
+        cache = _cache(tmp_path)
+        key = cache.register(f"{origin}/vi/abc.jpg")
+
+        async def scenario():
+            results = await asyncio.gather(*[cache.get(key) for _ in range(10)])
+            again = await cache.get(key)
+            await cache.close()
+            return results, again
+
+        results, again = asyncio.run(scenario())
+        assert _StubOrigin.hits == ["/vi/abc.jpg"] and cache.origin_requests == 1
+        assert all(r and r[2] == "image/jpeg" for r in results) and again
+        with open(results[0][0], "rb") as f:
+            assert f.read() == IMAGE
+
+    def test_lru_eviction(self, tmp_path, origin):
+        cache = _cache(tmp_path, max_bytes=2700)
+        keys = [cache.register(f"{origin}/vi/{i}.jpg") for i in range(3)]
+
+        async def scenario():
+            await cache.get(keys[0])
+            await cache.get(keys[1])
+            os.utime(tmp_path / keys[1], (time.time() - 100, time.time() - 100))
+            os.utime(tmp_path / keys[0], (time.time() - 50, time.time() - 50))
+            await cache.get(keys[2])  # dépasse 2700 octets (json compris): le moins récent (keys[1]) part
+            await cache.close()
+
+        asyncio.run(scenario())
+        assert sorted(os.listdir(tmp_path)) == sorted([keys[0], f"{keys[0]}.json", keys[2], f"{keys[2]}.json"])
+        assert cache.source_url(keys[1])  # encore dans le registre mémoire: retéléchargeable
+
+    def test_prefetch(self, tmp_path, origin):
+        cache = _cache(tmp_path)
+
+        async def scenario():
+            task = cache.prefetch(f"{origin}/vi/pre.jpg")
+            await task
+            second = cache.prefetch(f"{origin}/vi/pre.jpg")
+            await cache.close()
+            return second
+
+        assert asyncio.run(scenario()) is None  # déjà en cache
+        assert _StubOrigin.hits == ["/vi/pre.jpg"]
+
+
+class TestRoute:
+    """GET /api/media/thumb/{key}"""
+
+    def test_route(self, tmp_path, origin):
+        cache = _cache(tmp_path)
+
+        async def endpoint(request: Request):
+            return await thumbnail_response(cache, request.path_params["key"], request.headers)
+
+        app = Starlette(routes=[Route("/api/media/thumb/{key}", endpoint)])
+        ok_key = cache.register(f"{origin}/vi/route.jpg")
+        missing_key = cache.register(f"{origin}/missing")
+        with TestClient(app) as client:
+            response = client.get(f"/api/media/thumb/{ok_key}")
+            assert response.status_code == 200 and response.content == IMAGE
+            assert response.headers["cache-control"] == "public, max-age=86400"
+            cached = client.get(f"/api/media/thumb/{ok_key}", headers={"If-None-Match": response.headers["etag"]})
+            assert cached.status_code == 304
+            failed = client.get(f"/api/media/thumb/{missing_key}", follow_redirects=False)
+            assert failed.status_code == 302 and failed.headers["location"] == f"{origin}/missing"
+            assert client.get(f"/api/media/thumb/{'f' * 32}").status_code == 404
+            assert client.get("/api/media/thumb/..%2Fsecret").status_code == 404
+        assert _StubOrigin.hits.count("/vi/route.jpg") == 1
@@ -0,0 +1,234 @@
+"""
+Test Suite: Pipeline vidéo des coaches (video_pipeline.py)
+Remux faststart, affiche JPEG/WebP, échelle HLS optionnelle et mise à jour
+des concepts / coaches qui référencent la vidéo d'origine.
+
+Features to test:
+1. Arguments ffmpeg (faststart sans réencodage, seek avant -i, HLS VOD)
+2. Échelle HLS sans agrandissement + master playlist
+3. Job complet (ffmpeg simulé): dérivés produits, concept et coach mis à jour
+4. Dédoublonnage des jobs et concept enregistré après la fin du job
+5. Erreur passagère: job remis en file jusqu'à VIDEO_MAX_ATTEMPTS, puis failed
+6. Reprise au démarrage sur plusieurs workers: job réclamé une seule fois, bail expiré repris
+7. Vrai ffmpeg (ignoré si le binaire est absent)
+"""
+
+import io
+import os
+import sys
+import shutil
+import asyncio
+from datetime import datetime, timezone, timedelta
+
+import pytest
+
+# Add backend to path for video_pipeline import
+sys.path.insert(0, '/app/backend')
+sys.path.insert(0, os.path.dirname(__file__))
+from PIL import Image
+import video_pipeline
+from video_pipeline import (faststart_args, poster_args, hls_args, ladder_for, master_playlist,
+                            process_video, enqueue_video_job, resolve_video_urls, concept_fields,
+                            claim_video_job, resume_video_jobs)
+from image_variants import shutdown_image_pool
+from motor_memory import async_memory_db
+
+KEY = "0123456789ab"
+
+
+async def _fake_ffmpeg(args, binary=None, timeout=None):
+    """Simule ffmpeg: écrit la sortie attendue (dernier argument)."""
+    dest = args[-1]
+    if "+faststart" in args:
+        shutil.copyfile(args[args.index("-i") + 1], dest)
+    elif "-frames:v" in args:
+        Image.new("RGB", (720, 1280), color=(200, 30, 180)).save(dest, "JPEG")
+    elif "hls" in args:
+        with open(dest, "w") as f:
+            f.write("#EXTM3U\n")
+    return b""
+
+
+def _run(coro):
+    try:
+        return asyncio.run(coro)
+    finally:
+        shutdown_image_pool()
+
+
+class TestCommands:
+    """Construction des commandes ffmpeg"""
+
+    def test_faststart_is_a_remux(self):
+        args = faststart_args("in.mov", "out.tmp")
+        assert args[args.index("-c") + 1] == "copy"
+        assert args[args.index("-movflags") + 1] == "+faststart"
+        assert args[args.index("-f") + 1] == "mp4" and args[-1] == "out.tmp"
+
+    def test_poster_seeks_before_input(self):
+        args = poster_args("in.mp4", "poster.jpg", 0.5)
+        assert args.index("-ss") < args.index("-i") and args[args.index("-ss") + 1] == "0.5"
+
+    def test_hls_rendition(self, tmp_path):
+        args = hls_args("in.mp4", str(tmp_path), 360)
+        assert "scale=-2:360" in args and args[args.index("-hls_playlist_type") + 1] == "vod"
+        assert args[-1] == str(tmp_path / "360p.m3u8")
+
+    def test_ladder_never_upscales(self):
+        assert ladder_for(1080, (720, 360)) == [360, 720]
+        assert ladder_for(480, (360, 720)) == [360]
+        assert ladder_for(240, (360, 720)) == [360]
+        assert ladder_for(None, (720,)) == [720]
+        assert ladder_for(1080, ()) == []
+        playlist = master_playlist([{"height": 360, "width": 202}])
+        assert "RESOLUTION=202x360" in playlist and playlist.strip().endswith("360p.m3u8")
+
+
+class TestJobs:
+    """Jobs media_jobs avec ffmpeg simulé"""
+
+    def test_job_updates_concept_and_coach(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(video_pipeline, "run_ffmpeg", _fake_ffmpeg)
+        monkeypatch.setattr(video_pipeline, "FFPROBE_BIN", None)
+        monkeypatch.setattr(video_pipeline, "FFMPEG_AVAILABLE", True)
+        monkeypatch.setattr(video_pipeline, "HLS_LADDER", (360,))
+        source = tmp_path / f"video_{KEY}.mov"
+        source.write_bytes(b"mdat" * 1000 + b"moov")
+        source_url = f"/api/uploads/coaches/c/video_{KEY}.mov"
+        db = async_memory_db()
+        db.sync.concept.insert_one({"id": "concept_c", "heroVideoUrl": source_url})
+        db.sync.coaches.insert_one({"id": "c", "video_url": source_url})
+
+        async def scenario():
+            job_id = await enqueue_video_job(db, str(source), source_url, str(tmp_path), "/api/uploads/coaches/c", KEY)
+            again = await enqueue_video_job(db, str(source), source_url, str(tmp_path), "/api/uploads/coaches/c", KEY)
+            await asyncio.gather(*video_pipeline._tasks)
+            return job_id, again, await resolve_video_urls(db, source_url)
+
+        job_id, again, urls = _run(scenario())
+        assert job_id == again and db.sync.media_jobs.count_documents({}) == 1
+        job = db.sync.media_jobs.find_one({"id": job_id})
+        assert job["status"] == "done" and job["attempts"] == 1
+        assert urls["video_url"] == f"/api/uploads/coaches/c/video_fs_{KEY}.mp4"
+        assert urls["poster_url"] == f"/api/uploads/coaches/c/poster_{KEY}_1280.jpg"
+        assert urls["poster_variants"]["400"]["webp"].endswith(f"poster_{KEY}_400.webp")
+        assert urls["hls_url"] == f"/api/uploads/coaches/c/hls_{KEY}/index.m3u8"
+        assert (tmp_path / f"video_fs_{KEY}.mp4").read_bytes() == source.read_bytes()
+        assert not [name for name in os.listdir(tmp_path) if name.endswith((".tmp", ".frame.jpg"))]
+
+        concept = db.sync.concept.find_one({"id": "concept_c"})
+        assert concept["heroVideoUrl"] == urls["video_url"]
+        assert concept["heroPosterUrl"] == urls["poster_url"] and concept["heroHlsUrl"] == urls["hls_url"]
+        coach = db.sync.coaches.find_one({"id": "c"})
+        assert coach["video_url"] == urls["video_url"] and coach["poster_url"] == urls["poster_url"]
+        assert concept_fields(urls)["heroVideoUrl"] == urls["video_url"]
+
+    def test_failure_is_retried_then_recorded(self, tmp_path, monkeypatch):
+        calls = []
+
+        async def broken_ffmpeg(args, binary=None, timeout=None):
+            calls.append(args)
+            raise video_pipeline.FFmpegError("moov atom not found")
+
+        monkeypatch.setattr(video_pipeline, "run_ffmpeg", broken_ffmpeg)
+        monkeypatch.setattr(video_pipeline, "FFPROBE_BIN", None)
+        monkeypatch.setattr(video_pipeline, "FFMPEG_AVAILABLE", True)
+        monkeypatch.setattr(video_pipeline, "VIDEO_RETRY_DELAY_SECONDS", 0.01)
+        db = async_memory_db()
+        source = tmp_path / f"video_{KEY}.webm"
+        source.write_bytes(b"webm")
+
+        async def scenario():
+            await enqueue_video_job(db, str(source), "/x.webm", str(tmp_path), "/x", KEY)
+            # Les nouvelles tentatives sont lancées par le job en échec
+            while video_pipeline._tasks:
+                await asyncio.gather(*list(video_pipeline._tasks))
+
+        _run(scenario())
+        job = db.sync.media_jobs.find_one({})
+        assert job["status"] == "failed" and "moov" in job["error"]
+        assert job["attempts"] == video_pipeline.VIDEO_MAX_ATTEMPTS == len(calls)
+
+    def test_transient_failure_recovers(self, tmp_path, monkeypatch):
+        attempts = []
+
+        async def flaky_process(source, dest_dir, key, ladder=()):
+            attempts.append(key)
+            if len(attempts) == 1:
+                raise OSError("disque plein")
+            return {"video": None, "poster": None, "hls": None, "info": {}}
+
+        monkeypatch.setattr(video_pipeline, "process_video", flaky_process)
+        monkeypatch.setattr(video_pipeline, "FFMPEG_AVAILABLE", True)
+        monkeypatch.setattr(video_pipeline, "VIDEO_RETRY_DELAY_SECONDS", 0.01)
+        db = async_memory_db()
+
+        async def scenario():
+            await enqueue_video_job(db, "/s.mp4", "/s.mp4", str(tmp_path), "/x", KEY)
+            while video_pipeline._tasks:
+                await asyncio.gather(*list(video_pipeline._tasks))
+
+        _run(scenario())
+        job = db.sync.media_jobs.find_one({})
+        assert job["status"] == "done" and job["attempts"] == 2
+
+    def test_no_job_without_ffmpeg(self, monkeypatch):
+        monkeypatch.setattr(video_pipeline, "FFMPEG_AVAILABLE", False)
+        db = async_memory_db()
+        assert asyncio.run(enqueue_video_job(db, "/a.mp4", "/a.mp4", "/", "/x", KEY)) is None
+        assert asyncio.run(resolve_video_urls(db, "/a.mp4")) == {}
+
+
+class TestResume:
+    """Reprise des jobs au démarrage de chaque worker"""
+
+    def test_job_claimed_once_across_workers(self, tmp_path, monkeypatch):
+        processed = []
+
+        async def fake_process(source, dest_dir, key, ladder=()):
+            processed.append(key)
+            await asyncio.sleep(0)
+            return {"video": None, "poster": None, "hls": None, "info": {}}
+
+        monkeypatch.setattr(video_pipeline, "process_video", fake_process)
+        monkeypatch.setattr(video_pipeline, "FFMPEG_AVAILABLE", True)
+        db = async_memory_db()
+        now = datetime.now(timezone.utc)
+        base = {"kind": "video", "source_path": "/s", "dest_dir": str(tmp_path), "url_prefix": "/x", "attempts": 0}
+        db.sync.media_jobs.insert_many([
+            {**base, "id": "queued", "key": "q", "status": "queued", "source_url": "/q.mp4"},
+            {**base, "id": "stale", "key": "s", "status": "running", "attempts": 1, "source_url": "/s.mp4",
+             "claimed_by": "old-worker", "lease_until": now - timedelta(minutes=1)},
+            {**base, "id": "busy", "key": "b", "status": "running", "attempts": 1, "source_url": "/b.mp4",
+             "claimed_by": "other-worker", "lease_until": now + timedelta(minutes=30)},
+        ])
+
+        async def scenario():
+            # Deux workers démarrent en même temps et voient les mêmes jobs
+            resumed = [await resume_video_jobs(db), await resume_video_jobs(db)]
+            await asyncio.gather(*video_pipeline._tasks)
+            return resumed, await claim_video_job(db, "queued")
+
+        resumed, late_claim = _run(scenario())
+        assert resumed == [2, 2]
+        assert sorted(processed) == ["q", "s"]  # chacun une seule fois, "busy" laissé à son worker
+        assert late_claim is None
+        jobs = {job["id"]: job for job in db.sync.media_jobs.find({})}
+        assert jobs["queued"]["status"] == "done" and jobs["queued"]["claimed_by"] == video_pipeline.WORKER_ID
+        assert jobs["stale"]["attempts"] == 2
+        assert jobs["busy"]["status"] == "running" and jobs["busy"]["claimed_by"] == "other-worker"
+
+
+@pytest.mark.skipif(not (video_pipeline.FFMPEG_BIN and video_pipeline.FFPROBE_BIN), reason="ffmpeg non installé")
+class TestRealFFmpeg:
+    """Bout en bout avec le binaire local"""
+
+    def test_faststart_moves_moov_first(self, tmp_path):
+        source = tmp_path / "clip.mp4"
+        asyncio.run(video_pipeline.run_ffmpeg([
+            "-f", "lavfi", "-i", "testsrc=size=320x568:rate=25:duration=2", "-pix_fmt", "yuv420p", str(source)
+        ]))
+        result = _run(process_video(str(source), str(tmp_path), KEY, ladder=()))
+        data = (tmp_path / result["video"]).read_bytes()
+        assert data.index(b"moov") < data.index(b"mdat")
+        assert result["info"]["height"] == 568 and result["poster"]["variants"]
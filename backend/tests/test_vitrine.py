@@ -0,0 +1,141 @@
+"""
+Test Suite: Vitrines partenaires matérialisées (vitrine.py)
+Un document par coach dans coach_vitrines, lu par une seule recherche sur `keys`,
+reconstruit à chaque écriture coach / offre / cours.
+
+Features to test:
+1. slugify / username_slug unique (homonymes, slugs réservés, inscriptions simultanées)
+2. Contenu: offres visibles, cours actifs, catalogue partagé sans coach_id
+3. find_vitrine par slug, email, id, nom; Bassi
+4. Reconstruction ciblée, retrait des coachs désactivés, matérialisation paresseuse
+5. Portée d'une écriture d'offre / cours (vitrine_scope)
+"""
+
+import sys
+import asyncio
+
+import pytest
+from pymongo.errors import DuplicateKeyError
+
+# Add backend to path for vitrine import
+sys.path.insert(0, '/app/backend')
+from motor_memory import async_memory_db
+from vitrine import slugify, rebuild_vitrines, find_vitrine, assign_username_slug, vitrine_scope, VITRINES
+
+
+@pytest.fixture
+def db():
+    database = async_memory_db()
+    database.sync.coaches.insert_one({"id": "c1", "email": "elodie@x.ch", "name": "Élodie Dupont", "is_active": True})
+    database.sync.coaches.insert_one({"id": "c2", "email": "autre@x.ch", "name": "Elodie  Dupont!", "is_active": True})
+    database.sync.coaches.insert_one({"id": "c3", "email": "off@x.ch", "name": "Off", "is_active": False})
+    database.sync.offers.insert_one({"id": "o-shared", "name": "Carte 10 cours"})
+    database.sync.offers.insert_one({"id": "o-own", "name": "Privé", "coach_id": "elodie@x.ch"})
+    database.sync.offers.insert_one({"id": "o-hidden", "name": "Caché", "coach_id": "elodie@x.ch", "visible": False})
+    database.sync.offers.insert_one({"id": "o-bassi", "name": "Bassi", "coach_id": "bassi_default"})
+    database.sync.courses.insert_one({"id": "k-shared", "name": "Cardio"})
+    database.sync.courses.insert_one({"id": "k-archived", "name": "Ancien", "archived": True})
+    return database
+
+
+class TestSlugs:
+    """username_slug"""
+
+    def test_slugify(self):
+        assert slugify("Élodie Dupont") == "elodie-dupont"
+        assert slugify("  Zumba & Co. ") == "zumba-co"
+        assert slugify(None) == ""
+
+    def test_unique_slugs(self, db):
+        async def scenario():
+            await rebuild_vitrines(db)
+            bassi = {"id": "c4", "email": "b@x.ch", "name": "Bassi"}
+            db.sync.coaches.insert_one(dict(bassi))
+            return await assign_username_slug(db, bassi)
+
+        reserved = asyncio.run(scenario())
+        slugs = {c["id"]: c.get("username_slug") for c in db.sync.coaches.find({})}
+        assert slugs["c1"] == "elodie-dupont" and slugs["c2"] == "elodie-dupont-2"
+        assert slugs["c3"] is None  # inactif: pas de vitrine
+        assert reserved == "bassi-2"
+
+    def test_concurrent_homonym_takes_next_suffix(self, db):
+        coach = {"id": "c4", "email": "new@x.ch", "name": "Zoé"}
+        db.sync.coaches.insert_one(dict(coach))
+        original = db.coaches.update_one
+        attempts = []
+
+        async def racing_update(query, update, **kwargs):
+            attempts.append(update["$set"]["username_slug"])
+            if len(attempts) == 1:
+                # L'homonyme concurrent a enregistré "zoe" entre la vérification et l'écriture
+                raise DuplicateKeyError("E11000 duplicate key error username_slug")
+            return await original(query, update, **kwargs)
+
+        db.coaches.update_one = racing_update
+        assert asyncio.run(assign_username_slug(db, coach)) == "zoe-2"
+        assert attempts == ["zoe", "zoe-2"]
+        assert db.sync.coaches.find_one({"id": "c4"})["username_slug"] == "zoe-2"
+
+
+class TestVitrine:
+    """Contenu et lecture par clé"""
+
+    def test_content_and_lookup(self, db):
+        async def scenario():
+            count = await rebuild_vitrines(db)
+            return count, {key: await find_vitrine(db, key) for key in
+                           ("elodie-dupont", "ELODIE@x.ch", "c1", "élodie dupont", "bassi", "off@x.ch", "inconnu")}
+
+        count, found = asyncio.run(scenario())
+        assert count == 3  # Bassi + 2 coachs actifs
+        vitrine = found["elodie-dupont"]
+        assert set(vitrine) == {"coach", "offers", "courses", "courses_count", "offers_count"}
+        assert vitrine["coach"]["username_slug"] == "elodie-dupont"
+        assert [o["id"] for o in vitrine["offers"]] == ["o-shared", "o-own"]
+        assert [c["id"] for c in vitrine["courses"]] == ["k-shared"] and vitrine["courses_count"] == 1
+        assert found["ELODIE@x.ch"] == found["c1"] == found["élodie dupont"] == vitrine
+        assert [o["id"] for o in found["bassi"]["offers"]] == ["o-shared", "o-bassi"]
+        assert found["off@x.ch"] is None and found["inconnu"] is None
+
+    def test_targeted_rebuild_and_deactivation(self, db):
+        async def scenario():
+            await rebuild_vitrines(db)
+            db.sync.coaches.update_one({"id": "c1"}, {"$set": {"bio": "Nouvelle bio"}})
+            await rebuild_vitrines(db, ["elodie@x.ch"])
+            updated = await find_vitrine(db, "elodie-dupont")
+            db.sync.coaches.update_one({"id": "c1"}, {"$set": {"is_active": False}})
+            await rebuild_vitrines(db, ["elodie@x.ch"])
+            return updated, await find_vitrine(db, "elodie-dupont")
+
+        updated, removed = asyncio.run(scenario())
+        assert updated["coach"]["bio"] == "Nouvelle bio"
+        assert removed is None
+        assert db.sync[VITRINES].count_documents({}) == 2
+
+    def test_lazy_materialization(self, db):
+        vitrine = asyncio.run(find_vitrine(db, "autre@x.ch"))
+        assert vitrine["coach"]["id"] == "c2"
+        assert db.sync[VITRINES].count_documents({}) == 1
+
+
+class TestScope:
+    """Écritures d'offres / cours"""
+
+    def test_vitrine_scope(self):
+        assert vitrine_scope({"id": "o1", "coach_id": "elodie@x.ch"}, {"id": "o2", "coach_id": "elodie@x.ch"}) == ["elodie@x.ch"]
+        assert vitrine_scope({"id": "o1", "coach_id": "elodie@x.ch"}, {"id": "o-shared"}) is None
+        assert vitrine_scope(None) == []
+
+    def test_scoped_rebuild_of_bassi(self, db):
+        async def scenario():
+            await rebuild_vitrines(db)
+            db.sync.offers.update_one({"id": "o-bassi"}, {"$set": {"name": "Bassi Pro"}})
+            db.sync.coaches.update_one({"id": "c1"}, {"$set": {"bio": "non reconstruite"}})
+            await rebuild_vitrines(db, vitrine_scope(db.sync.offers.find_one({"id": "o-bassi"})))
+            return await find_vitrine(db, "bassi"), await find_vitrine(db, "elodie-dupont")
+
+        bassi, elodie = asyncio.run(scenario())
+        assert [o["name"] for o in bassi["offers"]] == ["Carte 10 cours", "Bassi Pro"]
+        assert elodie["coach"].get("bio") is None
+        assert db.sync[VITRINES].count_documents({}) == 3
@@ -0,0 +1,317 @@
+"""
+THUMB PROXY - Cache local des miniatures YouTube / Google Drive
+get_media_type renvoie des miniatures distantes (img.youtube.com, drive.google.com/thumbnail):
+chaque client du chat les téléchargeait lui-même, et une miniature Drive lente bloquait
+le rendu. Les miniatures passent maintenant par /api/media/thumb/{hash}:
+- cache disque borné en taille (THUMB_CACHE_MAX_BYTES, <key>.json compris), éviction LRU par mtime
+- préchargement en arrière-plan dès qu'un message contenant un média est stocké
+- une seule requête vers l'origine pour des demandes simultanées de la même miniature
+- seules les URLs enregistrées (hôtes THUMB_ALLOWED_HOSTS) sont relayées: pas de proxy ouvert
+- l'enregistrement (public_url, au rendu des messages) reste en mémoire: les fichiers
+  <key>.json sont écrits par une tâche de fond dans un thread, jamais sur la boucle
+- registre mémoire borné (THUMB_REGISTRY_SIZE, LRU): une clé sortie est relue depuis <key>.json
+"""
+
+import os
+import json
+import time
+import uuid
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import httpx
+from starlette.responses import Response, RedirectResponse
+
+from media_files import MediaFileResponse
+
+logger = logging.getLogger(__name__)
+
+THUMBS_DIR = os.environ.get('THUMBS_DIR', '/app/backend/uploads/thumbs')
+THUMB_CACHE_MAX_BYTES = int(os.environ.get('THUMB_CACHE_MAX_BYTES', str(200 * 1024 * 1024)))
+THUMB_MAX_IMAGE_BYTES = 2 * 1024 * 1024
+THUMB_FETCH_TIMEOUT = float(os.environ.get('THUMB_FETCH_TIMEOUT', '8'))
+THUMB_ALLOWED_HOSTS = tuple(
+    host.strip() for host in os.environ.get(
+        'THUMB_ALLOWED_HOSTS', 'img.youtube.com,i.ytimg.com,drive.google.com,lh3.googleusercontent.com'
+    ).split(',') if host.strip()
+)
+# URLs gardées en mémoire (les plus récemment rendues), au-delà relues depuis le disque
+THUMB_REGISTRY_SIZE = int(os.environ.get('THUMB_REGISTRY_SIZE', '5000'))
+THUMB_URL_PREFIX = "/api/media/thumb"
+# Une miniature d'une vidéo donnée ne change (presque) jamais
+THUMB_CACHE_CONTROL = "public, max-age=86400"
+# Après éviction, le cache redescend à cette fraction de la limite (évite d'évincer à chaque écriture)
+EVICTION_TARGET = 0.9
+
+
+def thumb_key(url: str) -> str:
+    return hashlib.sha256(url.encode()).hexdigest()[:32]
+
+
+class ThumbnailCache:
+    """Cache disque des miniatures distantes: <key> (octets) + <key>.json (URL source, type)."""
+
+    def __init__(self, directory: str = THUMBS_DIR, max_bytes: int = THUMB_CACHE_MAX_BYTES,
+                 allowed_hosts: Tuple[str, ...] = THUMB_ALLOWED_HOSTS, timeout: float = THUMB_FETCH_TIMEOUT,
+                 registry_size: int = THUMB_REGISTRY_SIZE):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.allowed_hosts = allowed_hosts
+        self.timeout = timeout
+        self.registry_size = registry_size
+        self._registered: "OrderedDict[str, str]" = OrderedDict()
+        self._unflushed: Dict[str, str] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._tasks = set()
+        self._size: Optional[int] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self.origin_requests = 0
+
+    def _data_path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def _meta_path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def is_allowed(self, url: Optional[str]) -> bool:
+        if not url or not isinstance(url, str):
+            return False
+        parsed = urlparse(url)
+        return parsed.scheme in ("http", "https") and parsed.hostname in self.allowed_hosts
+
+    def register(self, url: str) -> Optional[str]:
+        """Autorise une URL de miniature et retourne sa clé (None si hôte non autorisé). Aucune E/S disque."""
+        if not self.is_allowed(url):
+            return None
+        key = thumb_key(url)
+        if key in self._registered:
+            self._registered.move_to_end(key)
+        else:
+            self._remember(key, url)
+            self._unflushed[key] = url
+            self._schedule_flush()
+        return key
+
+    def _remember(self, key: str, url: str):
+        self._registered[key] = url
+        while len(self._registered) > self.registry_size:
+            self._registered.popitem(last=False)
+
+    def _schedule_flush(self):
+        if self._flush_task is not None and not self._flush_task.done():
+            return  # la tâche en cours reprend les nouvelles entrées
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Hors boucle (scripts, tests): écriture directe
+            batch, self._unflushed = self._unflushed, {}
+            self._account_metadata(self._write_metadata(batch))
+            return
+        self._flush_task = loop.create_task(self.flush())
+
+    async def flush(self):
+        """Écrit les enregistrements en attente (<key>.json) dans un thread."""
+        while self._unflushed:
+            batch, self._unflushed = self._unflushed, {}
+            try:
+                self._account_metadata(await asyncio.to_thread(self._write_metadata, batch))
+            except OSError as e:
+                logger.warning(f"[THUMB] Enregistrement des miniatures: {e}")
+
+    def _write_metadata(self, batch: Dict[str, str]) -> int:
+        """Écrit les <key>.json manquants; retourne le nombre d'octets ajoutés au cache."""
+        os.makedirs(self.directory, exist_ok=True)
+        written = 0
+        for key, url in batch.items():
+            meta_path = self._meta_path(key)
+            if os.path.exists(meta_path):
+                continue
+            tmp_path = f"{meta_path}.{uuid.uuid4().hex[:8]}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({"url": url}, f)
+            try:
+                # link: n'écrase jamais les métadonnées complètes écrites par _download entre-temps
+                os.link(tmp_path, meta_path)
+                written += os.path.getsize(meta_path)
+            except FileExistsError:
+                pass
+            finally:
+                os.remove(tmp_path)
+        return written
+
+    def public_url(self, url: Optional[str]) -> Optional[str]:
+        """URL servie au client: le proxy pour les hôtes connus, l'URL d'origine sinon."""
+        key = self.register(url) if self.is_allowed(url) else None
+        return f"{THUMB_URL_PREFIX}/{key}" if key else url
+
+    def _metadata(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._meta_path(key)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def source_url(self, key: str) -> Optional[str]:
+        if key in self._registered:
+            self._registered.move_to_end(key)
+            return self._registered[key]
+        if key in self._unflushed:
+            return self._unflushed[key]
+        meta = self._metadata(key)
+        if meta and self.is_allowed(meta.get("url")):
+            self._remember(key, meta["url"])
+            return meta["url"]
+        return None
+
+    def cached(self, key: str) -> Optional[Tuple[str, os.stat_result, str]]:
+        """(chemin, stat, content-type) si la miniature est sur disque; marque l'accès (LRU)."""
+        path = self._data_path(key)
+        try:
+            now = time.time()
+            os.utime(path, (now, now))
+            stat_result = os.stat(path)
+        except OSError:
+            return None
+        meta = self._metadata(key) or {}
+        return path, stat_result, meta.get("content_type") or "image/jpeg"
+
+    async def get(self, key: str) -> Optional[Tuple[str, os.stat_result, str]]:
+        """Miniature sur disque, téléchargée au besoin. Les échecs simultanés partagent une seule requête."""
+        hit = self.cached(key)
+        if hit:
+            return hit
+        if not self.source_url(key):
+            return None
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._download(key))
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # shield: l'annulation d'un client ne doit pas interrompre le téléchargement partagé
+        if not await asyncio.shield(future):
+            return None
+        return self.cached(key)
+
+    def _http(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=self.timeout, follow_redirects=True,
+                                             limits=httpx.Limits(max_connections=20, max_keepalive_connections=10))
+        return self._client
+
+    async def _download(self, key: str) -> bool:
+        url = self.source_url(key)
+        tmp_path = f"{self._data_path(key)}.{uuid.uuid4().hex[:8]}.tmp"
+        os.makedirs(self.directory, exist_ok=True)
+        try:
+            self.origin_requests += 1
+            size = 0
+            async with self._http().stream("GET", url) as response:
+                content_type = response.headers.get("content-type", "").split(";")[0].strip().lower()
+                if response.status_code != 200 or not content_type.startswith("image/"):
+                    logger.warning(f"[THUMB] {url[:100]}: HTTP {response.status_code} ({content_type or '?'})")
+                    return False
+                with open(tmp_path, "wb") as f:
+                    async for chunk in response.aiter_bytes():
+                        size += len(chunk)
+                        if size > THUMB_MAX_IMAGE_BYTES:
+                            logger.warning(f"[THUMB] {url[:100]}: miniature trop volumineuse")
+                            return False
+                        f.write(chunk)
+            os.replace(tmp_path, self._data_path(key))
+            meta_before = os.path.getsize(self._meta_path(key)) if os.path.exists(self._meta_path(key)) else 0
+            with open(self._meta_path(key), "w") as f:
+                json.dump({"url": url, "content_type": content_type, "size": size}, f)
+            self._account(size + os.path.getsize(self._meta_path(key)) - meta_before)
+            return True
+        except (httpx.HTTPError, OSError) as e:
+            logger.warning(f"[THUMB] {url[:100]}: {e}")
+            return False
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _scan(self) -> List[Tuple[float, int, str]]:
+        """(mtime, taille miniature + <key>.json, clé) par clé; l'accès LRU est porté par la miniature."""
+        keys: Dict[str, list] = {}
+        for name in os.listdir(self.directory):
+            key, _, suffix = name.partition(".")
+            if suffix not in ("", "json"):
+                continue  # temporaires
+            try:
+                stat_result = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            entry = keys.setdefault(key, [stat_result.st_mtime, 0])
+            if not suffix:
+                entry[0] = stat_result.st_mtime
+            entry[1] += stat_result.st_size
+        return [(mtime, size, key) for key, (mtime, size) in keys.items()]
+
+    def _account(self, added: int):
+        if self._size is None:
+            self._size = sum(size for _, size, _ in self._scan())
+        else:
+            self._size += added
+        if self._size > self.max_bytes:
+            self._size = self.evict()
+
+    def _account_metadata(self, added: int):
+        # Taille encore inconnue: le premier scan (au premier téléchargement) comptera ces fichiers
+        if added and self._size is not None:
+            self._account(added)
+
+    def evict(self) -> int:
+        """Supprime les miniatures les moins récemment servies (avec leur <key>.json); retourne la taille restante."""
+        entries = sorted(self._scan())
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * EVICTION_TARGET
+        for _, size, key in entries:
+            if total <= target:
+                break
+            # Le registre mémoire garde la clé: une miniature encore affichée est retéléchargée
+            for path in (self._data_path(key), self._meta_path(key)):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            total -= size
+        return total
+
+    def prefetch(self, url: Optional[str]):
+        """Précharge une miniature en tâche de fond (message média stocké)."""
+        key = self.register(url) if self.is_allowed(url) else None
+        if not key or os.path.exists(self._data_path(key)):
+            return None
+        task = asyncio.create_task(self.get(key))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def close(self):
+        if self._flush_task is not None:
+            await self._flush_task
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+async def thumbnail_response(cache: ThumbnailCache, key: str, request_headers) -> Response:
+    """Réponse de GET /api/media/thumb/{key}: fichier en cache, 304, ou redirection vers l'origine."""
+    if len(key) != 32 or not all(c in "0123456789abcdef" for c in key):
+        return Response(status_code=404)
+    hit = await cache.get(key)
+    if not hit:
+        source = cache.source_url(key)
+        # Origine en échec: le client tente directement plutôt que d'afficher une image cassée
+        return RedirectResponse(source, status_code=302) if source else Response(status_code=404)
+    path, stat_result, content_type = hit
+    etag = f'"{key[:16]}-{stat_result.st_size:x}"'
+    headers = {"content-type": content_type, "etag": etag, "cache-control": THUMB_CACHE_CONTROL}
+    if etag in [tag.strip().removeprefix("W/") for tag in request_headers.get("if-none-match", "").split(",")]:
+        return MediaFileResponse(path, 0, {k: v for k, v in headers.items() if k != "content-type"}, status_code=304)
+    return MediaFileResponse(path, stat_result.st_size, headers)
@@ -0,0 +1,390 @@
+"""
+VIDEO PIPELINE - Traitement des vidéos hero des coaches (ffmpeg local)
+Les vidéos uploadées (upload_coach_asset, asset_type="video") étaient publiées telles
+quelles: beaucoup de .mov/.mp4 de téléphone ont l'atome `moov` en FIN de fichier, le
+navigateur doit tout télécharger avant la première image du carousel /partners/active.
+
+Après l'upload, un job en arrière-plan (collection `media_jobs`):
+1. remuxe en MP4 "faststart" (moov en tête, sans réencodage: -c copy)
+2. extrait une affiche (poster) JPEG + WebP aux tailles POSTER_SIZES
+3. optionnellement (VIDEO_HLS_LADDER="360,720"), produit une petite échelle HLS
+4. met à jour les concepts (heroVideoUrl) et coaches (video_url) qui pointent vers
+   la vidéo d'origine: URL faststart + heroPosterUrl / heroHlsUrl
+
+Chaque job est réclamé atomiquement (queued -> running, worker + bail) avant traitement:
+avec plusieurs workers, un job repris au démarrage n'est exécuté qu'une fois; un bail expiré
+(worker arrêté en cours de job) le rend à nouveau réclamable.
+
+Sans binaire ffmpeg (FFMPEG_AVAILABLE False), la vidéo d'origine reste servie telle quelle.
+"""
+
+import os
+import json
+import uuid
+import shutil
+import socket
+import asyncio
+import logging
+from datetime import datetime, timezone, timedelta
+from typing import Dict, Any, List, Optional, Sequence
+
+from pymongo import ReturnDocument
+
+from image_variants import process_image, variant_urls, primary_variant
+from response_cache import catalog_cache
+from tenant_context import coach_profiles
+
+logger = logging.getLogger(__name__)
+
+FFMPEG_BIN = os.environ.get('FFMPEG_BIN') or shutil.which('ffmpeg')
+FFPROBE_BIN = os.environ.get('FFPROBE_BIN') or shutil.which('ffprobe')
+FFMPEG_AVAILABLE = bool(FFMPEG_BIN)
+
+# Jobs ffmpeg simultanés (un remux est léger, un encodage HLS occupe un cœur entier)
+VIDEO_MAX_JOBS = int(os.environ.get('VIDEO_MAX_JOBS', '1'))
+# Hauteurs de l'échelle HLS, vide = pas de HLS
+HLS_LADDER = tuple(int(h) for h in os.environ.get('VIDEO_HLS_LADDER', '').split(',') if h.strip())
+FFMPEG_TIMEOUT_SECONDS = int(os.environ.get('FFMPEG_TIMEOUT_SECONDS', '600'))
+# Bail d'un job réclamé: au-delà, un autre worker peut le reprendre
+VIDEO_JOB_LEASE_SECONDS = int(os.environ.get('VIDEO_JOB_LEASE_SECONDS', '3600'))
+VIDEO_MAX_ATTEMPTS = 3
+# Délai avant une nouvelle tentative après une erreur (ffmpeg, disque) tant qu'il reste des essais
+VIDEO_RETRY_DELAY_SECONDS = float(os.environ.get('VIDEO_RETRY_DELAY_SECONDS', '30'))
+# Identité de ce worker dans media_jobs.claimed_by
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+POSTER_SIZES = (400, 1280)
+POSTER_AT_SECONDS = 1.0
+HLS_SEGMENT_SECONDS = 4
+# Débits vidéo (kbit/s) par hauteur, pour l'encodage et le master playlist
+HLS_BITRATES = {240: 400, 360: 800, 480: 1400, 720: 2500, 1080: 5000}
+HLS_AUDIO_KBPS = 96
+
+# Conteneurs ISO-BMFF: seuls concernés par la position de l'atome moov
+FASTSTART_EXTENSIONS = (".mp4", ".mov", ".m4v")
+
+_semaphore: Optional[asyncio.Semaphore] = None
+_tasks = set()
+
+
+class FFmpegError(RuntimeError):
+    pass
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(VIDEO_MAX_JOBS)
+    return _semaphore
+
+
+def faststart_args(source: str, dest: str) -> List[str]:
+    """Remux sans réencodage, atome moov déplacé en tête."""
+    return ["-y", "-i", source, "-map", "0:v:0", "-map", "0:a?", "-c", "copy",
+            "-movflags", "+faststart", "-f", "mp4", dest]
+
+
+def poster_args(source: str, dest: str, at_seconds: float = POSTER_AT_SECONDS) -> List[str]:
+    """Une image JPEG (seek rapide avant -i)."""
+    return ["-y", "-ss", f"{at_seconds:g}", "-i", source, "-frames:v", "1", "-q:v", "2", dest]
+
+
+def hls_args(source: str, out_dir: str, height: int) -> List[str]:
+    """Une rendition HLS VOD (H.264 + AAC), segments {height}p_000.ts."""
+    kbps = HLS_BITRATES.get(height, height * 4)
+    return ["-y", "-i", source, "-map", "0:v:0", "-map", "0:a?",
+            "-vf", f"scale=-2:{height}", "-c:v", "libx264", "-preset", "veryfast", "-profile:v", "main",
+            "-b:v", f"{kbps}k", "-maxrate", f"{int(kbps * 1.07)}k", "-bufsize", f"{kbps * 2}k",
+            "-g", str(HLS_SEGMENT_SECONDS * 30), "-sc_threshold", "0",
+            "-c:a", "aac", "-b:a", f"{HLS_AUDIO_KBPS}k", "-ac", "2",
+            "-f", "hls", "-hls_time", str(HLS_SEGMENT_SECONDS), "-hls_playlist_type", "vod",
+            "-hls_segment_filename", os.path.join(out_dir, f"{height}p_%03d.ts"),
+            os.path.join(out_dir, f"{height}p.m3u8")]
+
+
+def master_playlist(renditions: Sequence[Dict[str, int]]) -> str:
+    """Master playlist à partir des renditions produites ({height, width})."""
+    lines = ["#EXTM3U", "#EXT-X-VERSION:3"]
+    for rendition in renditions:
+        height = rendition["height"]
+        bandwidth = (HLS_BITRATES.get(height, height * 4) + HLS_AUDIO_KBPS) * 1000
+        lines.append(f"#EXT-X-STREAM-INF:BANDWIDTH={bandwidth},RESOLUTION={rendition['width']}x{height}")
+        lines.append(f"{height}p.m3u8")
+    return "\n".join(lines) + "\n"
+
+
+def ladder_for(source_height: Optional[int], ladder: Sequence[int] = HLS_LADDER) -> List[int]:
+    """Hauteurs à produire: jamais d'agrandissement (au moins la plus petite si la source est basse)."""
+    heights = sorted(set(ladder))
+    if not heights or not source_height:
+        return heights
+    kept = [h for h in heights if h <= source_height]
+    return kept or heights[:1]
+
+
+def scaled_width(info: Dict[str, Any], height: int) -> int:
+    """Largeur paire correspondant à scale=-2:height (9:16 par défaut, format du carousel)."""
+    if info.get("width") and info.get("height"):
+        return round(info["width"] * height / info["height"] / 2) * 2
+    return round(height * 9 / 16 / 2) * 2
+
+
+async def run_ffmpeg(args: List[str], binary: Optional[str] = None, timeout: int = FFMPEG_TIMEOUT_SECONDS) -> bytes:
+    """Exécute ffmpeg/ffprobe en sous-processus (la boucle n'est jamais bloquée)."""
+    binary = binary or FFMPEG_BIN
+    if not binary:
+        raise FFmpegError("ffmpeg introuvable")
+    process = await asyncio.create_subprocess_exec(
+        binary, "-hide_banner", "-loglevel", "error", *args,
+        stdin=asyncio.subprocess.DEVNULL, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+    )
+    try:
+        stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=timeout)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+        raise FFmpegError(f"{os.path.basename(binary)}: délai dépassé ({timeout}s)")
+    if process.returncode != 0:
+        raise FFmpegError(f"{os.path.basename(binary)} code {process.returncode}: {stderr.decode(errors='replace')[-500:]}")
+    return stdout
+
+
+async def probe(source: str) -> Dict[str, Any]:
+    """Largeur, hauteur, durée et présence d'audio (vide si ffprobe est absent ou échoue)."""
+    if not FFPROBE_BIN:
+        return {}
+    try:
+        output = await run_ffmpeg(["-print_format", "json", "-show_streams", "-show_format", source], binary=FFPROBE_BIN)
+        data = json.loads(output or b"{}")
+    except (FFmpegError, ValueError) as e:
+        logger.warning(f"[VIDEO] ffprobe {source}: {e}")
+        return {}
+    video = next((s for s in data.get("streams", []) if s.get("codec_type") == "video"), {})
+    return {
+        "width": video.get("width"),
+        "height": video.get("height"),
+        "duration": float(data.get("format", {}).get("duration") or 0) or None,
+        "has_audio": any(s.get("codec_type") == "audio" for s in data.get("streams", [])),
+    }
+
+
+def _has_output(path: str) -> bool:
+    return os.path.exists(path) and os.path.getsize(path) > 0
+
+
+async def process_video(source: str, dest_dir: str, key: str, ladder: Sequence[int] = HLS_LADDER) -> Dict[str, Any]:
+    """
+    Produit les dérivés d'une vidéo dans dest_dir. `key` est le fragment de hash du fichier
+    d'origine: les noms restent adressés par contenu (cache immutable de media_files).
+    Retourne {"video", "poster" (résultat de process_image), "hls", "info"} (noms de fichiers).
+    """
+    info = await probe(source)
+    result: Dict[str, Any] = {"video": None, "poster": None, "hls": None, "info": info}
+    tmp_suffix = f".{uuid.uuid4().hex[:8]}.tmp"
+
+    # 1. Faststart (remux seul: quelques secondes même pour 50 MB)
+    if source.lower().endswith(FASTSTART_EXTENSIONS):
+        video_name = f"video_fs_{key}.mp4"
+        final_path = os.path.join(dest_dir, video_name)
+        if not _has_output(final_path):
+            tmp_path = final_path + tmp_suffix
+            try:
+                await run_ffmpeg(faststart_args(source, tmp_path))
+                os.replace(tmp_path, final_path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+        result["video"] = video_name
+
+    # 2. Affiche: image à ~1 s (ou à mi-durée pour les clips courts), puis variantes JPEG/WebP
+    frame_path = os.path.join(dest_dir, f"poster_{key}.frame.jpg")
+    duration = info.get("duration")
+    at_seconds = min(POSTER_AT_SECONDS, duration / 2) if duration else POSTER_AT_SECONDS
+    try:
+        await run_ffmpeg(poster_args(source, frame_path, at_seconds))
+        if not _has_output(frame_path) and at_seconds:
+            await run_ffmpeg(poster_args(source, frame_path, 0))
+        if _has_output(frame_path):
+            result["poster"] = await process_image(frame_path, dest_dir, f"poster_{key}", POSTER_SIZES)
+    finally:
+        if os.path.exists(frame_path):
+            os.remove(frame_path)
+
+    # 3. Échelle HLS optionnelle, une rendition par passe (audio facultatif via 0:a?)
+    heights = ladder_for(info.get("height"), ladder)
+    if heights:
+        hls_dir = os.path.join(dest_dir, f"hls_{key}")
+        os.makedirs(hls_dir, exist_ok=True)
+        renditions = []
+        for height in heights:
+            if not _has_output(os.path.join(hls_dir, f"{height}p.m3u8")):
+                await run_ffmpeg(hls_args(source, hls_dir, height))
+            renditions.append({"height": height, "width": scaled_width(info, height)})
+        with open(os.path.join(hls_dir, "index.m3u8"), "w") as f:
+            f.write(master_playlist(renditions))
+        result["hls"] = f"hls_{key}/index.m3u8"
+    return result
+
+
+def derived_urls(result: Dict[str, Any], url_prefix: str) -> Dict[str, Any]:
+    """URLs publiques des dérivés (clés absentes si non produits)."""
+    urls: Dict[str, Any] = {}
+    if result.get("video"):
+        urls["video_url"] = f"{url_prefix}/{result['video']}"
+    if result.get("poster"):
+        urls["poster_variants"] = variant_urls(result["poster"], url_prefix)
+        urls["poster_url"] = f"{url_prefix}/{primary_variant(result['poster'], max(POSTER_SIZES))['jpeg']}"
+    if result.get("hls"):
+        urls["hls_url"] = f"{url_prefix}/{result['hls']}"
+    return urls
+
+
+def concept_fields(urls: Dict[str, Any]) -> Dict[str, str]:
+    """Champs du concept dérivés d'un job terminé."""
+    fields = {}
+    if urls.get("video_url"):
+        fields["heroVideoUrl"] = urls["video_url"]
+    if urls.get("poster_url"):
+        fields["heroPosterUrl"] = urls["poster_url"]
+    if urls.get("hls_url"):
+        fields["heroHlsUrl"] = urls["hls_url"]
+    return fields
+
+
+def coach_fields(urls: Dict[str, Any]) -> Dict[str, str]:
+    """Champs du document coach (vitrine) dérivés d'un job terminé."""
+    fields = {}
+    for key in ("video_url", "poster_url", "hls_url"):
+        if urls.get(key):
+            fields[key] = urls[key]
+    return fields
+
+
+async def apply_video_result(db, source_url: str, urls: Dict[str, Any]) -> Dict[str, int]:
+    """Remplace la vidéo d'origine par ses dérivés partout où elle est référencée."""
+    now = datetime.now(timezone.utc).isoformat()
+    concepts = await db.concept.update_many(
+        {"heroVideoUrl": source_url}, {"$set": {**concept_fields(urls), "heroMediaUpdatedAt": now}}
+    )
+    coaches = await db.coaches.update_many(
+        {"video_url": source_url}, {"$set": {**coach_fields(urls), "updated_at": now}}
+    )
+    if concepts.modified_count:
+        catalog_cache.bump("concept")
+    if coaches.modified_count:
+        coach_profiles.invalidate()
+    if concepts.modified_count or coaches.modified_count:
+        catalog_cache.bump("partners")  # carousel: video_url / poster_url / hls_url
+    return {"concepts": concepts.modified_count, "coaches": coaches.modified_count}
+
+
+async def resolve_video_urls(db, video_url: Optional[str]) -> Dict[str, Any]:
+    """URLs dérivées d'une vidéo déjà traitée (concept enregistré APRÈS la fin du job)."""
+    if not video_url:
+        return {}
+    job = await db.media_jobs.find_one({"source_url": video_url, "status": "done"}, {"_id": 0, "urls": 1})
+    return (job or {}).get("urls") or {}
+
+
+def _claimable(now: datetime, max_attempts: int = VIDEO_MAX_ATTEMPTS) -> Dict[str, Any]:
+    """Jobs en attente, ou en cours dont le bail a expiré (worker arrêté)."""
+    return {"attempts": {"$lt": max_attempts}, "$or": [
+        {"status": "queued"},
+        {"status": "running", "lease_until": {"$lt": now}},
+        {"status": "running", "lease_until": {"$exists": False}},
+    ]}
+
+
+async def claim_video_job(db, job_id: str) -> Optional[Dict[str, Any]]:
+    """Passe le job à running pour ce worker (find_one_and_update); None s'il est déjà pris."""
+    now = datetime.now(timezone.utc)
+    return await db.media_jobs.find_one_and_update(
+        {"id": job_id, **_claimable(now)},
+        {"$set": {"status": "running", "claimed_by": WORKER_ID, "started_at": now.isoformat(),
+                  "lease_until": now + timedelta(seconds=VIDEO_JOB_LEASE_SECONDS)},
+         "$inc": {"attempts": 1}},
+        projection={"_id": 0}, return_document=ReturnDocument.AFTER
+    )
+
+
+async def run_video_job(db, job_id: str) -> Optional[Dict[str, Any]]:
+    """Exécute un job `media_jobs` (concurrence bornée par VIDEO_MAX_JOBS) s'il est réclamé par ce worker."""
+    async with _get_semaphore():
+        # Réclamé une fois le créneau obtenu: le bail ne court pas pendant l'attente
+        job = await claim_video_job(db, job_id)
+        if not job:
+            return None
+        owned = {"id": job_id, "claimed_by": WORKER_ID}
+        try:
+            result = await process_video(job["source_path"], job["dest_dir"], job["key"], job.get("ladder") or ())
+            urls = derived_urls(result, job["url_prefix"])
+            applied = await apply_video_result(db, job["source_url"], urls)
+            await db.media_jobs.update_one(owned, {"$set": {
+                "status": "done", "urls": urls, "info": result["info"], "applied": applied,
+                "finished_at": datetime.now(timezone.utc).isoformat()
+            }})
+            logger.info(f"[VIDEO] ✅ {job['source_url']} -> {urls.get('video_url')} (appliqué: {applied})")
+            return urls
+        except Exception as e:
+            # Erreur passagère possible: remis en file tant que les tentatives ne sont pas épuisées
+            retry = job.get("attempts", 1) < VIDEO_MAX_ATTEMPTS
+            logger.error(f"[VIDEO] ❌ Job {job_id} ({job['source_url']}) tentative {job.get('attempts')}: {e}")
+            await db.media_jobs.update_one(owned, {"$set": {
+                "status": "queued" if retry else "failed", "error": str(e)[:1000],
+                "finished_at": datetime.now(timezone.utc).isoformat()
+            }, "$unset": {"lease_until": ""}})
+    if retry:
+        _spawn(db, job_id, delay=VIDEO_RETRY_DELAY_SECONDS)
+    return None
+
+
+async def _run_later(db, job_id: str, delay: float):
+    await asyncio.sleep(delay)
+    return await run_video_job(db, job_id)
+
+
+def _spawn(db, job_id: str, delay: float = 0):
+    task = asyncio.create_task(_run_later(db, job_id, delay) if delay else run_video_job(db, job_id))
+    # Référence forte: une tâche sans référence peut être collectée en cours de route
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return task
+
+
+async def enqueue_video_job(db, source_path: str, source_url: str, dest_dir: str, url_prefix: str,
+                            key: str, owner: Optional[str] = None) -> Optional[str]:
+    """
+    Enregistre et lance le traitement d'une vidéo uploadée. Un même fichier (même URL)
+    n'est traité qu'une fois. Retourne l'id du job, None si ffmpeg est absent.
+    """
+    if not FFMPEG_AVAILABLE:
+        return None
+    existing = await db.media_jobs.find_one(
+        {"source_url": source_url, "status": {"$in": ["queued", "running", "done"]}}, {"_id": 0, "id": 1}
+    )
+    if existing:
+        return existing["id"]
+    job_id = str(uuid.uuid4())
+    await db.media_jobs.insert_one({
+        "id": job_id, "kind": "video", "status": "queued", "owner": owner,
+        "source_path": source_path, "source_url": source_url, "dest_dir": dest_dir,
+        "url_prefix": url_prefix, "key": key, "ladder": list(HLS_LADDER), "attempts": 0,
+        "created_at": datetime.now(timezone.utc).isoformat()
+    })
+    _spawn(db, job_id)
+    return job_id
+
+
+async def resume_video_jobs(db, max_attempts: int = VIDEO_MAX_ATTEMPTS) -> int:
+    """
+    Au démarrage (chaque worker): relance les jobs interrompus par un redémarrage.
+    Plusieurs workers peuvent voir le même job; seul celui qui le réclame l'exécute.
+    """
+    if not FFMPEG_AVAILABLE:
+        return 0
+    jobs = await db.media_jobs.find(
+        {"kind": "video", **_claimable(datetime.now(timezone.utc), max_attempts)}, {"_id": 0, "id": 1}
+    ).to_list(100)
+    for job in jobs:
+        _spawn(db, job["id"])
+    return len(jobs)
@@ -0,0 +1,191 @@
+"""
+VITRINE - Pages publiques des partenaires matérialisées
+get_coach_vitrine résolvait le coach par regex insensible à la casse sur `name` ($or avec
+email / id) puis relisait offres et cours ($or coach_id / $exists) à chaque visite.
+
+- chaque coach reçoit un `username_slug` unique et indexé (nom sans accents, minuscules, tirets)
+- un document par coach dans `coach_vitrines`: carte coach, offres visibles, cours actifs, compteurs,
+  et les clés d'accès acceptées (slug, email, id, nom) -> une seule recherche indexée sur `keys`
+- reconstruit à chaque écriture coach / offre / cours (rebuild_vitrines), servi via le cache catalogue;
+  une écriture d'offre / cours ne reconstruit que la vitrine de son coach (vitrine_scope), en tâche
+  de fond (refresh_vitrines) - toutes seulement pour le catalogue historique sans coach_id
+"""
+
+import re
+import logging
+import unicodedata
+from datetime import datetime, timezone
+from typing import Dict, Any, Optional, List
+
+from pymongo.errors import DuplicateKeyError
+
+from response_cache import catalog_cache
+
+logger = logging.getLogger(__name__)
+
+VITRINES = "coach_vitrines"
+SUPER_ADMIN_EMAIL = "contact.artboost@gmail.com"
+DEFAULT_COACH_ID = "bassi_default"
+# Vitrine du Super Admin: /coach/bassi, /coach/afroboost ou son email
+BASSI_KEYS = ["bassi", "afroboost", SUPER_ADMIN_EMAIL]
+BASSI_CARD = {"id": "bassi", "name": "Bassi - Afroboost", "email": SUPER_ADMIN_EMAIL, "photo_url": None,
+              "bio": "Coach Afroboost - Fitness & Bien-être", "platform_name": "Afroboost", "logo_url": None}
+RESERVED_SLUGS = {"bassi", "afroboost"}
+COACH_CARD_FIELDS = ("id", "name", "photo_url", "bio", "email", "platform_name", "logo_url", "username_slug")
+VITRINE_ITEMS_LIMIT = 20
+VITRINE_PROJECTION = {"_id": 0, "coach": 1, "offers": 1, "courses": 1, "courses_count": 1, "offers_count": 1}
+
+
+def slugify(value: Optional[str]) -> str:
+    """'Élodie Dupont' -> 'elodie-dupont'"""
+    normalized = unicodedata.normalize("NFKD", value or "").encode("ascii", "ignore").decode().lower()
+    return re.sub(r"[^a-z0-9]+", "-", normalized).strip("-")
+
+
+def base_slug(coach: Dict[str, Any]) -> str:
+    email = (coach.get("email") or "").lower()
+    return slugify(coach.get("name")) or slugify(email.split("@")[0]) or slugify(coach.get("id")) or "partenaire"
+
+
+def vitrine_keys(coach: Dict[str, Any]) -> List[str]:
+    """Identifiants acceptés dans /coach/{username}: slug, email, id et nom (ancienne recherche par nom)."""
+    keys = []
+    for value in (coach.get("username_slug"), coach.get("email"), coach.get("id"), coach.get("name")):
+        key = (value or "").lower().strip()
+        if key and key not in keys:
+            keys.append(key)
+    return keys
+
+
+def visible_offer(offer: Dict[str, Any]) -> bool:
+    return offer.get("visible", True) is not False
+
+
+def visible_course(course: Dict[str, Any]) -> bool:
+    return course.get("visible", True) is not False and not course.get("archived")
+
+
+def vitrine_document(coach_id: str, card: Dict[str, Any], keys: List[str],
+                     offers: List[Dict[str, Any]], courses: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Offres / cours du coach + ceux sans coach_id (catalogue historique partagé), dans l'ordre naturel."""
+    def owned(item):
+        return "coach_id" not in item or item["coach_id"] == coach_id
+    own_offers = [o for o in offers if owned(o)][:VITRINE_ITEMS_LIMIT]
+    own_courses = [c for c in courses if owned(c)][:VITRINE_ITEMS_LIMIT]
+    return {
+        "coach_id": coach_id,
+        "keys": keys,
+        "coach": card,
+        "offers": own_offers,
+        "courses": own_courses,
+        "courses_count": len(own_courses),
+        "offers_count": len(own_offers),
+        "updated_at": datetime.now(timezone.utc).isoformat()
+    }
+
+
+async def ensure_vitrine_indexes(db):
+    await db.coaches.create_index("username_slug", unique=True, sparse=True)
+    await db[VITRINES].create_index("coach_id", unique=True)
+    await db[VITRINES].create_index("keys")
+
+
+async def assign_username_slug(db, coach: Dict[str, Any]) -> str:
+    """Slug unique du coach (suffixe -2, -3... en cas d'homonyme), enregistré une seule fois."""
+    if coach.get("username_slug"):
+        return coach["username_slug"]
+    base = base_slug(coach)
+    slug, suffix = base, 2
+    while True:
+        while slug in RESERVED_SLUGS or await db.coaches.find_one(
+                {"username_slug": slug, "email": {"$ne": coach.get("email")}}, {"_id": 1}):
+            slug, suffix = f"{base}-{suffix}", suffix + 1
+        try:
+            await db.coaches.update_one({"email": coach.get("email")}, {"$set": {"username_slug": slug}})
+            break
+        except DuplicateKeyError:
+            # Homonyme inscrit en même temps: le slug vient d'être pris (index unique), suffixe suivant
+            slug, suffix = f"{base}-{suffix}", suffix + 1
+    coach["username_slug"] = slug
+    return slug
+
+
+def vitrine_scope(*items: Optional[Dict[str, Any]]) -> Optional[List[str]]:
+    """
+    Vitrines touchées par l'écriture d'offres / cours: le coach_id de chaque élément,
+    ou None (toutes) dès qu'un élément n'en a pas (catalogue historique partagé).
+    """
+    owners = []
+    for item in items:
+        if item is None:
+            continue
+        if "coach_id" not in item:
+            return None
+        if item["coach_id"] and item["coach_id"] not in owners:
+            owners.append(item["coach_id"])
+    return owners
+
+
+async def rebuild_vitrines(db, coach_emails: Optional[List[str]] = None) -> int:
+    """
+    Reconstruit les vitrines de coach_emails (écriture sur un coach), ou toutes si None
+    (écriture sur une offre / un cours: le catalogue sans coach_id apparaît partout).
+    3 lectures quel que soit le nombre de coachs; les vitrines des coachs inactifs ou supprimés sont retirées.
+    """
+    full = coach_emails is None
+    emails = [e.lower().strip() for e in coach_emails or [] if e]
+    # Vitrine Bassi: reconstruite avec toutes, ou ciblée par son coach_id (bassi_default)
+    with_bassi = full or DEFAULT_COACH_ID in emails
+    query = {"is_active": True} if full else {"is_active": True, "email": {"$in": emails}}
+    coaches = await db.coaches.find(query, {"_id": 0}).to_list(None)
+    owners = [(c.get("email") or "").lower() for c in coaches] + ([DEFAULT_COACH_ID] if with_bassi else [])
+    scope = {"$or": [{"coach_id": {"$in": owners}}, {"coach_id": {"$exists": False}}]}
+    offers = [o for o in await db.offers.find(scope, {"_id": 0}).to_list(None) if visible_offer(o)]
+    courses = [c for c in await db.courses.find(scope, {"_id": 0}).to_list(None) if visible_course(c)]
+
+    documents = []
+    if with_bassi:
+        documents.append(vitrine_document(DEFAULT_COACH_ID, BASSI_CARD, BASSI_KEYS, offers, courses))
+    for coach in coaches:
+        await assign_username_slug(db, coach)
+        card = {field: coach.get(field) for field in COACH_CARD_FIELDS}
+        documents.append(vitrine_document((coach.get("email") or "").lower(), card, vitrine_keys(coach), offers, courses))
+    for document in documents:
+        await db[VITRINES].update_one({"coach_id": document["coach_id"]}, {"$set": document}, upsert=True)
+
+    built = [d["coach_id"] for d in documents]
+    stale = {"coach_id": {"$nin": built}} if full else {"coach_id": {"$in": [e for e in emails if e not in built]}}
+    await db[VITRINES].delete_many(stale)
+    catalog_cache.bump("vitrine")
+    logger.info(f"[VITRINE] {len(documents)} vitrine(s) reconstruite(s)")
+    return len(documents)
+
+
+async def refresh_vitrines(db, coach_emails: Optional[List[str]] = None):
+    """rebuild_vitrines hors du chemin de la requête (BackgroundTasks): un échec est journalisé."""
+    if coach_emails == []:
+        return
+    try:
+        await rebuild_vitrines(db, coach_emails)
+    except Exception as e:
+        logger.warning(f"[VITRINE] Reconstruction échouée ({coach_emails or 'toutes'}): {e}")
+
+
+async def find_vitrine(db, username: str) -> Optional[Dict[str, Any]]:
+    """Vitrine publique par slug / email / id / nom: une recherche indexée sur `keys`."""
+    key = (username or "").lower().strip()
+    if not key:
+        return None
+    vitrine = await db[VITRINES].find_one({"keys": key}, VITRINE_PROJECTION)
+    if vitrine is not None:
+        return vitrine
+    # Pas encore matérialisée (avant la reconstruction au démarrage)
+    if key in BASSI_KEYS:
+        await rebuild_vitrines(db)
+    else:
+        coach = await db.coaches.find_one(
+            {"$or": [{"username_slug": key}, {"email": key}, {"id": username}], "is_active": True}, {"_id": 0, "email": 1})
+        if not coach:
+            return None
+        await rebuild_vitrines(db, [coach["email"]])
+    return await db[VITRINES].find_one({"keys": key}, VITRINE_PROJECTION)
@@ -2096,6 +2096,18 @@ function App() {
   const [appliedDiscount, setAppliedDiscount] = useState(null);
   const [hasSavedTicket, setHasSavedTicket] = useState(false); // Bouton flottant "Voir mon ticket"
 
+  // Places restantes par séance: { [courseId]: { 'YYYY-MM-DD': { remaining, full } } } (cours avec capacité)
+  // Déclaré après showSuccess: rechargé après chaque réservation confirmée
+  const [courseSeats, setCourseSeats] = useState({});
+  useEffect(() => {
+    const limited = courses.filter(c => c.capacity !== null && c.capacity !== undefined);
+    if (limited.length === 0) return;
+    Promise.all(limited.map(c => axios.get(`${API}/courses/${c.id}/availability`)
+      .then(res => [c.id, Object.fromEntries(res.data.occurrences.map(o => [o.date, o]))])
+      .catch(() => [c.id, {}])
+    )).then(entries => setCourseSeats(Object.fromEntries(entries)));
+  }, [courses, showSuccess]);
+
   // Navigation et filtrage
   const [activeFilter, setActiveFilter] = useState('all');
   const [searchQuery, setSearchQuery] = useState('');
@@ -2654,6 +2666,7 @@ function App() {
   }, []);
 
   // Fonction pour charger les données avec cache
+  // Un seul GET /bootstrap (concept, cours, offres, liens, codes promo...) revalidé par ETag côté serveur
   const fetchData = useCallback(async (forceRefresh = false) => {
     try {
       // Utiliser le cache si disponible et pas de force refresh
@@ -2662,111 +2675,50 @@ function App() {
       const cachedConcept = !forceRefresh && isCacheValid('concept') ? cacheRef.current.concept.data : null;
       const cachedLinks = !forceRefresh && isCacheValid('paymentLinks') ? cacheRef.current.paymentLinks.data : null;
 
-      // Construire les requêtes uniquement pour les données non cachées
-      const requests = [];
-      const requestMap = {};
-
-      if (!cachedCourses) {
-        requestMap.courses = requests.length;
-        requests.push(axios.get(`${API}/courses`));
-      }
-      if (!cachedOffers) {
-        requestMap.offers = requests.length;
-        requests.push(axios.get(`${API}/offers`));
-      }
-      if (!cachedLinks) {
-        requestMap.links = requests.length;
-        requests.push(axios.get(`${API}/payment-links`));
-      }
-      if (!cachedConcept) {
-        requestMap.concept = requests.length;
-        requests.push(axios.get(`${API}/concept`));
-      }
-
-      // Toujours récupérer users et discount codes (données dynamiques)
-      requestMap.users = requests.length;
-      requests.push(axios.get(`${API}/users`));
-      requestMap.codes = requests.length;
-      requests.push(axios.get(`${API}/discount-codes`));
-
-      const responses = await Promise.all(requests);
+      // Toujours récupérer users et le bootstrap (codes promo = données dynamiques, 304 si inchangé)
+      const [bootstrapRes, usersRes] = await Promise.all([
+        axios.get(`${API}/bootstrap`),
+        axios.get(`${API}/users`)
+      ]);
+      const bootstrap = bootstrapRes.data;
 
       // Mettre à jour le cache et les états
       const now = Date.now();
-
-      if (cachedCourses) {
-        setCourses(cachedCourses);
-      } else if (requestMap.courses !== undefined) {
-        const coursesData = responses[requestMap.courses].data;
-        cacheRef.current.courses = { data: coursesData, timestamp: now };
-        setCourses(coursesData);
+      const coursesData = cachedCourses || bootstrap.courses;
+      const offersData = cachedOffers || bootstrap.offers;
+      const linksData = cachedLinks || bootstrap.paymentLinks;
+      const conceptData = cachedConcept || bootstrap.concept;
+      if (!cachedCourses) cacheRef.current.courses = { data: coursesData, timestamp: now };
+      if (!cachedOffers) cacheRef.current.offers = { data: offersData, timestamp: now };
+      if (!cachedLinks) cacheRef.current.paymentLinks = { data: linksData, timestamp: now };
+      if (!cachedConcept) cacheRef.current.concept = { data: conceptData, timestamp: now };
+      setCourses(coursesData);
+      setOffers(offersData);
+      setPaymentLinks(linksData);
+      setConcept(conceptData);
+
+      // Appliquer les couleurs personnalisées
+      if (conceptData.primaryColor) {
+        document.documentElement.style.setProperty('--primary-color', conceptData.primaryColor);
+        // Glow: utiliser glowColor si défini, sinon primaryColor
+        const glowBase = conceptData.glowColor || conceptData.primaryColor;
+        document.documentElement.style.setProperty('--glow-color', `${glowBase}66`);
+        document.documentElement.style.setProperty('--glow-color-strong', `${glowBase}99`);
       }
-
-      if (cachedOffers) {
-        setOffers(cachedOffers);
-      } else if (requestMap.offers !== undefined) {
-        const offersData = responses[requestMap.offers].data;
-        cacheRef.current.offers = { data: offersData, timestamp: now };
-        setOffers(offersData);
-      }
-
-      if (cachedLinks) {
-        setPaymentLinks(cachedLinks);
-      } else if (requestMap.links !== undefined) {
-        const linksData = responses[requestMap.links].data;
-        cacheRef.current.paymentLinks = { data: linksData, timestamp: now };
-        setPaymentLinks(linksData);
+      if (conceptData.secondaryColor) {
+        document.documentElement.style.setProperty('--secondary-color', conceptData.secondaryColor);
       }
-
-      if (cachedConcept) {
-        setConcept(cachedConcept);
-        // Appliquer les couleurs personnalisées
-        if (cachedConcept.primaryColor) {
-          document.documentElement.style.setProperty('--primary-color', cachedConcept.primaryColor);
-          // Glow: utiliser glowColor si défini, sinon primaryColor
-          const glowBase = cachedConcept.glowColor || cachedConcept.primaryColor;
-          document.documentElement.style.setProperty('--glow-color', `${glowBase}66`);
-          document.documentElement.style.setProperty('--glow-color-strong', `${glowBase}99`);
-        }
-        if (cachedConcept.secondaryColor) {
-          document.documentElement.style.setProperty('--secondary-color', cachedConcept.secondaryColor);
-        }
-        // v9.4.4: Appliquer la couleur de fond
-        if (cachedConcept.backgroundColor) {
-          document.documentElement.style.setProperty('--background-color', cachedConcept.backgroundColor);
-          document.body.style.backgroundColor = cachedConcept.backgroundColor;
-        }
-      } else if (requestMap.concept !== undefined) {
-        const conceptData = responses[requestMap.concept].data;
-        cacheRef.current.concept = { data: conceptData, timestamp: now };
-        setConcept(conceptData);
-        // Appliquer les couleurs personnalisées
-        if (conceptData.primaryColor) {
-          document.documentElement.style.setProperty('--primary-color', conceptData.primaryColor);
-          // Glow: utiliser glowColor si défini, sinon primaryColor
-          const glowBase = conceptData.glowColor || conceptData.primaryColor;
-          document.documentElement.style.setProperty('--glow-color', `${glowBase}66`);
-          document.documentElement.style.setProperty('--glow-color-strong', `${glowBase}99`);
-        }
-        if (conceptData.secondaryColor) {
-          document.documentElement.style.setProperty('--secondary-color', conceptData.secondaryColor);
-        }
-        // v9.4.4: Appliquer la couleur de fond
-        if (conceptData.backgroundColor) {
-          document.documentElement.style.setProperty('--background-color', conceptData.backgroundColor);
-          document.body.style.backgroundColor = conceptData.backgroundColor;
-        }
+      // v9.4.4: Appliquer la couleur de fond
+      if (conceptData.backgroundColor) {
+        document.documentElement.style.setProperty('--background-color', conceptData.backgroundColor);
+        document.body.style.backgroundColor = conceptData.backgroundColor;
       }
 
       // Données dynamiques (toujours rafraîchies)
-      if (requestMap.users !== undefined) {
-        setUsers(responses[requestMap.users].data);
-      }
-      if (requestMap.codes !== undefined) {
-        setDiscountCodes(responses[requestMap.codes].data);
-      }
+      setUsers(usersRes.data);
+      setDiscountCodes(bootstrap.discountCodes);
 
-      console.log(`📦 Cache: ${cachedCourses ? '✓' : '↓'}courses ${cachedOffers ? '✓' : '↓'}offers ${cachedConcept ? '✓' : '↓'}concept`);
+      console.log(`📦 Bootstrap ${bootstrap.version}: ${cachedCourses ? '✓' : '↓'}courses ${cachedOffers ? '✓' : '↓'}offers ${cachedConcept ? '✓' : '↓'}concept`);
 
     } catch (err) { console.error("Error:", err); }
   }, [isCacheValid]);
@@ -3215,7 +3167,11 @@ function App() {
         
         setShowSuccess(true);
         resetFormKeepClient();
-      } catch (err) { console.error(err); }
+      } catch (err) {
+        console.error(err);
+        // Séance complète entre l'affichage et la validation
+        if (err.response?.status === 409) setValidationMessage(err.response.data.detail);
+      }
       setLoading(false);
       return;
     }
@@ -3299,7 +3255,10 @@ function App() {
       setShowSuccess(true);
       setShowConfirmPayment(false);
       resetFormKeepClient();
-    } catch (err) { console.error(err); }
+    } catch (err) {
+      console.error(err);
+      if (err.response?.status === 409) setValidationMessage(err.response.data.detail);
+    }
     setLoading(false);
   };
 
@@ -3310,8 +3269,10 @@ function App() {
         {dates.map((date, idx) => {
           const dateISO = date.toISOString();
           const isSelected = selectedCourse?.id === course.id && selectedDates.includes(dateISO);
+          const dayKey = `${date.getFullYear()}-${String(date.getMonth() + 1).padStart(2, '0')}-${String(date.getDate()).padStart(2, '0')}`;
+          const seats = courseSeats[course.id]?.[dayKey];
           return (
-            <button key={idx} type="button"
+            <button key={idx} type="button" disabled={seats?.full && !isSelected}
               onClick={() => { 
                 // Sélectionner le cours si différent
                 if (selectedCourse?.id !== course.id) {
@@ -3325,6 +3286,7 @@ function App() {
               className={`session-btn px-3 py-2 rounded-lg text-sm font-medium ${isSelected ? 'selected' : ''}`}
               style={{ color: 'white' }} data-testid={`date-btn-${course.id}-${idx}`}>
               {formatDate(date, course.time, lang)} {isSelected && '✔'}
+              {seats && <span className="block text-xs opacity-70">{seats.full ? 'Complet' : `${seats.remaining} place${seats.remaining > 1 ? 's' : ''}`}</span>}
             </button>
           );
         })}
@@ -423,7 +423,7 @@ const CoachDashboard = ({ t, lang, onBack, onLogout, coachUser }) => {
           });
           setCoachCredits(res.data?.credits ?? 0);
           // v8.9.9: Récupérer username pour vitrine
-          const username = res.data?.name?.toLowerCase().replace(/\s+/g, '-') || res.data?.id || safeCoachUser.email.split('@')[0];
+          const username = res.data?.username_slug || res.data?.name?.toLowerCase().replace(/\s+/g, '-') || res.data?.id || safeCoachUser.email.split('@')[0];
           setCoachUsername(isSuperAdmin ? 'bassi' : username);
           // v9.1.3: Récupérer platform_name pour marque blanche
           setCoachPlatformName(res.data?.platform_name || null);
@@ -813,11 +813,14 @@ const CoachDashboard = ({ t, lang, onBack, onLogout, coachUser }) => {
     }
   };
 
-  // Fonction pour charger les réservations avec pagination
-  const loadReservations = async (page = 1, limit = 20) => {
+  // Fonction pour charger les réservations avec pagination (curseur after/before: pages profondes aussi rapides que la 1re)
+  const loadReservations = async (page = 1, limit = 20, cursor = {}) => {
     setLoadingReservations(true);
     try {
-      const res = await axios.get(`${API}/reservations?page=${page}&limit=${limit}`, getCoachHeaders());
+      const params = new URLSearchParams({ page, limit });
+      if (cursor.after) params.set('after', cursor.after);
+      if (cursor.before) params.set('before', cursor.before);
+      const res = await axios.get(`${API}/reservations?${params}`, getCoachHeaders());
       setReservations(res.data.data);
       setReservationPagination(res.data.pagination);
     } catch (err) {
@@ -885,25 +888,23 @@ const CoachDashboard = ({ t, lang, onBack, onLogout, coachUser }) => {
 
   const exportCSV = async () => {
     try {
-      // Récupérer TOUTES les réservations pour l'export (sans pagination)
-      const response = await axios.get(`${API}/reservations?all_data=true`);
-      const allReservations = response.data.data;
-      
-      const rows = [
-        [t('code'), t('name'), t('email'), "WhatsApp", t('courses'), t('date'), t('time'), t('offer'), t('qty'), t('total'), "Dates multiples"],
-        ...allReservations.map(r => {
-          const dt = new Date(r.datetime);
-          return [r.reservationCode || '', r.userName, r.userEmail, r.userWhatsapp || '', r.courseName, 
-            dt.toLocaleDateString('fr-CH'), dt.toLocaleTimeString('fr-CH', { hour: '2-digit', minute: '2-digit' }),
-            r.offerName, r.quantity || 1, r.totalPrice || r.price, r.selectedDatesText || ''];
-        })
+      // Export en flux côté serveur (curseur, sans limite de 10 000 lignes)
+      // date / time / qty / total: colonnes calculées par le serveur (heure suisse, quantity || 1, totalPrice || price)
+      const columns = [
+        ["reservationCode", t('code')], ["userName", t('name')], ["userEmail", t('email')], ["userWhatsapp", "WhatsApp"],
+        ["courseName", t('courses')], ["date", t('date')], ["time", t('time')], ["offerName", t('offer')],
+        ["qty", t('qty')], ["total", t('total')], ["selectedDatesText", "Dates multiples"]
       ];
-      const csv = rows.map(r => r.map(c => `"${c}"`).join(",")).join("\n");
-      const blob = new Blob(["\uFEFF" + csv], { type: "text/csv;charset=utf-8;" }); // UTF-8 BOM
+      const params = new URLSearchParams({ format: "csv", columns: columns.map(([key]) => key).join(",") });
+      columns.forEach(([, label]) => params.append("label", label));
+      const response = await axios.get(`${API}/reservations/export?${params}`,
+        { ...getCoachHeaders(), responseType: "blob" });
+      const blob = new Blob(["\uFEFF", response.data], { type: "text/csv;charset=utf-8;" }); // UTF-8 BOM
       const url = URL.createObjectURL(blob);
       const a = document.createElement("a"); a.href = url; 
       a.download = `afroboost_reservations_${new Date().toISOString().split('T')[0]}.csv`;
       document.body.appendChild(a); a.click(); document.body.removeChild(a);
+      URL.revokeObjectURL(url);
     } catch (err) {
       console.error("Export error:", err);
       alert("Erreur lors de l'export CSV");
@@ -995,49 +996,39 @@ const CoachDashboard = ({ t, lang, onBack, onLogout, coachUser }) => {
     e.preventDefault();
     if (!newCode.type || !newCode.value) return;
     
-    const count = Math.min(Math.max(1, parseInt(newCode.batchCount) || 1), 50); // Entre 1 et 50
+    const count = Math.min(Math.max(1, parseInt(newCode.batchCount) || 1), 10000); // Entre 1 et 10000
     const prefix = newCode.prefix?.trim().toUpperCase() || "CODE";
     
     setBatchLoading(true);
-    const createdCodes = [];
     
     try {
-      // Si plusieurs bénéficiaires sélectionnés, attribuer un code à chacun
-      const beneficiaries = selectedBeneficiaries.length > 0 ? selectedBeneficiaries : [null];
-      let codeIndex = 1;
+      // Un seul appel: codes uniques générés côté serveur, renvoyés en CSV
+      const response = await axios.post(`${API}/discount-codes/batch`, {
+        count,
+        prefix,
+        type: newCode.type, 
+        value: parseFloat(newCode.value),
+        assignedEmails: selectedBeneficiaries, // attribués de manière circulaire
+        courses: newCode.courses, // Cours ET produits autorisés
+        maxUses: newCode.maxUses ? parseInt(newCode.maxUses) : null,
+        expiresAt: newCode.expiresAt || null
+      }, { responseType: "blob" });
       
-      for (let i = 0; i < count; i++) {
-        // Attribuer les bénéficiaires de manière circulaire si moins de bénéficiaires que de codes
-        const beneficiaryEmail = beneficiaries[i % beneficiaries.length];
-        const codeValue = `${prefix}-${String(codeIndex).padStart(2, '0')}`;
-        codeIndex++;
-        
-        const response = await axios.post(`${API}/discount-codes`, {
-          code: codeValue,
-          type: newCode.type, 
-          value: parseFloat(newCode.value),
-          assignedEmail: beneficiaryEmail,
-          courses: newCode.courses, // Cours ET produits autorisés
-          maxUses: newCode.maxUses ? parseInt(newCode.maxUses) : null,
-          expiresAt: newCode.expiresAt || null
-        });
-        createdCodes.push(response.data);
-      }
+      const url = URL.createObjectURL(new Blob(["\uFEFF", response.data], { type: "text/csv;charset=utf-8;" }));
+      const a = document.createElement("a"); a.href = url;
+      a.download = `codes_${prefix}_${new Date().toISOString().split('T')[0]}.csv`;
+      document.body.appendChild(a); a.click(); document.body.removeChild(a);
+      URL.revokeObjectURL(url);
       
-      setDiscountCodes(prev => [...prev, ...createdCodes]);
+      const updatedCodes = await axios.get(`${API}/discount-codes`);
+      setDiscountCodes(updatedCodes.data);
       setNewCode({ code: "", type: "", value: "", assignedEmails: [], courses: [], maxUses: "", expiresAt: "", batchCount: 1, prefix: "" });
       setSelectedBeneficiaries([]);
       setIsBatchMode(false);
-      alert(`✅ ${count} codes créés avec succès !`);
+      alert(`✅ ${response.headers["x-codes-created"] || count} codes créés avec succès !`);
     } catch (error) {
       console.error("Erreur génération en série:", error);
-      // Ajouter les codes déjà créés même si erreur partielle
-      if (createdCodes.length > 0) {
-        setDiscountCodes(prev => [...prev, ...createdCodes]);
-        alert(`⚠️ ${createdCodes.length}/${count} codes créés. Erreur partielle.`);
-      } else {
-        alert("❌ Erreur lors de la création des codes.");
-      }
+      alert("❌ Erreur lors de la création des codes.");
     } finally {
       setBatchLoading(false);
     }
@@ -2036,7 +2027,7 @@ const CoachDashboard = ({ t, lang, onBack, onLogout, coachUser }) => {
         for (const emoji of customEmojis) {
           const tag = `[emoji:${emoji.id}]`;
           if (messageContent.includes(tag)) {
-            messageContent = messageContent.replace(tag, `<img src="${emoji.image_data}" alt="${emoji.name}" style="width:24px;height:24px;display:inline;vertical-align:middle" />`);
+            messageContent = messageContent.replace(tag, `<img src="${emoji.thumb_url || emoji.image_data}" alt="${emoji.name}" style="width:24px;height:24px;display:inline;vertical-align:middle" />`);
           }
         }
       }
@@ -2859,8 +2850,9 @@ const CoachDashboard = ({ t, lang, onBack, onLogout, coachUser }) => {
       addCampaignLog(campaignId, 'Lancement de la campagne...', 'info');
       const res = await axios.post(`${API}/campaigns/${campaignId}/launch`);
       setCampaigns(campaigns.map(c => c.id === campaignId ? res.data : c));
-      addCampaignLog(campaignId, `Campagne lancée avec ${res.data.results?.length || 0} destinataire(s)`, 'success');
-      showCampaignToast(`Campagne lancée ! ${res.data.results?.length || 0} destinataire(s)`, 'success');
+      const recipients = res.data.resultsSummary?.total ?? (res.data.results?.length || 0);
+      addCampaignLog(campaignId, `Campagne lancée avec ${recipients} destinataire(s)`, 'success');
+      showCampaignToast(`Campagne lancée ! ${recipients} destinataire(s)`, 'success');
     } catch (err) { 
       console.error("Error launching campaign:", err);
       addCampaignLog(campaignId, `Erreur lancement: ${err.message}`, 'error');
@@ -4355,7 +4347,10 @@ const CoachDashboard = ({ t, lang, onBack, onLogout, coachUser }) => {
               onClearSearch: () => setReservationsSearch(''),
               onScanClick: () => setShowScanner(true),
               onExportCSV: exportCSV,
-              onPageChange: (page) => loadReservations(page, reservationPagination.limit),
+              onPageChange: (page) => loadReservations(page, reservationPagination.limit,
+                page > reservationPagination.page
+                  ? { after: reservationPagination.next_cursor }
+                  : { before: reservationPagination.prev_cursor }),
               onValidateReservation: validateReservation,
               onDeleteReservation: deleteReservation,
               formatDateTime: (date) => {
@@ -5154,6 +5149,11 @@ const CoachDashboard = ({ t, lang, onBack, onLogout, coachUser }) => {
                       <input type="time" value={course.time} onChange={(e) => { const n = [...courses]; n[idx].time = e.target.value; setCourses(n); }}
                         onBlur={() => updateCourse(course)} className="w-full px-3 py-2 rounded-lg neon-input text-sm" />
                     </div>
+                    <div>
+                      <label className="block mb-1 text-white text-xs opacity-70">Places par séance</label>
+                      <input type="number" min="0" value={course.capacity ?? ''} onChange={(e) => { const n = [...courses]; n[idx].capacity = e.target.value === '' ? null : parseInt(e.target.value); setCourses(n); }}
+                        onBlur={() => updateCourse(course)} className="w-full px-3 py-2 rounded-lg neon-input text-sm" placeholder="Illimité" />
+                    </div>
                     <div className="md:col-span-2">
                       <label className="block mb-1 text-white text-xs opacity-70">{t('mapsLink')}</label>
                       <input type="url" value={course.mapsUrl || ''} onChange={(e) => { const n = [...courses]; n[idx].mapsUrl = e.target.value; setCourses(n); }}
@@ -5798,22 +5798,22 @@ const CoachDashboard = ({ t, lang, onBack, onLogout, coachUser }) => {
                       type="text" 
                       placeholder="VIP, PROMO, COACH..." 
                       value={newCode.prefix} 
-                      onChange={e => setNewCode({ ...newCode, prefix: e.target.value.toUpperCase() })}
+                      onChange={e => setNewCode({ ...newCode, prefix: e.target.value.toUpperCase().replace(/[^A-Z0-9_-]/g, "") })}
                       className="w-full px-3 py-2 rounded-lg neon-input text-sm uppercase" 
                       data-testid="batch-prefix"
                       maxLength={15}
                     />
-                    <span className="text-xs text-purple-300 opacity-50 mt-1 block">Ex: VIP → VIP-1, VIP-2...</span>
+                    <span className="text-xs text-purple-300 opacity-50 mt-1 block">Ex: VIP → VIP-7KQ2M9XA, VIP-P4HT8WZC...</span>
                   </div>
                   <div>
                     <label className="block text-white text-xs mb-1 opacity-70">{t('batchCount')}</label>
                     <input 
                       type="number" 
                       min="1" 
-                      max="20" 
-                      placeholder="1-20" 
+                      max="10000" 
+                      placeholder="1-10000" 
                       value={newCode.batchCount} 
-                      onChange={e => setNewCode({ ...newCode, batchCount: Math.min(20, Math.max(1, parseInt(e.target.value) || 1)) })}
+                      onChange={e => setNewCode({ ...newCode, batchCount: Math.min(10000, Math.max(1, parseInt(e.target.value) || 1)) })}
                       className="w-full px-3 py-2 rounded-lg neon-input text-sm" 
                       data-testid="batch-count"
                     />
@@ -12,6 +12,7 @@ import axios from "axios";
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL || '';
 const API = `${BACKEND_URL}/api`;
+const PARTNERS_PAGE_SIZE = 50;
 
 // v9.5.3: Vidéo par défaut Afroboost - Afrobeat Dance Workout (vidéo populaire 2025)
 const DEFAULT_VIDEO_URL = "https://www.youtube.com/watch?v=9ZvW8wnWcxE";
@@ -249,6 +250,7 @@ const PartnerVideoCard = ({ partner, onToggleMute, isMuted, onLike, isLiked, onN
                     className="absolute inset-0 w-full h-full object-cover"
                     onError={() => setHasError(true)}
                     preload="metadata"
+                    poster={hasError ? undefined : partner.poster_url || undefined}
                   >
                     <source src={activeMedia.url} type="video/mp4" />
                   </video>
@@ -492,8 +494,14 @@ const PartnersCarousel = ({ onPartnerClick, onSearch, maintenanceMode = false, i
   useEffect(() => {
     const fetchPartners = async () => {
       try {
-        const res = await axios.get(`${API}/partners/active`);
-        const rawData = res.data || [];
+        // Pages de PARTNERS_PAGE_SIZE jusqu'à une page incomplète (liste en cache côté serveur)
+        const rawData = [];
+        for (let offset = 0; ; offset += PARTNERS_PAGE_SIZE) {
+          const res = await axios.get(`${API}/partners/active`, { params: { offset, limit: PARTNERS_PAGE_SIZE } });
+          const page = res.data || [];
+          rawData.push(...page);
+          if (page.length < PARTNERS_PAGE_SIZE) break;
+        }
         
         // v9.6.6: Déduplication par email (double sécurité)
         const seen = new Set();
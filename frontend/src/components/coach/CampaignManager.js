@@ -1877,7 +1877,7 @@ const CampaignManager = ({
                 })
                 .map(campaign => {
                 // Count failed results for this campaign
-                const failedCount = campaign.results?.filter(r => r.status === 'failed').length || 0;
+                const failedCount = campaign.resultsSummary?.failed ?? (campaign.results?.filter(r => r.status === 'failed').length || 0);
                 const hasErrors = failedCount > 0 || campaignLogs.some(l => l.campaignId === campaign.id && l.type === 'error');
                 const convType = activeConversations.find(ac => ac.conversation_id === campaign.targetConversationId)?.type;
                 
@@ -1899,7 +1899,7 @@ const CampaignManager = ({
                             <span className="truncate max-w-[150px]">{campaign.targetConversationName || 'Chat Interne'}</span>
                           </>
                         ) : campaign.targetType === "all" ? (
-                          `Tous (${campaign.results?.length || 0})`
+                          `Tous (${campaign.resultsSummary?.total ?? (campaign.results?.length || 0)})`
                         ) : (
                           campaign.selectedContacts?.length || 0
                         )}
@@ -2064,7 +2064,7 @@ const CampaignManager = ({
               
               <div className="mt-3 flex justify-between text-xs">
                 <span className="text-purple-400">
-                  Progression: {campaign.results?.filter(r => r.status === 'sent').length || 0} / {campaign.results?.length || 0} envoyé(s)
+                  Progression: {campaign.resultsSummary?.sent ?? (campaign.results?.filter(r => r.status === 'sent').length || 0)} / {campaign.resultsSummary?.total ?? (campaign.results?.length || 0)} envoyé(s)
                 </span>
                 {campaign.results?.some(r => r.status === 'pending' && (
                   (r.channel === 'whatsapp' && !formatPhoneForWhatsApp(r.contactPhone)) ||
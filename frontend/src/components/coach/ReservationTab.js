@@ -6,7 +6,7 @@
  * 
  * Props attendues:
  * - reservations: Liste des réservations filtrées
- * - pagination: Objet {page, pages, total, limit}
+ * - pagination: Objet {page, pages, total, limit, next_cursor, prev_cursor}
  * - search: Terme de recherche
  * - loading: État de chargement
  * - handlers: Objet contenant les fonctions de callback
@@ -106,7 +106,7 @@ const ReservationTab = ({
           </span>
           <button 
             onClick={() => onPageChange(pagination.page + 1)}
-            disabled={pagination.page >= pagination.pages || loading}
+            disabled={pagination.page >= pagination.pages || !pagination.next_cursor || loading}
             className="px-3 py-1 rounded bg-purple-600/50 text-white text-sm disabled:opacity-30 hover:bg-purple-600"
           >
             Suivant →